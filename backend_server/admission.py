@@ -0,0 +1,102 @@
+"""
+Admission control for the API server.
+
+Requests take one of MAX_CONCURRENT_AGENT_REQUESTS execution slots. When all
+slots are busy they wait in a bounded priority queue (interactive before
+batch). A request is shed with 503 + Retry-After when the queue is full or
+when its estimated wait would exceed the SLO for its priority.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
+
+from src.config.settings import MAX_CONCURRENT_AGENT_REQUESTS, MAX_QUEUE_DEPTH, QUEUE_SLO_S
+
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class Overloaded(Exception):
+    """Request rejected by admission control"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """Concurrency slots plus a bounded priority wait queue (single event loop)"""
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_AGENT_REQUESTS,
+                 max_queue: int = MAX_QUEUE_DEPTH, slo_s: Dict[str, float] = QUEUE_SLO_S):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.slo_s = slo_s
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._service_time = 5.0  # EWMA of request service time, seconds
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def estimated_wait(self, priority: str) -> float:
+        """Requests ahead of this one, drained max_concurrent at a time"""
+        rank = PRIORITIES[priority]
+        ahead = sum(1 for p, _, fut in self._waiters if p <= rank and not fut.done())
+        return (ahead + 1) / self.max_concurrent * self._service_time
+
+    async def acquire(self, priority: str = "interactive") -> float:
+        """Wait for a slot; returns seconds spent queued or raises Overloaded"""
+        if self.active < self.max_concurrent and not self.queue_depth:
+            self.active += 1
+            return 0.0
+
+        wait = self.estimated_wait(priority)
+        if self.queue_depth >= self.max_queue:
+            raise Overloaded("queue_full", wait)
+        if wait > self.slo_s[priority]:
+            raise Overloaded("slo", wait)
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._seq), fut))
+        start = time.monotonic()
+        try:
+            await asyncio.wait({fut}, timeout=self.slo_s[priority])
+        except asyncio.CancelledError:
+            # Client gone: give back a slot handed over meanwhile, or leave the queue
+            if fut.done() and not fut.cancelled():
+                self.release(self._service_time)  # Unused slot: leaves the service time estimate as is
+            else:
+                fut.cancel()
+            raise
+        if not fut.done():
+            # Timed out; the cancelled entry is skipped when slots are handed out
+            fut.cancel()
+            raise Overloaded("timeout", self.estimated_wait(priority))
+        return time.monotonic() - start
+
+    def release(self, service_time: float):
+        """Hand the slot to the next waiter, or free it"""
+        self._service_time = 0.8 * self._service_time + 0.2 * service_time
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive"):
+        waited = await self.acquire(priority)
+        start = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.release(time.monotonic() - start)
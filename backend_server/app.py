@@ -1,12 +1,47 @@
-from fastapi import FastAPI, Response
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Literal, Optional
 from dotenv import load_dotenv
+import asyncio
+import hmac
 import time
 
 from main import main as execute_sql_query
+from backend_server.admission import AdmissionController, Overloaded
+from backend_server.encoding import NotAcceptable, negotiate, query_response
+from backend_server.metrics import MULTIPROCESS_DIR, forget_dead_workers, gauge_function, publish_gauges, render_metrics
+from src.config.settings import (
+    ADMIN_TOKEN,
+    DATABASE_IDLE_TTL_S,
+    METRICS_REFRESH_INTERVAL_S,
+    PROFILE_SAMPLE_INTERVAL_MS,
+    SHARED_CACHE_PATH,
+    WARMUP_ENABLED,
+    WARMUP_INTERVAL_S,
+    WARMUP_MAX_ACTIVE,
+)
+from src.db.change_tracking import start_change_tracker
+from src.db.export import (
+    FORMATS,
+    ExportError,
+    create_handle,
+    export_filename,
+    export_page,
+    get_handle,
+    parse_range,
+    stream_export,
+)
+from src.db.registry import UnknownDatabaseError, get_registry
+from src.memory.cache import cache_stats
+from src.memory.warmup import CacheWarmer, WarmupLock, popular_questions
+from src.schema.introspect import start_schema_refresher
+from src.utils import profiling
+from src.utils.concurrency import DB_LIMITER, LLM_LIMITER, LimiterTimeout
 
 from fastapi.middleware.cors import CORSMiddleware
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram
 
 load_dotenv()
 
@@ -22,6 +57,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+async def start_background_jobs():
+    # Keeps FULL_SCHEMA in sync with the database (no-op unless SCHEMA_REFRESH_INTERVAL_S > 0)
+    start_schema_refresher()
+    # Table versions that let cached answers live until their tables change (CHANGE_TRACKING_INTERVAL_S)
+    start_change_tracker()
+    asyncio.create_task(evict_idle_databases())
+    if MULTIPROCESS_DIR:
+        asyncio.create_task(publish_worker_gauges())
+    if WARMUP_ENABLED:
+        asyncio.create_task(warm_caches())
+
+
+async def evict_idle_databases():
+    """Close registered databases nobody has used for DATABASE_IDLE_TTL_S, even without traffic"""
+    while True:
+        await asyncio.sleep(max(DATABASE_IDLE_TTL_S / 4, 1))
+        await run_in_threadpool(get_registry().evict_idle)
+
+
+async def publish_worker_gauges():
+    """Multi-worker metrics: this worker's gauges for whichever worker is scraped"""
+    while True:
+        await run_in_threadpool(publish_gauges)
+        await run_in_threadpool(forget_dead_workers)
+        await asyncio.sleep(METRICS_REFRESH_INTERVAL_S)
+
+
 # ---------------------------
 # Prometheus metrics
 # ---------------------------
@@ -43,6 +107,102 @@ AGENT_FAILURES_TOTAL = Counter(
     "Total failed agent executions"
 )
 
+# ---------------------------
+# Admission control
+# ---------------------------
+
+admission = AdmissionController()
+
+QUEUE_DEPTH = Gauge("agent_queue_depth", "Requests waiting for an execution slot", multiprocess_mode="livesum")
+gauge_function(QUEUE_DEPTH, lambda: admission.queue_depth)
+
+AGENT_INFLIGHT = Gauge("agent_requests_inflight", "Requests holding an execution slot", multiprocess_mode="livesum")
+gauge_function(AGENT_INFLIGHT, lambda: admission.active)
+
+QUEUE_WAIT_SECONDS = Histogram(
+    "agent_queue_wait_seconds",
+    "Time spent waiting for an execution slot",
+    ["priority"]
+)
+
+REQUESTS_SHED_TOTAL = Counter(
+    "agent_requests_shed_total",
+    "Requests rejected with 503 by admission control",
+    ["priority", "reason"]
+)
+
+LLM_CALLS_INFLIGHT = Gauge("llm_calls_inflight", "Concurrent LLM calls", multiprocess_mode="livesum")
+gauge_function(LLM_CALLS_INFLIGHT, lambda: LLM_LIMITER.in_use)
+
+# Each worker has its own rate-limit bucket: one series per worker
+LLM_TOKEN_BUDGET = Gauge("llm_token_budget_available", "Tokens left in the provider rate-limit bucket",
+                         multiprocess_mode="liveall")
+gauge_function(LLM_TOKEN_BUDGET, lambda: LLM_LIMITER.tokens.available)
+
+DB_QUERIES_INFLIGHT = Gauge("db_queries_inflight", "Concurrent DB executions", multiprocess_mode="livesum")
+gauge_function(DB_QUERIES_INFLIGHT, lambda: DB_LIMITER.in_use)
+
+CACHE_HITS = Gauge("agent_cache_hits", "Cache hits since start", ["cache"], multiprocess_mode="livesum")
+CACHE_INVALIDATED = Gauge("agent_cache_invalidated", "Entries dropped because a table they read changed",
+                          ["cache"], multiprocess_mode="livesum")
+# Shared caches (SHARED_CACHE_PATH) report the same host-wide count from every worker
+CACHE_ENTRIES = Gauge("agent_cache_entries", "Entries held per cache", ["cache"], multiprocess_mode="liveall")
+for _name in cache_stats():
+    gauge_function(CACHE_HITS.labels(_name), lambda name=_name: cache_stats()[name]["hits"])
+    gauge_function(CACHE_INVALIDATED.labels(_name), lambda name=_name: cache_stats()[name]["invalidated"])
+    gauge_function(CACHE_ENTRIES.labels(_name), lambda name=_name: cache_stats()[name]["entries"])
+
+QUERY_LATENCY = Histogram(
+    "agent_query_latency_seconds",
+    "Agent execution time, session follow-ups (local | cte | new) apart from standalone questions",
+    ["follow_up"]
+)
+
+DATABASES_OPEN = Gauge("agent_databases_open", "Registered databases with resources open, summed over workers",
+                       multiprocess_mode="livesum")
+gauge_function(DATABASES_OPEN, lambda: len(get_registry().stats()))
+
+WARMUP_ITEMS_TOTAL = Counter("agent_warmup_items_total", "Warm-up items processed", ["result"])
+
+# ---------------------------
+# Cache warm-up
+# ---------------------------
+
+async def warm_caches():
+    """
+    Warm or refresh popular questions every WARMUP_INTERVAL_S. Items go one at
+    a time through admission control at batch priority, and only start while
+    at most WARMUP_MAX_ACTIVE requests hold a slot and none are queued.
+    With a shared cache, only the worker holding the warm-up lock runs cycles
+    (another takes over if it exits); per-process caches are warmed by each.
+    """
+    lock = WarmupLock() if SHARED_CACHE_PATH else None
+    while True:
+        if lock is not None and not lock.acquire():
+            await asyncio.sleep(WARMUP_INTERVAL_S)
+            continue
+        items = await run_in_threadpool(popular_questions)
+        warmer = CacheWarmer()
+        try:
+            for item in items:
+                if warmer.exhausted:
+                    break
+                while admission.active > WARMUP_MAX_ACTIVE or admission.queue_depth:
+                    await asyncio.sleep(1)
+                try:
+                    async with admission.slot("batch"):
+                        await run_in_threadpool(warmer.run_item, item)
+                except (Overloaded, LimiterTimeout):
+                    break
+        finally:
+            await run_in_threadpool(warmer.close)
+        for result, count in warmer.stats.items():
+            if result != "tokens" and count:
+                WARMUP_ITEMS_TOTAL.labels(result).inc(count)
+        print(f"🔥 Cache warm-up cycle: {warmer.stats}")
+        await asyncio.sleep(WARMUP_INTERVAL_S)
+
+
 # ---------------------------
 # Middleware for metrics
 # ---------------------------
@@ -69,6 +229,13 @@ async def prometheus_middleware(request, call_next):
 # Define what data we expect from user
 class QueryRequest(BaseModel):
     query: str
+    engine: Optional[Literal["postgres", "duckdb", "auto"]] = None  # Defaults to EXECUTION_BACKEND
+    priority: Literal["interactive", "batch"] = "interactive"
+    session_id: Optional[str] = None  # Follow-ups in the same session refine the previous answer
+    database_id: Optional[str] = None  # Registered database (src.db.registry), defaults to "default"
+    approximate: bool = False  # Aggregates may be estimated from a sample, with confidence intervals
+    fields: Optional[List[str]] = None  # Response keys to return (all by default); without "results", no rows
+    layout: Optional[Literal["rows", "columns"]] = None  # Result rows, or one list per column (msgpack default)
 
 
 # Root endpoint - just to check if server is running
@@ -77,18 +244,167 @@ def home():
     return {"message": "SQL Agent API is running!"}
 
 
+def overloaded_response(priority: str, reason: str, retry_after: int):
+    REQUESTS_SHED_TOTAL.labels(priority, reason).inc()
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(retry_after)},
+        content={"detail": "Server is overloaded, please retry later", "reason": reason}
+    )
+
+
 # Main endpoint - execute natural language query
 @app.post("/query")
-def execute_query(request: QueryRequest):
+async def execute_query(
+    request: QueryRequest,
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """Answer a question; the body is JSON, MessagePack or Arrow (Accept) and may be compressed"""
     user_query = request.query
+    try:
+        fmt = negotiate(accept)
+    except NotAcceptable as e:
+        return JSONResponse(status_code=406, content={"detail": str(e)})
 
-    result = execute_sql_query(user_query)
+    try:
+        async with admission.slot(request.priority) as waited:
+            QUEUE_WAIT_SECONDS.labels(request.priority).observe(waited)
+            start = time.perf_counter()
+            result = await run_in_threadpool(
+                execute_sql_query, user_query, engine=request.engine, session_id=request.session_id,
+                database=request.database_id, approximate=request.approximate
+            )
+            QUERY_LATENCY.labels(result.get("follow_up") or "standalone").observe(time.perf_counter() - start)
+    except Overloaded as e:
+        return overloaded_response(request.priority, e.reason, e.retry_after)
+    except LimiterTimeout:
+        return overloaded_response(request.priority, "rate_limit", 30)
+    except UnknownDatabaseError as e:
+        return JSONResponse(status_code=404, content={"detail": str(e)})
 
     # Track agent-level failures
     if not result.get("valid", False):
         AGENT_FAILURES_TOTAL.inc()
 
-    return result
+    # The full result, beyond the rows shown here, is exported from /results/{handle}
+    result = {**result, "result_handle": create_handle(result)}
+    return await run_in_threadpool(
+        query_response, result, fmt, accept_encoding, layout=request.layout, fields=request.fields
+    )
+
+
+@app.get("/databases")
+def list_databases():
+    """Registered database ids and what this process currently holds open for each"""
+    registry = get_registry()
+    return {"databases": sorted(registry.configs), "open": registry.stats()}
+
+
+# ---------------------------
+# Result export
+# ---------------------------
+
+@app.get("/results/{handle}")
+async def export_result(
+    handle: str,
+    request: Request,
+    format: Literal["csv", "arrow", "parquet"] = "csv",
+    page_size: Optional[int] = None,
+    key: Optional[str] = None,
+    after: Optional[str] = None,
+    range_header: Optional[str] = Header(None, alias="Range"),
+):
+    """
+    Stream the full result of an answered query as CSV, Arrow IPC or Parquet.
+    With page_size and key, return one keyset page instead; X-Next-Cursor
+    (and the Link header) point to the next one.
+    """
+    stored = get_handle(handle)
+    if stored is None:
+        return JSONResponse(status_code=404, content={"detail": "Unknown or expired result handle"})
+    media_type = FORMATS[format][0]
+    disposition = {"Content-Disposition": f'attachment; filename="{export_filename(handle, format)}"'}
+
+    try:
+        if page_size is not None or key or after:
+            body, cursor, rows = await run_in_threadpool(
+                export_page, stored, format, key, page_size or 1000, after
+            )
+            headers = {**disposition, "X-Page-Rows": str(rows)}
+            if cursor:
+                headers["X-Next-Cursor"] = cursor
+                headers["Link"] = f'<{request.url.include_query_params(after=cursor)}>; rel="next"'
+            return Response(body, media_type=media_type, headers=headers)
+
+        requested = parse_range(range_header)
+        chunks = stream_export(stored, format, requested)
+        # Runs the query before any byte is sent, so failures get a status code
+        first = await run_in_threadpool(next, chunks, b"")
+    except ExportError as e:
+        status = 416 if range_header and "Range" in str(e) else 400
+        return JSONResponse(status_code=status, content={"detail": str(e)})
+    except LimiterTimeout:
+        return overloaded_response("batch", "exports", 5)
+
+    def body():
+        yield first
+        yield from chunks
+
+    headers = {**disposition, "Accept-Ranges": "rows"}
+    if requested:
+        first_row, count = requested
+        last_row = str(first_row + count - 1) if count else "*"
+        headers["Content-Range"] = f"rows {first_row}-{last_row}/*"
+    return StreamingResponse(body(), status_code=206 if requested else 200,
+                             media_type=media_type, headers=headers)
+
+
+# ---------------------------
+# Admin: on-demand profiling
+# ---------------------------
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+class ProfilingRequest(BaseModel):
+    requests: int = 1  # Capture this many upcoming requests
+    pattern: Optional[str] = None  # Only requests whose question matches this regex
+    memory: bool = True  # Allocation snapshot (tracemalloc) as well as CPU
+    interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS  # Stack sampling period
+
+
+@app.post("/admin/profiling", dependencies=[Depends(require_admin)])
+def arm_profiling(request: ProfilingRequest):
+    """Profile the next matching requests; captures appear under /admin/profiling/captures"""
+    try:
+        return profiling.arm(request.requests, request.pattern, request.memory, request.interval_ms)
+    except profiling.ProfilingError as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+
+
+@app.delete("/admin/profiling", dependencies=[Depends(require_admin)])
+def disarm_profiling():
+    return profiling.disarm()
+
+
+@app.get("/admin/profiling", dependencies=[Depends(require_admin)])
+def profiling_status():
+    return {**profiling.status(), "captures": profiling.list_captures()}
+
+
+@app.get("/admin/profiling/captures/{capture_id}/{kind}", dependencies=[Depends(require_admin)])
+def download_capture(capture_id: str, kind: str):
+    """One capture file: prof (pstats), folded (flamegraph stacks), tracemalloc or json (summary)"""
+    try:
+        path = profiling.capture_path(capture_id, kind)
+    except profiling.ProfilingError as e:
+        return JSONResponse(status_code=404, content={"detail": str(e)})
+    return FileResponse(path, media_type=profiling.CAPTURE_FILES[kind], filename=path.name)
 
 
 # ---------------------------
@@ -97,7 +413,8 @@ def execute_query(request: QueryRequest):
 
 @app.get("/metrics")
 def metrics():
+    body, content_type = render_metrics()
     return Response(
-        generate_latest(),
-        media_type=CONTENT_TYPE_LATEST
+        body,
+        media_type=content_type
     )
@@ -0,0 +1,185 @@
+"""
+Wire formats for /query responses.
+
+The body format follows the request's Accept header:
+
+- application/json (default): serialized with orjson when it is installed,
+  the standard library otherwise
+- application/msgpack (or application/x-msgpack): MessagePack, through
+  ormsgpack or msgpack
+- application/vnd.apache.arrow.stream: an Arrow IPC stream of the result
+  rows, with every other response field as JSON in the schema metadata
+  under "response"
+
+With layout "columns" (the default for MessagePack), "results" holds one
+list per entry of "columns" instead of one list per row: no per-row
+framing, and runs of similar values that compress better. `fields` keeps
+only the listed response keys; leaving out "results" skips the rows.
+
+Bodies of at least RESPONSE_COMPRESS_MIN_BYTES are compressed with brotli
+(when the brotli package is installed) or gzip, whichever the client's
+Accept-Encoding allows.
+"""
+import datetime
+import decimal
+import gzip
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Response
+
+from src.config.settings import RESPONSE_BROTLI_QUALITY, RESPONSE_COMPRESS_MIN_BYTES, RESPONSE_GZIP_LEVEL
+
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+ACCEPTED_TYPES = {
+    "*/*": "json",
+    "application/*": "json",
+    "application/json": "json",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.apache.arrow.stream": "arrow",
+}
+DEFAULT_LAYOUT = {"json": "rows", "msgpack": "columns", "arrow": "columns"}
+
+
+class NotAcceptable(ValueError):
+    """None of the accepted media types can be produced"""
+
+
+def _preferences(header: Optional[str]) -> List[Tuple[str, float]]:
+    """(value, q) of an Accept / Accept-Encoding header, by decreasing q then header order"""
+    ranked = []
+    for position, part in enumerate((header or "").split(",")):
+        name, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            ranked.append((-quality, position, name.lower()))
+    return [(name, -quality) for quality, _, name in sorted(ranked)]
+
+
+def _msgpack():
+    try:
+        import ormsgpack
+
+        return ormsgpack
+    except ImportError:
+        pass
+    try:
+        import msgpack
+
+        return msgpack
+    except ImportError:
+        return None
+
+
+def _available(fmt: str) -> bool:
+    if fmt == "msgpack":
+        return _msgpack() is not None
+    if fmt == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return False
+    return True
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Response format for an Accept header; NotAcceptable if none can be produced"""
+    if not accept:
+        return "json"
+    for media_type, quality in _preferences(accept):
+        fmt = ACCEPTED_TYPES.get(media_type)
+        if quality > 0 and fmt is not None and _available(fmt):
+            return fmt
+    supported = [media_type for fmt, media_type in MEDIA_TYPES.items() if _available(fmt)]
+    raise NotAcceptable(f"Supported response types: {', '.join(supported)}")
+
+
+def _default(value: Any) -> Any:
+    """Values the serializers don't handle natively (Postgres numerics, dates, sets)"""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+
+def dumps_json(payload: Any) -> bytes:
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+    return orjson.dumps(payload, default=_default)
+
+
+def columnar(rows: Optional[list], width: int) -> Optional[list]:
+    """Rows as one list per column"""
+    if rows is None:
+        return None
+    width = len(rows[0]) if rows else width
+    return [[row[i] for row in rows] for i in range(width)]  # Faster than zip(*rows) on long results
+
+
+def encode(result: Dict[str, Any], fmt: str, layout: Optional[str] = None,
+           fields: Optional[List[str]] = None) -> bytes:
+    """Response body of a /query result in one of MEDIA_TYPES"""
+    columns = list(result.get("columns") or [])
+    payload = {key: value for key, value in result.items() if fields is None or key in fields}
+
+    if fmt == "arrow":
+        from src.db.export import encode as encode_rows
+
+        rows = payload.pop("results", None) or []
+        metadata = {"response": dumps_json(payload).decode("utf-8")}
+        return b"".join(encode_rows(columns, iter([rows]), "arrow", metadata=metadata))
+
+    if (layout or DEFAULT_LAYOUT[fmt]) == "columns" and "results" in payload:
+        payload["results"] = columnar(payload["results"], len(columns))
+        payload["layout"] = "columns"
+    if fmt == "msgpack":
+        packer = _msgpack()
+        if packer.__name__ == "ormsgpack":
+            return packer.packb(payload, default=_default)
+        return packer.packb(payload, default=_default, use_bin_type=True)
+    return dumps_json(payload)
+
+
+def compress(body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """(body, Content-Encoding) for the best accepted encoding; small bodies stay as they are"""
+    if len(body) < RESPONSE_COMPRESS_MIN_BYTES or not accept_encoding:
+        return body, None
+    accepted = dict(_preferences(accept_encoding))
+    br, gz = (accepted.get(name, accepted.get("*", 0.0)) for name in ("br", "gzip"))
+    if br > 0 and br >= gz:  # Smaller at a similar cost: preferred when the client likes both as much
+        try:
+            import brotli
+
+            return brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY), "br"
+        except ImportError:
+            pass
+    if gz > 0:
+        return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0), "gzip"
+    return body, None
+
+
+def query_response(result: Dict[str, Any], fmt: str, accept_encoding: Optional[str] = None,
+                   layout: Optional[str] = None, fields: Optional[List[str]] = None) -> Response:
+    body, encoding = compress(encode(result, fmt, layout, fields), accept_encoding)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=MEDIA_TYPES[fmt], headers=headers)
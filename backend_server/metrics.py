@@ -0,0 +1,73 @@
+"""
+Prometheus metrics for one or several worker processes.
+
+With a single worker, metrics live in the process and gauges are computed
+when /metrics is scraped. With several workers (uvicorn --workers N,
+gunicorn), a scrape reaches one of them, so each worker must publish its
+numbers where the others can read them: set PROMETHEUS_MULTIPROC_DIR to an
+empty directory (wiped at each deploy) before starting the server, and
+prometheus_client keeps counters, histograms and gauges in per-process
+files there that /metrics aggregates.
+
+Computed gauges can't be read across processes, so in that mode each
+worker stores their values every METRICS_REFRESH_INTERVAL_S (and on scrape)
+instead. Gauges say in multiprocess_mode how workers' values combine, e.g.
+livesum for in-flight requests and liveall (one series per pid) for
+per-worker state. Files of workers that exited are dropped from live
+gauges.
+"""
+import os
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.getenv("prometheus_multiproc_dir")
+
+# (gauge or labelled child, value function) published by publish_gauges in multiprocess mode
+_computed: List[Tuple[object, Callable[[], float]]] = []
+
+
+def gauge_function(gauge, function: Callable[[], float]):
+    """Gauge whose value is function(): computed on scrape, or published by each worker"""
+    if MULTIPROCESS_DIR:
+        _computed.append((gauge, function))
+    else:
+        gauge.set_function(function)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def forget_dead_workers():
+    """Drop live-gauge files of workers that exited (their counters still add to the totals)"""
+    from prometheus_client import multiprocess
+
+    pids = {int(path.stem.rsplit("_", 1)[1]) for path in Path(MULTIPROCESS_DIR).glob("gauge_live*_*.db")}
+    for pid in pids:
+        if pid != os.getpid() and not _alive(pid):
+            multiprocess.mark_process_dead(pid, MULTIPROCESS_DIR)
+
+
+def publish_gauges():
+    for gauge, function in _computed:
+        gauge.set(function())
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition of this process, or of all workers in multiprocess mode"""
+    if not MULTIPROCESS_DIR:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    from prometheus_client import multiprocess
+
+    publish_gauges()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, MULTIPROCESS_DIR)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
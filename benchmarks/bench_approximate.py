@@ -0,0 +1,128 @@
+"""
+Benchmark: approximate answers vs. exact execution, per query class.
+
+Runs one query per class exactly and through the approximate rewrite
+(src.agent.approximate) with prebuilt sample tables and with TABLESAMPLE,
+and reports median latency, the relative error of the estimates against the
+exact values, and how often the exact value falls inside the reported 95%
+interval. Classes the rewrite can't estimate (MIN/MAX, COUNT DISTINCT) should
+be reported as falling back.
+
+Build the sample tables first:
+    python -m src.agent.approximate build --engine duckdb
+
+Usage:
+    python -m benchmarks.bench_approximate --engine duckdb --repeat 5
+"""
+import argparse
+import statistics
+import time
+
+from src.agent.approximate import approximate_sql, estimate_results
+from src.config.settings import APPROXIMATE_SAMPLE_PERCENT
+from src.db.backends import get_backend
+
+
+QUERY_CLASSES = {
+    "scalar_count": "select count(*) as orders from orders",
+    "share": """
+        select count(*) filter (where order_dow in (0, 6)) * 1.0 / count(*) as weekend_share
+        from orders
+    """,
+    "group_count": """
+        select order_dow, count(*) as order_count
+        from orders group by order_dow order by order_dow
+    """,
+    "group_avg": """
+        select order_hour_of_day, avg(days_since_prior_order) as avg_days
+        from orders group by order_hour_of_day order by order_hour_of_day
+    """,
+    "fact_dimension_join": """
+        select d.department, count(*) as items, avg(op.reordered) as reorder_rate
+        from order_products_prior op
+        join products p on op.product_id = p.product_id
+        join departments d on p.department_id = d.department_id
+        group by d.department order by items desc
+    """,
+    "two_fact_join": """
+        select o.order_dow, sum(op.reordered) as reorders
+        from orders o join order_products_prior op on o.order_id = op.order_id
+        group by o.order_dow order by o.order_dow
+    """,
+    "non_scalable_max": "select max(order_number) as max_orders from orders",
+    "non_scalable_distinct": "select count(distinct user_id) as users from orders",
+}
+
+
+def _timed(backend, conn, cursor, sql: str):
+    start = time.perf_counter()
+    _, rows = backend.execute(conn, cursor, backend.translate(sql))
+    return time.perf_counter() - start, rows
+
+
+def _compare(plan, exact_rows, estimated, intervals):
+    """(relative errors, covered flags) over every estimated value"""
+    errors, covered = [], []
+    key_width = sum(1 for kind in plan["kinds"] if kind == "group")
+    exact_by_key = {tuple(row[:key_width]): row for row in exact_rows}
+    for index, row in enumerate(estimated):
+        exact = exact_by_key.get(tuple(row[:key_width]))
+        if exact is None:
+            continue
+        for position, (column, kind) in enumerate(zip(plan["columns"], plan["kinds"])):
+            if kind == "group" or exact[position] is None or row[position] is None:
+                continue
+            truth = float(exact[position])
+            errors.append(abs(float(row[position]) - truth) / abs(truth) if truth else 0.0)
+            low, high = intervals[column][index]
+            covered.append(low <= truth <= high)
+    return errors, covered
+
+
+def run(engine: str, repeat: int, percent: float):
+    backend = get_backend(engine)
+    conn = backend.connect()
+    cursor = conn.cursor()
+    print(f"\n{engine}, {percent:g}% samples, {repeat} runs each")
+    print(f"{'class':24}{'sampling':13}{'exact ms':>10}{'approx ms':>11}{'speed-up':>10}"
+          f"{'med err':>9}{'max err':>9}{'CI cover':>10}  notes")
+    for name, sql in QUERY_CLASSES.items():
+        sql = " ".join(sql.split())
+        exact_times, exact_rows = [], None
+        for _ in range(repeat):
+            elapsed, exact_rows = _timed(backend, conn, cursor, sql)
+            exact_times.append(elapsed)
+        exact_ms = statistics.median(exact_times) * 1000
+        for sampling in ("tables", "tablesample"):
+            plan, reason = approximate_sql(sql, sampling, percent)
+            if plan is None:
+                print(f"{name:24}{sampling:13}{exact_ms:10.1f}{'':>11}{'':>10}{'':>9}{'':>9}{'':>10}  exact: {reason}")
+                continue
+            times, errors, covered, worst = [], [], [], 0.0
+            for _ in range(repeat):
+                elapsed, rows = _timed(backend, conn, cursor, plan["sql"])
+                times.append(elapsed)
+                estimated, intervals, relative = estimate_results(plan, rows)
+                worst = max(worst, relative)
+                run_errors, run_covered = _compare(plan, exact_rows, estimated, intervals)
+                errors += run_errors
+                covered += run_covered
+            approx_ms = statistics.median(times) * 1000
+            print(f"{name:24}{sampling:13}{exact_ms:10.1f}{approx_ms:11.1f}{exact_ms / approx_ms:9.1f}x"
+                  f"{statistics.median(errors):9.2%}{max(errors):9.2%}"
+                  f"{sum(covered) / len(covered):10.0%}  reported ±{worst:.1%}")
+    cursor.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Approximate answer benchmark")
+    parser.add_argument("--engine", default="duckdb", choices=["duckdb", "postgres"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--percent", type=float, default=APPROXIMATE_SAMPLE_PERCENT)
+    args = parser.parse_args()
+    run(args.engine, args.repeat, args.percent)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: cold-start cost of the agent.
+
+Each measurement runs in a fresh interpreter so nothing is cached in-process:
+- import time and peak RSS of the modules a CLI run / new worker loads
+- schema load time from the compiled artifact vs. parsing the YAML
+- graph compilation time on first use vs. the per-process cached graph
+
+Usage:
+    python -m benchmarks.bench_cold_start --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = """
+import json, resource, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+SCHEMA_SNIPPET = """
+import json, time, yaml
+from src.utils.schema_utils import SCHEMA_PATH, load_schema
+start = time.perf_counter(); load_schema(); artifact = time.perf_counter() - start
+start = time.perf_counter(); yaml.safe_load(SCHEMA_PATH.read_text(encoding="utf-8")); parsed = time.perf_counter() - start
+print(json.dumps({"artifact_seconds": artifact, "yaml_seconds": parsed}))
+"""
+
+GRAPH_SNIPPET = """
+import json, time
+from src.agent.agent import SQLAgent
+start = time.perf_counter(); SQLAgent._get_graph(); first = time.perf_counter() - start
+start = time.perf_counter(); SQLAgent._get_graph(); cached = time.perf_counter() - start
+print(json.dumps({"first_seconds": first, "cached_seconds": cached}))
+"""
+
+
+def _run(snippet: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", snippet],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _median(runs, key):
+    return statistics.median(r[key] for r in runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'import':32} {'median ms':>10} {'peak RSS MB':>12}")
+    for module in ["src.agent.agent", "main", "backend_server.app"]:
+        runs = [_run(IMPORT_SNIPPET.format(module=module)) for _ in range(args.runs)]
+        print(f"{module:32} {_median(runs, 'seconds') * 1000:>10.1f} {_median(runs, 'max_rss_mb'):>12.1f}")
+
+    runs = [_run(SCHEMA_SNIPPET) for _ in range(args.runs)]
+    print(f"\nschema load: artifact {_median(runs, 'artifact_seconds') * 1000:.2f} ms, "
+          f"yaml {_median(runs, 'yaml_seconds') * 1000:.2f} ms")
+
+    runs = [_run(GRAPH_SNIPPET) for _ in range(args.runs)]
+    print(f"graph build: first {_median(runs, 'first_seconds') * 1000:.1f} ms, "
+          f"cached {_median(runs, 'cached_seconds') * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
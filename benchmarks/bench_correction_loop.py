@@ -0,0 +1,144 @@
+"""
+Benchmark: loop detection and the fix store in the correction cycle.
+
+Runs the same questions with loop detection and the fix store disabled
+(baseline) and enabled, the enabled pass twice: cold fix store, then warm.
+Reports success, attempts, LLM calls, DB executions and wall time per pass,
+and the attempts and seconds saved against the baseline.
+
+--scripted replaces the LLM with a deterministic one that reproduces the
+failure pattern (corrections echo the failing SQL back, the simplified
+strategy fixes it) with a simulated latency, and executes on DuckDB, so it
+runs without credentials once Parquet files exist
+(python -m src.db.backends convert ...). Without it, the real LLM and the
+configured backend are used.
+
+Usage:
+    python -m benchmarks.bench_correction_loop --scripted --llm-latency 0.5
+    python -m benchmarks.bench_correction_loop
+"""
+import argparse
+import json
+import time
+
+import src.agent.nodes as nodes
+import src.memory.cache as cache
+import src.memory.fix_store as fix_store
+import src.memory.few_shot as few_shot
+from benchmarks.questions import PARAPHRASE_PAIRS, SIMPLE_QUESTIONS
+
+
+# question -> (SQL the generator gets stuck on, SQL the simplified strategy finds)
+SCRIPTED_CASES = {
+    "How many orders are placed on each day of the week?": (
+        "SELECT order_dow, COUNT(order_uid) FROM orders GROUP BY order_dow",
+        "SELECT order_dow, COUNT(*) AS order_count FROM orders GROUP BY order_dow ORDER BY order_dow",
+    ),
+    "At what hour of the day are most orders placed?": (
+        "SELECT order_hour, COUNT(*) FROM orders GROUP BY order_hour ORDER BY 2 DESC LIMIT 1",
+        "SELECT order_hour_of_day, COUNT(*) AS order_count FROM orders "
+        "GROUP BY order_hour_of_day ORDER BY order_count DESC LIMIT 1",
+    ),
+    "Which department has the most products?": (
+        "SELECT d.department_name, COUNT(*) FROM products p JOIN departments d "
+        "ON p.department_id = d.department_id GROUP BY 1 ORDER BY 2 DESC LIMIT 1",
+        "SELECT d.department, COUNT(*) AS product_count FROM products p JOIN departments d "
+        "ON p.department_id = d.department_id GROUP BY d.department ORDER BY product_count DESC LIMIT 1",
+    ),
+}
+
+
+def scripted_llm(latency: float):
+    def call(prompt: str, *args, **kwargs) -> str:
+        time.sleep(latency)
+        if "database query planner" in prompt:
+            return '["orders", "products", "departments"]'
+        if "validator and response generator" in prompt:
+            return json.dumps({"valid": True, "reason": "ok", "natural_language_response": "ok"})
+        question = next(q for q in SCRIPTED_CASES if q in prompt)
+        stuck, fixed = SCRIPTED_CASES[question]
+        return fixed if "Generate a SIMPLER query" in prompt else stuck
+    return call
+
+
+def _run(agent, questions, llm_calls):
+    totals = {"valid": 0, "attempts": 0, "llm_calls": 0, "executions": 0,
+              "short_circuits": 0, "fix_store_hits": 0, "seconds": 0.0}
+    get_backend = nodes.get_backend
+
+    def counting_get_backend(name):
+        # Only execute_sql_node resolves backends through the nodes module
+        totals["executions"] += 1
+        return get_backend(name)
+
+    nodes.get_backend = counting_get_backend
+    try:
+        for question in questions:
+            before = llm_calls["n"]
+            start = time.perf_counter()
+            result = agent.query(question)
+            totals["seconds"] += time.perf_counter() - start
+            totals["llm_calls"] += llm_calls["n"] - before
+            totals["valid"] += result["valid"] and result["executed"]
+            totals["attempts"] += result["total_attempts"]
+            totals["short_circuits"] += result["short_circuits"]
+            totals["fix_store_hits"] += result["fix_store_hits"]
+    finally:
+        nodes.get_backend = get_backend
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Correction loop benchmark")
+    parser.add_argument("--scripted", action="store_true", help="Deterministic LLM on DuckDB")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Scripted LLM latency, seconds")
+    args = parser.parse_args()
+
+    llm_calls = {"n": 0}
+    llm = scripted_llm(args.llm_latency) if args.scripted else nodes.call_llm
+
+    def counting_llm(prompt, *a, **kw):
+        llm_calls["n"] += 1
+        return llm(prompt, *a, **kw)
+
+    nodes.call_llm = counting_llm
+    few_shot.FEW_SHOT_ENABLED = False  # Isolate the correction loop from retrieval effects
+    cache.CACHE_ENABLED = False
+
+    from src.agent.agent import SQLAgent
+
+    questions = list(SCRIPTED_CASES) if args.scripted else (
+        SIMPLE_QUESTIONS + [q for q, _ in PARAPHRASE_PAIRS]
+    )
+    agent = SQLAgent(engine="duckdb") if args.scripted else SQLAgent()
+    passes = {}
+    try:
+        nodes.LOOP_DETECTION_ENABLED = fix_store.FIX_STORE_ENABLED = False
+        passes["baseline"] = _run(agent, questions, llm_calls)
+
+        nodes.LOOP_DETECTION_ENABLED = fix_store.FIX_STORE_ENABLED = True
+        fix_store.FIX_STORE.clear()
+        passes["cold store"] = _run(agent, questions, llm_calls)
+        passes["warm store"] = _run(agent, questions, llm_calls)
+    finally:
+        agent.close()
+
+    print(f"\n{len(questions)} questions per pass")
+    print(f"{'pass':11} {'valid':>6} {'attempts':>9} {'llm calls':>10} {'db execs':>9} "
+          f"{'dup skips':>10} {'fix hits':>9} {'seconds':>8} {'s/answer':>9}")
+    for name, t in passes.items():
+        print(f"{name:11} {t['valid']:>6} {t['attempts']:>9} {t['llm_calls']:>10} {t['executions']:>9} "
+              f"{t['short_circuits']:>10} {t['fix_store_hits']:>9} {t['seconds']:>8.2f} "
+              f"{t['seconds'] / t['valid'] if t['valid'] else float('nan'):>9.2f}")
+
+    base = passes["baseline"]
+    for name in ("cold store", "warm store"):
+        t = passes[name]
+        print(f"{name}: {base['attempts'] - t['attempts']} attempts, "
+              f"{base['llm_calls'] - t['llm_calls']} LLM calls, "
+              f"{base['executions'] - t['executions']} DB executions and "
+              f"{base['seconds'] - t['seconds']:.2f}s saved vs baseline")
+
+
+if __name__ == "__main__":
+    main()
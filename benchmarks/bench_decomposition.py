@@ -0,0 +1,85 @@
+"""
+Benchmark: question decomposition on compound questions.
+
+Runs the compound questions with DECOMPOSITION_ENABLED off (one generated
+query, plus the correction ladder when it fails) and on (parallel
+sub-queries merged locally) and reports, per mode, average and worst
+latency, success rate (validated and executed), LLM calls and tokens per
+question, and how many questions were actually decomposed.
+
+--stub starts the stub LLM server in-process and executes on DuckDB. The
+stub always answers correctly, so it measures the mechanics (extra calls,
+parallel sub-queries, local merge) but not success rates; those need a real
+model.
+
+Usage:
+    python -m benchmarks.bench_decomposition --stub --latency lognormal:0.8,0.4
+    python -m benchmarks.bench_decomposition
+"""
+import argparse
+import statistics
+import time
+
+import src.agent.nodes as nodes
+import src.memory.cache as cache
+import src.memory.few_shot as few_shot
+import src.utils.llm as llm
+from benchmarks.bench_speculative import start_stub
+from benchmarks.questions import COMPOUND_QUERIES
+
+
+def _run(agent, questions):
+    latencies, calls, tokens, answered, decomposed = [], [], [], 0, 0
+    for question in questions:
+        start = time.perf_counter()
+        result = agent.query(question)
+        latencies.append(time.perf_counter() - start)
+        calls.append(result["llm_usage"]["calls"])
+        tokens.append(result["llm_usage"]["total_tokens"])
+        answered += result["valid"] and result["executed"]
+        decomposed += result["decomposition"] == "merged"
+    return {
+        "avg_s": statistics.mean(latencies),
+        "max_s": max(latencies),
+        "success": answered / len(questions),
+        "calls": statistics.mean(calls),
+        "tokens": statistics.mean(tokens),
+        "decomposed": decomposed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Question decomposition benchmark")
+    parser.add_argument("--stub", action="store_true", help="In-process stub LLM on DuckDB")
+    parser.add_argument("--latency", default="lognormal:0.8,0.4", help="Stub LLM latency distribution")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the question set per mode")
+    args = parser.parse_args()
+
+    if args.stub:
+        llm.LLM_BASE_URL = start_stub(args.latency)
+        llm.os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    few_shot.FEW_SHOT_ENABLED = False  # Both passes see the same prompts
+    cache.CACHE_ENABLED = False
+
+    from src.agent.agent import SQLAgent
+
+    questions = list(COMPOUND_QUERIES) * args.repeat
+    agent = SQLAgent(engine="duckdb") if args.stub else SQLAgent()
+    rows = {}
+    try:
+        for enabled in (False, True):
+            nodes.DECOMPOSITION_ENABLED = enabled
+            rows["decomposed" if enabled else "single"] = _run(agent, questions)
+    finally:
+        agent.close()
+
+    print(f"\n{len(questions)} compound questions")
+    print(f"{'mode':11} {'avg s':>7} {'max s':>7} {'success':>8} {'llm calls/q':>12} {'tokens/q':>9} {'split':>6}")
+    for name, r in rows.items():
+        print(f"{name:11} {r['avg_s']:>7.2f} {r['max_s']:>7.2f} {r['success']:>8.0%} "
+              f"{r['calls']:>12.2f} {r['tokens']:>9.0f} {r['decomposed']:>6}")
+
+
+if __name__ == "__main__":
+    main()
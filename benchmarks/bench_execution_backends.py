@@ -0,0 +1,101 @@
+"""
+Benchmark: aggregate query latency on Postgres vs. DuckDB over Parquet.
+
+Runs a fixed set of scan-heavy aggregate queries (the shape that dominates
+agent traffic) on each available backend and reports median / p95 latency.
+
+Usage:
+    python -m benchmarks.bench_execution_backends --repeat 5
+"""
+import argparse
+import statistics
+import time
+
+from src.db.backends import get_backend
+
+
+AGGREGATE_QUERIES = {
+    "orders_by_dow": """
+        select order_dow, count(*) as order_count
+        from orders group by order_dow order by order_dow
+    """,
+    "top_products": """
+        select p.product_name, count(*) as order_count
+        from order_products_prior op
+        join products p on op.product_id = p.product_id
+        group by p.product_name order by order_count desc limit 10
+    """,
+    "department_reorder_rate": """
+        select d.department, avg(op.reordered) as reorder_rate
+        from order_products_prior op
+        join products p on op.product_id = p.product_id
+        join departments d on p.department_id = d.department_id
+        group by d.department order by reorder_rate desc
+    """,
+    "avg_days_between_orders": """
+        select avg(days_since_prior_order) from orders
+        where days_since_prior_order is not null
+    """,
+    "basket_size_distribution": """
+        select basket_size, count(*) from (
+            select order_id, count(*) as basket_size
+            from order_products_prior group by order_id
+        ) b group by basket_size order by basket_size
+    """,
+}
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(engines, repeat: int):
+    timings = {}
+    for engine in engines:
+        backend = get_backend(engine)
+        if not backend.is_available():
+            print(f"⚠️ Skipping {engine}: backend not available")
+            continue
+        conn = backend.connect()
+        cursor = conn.cursor()
+        try:
+            for name, sql in AGGREGATE_QUERIES.items():
+                sql = backend.translate(" ".join(sql.split()))
+                backend.execute(conn, cursor, sql)  # warm-up
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    backend.execute(conn, cursor, sql)
+                    samples.append((time.perf_counter() - start) * 1000)
+                timings[(engine, name)] = samples
+        finally:
+            cursor.close()
+            conn.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--engines", nargs="+", default=["postgres", "duckdb"])
+    args = parser.parse_args()
+
+    timings = run(args.engines, args.repeat)
+
+    print(f"\n{'query':28} {'engine':10} {'median ms':>10} {'p95 ms':>10}")
+    print("-" * 62)
+    for name in AGGREGATE_QUERIES:
+        medians = {}
+        for engine in args.engines:
+            samples = timings.get((engine, name))
+            if not samples:
+                continue
+            medians[engine] = statistics.median(samples)
+            print(f"{name:28} {engine:10} {medians[engine]:>10.1f} {_percentile(samples, 95):>10.1f}")
+        if "postgres" in medians and "duckdb" in medians:
+            print(f"{'':28} {'speed-up':10} {medians['postgres'] / medians['duckdb']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: fast-path answers vs. the validation LLM.
+
+Runs the questions with FAST_PATH_ENABLED off and on and reports, per mode,
+how many answers came from templates, LLM calls per question and latency.
+
+--scripted answers every LLM call with the stub model's canned responses
+(benchmarks.stub_llm) after a simulated latency and executes on DuckDB, so
+it runs without credentials once Parquet files exist.
+
+Usage:
+    python -m benchmarks.bench_fast_path --scripted --llm-latency 0.8
+    python -m benchmarks.bench_fast_path
+"""
+import argparse
+import statistics
+import time
+
+import src.agent.nodes as nodes
+import src.memory.cache as cache
+from benchmarks.questions import LIST_QUESTIONS, LOAD_TEST_QUERIES, SIMPLE_QUESTIONS
+from benchmarks.stub_llm import canned_response
+
+
+def _run(agent, questions, llm_calls):
+    fast, calls, latencies = 0, [], []
+    for question in questions:
+        before = llm_calls["n"]
+        start = time.perf_counter()
+        result = agent.query(question)
+        latencies.append(time.perf_counter() - start)
+        calls.append(llm_calls["n"] - before)
+        fast += result["fast_path"]
+    return fast, statistics.mean(calls), statistics.mean(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fast-path answer benchmark")
+    parser.add_argument("--scripted", action="store_true", help="Canned LLM responses on DuckDB")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Scripted LLM latency, seconds")
+    args = parser.parse_args()
+
+    llm_calls = {"n": 0}
+    call_llm = nodes.call_llm
+
+    def counting_llm(prompt, *a, **kw):
+        llm_calls["n"] += 1
+        if args.scripted:
+            time.sleep(args.llm_latency)
+            return canned_response(prompt)
+        return call_llm(prompt, *a, **kw)
+
+    nodes.call_llm = counting_llm
+    cache.CACHE_ENABLED = False  # Both passes answer every question from scratch
+
+    from src.agent.agent import SQLAgent
+
+    questions = list(LOAD_TEST_QUERIES) if args.scripted else SIMPLE_QUESTIONS + LIST_QUESTIONS
+    agent = SQLAgent(engine="duckdb") if args.scripted else SQLAgent()
+    rows = {}
+    try:
+        for enabled in (False, True):
+            nodes.FAST_PATH_ENABLED = enabled
+            rows["fast path" if enabled else "llm only"] = _run(agent, questions, llm_calls)
+    finally:
+        agent.close()
+
+    print(f"\n{len(questions)} questions")
+    print(f"{'mode':10} {'template answers':>17} {'llm calls/q':>12} {'avg latency s':>14}")
+    for name, (fast, calls, latency) in rows.items():
+        print(f"{name:10} {fast:>17} {calls:>12.2f} {latency:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
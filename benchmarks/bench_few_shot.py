@@ -0,0 +1,90 @@
+"""
+Benchmark: few-shot retrieval vs. zero-shot generation.
+
+1. Retrieval micro-benchmark over a synthetic store of FEW_SHOT_MAX_EXAMPLES.
+2. End-to-end: measured paraphrases are run zero-shot, then again after the
+   seed questions have populated the example store. Reports average attempts
+   and latency per question (requires the database and OpenAI credentials).
+
+Usage:
+    python -m benchmarks.bench_few_shot --retrieval-only
+    python -m benchmarks.bench_few_shot
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import src.memory.cache as cache
+import src.memory.few_shot as few_shot
+from src.config.settings import FEW_SHOT_MAX_EXAMPLES
+from benchmarks.questions import PARAPHRASE_PAIRS
+
+
+def bench_retrieval(queries: int = 500):
+    words = ["products", "orders", "department", "aisle", "reorder", "rate", "top", "hour",
+             "day", "week", "average", "count", "dairy", "produce", "snacks", "users", "basket"]
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = few_shot.ExampleStore(str(Path(tmp) / "examples.jsonl"))
+        for i in range(FEW_SHOT_MAX_EXAMPLES):
+            store.add(" ".join(rng.choices(words, k=8)) + f" {i}", f"select {i}")
+        store.search("warm up index")
+
+        start = time.perf_counter()
+        for _ in range(queries):
+            store.search(" ".join(rng.choices(words, k=6)))
+        elapsed = (time.perf_counter() - start) / queries * 1000
+    print(f"Retrieval over {FEW_SHOT_MAX_EXAMPLES} examples: {elapsed:.3f} ms/query")
+
+
+def _run(agent, questions):
+    attempts, latencies = [], []
+    for question in questions:
+        start = time.perf_counter()
+        result = agent.query(question)
+        latencies.append(time.perf_counter() - start)
+        attempts.append(result["total_attempts"])
+    return statistics.mean(attempts), statistics.mean(latencies)
+
+
+def bench_end_to_end():
+    from src.agent.agent import SQLAgent
+
+    cache.CACHE_ENABLED = False  # Measure retrieval, not repeated-question caching
+    seeds = [seed for seed, _ in PARAPHRASE_PAIRS]
+    measured = [question for _, question in PARAPHRASE_PAIRS]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        few_shot._store = few_shot.ExampleStore(str(Path(tmp) / "examples.jsonl"))
+        agent = SQLAgent()
+        try:
+            few_shot.FEW_SHOT_ENABLED = False
+            zero_attempts, zero_latency = _run(agent, measured)
+
+            few_shot.FEW_SHOT_ENABLED = True
+            _run(agent, seeds)
+            print(f"Example store populated with {len(few_shot._store)} validated examples")
+            few_attempts, few_latency = _run(agent, measured)
+        finally:
+            agent.close()
+
+    print(f"\n{'mode':12} {'avg attempts':>13} {'avg latency s':>14}")
+    print(f"{'zero-shot':12} {zero_attempts:>13.2f} {zero_latency:>14.2f}")
+    print(f"{'few-shot':12} {few_attempts:>13.2f} {few_latency:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Few-shot retrieval benchmark")
+    parser.add_argument("--retrieval-only", action="store_true")
+    args = parser.parse_args()
+
+    bench_retrieval()
+    if not args.retrieval_only:
+        bench_end_to_end()
+
+
+if __name__ == "__main__":
+    main()
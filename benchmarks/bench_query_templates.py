@@ -0,0 +1,75 @@
+"""
+Benchmark: answering literal variations of validated questions from query templates.
+
+Records templates for validated Instacart questions (as validate_and_respond
+does), then asks variations of them with other numbers and names, plus
+unrelated questions, and reports how many were answered from a template and
+how long matching and filling took. A template match replaces the planning
+and SQL generation LLM calls (and, on Postgres, the planning of the query
+once its prepared statement uses the generic plan).
+
+Usage:
+    python -m benchmarks.bench_query_templates --templates 500
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from src.memory import query_templates
+
+VALIDATED = [
+    ("Top 5 products in the dairy eggs department",
+     "select p.product_name, count(*) as orders from order_products_prior op "
+     "join products p on p.product_id = op.product_id join departments d on d.department_id = p.department_id "
+     "where d.department = 'dairy eggs' group by p.product_name order by orders desc limit 5"),
+    ("How many orders were placed at hour 10?",
+     "select count(*) from orders where order_hour_of_day = 10"),
+    ("Which 3 aisles have the most products in the snacks department?",
+     "select a.aisle, count(*) as products from products p join aisles a on a.aisle_id = p.aisle_id "
+     "join departments d on d.department_id = p.department_id where d.department = 'snacks' "
+     "group by a.aisle order by products desc limit 3"),
+]
+VARIATIONS = [
+    "top 10 products in the bakery department",
+    "Top 3 products in the frozen department?",
+    "How many orders were placed at hour 18?",
+    "Which 5 aisles have the most products in the beverages department?",
+]
+UNRELATED = [
+    "What is the average basket size?",
+    "Which products are reordered most often on weekends?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query template benchmark")
+    parser.add_argument("--templates", type=int, default=500, help="Filler templates in the store")
+    args = parser.parse_args()
+
+    query_templates.QUERY_TEMPLATE_LLM_FILL = False  # Local pattern fills only
+    with tempfile.TemporaryDirectory() as directory:
+        query_templates._store = query_templates.TemplateStore(str(Path(directory) / "templates.jsonl"))
+        start = time.perf_counter()
+        for i in range(args.templates):
+            query_templates.record_template(f"How many products of brand{i} are in aisle 5",
+                                            f"select count(*) from products where aisle_id = 5 and brand_id = {i}")
+        for question, sql in VALIDATED:
+            query_templates.record_template(question, sql)
+        print(f"{len(query_templates._store)} templates recorded in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        times = []
+        for question in VARIATIONS + UNRELATED:
+            start = time.perf_counter()
+            match = query_templates.match_template(question)
+            sql = query_templates.render(match[0], match[1]) if match else None
+            times.append((time.perf_counter() - start) * 1000)
+            print(f"{times[-1]:>7.2f} ms  {'hit ' if match else 'miss'}  {question}")
+            if sql:
+                print(f"{'':>18}{sql[:110]}")
+    print(f"median {statistics.median(times):.2f} ms per question")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: memory and first-request cost per registered database.
+
+Registers --databases databases that all point at the same Parquet
+directory and schema file (each gets its own DuckDB engine, schema copy and
+connection pool, exactly as distinct databases would) and, for each one,
+runs a query through its pool the way a request does. Reports:
+
+- first request per database (schema load, engine start, first connection)
+  vs. a repeated request on an open database
+- RSS and Python heap growth per open, idle database
+- what is left after idle databases are evicted, and after reopening them
+  all (freed engine memory may stay with the allocator rather than go back
+  to the OS; reopening should land where the first opening did, not above)
+
+Postgres connections cost memory on the server (one backend process each),
+which this process-side measurement does not include; the pooled
+connection count per database is printed instead.
+
+Usage:
+    python -m benchmarks.bench_registry --databases 32
+    python -m benchmarks.bench_registry --engine postgres --databases 8
+"""
+import argparse
+import gc
+import statistics
+import time
+import tracemalloc
+
+from src.config.settings import PARQUET_DIR
+from src.db.backends import get_backend, get_pool
+from src.db.registry import DatabaseRegistry, use_database
+from src.utils.schema_utils import SCHEMA_PATH, current_schema
+
+QUERY = "select count(*) from orders"
+
+
+def _rss_mb() -> float:
+    """Current resident set size (Linux); peak RSS would hide eviction"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def _request(registry: DatabaseRegistry, database_id: str, engine: str) -> float:
+    start = time.perf_counter()
+    with registry.acquire(database_id) as database, use_database(database):
+        current_schema()
+        backend = get_backend(engine)
+        with get_pool(engine).connection() as (conn, cursor):
+            backend.execute(conn, cursor, backend.translate(QUERY))
+    return time.perf_counter() - start
+
+
+def _measure():
+    gc.collect()
+    return _rss_mb(), tracemalloc.get_traced_memory()[0] / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database registry benchmark")
+    parser.add_argument("--databases", type=int, default=32)
+    parser.add_argument("--engine", default="duckdb", choices=["duckdb", "postgres"])
+    parser.add_argument("--parquet-dir", default=PARQUET_DIR)
+    args = parser.parse_args()
+
+    configs = {
+        f"db{i:03d}": {"parquet_dir": args.parquet_dir, "schema_path": str(SCHEMA_PATH)}
+        for i in range(args.databases)
+    }
+    registry = DatabaseRegistry(configs, idle_ttl_s=3600, max_open=args.databases + 1)
+    tracemalloc.start()
+    # Imports and one-off engine setup are not per-database costs
+    _request(registry, "db000", args.engine)
+    registry.evict_idle(now=time.monotonic() + 7200)
+    base_rss, base_heap = _measure()
+
+    first = [_request(registry, database_id, args.engine) for database_id in configs]
+    repeat = [_request(registry, database_id, args.engine) for database_id in configs]
+    open_rss, open_heap = _measure()
+
+    evicted = registry.evict_idle(now=time.monotonic() + 7200)
+    closed_rss, closed_heap = _measure()
+    for database_id in configs:
+        _request(registry, database_id, args.engine)
+    reopened_rss, _ = _measure()
+    registry.close()
+    tracemalloc.stop()
+
+    n = args.databases
+    print(f"\n{n} databases ({args.engine}), {len(evicted)} evicted when idle")
+    print(f"{'first request':26} median {statistics.median(first) * 1000:8.1f} ms   max {max(first) * 1000:8.1f} ms")
+    print(f"{'open database, repeated':26} median {statistics.median(repeat) * 1000:8.1f} ms   "
+          f"max {max(repeat) * 1000:8.1f} ms")
+    print(f"{'per idle open database':26} RSS {(open_rss - base_rss) / n:8.2f} MB   "
+          f"Python heap {(open_heap - base_heap) / n:6.2f} MB")
+    print(f"{'after eviction (total)':26} RSS {closed_rss - base_rss:+8.1f} MB   "
+          f"Python heap {closed_heap - base_heap:+6.2f} MB")
+    print(f"{'reopened all (total)':26} RSS {reopened_rss - base_rss:+8.1f} MB")
+    print(f"{'pooled connections':26} {args.databases} databases x 1 idle connection each")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: automatic LIMIT on list-style queries.
+
+Runs unbounded list queries of the kind generated for "show me products in
+the snacks department" as written and after apply_row_limit(), and reports
+median latency and result payload size (pickled rows, a proxy for bytes
+transferred) for each. The limited run includes the total-rows estimate the
+agent adds when a result is truncated.
+
+Usage:
+    python -m benchmarks.bench_row_limit --repeat 5
+    python -m benchmarks.bench_row_limit --engine duckdb
+"""
+import argparse
+import pickle
+import statistics
+import time
+
+from src.config.settings import EXECUTION_BACKEND, SQL_AUTO_LIMIT
+from src.db.backends import get_backend
+from src.utils.sql_rewrite import apply_row_limit
+
+
+LIST_QUERIES = {
+    "snacks_products": """
+        select p.product_name, a.aisle
+        from products p
+        join departments d on p.department_id = d.department_id
+        join aisles a on p.aisle_id = a.aisle_id
+        where d.department = 'snacks' order by p.product_name
+    """,
+    "sunday_orders": """
+        select order_id, user_id, order_hour_of_day
+        from orders where order_dow = 0 order by order_id
+    """,
+    "never_reordered": """
+        select p.product_name
+        from products p
+        join order_products_prior op on op.product_id = p.product_id
+        group by p.product_name having max(op.reordered) = 0
+        order by p.product_name
+    """,
+    "dairy_aisles": """
+        select a.aisle, p.product_name
+        from aisles a join products p on p.aisle_id = a.aisle_id
+        join departments d on p.department_id = d.department_id
+        where d.department = 'dairy eggs'
+    """,
+}
+
+
+def _measure(backend, conn, cursor, sql: str, repeat: int, total_sql: str = None):
+    samples, payload = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, rows = backend.execute(conn, cursor, sql)
+        if total_sql and len(rows) > SQL_AUTO_LIMIT:
+            rows = rows[:SQL_AUTO_LIMIT]
+            if backend.estimate_rows(conn, cursor, total_sql) is None:
+                backend.count_rows(conn, cursor, total_sql)
+        samples.append((time.perf_counter() - start) * 1000)
+        payload = len(pickle.dumps(rows))
+    return statistics.median(samples), payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Automatic LIMIT benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--engine", default=EXECUTION_BACKEND)
+    args = parser.parse_args()
+
+    backend = get_backend(args.engine)
+    conn = backend.connect()
+    cursor = conn.cursor()
+    print(f"Engine: {backend.name}, LIMIT {SQL_AUTO_LIMIT}\n")
+    print(f"{'query':18} {'full ms':>9} {'limited ms':>11} {'full KB':>9} {'limited KB':>11}")
+    try:
+        for name, sql in LIST_QUERIES.items():
+            sql = " ".join(sql.split())
+            limited, _ = apply_row_limit(sql, SQL_AUTO_LIMIT + 1)
+            sql, limited = backend.translate(sql), backend.translate(limited)
+            backend.execute(conn, cursor, sql)  # warm-up
+            full_ms, full_bytes = _measure(backend, conn, cursor, sql, args.repeat)
+            limited_ms, limited_bytes = _measure(backend, conn, cursor, limited, args.repeat, sql)
+            print(f"{name:18} {full_ms:>9.1f} {limited_ms:>11.1f} "
+                  f"{full_bytes / 1024:>9.1f} {limited_bytes / 1024:>11.1f}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
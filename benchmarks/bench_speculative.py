@@ -0,0 +1,92 @@
+"""
+Benchmark: speculative SQL generation during planning.
+
+Runs the questions with SPECULATIVE_GENERATION off and on and reports, per
+mode, average latency, LLM calls and tokens per question, and how often the
+speculative SQL was accepted. Tokens spent on discarded speculation are the
+extra cost; time to the first executed query is the saving.
+
+--stub starts the stub LLM server (benchmarks.stub_llm) in-process and
+executes on DuckDB, so the real call_llm() path, including token accounting,
+runs without credentials once Parquet files exist.
+
+Usage:
+    python -m benchmarks.bench_speculative --stub --latency lognormal:0.8,0.4
+    python -m benchmarks.bench_speculative
+"""
+import argparse
+import socket
+import statistics
+import threading
+import time
+
+import src.agent.nodes as nodes
+import src.memory.cache as cache
+import src.memory.few_shot as few_shot
+import src.utils.llm as llm
+from benchmarks.questions import LOAD_TEST_QUERIES, PARAPHRASE_PAIRS, SIMPLE_QUESTIONS
+
+
+def start_stub(latency: str) -> str:
+    """Run the stub LLM on a free local port; returns its base URL"""
+    import uvicorn
+    from benchmarks.stub_llm import create_app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(latency), port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def _run(agent, questions):
+    latencies, calls, tokens, accepted = [], [], [], 0
+    for question in questions:
+        start = time.perf_counter()
+        result = agent.query(question)
+        latencies.append(time.perf_counter() - start)
+        calls.append(result["llm_usage"]["calls"])
+        tokens.append(result["llm_usage"]["total_tokens"])
+        accepted += result["speculation"] == "accepted"
+    return statistics.mean(latencies), statistics.mean(calls), statistics.mean(tokens), accepted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative generation benchmark")
+    parser.add_argument("--stub", action="store_true", help="In-process stub LLM on DuckDB")
+    parser.add_argument("--latency", default="lognormal:0.8,0.4", help="Stub LLM latency distribution")
+    args = parser.parse_args()
+
+    if args.stub:
+        llm.LLM_BASE_URL = start_stub(args.latency)
+        llm.os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    few_shot.FEW_SHOT_ENABLED = False  # Both passes see the same prompts
+    cache.CACHE_ENABLED = False
+
+    from src.agent.agent import SQLAgent
+
+    questions = list(LOAD_TEST_QUERIES) if args.stub else SIMPLE_QUESTIONS + [q for q, _ in PARAPHRASE_PAIRS]
+    agent = SQLAgent(engine="duckdb") if args.stub else SQLAgent()
+    rows = {}
+    try:
+        for enabled in (False, True):
+            nodes.SPECULATIVE_GENERATION = enabled
+            rows["speculative" if enabled else "sequential"] = _run(agent, questions)
+    finally:
+        agent.close()
+
+    print(f"\n{len(questions)} questions")
+    print(f"{'mode':12} {'avg latency s':>14} {'llm calls/q':>12} {'tokens/q':>9} {'accepted':>9}")
+    for name, (latency, calls, tokens, accepted) in rows.items():
+        print(f"{name:12} {latency:>14.2f} {calls:>12.2f} {tokens:>9.0f} {accepted:>9}")
+    (base_latency, _, base_tokens, _), (spec_latency, _, spec_tokens, _) = rows.values()
+    print(f"\nSaved {base_latency - spec_latency:.2f}s per question "
+          f"for {spec_tokens - base_tokens:+.0f} tokens per question")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: per-request tracing overhead.
+
+Simulates a request that passes through the agent's ten graph nodes and
+measures the added cost of each tracing mode against undecorated calls:
+"off", "sampled" (in-memory exporter, 10% head sampling) and, if Langfuse
+credentials are configured, "full".
+
+Usage:
+    python -m benchmarks.bench_tracing --requests 20000
+"""
+import argparse
+import os
+import time
+
+from src.utils import tracing
+
+
+NODES = 10
+
+
+def _build(mode: str, exporter=None):
+    tracer = tracing.configure_tracing(mode, exporter, sample_rate=0.1)
+
+    @tracing.observe(name="node")
+    def node(state):
+        return dict(state)
+
+    @tracing.observe(name="request")
+    def request(state):
+        for _ in range(NODES):
+            state = node(state)
+        tracing.update_current_trace(input="q", output="a", metadata={"valid": True})
+        return state
+
+    return request, tracer
+
+
+def _time_per_request(func, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        func({"i": i})
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracing overhead benchmark")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    def baseline(state):
+        for _ in range(NODES):
+            state = dict(state)
+        return state
+
+    base_us = _time_per_request(baseline, args.requests)
+    modes = ["off", "sampled"]
+    if os.getenv("LANGFUSE_PUBLIC_KEY"):
+        modes.append("full")
+
+    print(f"{'mode':10} {'us/request':>12} {'overhead us':>12}")
+    print(f"{'baseline':10} {base_us:>12.2f} {0:>12.2f}")
+    for mode in modes:
+        exporter = tracing.InMemoryExporter() if mode == "sampled" else None
+        request, tracer = _build(mode, exporter)
+        requests = args.requests if mode != "full" else min(args.requests, 200)
+        us = _time_per_request(request, requests)
+        print(f"{mode:10} {us:>12.2f} {us - base_us:>12.2f}")
+        if tracer:
+            tracer.flush()
+            print(f"{'':10} kept {tracer.stats['kept']}/{tracer.stats['recorded']}, "
+                  f"dropped {tracer.stats['dropped']}")
+    tracing.configure_tracing("off")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: /query response size and serialization time by wire format.
+
+Builds a result shaped like the agent's large answers (product name, aisle,
+order count, Postgres numeric average, reorder ratio) and encodes it the way
+FastAPI did before content negotiation (jsonable_encoder + json.dumps) and
+with each backend_server.encoding format and layout, then compresses every
+body with gzip and, when the brotli package is installed, brotli. Reports
+median encode and compress times and the bytes on the wire.
+
+Usage:
+    python -m benchmarks.bench_wire_format --rows 100000
+"""
+import argparse
+import decimal
+import gzip
+import json
+import statistics
+import time
+
+from backend_server import encoding
+from src.config.settings import RESPONSE_BROTLI_QUALITY, RESPONSE_GZIP_LEVEL
+
+
+def _result(rows: int) -> dict:
+    aisles = ["fresh fruits", "fresh vegetables", "packaged cheese", "yogurt", "water seltzer sparkling water"]
+    return {
+        "question": "Reorder statistics per product",
+        "sql": "select p.product_name, a.aisle, count(*), avg(op.add_to_cart_order), avg(op.reordered) ...",
+        "nl_response": "Bananas are reordered most often.",
+        "columns": ["product_name", "aisle", "orders", "avg_cart_position", "reorder_ratio"],
+        "results": [
+            (f"Product {i} Organic Whole Milk", aisles[i % len(aisles)], 10000 - i % 9973,
+             decimal.Decimal(f"{(i % 997) / 100 + 1:.4f}"), (i % 89) / 89)
+            for i in range(rows)
+        ],
+        "valid": True,
+        "executed": True,
+        "total_attempts": 1,
+        "attempted_strategies": [],
+        "llm_usage": {"calls": 2, "prompt_tokens": 2300, "completion_tokens": 180, "total_tokens": 2480},
+    }
+
+
+def _fastapi_default(result: dict) -> bytes:
+    from fastapi.encoders import jsonable_encoder
+
+    return json.dumps(jsonable_encoder(result), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _timed(function, runs: int):
+    times, value = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        value = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return value, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wire format benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    result = _result(args.rows)
+    candidates = {"fastapi default json": lambda: _fastapi_default(result)}
+    for fmt, layouts in (("json", ["rows", "columns"]), ("msgpack", ["columns", "rows"]), ("arrow", ["columns"])):
+        if encoding._available(fmt):
+            for layout in layouts:
+                candidates[f"{fmt} {layout}"] = lambda fmt=fmt, layout=layout: encoding.encode(result, fmt, layout)
+
+    compressors = {"gzip": lambda body: gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)}
+    try:
+        import brotli
+
+        compressors["br"] = lambda body: brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+    except ImportError:
+        print("(brotli not installed: gzip only)")
+
+    print(f"{args.rows} rows, median of {args.runs} runs")
+    header = f"{'format':<22}{'encode ms':>10}{'bytes':>12}"
+    for name in compressors:
+        header += f"{name + ' ms':>10}{name + ' bytes':>12}"
+    print(header)
+    for name, encode in candidates.items():
+        body, encode_ms = _timed(encode, args.runs)
+        line = f"{name:<22}{encode_ms:>10.1f}{len(body):>12,}"
+        for compress in compressors.values():
+            compressed, compress_ms = _timed(lambda: compress(body), args.runs)
+            line += f"{compress_ms:>10.1f}{len(compressed):>12,}"
+        print(line)
+
+    selected, selected_ms = _timed(lambda: encoding.encode(result, "json", fields=["nl_response", "sql"]), args.runs)
+    print(f"{'json without results':<22}{selected_ms:>10.3f}{len(selected):>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Load generator for the API server.
+
+Drives POST /query with a weighted mix of questions and priorities and runs
+one stage per arrival rate (open loop) or user count (closed loop):
+
+- open:   Poisson arrivals at a fixed rate, independent of response times,
+          so queueing and load shedding show up as they would in production
+- closed: N users that each send a request, wait for it, then think for an
+          exponentially distributed time
+
+Each stage reports throughput, p50/p95/p99 latency, errors by kind and the
+server's CPU, memory and queue depth (scraped from /metrics). The saturation
+point is the highest throughput among stages that met the p95 and error-rate
+targets.
+
+For a self-contained run use the stub LLM and DuckDB:
+
+    python -m benchmarks.stub_llm --port 8001 --latency lognormal:0.8,0.4
+    LLM_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub EXECUTION_BACKEND=duckdb \\
+        uvicorn backend_server.app:app --port 8000
+    python -m benchmarks.load_test --mode open --rates 1,2,4,8 --duration 60
+
+Usage:
+    python -m benchmarks.load_test --mode closed --users 1,4,16 --think-time 1
+    python -m benchmarks.load_test --questions my_questions.txt --mix interactive:0.7,batch:0.3
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.questions import LOAD_TEST_QUERIES
+from src.config.settings import QUEUE_SLO_S
+
+
+# Gauges and counters scraped from /metrics during a stage
+SCRAPED_METRICS = (
+    "process_cpu_seconds_total",
+    "process_resident_memory_bytes",
+    "agent_queue_depth",
+    "agent_requests_inflight",
+    "llm_calls_inflight",
+)
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """"interactive:0.8,batch:0.2" -> {"interactive": 0.8, "batch": 0.2}"""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition(":")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Sum of each metric over its label sets, from the Prometheus text format"""
+    values: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name_part, _, value = line.rpartition(" ")
+        name = name_part.split("{", 1)[0]
+        if name in SCRAPED_METRICS:
+            try:
+                values[name] = values.get(name, 0.0) + float(value)
+            except ValueError:
+                continue
+    return values
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class LoadTest:
+    """Sends requests and records (latency, outcome) per request"""
+
+    def __init__(self, url: str, questions: Dict[str, float], priorities: Dict[str, float],
+                 timeout: float, seed: int = 0):
+        self.url = url.rstrip("/")
+        self.questions = questions
+        self.priorities = priorities
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.records: List[Dict[str, Any]] = []
+
+    def _pick(self, weights: Dict[str, float]) -> str:
+        return self.rng.choices(list(weights), weights=list(weights.values()))[0]
+
+    async def send(self, client: httpx.AsyncClient):
+        payload = {"query": self._pick(self.questions), "priority": self._pick(self.priorities)}
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{self.url}/query", json=payload, timeout=self.timeout)
+            if response.status_code == 503:
+                outcome = f"shed_{response.json().get('reason', 'unknown')}"
+            elif response.status_code >= 400:
+                outcome = f"http_{response.status_code}"
+            else:
+                outcome = "ok" if response.json().get("valid") else "invalid_answer"
+        except httpx.TimeoutException:
+            outcome = "timeout"
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        self.records.append({
+            "priority": payload["priority"],
+            "latency": time.perf_counter() - start,
+            "outcome": outcome,
+        })
+
+    async def open_loop(self, client: httpx.AsyncClient, rate: float, duration: float):
+        """Poisson arrivals at `rate` requests/second for `duration` seconds"""
+        tasks = []
+        start = time.monotonic()
+        next_arrival = start
+        while True:
+            next_arrival += self.rng.expovariate(rate)
+            if next_arrival - start >= duration:
+                break
+            await asyncio.sleep(max(0.0, next_arrival - time.monotonic()))
+            tasks.append(asyncio.create_task(self.send(client)))
+        await asyncio.gather(*tasks)
+
+    async def closed_loop(self, client: httpx.AsyncClient, users: int, duration: float, think_time: float):
+        """`users` concurrent users, each waiting for its response before thinking and sending again"""
+        deadline = time.monotonic() + duration
+
+        async def user():
+            while time.monotonic() < deadline:
+                await self.send(client)
+                if think_time > 0:
+                    await asyncio.sleep(self.rng.expovariate(1 / think_time))
+
+        await asyncio.gather(*(user() for _ in range(users)))
+
+
+async def _scrape(client: httpx.AsyncClient, url: str, samples: List[Dict[str, float]],
+                  stop: asyncio.Event, interval: float = 1.0):
+    while True:
+        try:
+            response = await client.get(f"{url}/metrics", timeout=5)
+            samples.append({"t": time.monotonic(), **parse_metrics(response.text)})
+        except httpx.HTTPError:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+            return
+        except asyncio.TimeoutError:
+            continue
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float,
+              samples: Optional[List[Dict[str, float]]] = None) -> Dict[str, Any]:
+    """Throughput, latency percentiles, outcomes and resource usage of one stage"""
+    ok = [r["latency"] for r in records if r["outcome"] == "ok"]
+    outcomes: Dict[str, int] = {}
+    for r in records:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+
+    summary = {
+        "requests": len(records),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else 0.0,
+        "p50_s": round(percentile(ok, 50), 3),
+        "p95_s": round(percentile(ok, 95), 3),
+        "p99_s": round(percentile(ok, 99), 3),
+        "mean_s": round(statistics.mean(ok), 3) if ok else float("nan"),
+        "outcomes": outcomes,
+    }
+
+    samples = [s for s in samples or [] if "process_cpu_seconds_total" in s]
+    if len(samples) >= 2:
+        first, last = samples[0], samples[-1]
+        summary["cpu_percent"] = round(
+            100 * (last["process_cpu_seconds_total"] - first["process_cpu_seconds_total"])
+            / max(last["t"] - first["t"], 1e-9), 1
+        )
+        summary["max_rss_mb"] = round(max(s["process_resident_memory_bytes"] for s in samples) / 2**20, 1)
+        summary["max_queue_depth"] = int(max(s.get("agent_queue_depth", 0) for s in samples))
+        summary["max_llm_inflight"] = int(max(s.get("llm_calls_inflight", 0) for s in samples))
+    return summary
+
+
+async def run_stage(test: LoadTest, mode: str, level: float, duration: float, think_time: float):
+    test.records = []
+    samples: List[Dict[str, float]] = []
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(limits=limits) as client:
+        scraper = asyncio.create_task(_scrape(client, test.url, samples, stop))
+        start = time.monotonic()
+        if mode == "open":
+            await test.open_loop(client, level, duration)
+        else:
+            await test.closed_loop(client, int(level), duration, think_time)
+        elapsed = time.monotonic() - start
+        stop.set()
+        await scraper
+    return summarize(test.records, elapsed, samples)
+
+
+def _load_questions(path: Optional[str]) -> Dict[str, float]:
+    if not path:
+        return {question: 1.0 for question in LOAD_TEST_QUERIES}
+    lines = [line.strip() for line in Path(path).read_text(encoding="utf-8").splitlines()]
+    return {line: 1.0 for line in lines if line}
+
+
+def print_report(stages: List[Dict[str, Any]], unit: str):
+    print(f"\n{unit:>7} {'reqs':>6} {'ok rps':>7} {'err %':>6} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+          f"{'cpu %':>6} {'rss MB':>7} {'queue':>6}  outcomes")
+    for stage in stages:
+        s = stage["summary"]
+        print(f"{stage['level']:>7g} {s['requests']:>6} {s['throughput_rps']:>7.2f} {100 * s['error_rate']:>6.1f} "
+              f"{s['p50_s']:>7.2f} {s['p95_s']:>7.2f} {s['p99_s']:>7.2f} "
+              f"{s.get('cpu_percent', float('nan')):>6.1f} {s.get('max_rss_mb', float('nan')):>7.1f} "
+              f"{s.get('max_queue_depth', 0):>6}  {s['outcomes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the SQL agent API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mode", choices=["open", "closed"], default="open")
+    parser.add_argument("--rates", default="0.5,1,2,4", help="Open loop: arrival rates (req/s), one stage each")
+    parser.add_argument("--users", default="1,2,4,8", help="Closed loop: concurrent users, one stage each")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Closed loop: mean think time, seconds")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per stage")
+    parser.add_argument("--questions", help="File with one question per line (default: LOAD_TEST_QUERIES)")
+    parser.add_argument("--mix", default="interactive:1", help="Priority weights, e.g. interactive:0.8,batch:0.2")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--p95-target", type=float, default=QUEUE_SLO_S["interactive"])
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="Write the per-stage results as JSON")
+    args = parser.parse_args()
+
+    levels = [float(v) for v in (args.rates if args.mode == "open" else args.users).split(",")]
+    test = LoadTest(args.url, _load_questions(args.questions), parse_weights(args.mix), args.timeout)
+
+    stages = []
+    for level in levels:
+        print(f"▶️ Stage: {level:g} {'req/s' if args.mode == 'open' else 'users'} for {args.duration:g}s")
+        summary = asyncio.run(run_stage(test, args.mode, level, args.duration, args.think_time))
+        stages.append({"level": level, "summary": summary})
+
+    print_report(stages, "req/s" if args.mode == "open" else "users")
+
+    healthy = [
+        stage for stage in stages
+        if stage["summary"]["error_rate"] <= args.max_error_rate
+        and stage["summary"]["p95_s"] <= args.p95_target
+    ]
+    if healthy:
+        best = max(healthy, key=lambda stage: stage["summary"]["throughput_rps"])
+        print(f"\nSaturation point: {best['summary']['throughput_rps']:.2f} ok req/s at level {best['level']:g} "
+              f"(p95 <= {args.p95_target:g}s, errors <= {100 * args.max_error_rate:g}%)")
+    else:
+        print("\nNo stage met the p95 / error-rate targets")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps({"args": vars(args), "stages": stages}, indent=2), encoding="utf-8")
+        print(f"📄 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Shared question sets for the agent benchmarks
+"""
+
+# Pairs of paraphrases: the first seeds history, the second is measured
+PARAPHRASE_PAIRS = [
+    ("Show me the top 5 most ordered products", "What are the 5 products ordered most often?"),
+    ("Which department has the most products?", "What department contains the largest number of products?"),
+    ("How many orders are placed on each day of the week?", "Number of orders per day of week"),
+    ("What is the average number of days between orders?", "Average days since prior order across all orders"),
+    ("Which aisles have the highest reorder rate?", "Top aisles by reorder rate"),
+    ("At what hour of the day are most orders placed?", "Busiest hour of the day for orders"),
+    ("How many products are in the dairy eggs department?", "Count products in the dairy eggs department"),
+    ("What are the top 10 products in the produce department?", "Most ordered products in produce, top 10"),
+]
+
+SIMPLE_QUESTIONS = [
+    "How many departments are there?",
+    "How many aisles are there?",
+    "How many orders are in the dataset?",
+    "Which department has the most products?",
+    "What is the average basket size?",
+]
+
+LIST_QUESTIONS = [
+    "Show me products in the snacks department",
+    "List all aisles in the dairy eggs department",
+    "Show me orders placed on Sunday",
+    "Which products have never been reordered?",
+]
+
+# Load-test mix: question -> SQL the stub LLM answers with
+LOAD_TEST_QUERIES = {
+    "How many departments are there?": "select count(*) from departments",
+    "How many orders are in the dataset?": "select count(*) from orders",
+    "Which department has the most products?": (
+        "select d.department, count(*) as product_count from products p "
+        "join departments d on p.department_id = d.department_id "
+        "group by d.department order by product_count desc limit 1"
+    ),
+    "How many orders are placed on each day of the week?": (
+        "select order_dow, count(*) as order_count from orders group by order_dow order by order_dow"
+    ),
+    "Show me the top 5 most ordered products": (
+        "select p.product_name, count(*) as order_count from order_products_prior op "
+        "join products p on op.product_id = p.product_id "
+        "group by p.product_name order by order_count desc limit 5"
+    ),
+    "Show me products in the snacks department": (
+        "select p.product_name from products p join departments d on p.department_id = d.department_id "
+        "where d.department = 'snacks'"
+    ),
+    "Show me orders placed on Sunday": "select order_id, user_id from orders where order_dow = 0",
+}
+
+# Compound questions for the decomposition benchmark: the single-query SQL the
+# stub LLM answers with, and the decomposition it returns (sub-questions with
+# their SQL, and the merge over their results)
+COMPOUND_QUERIES = {
+    "Compare the top aisle in each department and the average days between orders for users who buy from it": {
+        "sql": (
+            "select d.department, a.aisle, round(avg(o.days_since_prior_order), 1) as avg_days_between_orders "
+            "from (select department_id, aisle_id, row_number() over "
+            "(partition by department_id order by count(*) desc, aisle_id) as rn "
+            "from products group by department_id, aisle_id) t "
+            "join departments d on d.department_id = t.department_id join aisles a on a.aisle_id = t.aisle_id "
+            "join products p on p.aisle_id = t.aisle_id join order_products_prior op on op.product_id = p.product_id "
+            "join orders o on o.order_id = op.order_id where t.rn = 1 group by d.department, a.aisle order by d.department"
+        ),
+        "steps": [
+            {
+                "id": "s1", "question": "Aisle with the most products in each department", "depends_on": [],
+                "columns": ["department", "aisle_id", "aisle"],
+                "sql": (
+                    "select d.department, a.aisle_id, a.aisle from (select department_id, aisle_id, row_number() over "
+                    "(partition by department_id order by count(*) desc, aisle_id) as rn "
+                    "from products group by department_id, aisle_id) t "
+                    "join departments d on d.department_id = t.department_id join aisles a on a.aisle_id = t.aisle_id "
+                    "where t.rn = 1"
+                ),
+            },
+            {
+                "id": "s2", "question": "Average days between orders of orders with products from each of those aisles",
+                "depends_on": ["s1"], "columns": ["aisle_id", "avg_days_between_orders"],
+                "sql": (
+                    "select s1.aisle_id, round(avg(o.days_since_prior_order), 1) from s1 "
+                    "join products p on p.aisle_id = s1.aisle_id join order_products_prior op on op.product_id = p.product_id "
+                    "join orders o on o.order_id = op.order_id group by s1.aisle_id"
+                ),
+            },
+        ],
+        "merge_sql": (
+            "select s1.department, s1.aisle, s2.avg_days_between_orders from s1 join s2 using (aisle_id) "
+            "order by s1.department"
+        ),
+    },
+    "Compare the number of products and the reorder rate in each department": {
+        "sql": (
+            "select d.department, count(distinct p.product_id) as product_count, round(avg(op.reordered), 3) as reorder_rate "
+            "from departments d join products p on p.department_id = d.department_id "
+            "left join order_products_prior op on op.product_id = p.product_id "
+            "group by d.department order by product_count desc"
+        ),
+        "steps": [
+            {
+                "id": "s1", "question": "Number of products in each department", "depends_on": [],
+                "columns": ["department", "product_count"],
+                "sql": (
+                    "select d.department, count(*) as product_count from products p "
+                    "join departments d on p.department_id = d.department_id group by d.department"
+                ),
+            },
+            {
+                "id": "s2", "question": "Share of reordered order lines in each department", "depends_on": [],
+                "columns": ["department", "reorder_rate"],
+                "sql": (
+                    "select d.department, round(avg(op.reordered), 3) as reorder_rate from order_products_prior op "
+                    "join products p on op.product_id = p.product_id "
+                    "join departments d on p.department_id = d.department_id group by d.department"
+                ),
+            },
+        ],
+        "merge_sql": (
+            "select s1.department, s1.product_count, s2.reorder_rate from s1 join s2 using (department) "
+            "order by s1.product_count desc"
+        ),
+    },
+    "Which department has the most reordered products, and which aisle has the most products in it?": {
+        "sql": (
+            "select d.department, a.aisle, count(*) as product_count from products p "
+            "join aisles a on a.aisle_id = p.aisle_id join departments d on d.department_id = p.department_id "
+            "where p.department_id = (select p2.department_id from order_products_prior op "
+            "join products p2 on op.product_id = p2.product_id where op.reordered = 1 "
+            "group by p2.department_id order by count(*) desc, p2.department_id limit 1) "
+            "group by d.department, a.aisle order by product_count desc limit 1"
+        ),
+        "steps": [
+            {
+                "id": "s1", "question": "Department with the most reordered order lines", "depends_on": [],
+                "columns": ["department_id", "department"],
+                "sql": (
+                    "select d.department_id, d.department from order_products_prior op "
+                    "join products p on op.product_id = p.product_id join departments d on p.department_id = d.department_id "
+                    "where op.reordered = 1 group by d.department_id, d.department order by count(*) desc, d.department_id limit 1"
+                ),
+            },
+            {
+                "id": "s2", "question": "Aisle with the most products in that department",
+                "depends_on": ["s1"], "columns": ["aisle", "product_count"],
+                "sql": (
+                    "select a.aisle, count(*) as product_count from products p join s1 on p.department_id = s1.department_id "
+                    "join aisles a on a.aisle_id = p.aisle_id group by a.aisle order by product_count desc limit 1"
+                ),
+            },
+        ],
+        "merge_sql": "select s1.department, s2.aisle, s2.product_count from s1 cross join s2",
+    },
+}
@@ -0,0 +1,135 @@
+"""
+Stub OpenAI-compatible LLM server for load tests.
+
+Answers /v1/chat/completions with canned responses, so the agent runs its
+full graph without a provider: planning prompts get the tables of the canned
+SQL, generation/correction prompts get the SQL for the question
+(LOAD_TEST_QUERIES and COMPOUND_QUERIES, falling back to a count), validation
+prompts get a valid answer and decomposition prompts get the canned
+decomposition of a compound question (or none). Every response is delayed according to a latency distribution:
+
+    fixed:0.5            always 0.5 s
+    uniform:0.2,1.5      uniform between 0.2 and 1.5 s
+    lognormal:0.8,0.4    median 0.8 s, sigma 0.4 (long right tail, like real APIs)
+    exp:0.6              exponential with mean 0.6 s
+
+Usage:
+    python -m benchmarks.stub_llm --port 8001 --latency lognormal:0.8,0.4
+    LLM_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub uvicorn backend_server.app:app
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from typing import Callable
+
+from fastapi import FastAPI, Request
+
+from benchmarks.questions import COMPOUND_QUERIES, LOAD_TEST_QUERIES
+
+
+FALLBACK_SQL = "select count(*) from orders"
+TABLE_PATTERN = re.compile(r"\b(?:from|join)\s+([a-z_]+)")
+QUERIES = {**{q: plan["sql"] for q, plan in COMPOUND_QUERIES.items()}, **LOAD_TEST_QUERIES}
+SUB_QUERIES = {step["question"]: step["sql"] for plan in COMPOUND_QUERIES.values() for step in plan["steps"]}
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Sampler for a latency spec such as "lognormal:0.8,0.4" (seconds)"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    rng = random.Random()
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: rng.lognormvariate(math.log(median), sigma)
+    if kind == "exp":
+        return lambda: rng.expovariate(1 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def canned_decomposition(prompt: str) -> str:
+    plan = next((plan for q, plan in COMPOUND_QUERIES.items() if q in prompt), None)
+    if plan is None:
+        return json.dumps({"steps": [], "merge_sql": ""})
+    return json.dumps({
+        "steps": [{k: v for k, v in step.items() if k != "sql"} for step in plan["steps"]],
+        "merge_sql": plan["merge_sql"],
+    })
+
+
+def canned_response(prompt: str) -> str:
+    if "query decomposer" in prompt:
+        return canned_decomposition(prompt)
+    part = prompt.partition("Part to answer now:")[2].strip()
+    if part:
+        return SUB_QUERIES.get(part.split("\n")[0], FALLBACK_SQL)
+    question = next((q for q in QUERIES if q in prompt), None)
+    sql = QUERIES.get(question, FALLBACK_SQL)
+    if "database query planner" in prompt:
+        return json.dumps(sorted(set(TABLE_PATTERN.findall(sql))))
+    if "validator and response generator" in prompt:
+        return json.dumps({
+            "valid": True,
+            "reason": "Stub validation",
+            "natural_language_response": "Here is the answer from the stub model.",
+        })
+    return sql
+
+
+def create_app(latency: str = "fixed:0.5") -> FastAPI:
+    app = FastAPI()
+    sample = parse_latency(latency)
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        app.state.requests += 1
+        await asyncio.sleep(sample())
+
+        content = canned_response(prompt)
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="lognormal:0.8,0.4")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    print(f"🤖 Stub LLM on http://{args.host}:{args.port}/v1 (latency {args.latency})")
+    uvicorn.run(create_app(args.latency), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
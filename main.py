@@ -7,14 +7,15 @@ from src.agent.agent import SQLAgent
 load_dotenv()
 
 
-def main(query: str) -> dict:
+def main(query: str, engine: str = None, session_id: str = None, database: str = None,
+         approximate: bool = False) -> dict:
     """
-    Execute the SQL agent for a single query.
-    Returns the result dict only.
+    Execute the SQL agent for a single query against a registered database
+    (None = the default one). Returns the result dict only.
     """
-    agent = SQLAgent()
+    agent = SQLAgent(database=database)
     try:
-        return agent.query(query)
+        return agent.query(query, engine=engine, session_id=session_id, approximate=approximate)
     finally:
         agent.close()
 
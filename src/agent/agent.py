@@ -1,12 +1,21 @@
 """
 Main SQL Agent class and graph construction
 """
-from langgraph.graph import StateGraph, END
+import threading
+import time
+from collections import OrderedDict
+
+from langgraph.constants import END
 from src.agent.state import SQLAgentState
+from src.agent.follow_up import session_context
 from src.agent.nodes import (
+    follow_up_node,
+    match_template_node,
     planning_node,
+    decompose_node,
     generate_sql_node,
     validate_sql_node,
+    rewrite_sql_node,
     execute_sql_node,
     validate_and_respond_node,
     correct_sql_node,
@@ -16,46 +25,149 @@ from src.agent.nodes import (
     ask_clarification_node
 )
 from src.agent.routing import (
+    route_entry,
+    route_after_follow_up,
+    route_after_template,
+    route_after_decompose,
     route_after_syntax_check,
     route_after_execution,
     route_after_validation,
     route_after_failure_analysis
 )
-from src.db.db_connection import get_db_connection
+from src.db.backends import resolve_engine
+from src.db.change_tracking import CHANGE_TRACKER, stamp
+from src.db.registry import get_registry, use_database
+from src.config.settings import EXECUTION_BACKEND, FOLLOW_UP_ENABLED, SESSION_MAX, SESSION_TTL_S
+from src.utils.schema_utils import reload_schema_if_modified
+from src.memory.cache import ANSWER_CACHE, answer_key, clear_caches
+from src.utils.llm import track_usage
+from src.utils.profiling import profile_node, profile_request
+from src.utils.run_log import record_node, track_run
+from src.utils.tracing import observe, update_current_trace
+
+
+# Compiled graphs shared by every SQLAgent in the process; the session graph
+# checkpoints each session's last state (one checkpoint per session)
+_graph = None
+_session_graph = None
+_graph_lock = threading.Lock()
+
+# thread id (database:session_id) -> last used (monotonic), oldest first
+_conversations: "OrderedDict[str, float]" = OrderedDict()
+_conversations_lock = threading.Lock()
+
+
+def _previous_turn(graph, session_id: str):
+    """
+    Follow-up context from the session's checkpoint, which is then cleared so
+    the session keeps exactly one (the new turn's state is saved on exit).
+    """
+    with _conversations_lock:
+        last_used = _conversations.get(session_id)
+    if last_used is None:
+        return None
+    config = {"configurable": {"thread_id": session_id}}
+    values = graph.get_state(config).values
+    graph.checkpointer.delete_thread(session_id)
+    if time.monotonic() - last_used > SESSION_TTL_S:
+        return None
+    return session_context(values)
+
+
+def _remember_session(graph, session_id: str):
+    """Mark the session as used and forget expired or excess sessions"""
+    now = time.monotonic()
+    forgotten = []
+    with _conversations_lock:
+        _conversations[session_id] = now
+        _conversations.move_to_end(session_id)
+        for other, last_used in _conversations.items():
+            if now - last_used <= SESSION_TTL_S and len(_conversations) - len(forgotten) <= SESSION_MAX:
+                break
+            forgotten.append(other)
+        for other in forgotten:
+            del _conversations[other]
+    for other in forgotten:
+        graph.checkpointer.delete_thread(other)
 
-from langfuse import Langfuse
-from langfuse import observe
 
 class SQLAgent:
     """
     Agentic SQL generation system with planning, execution, and self-correction
     """
     
-    def __init__(self):
-        """Initialize the SQL agent with database connection and graph"""
-        self.conn = get_db_connection()
-        self.cursor = self.conn.cursor()
-        self.graph = self._build_graph()
-        self.langfuse = Langfuse()
+    def __init__(self, engine: str = EXECUTION_BACKEND, database: str = None):
+        """
+        Initialize the SQL agent with database connection and graph. `database`
+        is a registry id (src.db.registry); the database stays open until close().
+        """
+        self.engine = engine
+        self.database = get_registry().open(database)
+        self._sessions = {}
+        try:
+            with use_database(self.database):
+                self.conn, self.cursor = self._session(resolve_engine(engine))
+        except Exception:
+            get_registry().release(self.database)
+            raise
+        self.graph = self._get_graph()
         print("✅ SQL Agent initialized")
+
+    def _session(self, engine_name: str):
+        """Lazily open one (conn, cursor) pair per execution backend"""
+        if engine_name not in self._sessions:
+            conn = self.database.backend(engine_name).connect()
+            self._sessions[engine_name] = (conn, conn.cursor())
+        return self._sessions[engine_name]
+
+    @classmethod
+    def _get_graph(cls, sessions: bool = False):
+        """Build and compile the graph once per process (with a checkpointer for sessions)"""
+        global _graph, _session_graph
+        with _graph_lock:
+            if sessions:
+                if _session_graph is None:
+                    from langgraph.checkpoint.memory import InMemorySaver
+
+                    _session_graph = cls._build_graph(InMemorySaver())
+                return _session_graph
+            if _graph is None:
+                _graph = cls._build_graph()
+            return _graph
     
-    def _build_graph(self):
+    @staticmethod
+    def _build_graph(checkpointer=None):
         """Build the LangGraph workflow"""
+        from langgraph.graph import StateGraph
+
         graph = StateGraph(SQLAgentState)
         
-        # Create wrapper functions that inject conn and cursor
+        # Create wrapper functions that inject the calling agent's conn and cursor
         def wrap_node(node_func, node_name: str):
             @observe(name=node_name)
-            def wrapped(state):
-                return node_func(state, self.conn, self.cursor)
+            def wrapped(state, config):
+                agent = config["configurable"]["agent"]
+                conn, cursor = agent._session(resolve_engine(state.get("engine"), state.get("sql")))
+                start = time.perf_counter()
+                new_state = None
+                try:
+                    with profile_node(node_name):
+                        new_state = node_func(state, conn, cursor)
+                    return new_state
+                finally:
+                    record_node(node_name, start, new_state)
             return wrapped
 
 
 
         # Add all nodes
+        graph.add_node("follow_up", wrap_node(follow_up_node, "follow_up"))
+        graph.add_node("match_template", wrap_node(match_template_node, "match_template"))
         graph.add_node("planning", wrap_node(planning_node, "planning"))
+        graph.add_node("decompose", wrap_node(decompose_node, "decompose"))
         graph.add_node("generate_sql", wrap_node(generate_sql_node, "generate_sql"))
         graph.add_node("validate_sql", wrap_node(validate_sql_node, "validate_sql"))
+        graph.add_node("rewrite_sql", wrap_node(rewrite_sql_node, "rewrite_sql"))
         graph.add_node("execute_sql", wrap_node(execute_sql_node, "execute_sql"))
         graph.add_node("validate_and_respond", wrap_node(validate_and_respond_node, "validate_and_respond"))
         graph.add_node("correct_sql", wrap_node(correct_sql_node, "correct_sql"))
@@ -64,20 +176,56 @@ class SQLAgent:
         graph.add_node("generate_alternative", wrap_node(generate_alternative_approach_node, "generate_alternative"))
         graph.add_node("ask_clarification", wrap_node(ask_clarification_node, "ask_clarification"))
 
-        # Set entry point
-        graph.set_entry_point("planning")
+        # Set entry point: session follow-ups first try the previous result
+        graph.set_conditional_entry_point(
+            route_entry,
+            {
+                "follow_up": "follow_up",
+                "match_template": "match_template"
+            }
+        )
         
         # Define edges
-        graph.add_edge("planning", "generate_sql")
+        graph.add_edge("planning", "decompose")
         graph.add_edge("generate_sql", "validate_sql")
+        graph.add_edge("rewrite_sql", "execute_sql")
         
         # Conditional edges
+        graph.add_conditional_edges(
+            "follow_up",
+            route_after_follow_up,
+            {
+                "validate_and_respond": "validate_and_respond",
+                "validate_sql": "validate_sql",
+                "match_template": "match_template"
+            }
+        )
+        
+        graph.add_conditional_edges(
+            "match_template",
+            route_after_template,
+            {
+                "validate_sql": "validate_sql",
+                "planning": "planning"
+            }
+        )
+        
+        graph.add_conditional_edges(
+            "decompose",
+            route_after_decompose,
+            {
+                "validate_and_respond": "validate_and_respond",
+                "generate_sql": "generate_sql"
+            }
+        )
+        
         graph.add_conditional_edges(
             "validate_sql",
             route_after_syntax_check,
             {
-                "execute_sql": "execute_sql",
+                "rewrite_sql": "rewrite_sql",
                 "correct_sql": "correct_sql",
+                "analyze_failure": "analyze_failure",
                 END: END
             }
         )
@@ -118,10 +266,24 @@ class SQLAgent:
         graph.add_edge("correct_sql", "validate_sql")
         graph.add_edge("ask_clarification", END)
 
-        return graph.compile()
+        return graph.compile(checkpointer=checkpointer)
     
+    def query(self, question: str, engine: str = None, source: str = "user",
+              session_id: str = None, approximate: bool = False) -> dict:
+        """
+        Answer a question against the agent's database. With a session_id the
+        question may follow up on the session's previous answer. `source`
+        labels the run in the run log ("user", or "warmup" for background
+        cache warm-up). With `approximate`, aggregates may be estimated from
+        a sample (see src.agent.approximate).
+        """
+        with use_database(self.database), profile_request(question):
+            return self._query(question, engine, source, session_id, approximate)
+
     @observe(name="text_to_sql_query")
-    def query(self, question: str) -> dict:
+    def _query(self, question: str, engine: str, source: str, session_id: str, approximate: bool) -> dict:
+        if reload_schema_if_modified():
+            clear_caches()
         initial_state: SQLAgentState = {
             "question": question,
             "sql": None,
@@ -130,33 +292,103 @@ class SQLAgent:
             "retries": 0,
             "executed": False,
             "results": None,
+            "columns": None,
+            "exec_sql": None,
+            "row_limit": None,
+            "truncated": False,
+            "total_rows": None,
+            "total_rows_estimated": False,
+            "engine": engine or self.engine,
+            "approximate": approximate,
+            "approximation": None,
             "nl_response": None,
+            "fast_path": False,
             "failure_type": None,
             "attempted_strategies": [],
             "current_strategy": "direct",
             "planned_tables": None,
             "filtered_schema": None,
-            "total_attempts": 0
+            "speculative_sql": None,
+            "speculation": None,
+            "query_template": None,
+            "decomposition": None,
+            "sub_queries": None,
+            "previous": None,
+            "follow_up": None,
+            "total_attempts": 0,
+            "failed_attempts": {},
+            "duplicate_attempt": False,
+            "short_circuits": 0,
+            "fix_store_hits": 0
         }
 
-        final_state = self.graph.invoke(
-            initial_state,
-            config={"recursion_limit": 100}
-        )
+        graph = self.graph
+        config = {"recursion_limit": 100, "configurable": {"agent": self}}
+        if session_id:
+            # The same session id on another database is another conversation
+            session_id = f"{self.database.id}:{session_id}"
+            graph = self._get_graph(sessions=True)
+            config["configurable"]["thread_id"] = session_id
+            previous = _previous_turn(graph, session_id)
+            initial_state["previous"] = previous if FOLLOW_UP_ENABLED else None
+
+        # A follow-up means something different in every conversation: never served from the cache
+        cache_key = answer_key(question, initial_state["engine"], approximate)
+        versions = CHANGE_TRACKER.snapshot(self.database.id)
+        with track_usage() as llm_usage, \
+                track_run(question, initial_state["engine"], llm_usage, source) as run:
+            start = time.perf_counter()
+            cached = None if initial_state["previous"] else ANSWER_CACHE.get(cache_key)
+            if cached is not None:
+                print("💾 Answer cache hit (graph skipped)")
+                if run is not None:
+                    run.record_cached(start, cached)
+                if session_id:
+                    # Later follow-ups refine this answer
+                    graph.update_state(config, {**initial_state, **cached, "previous": None},
+                                       as_node="validate_and_respond")
+            else:
+                # Sessions only need the final state checkpointed
+                durability = {"durability": "exit"} if session_id else {}
+                final_state = graph.invoke(initial_state, config=config, **durability)
+        if session_id:
+            _remember_session(graph, session_id)
+
+        if cached is not None:
+            result = {"question": question, **cached, "cached": True, "follow_up": None, "llm_usage": llm_usage}
+            update_current_trace(input=question, output=result.get("nl_response"), metadata={"cached": True})
+            return result
 
         result = {
             "question": final_state["question"],
             "sql": final_state.get("sql"),
             "nl_response": final_state.get("nl_response"),
+            "fast_path": final_state.get("fast_path", False),
+            "cached": False,
+            "follow_up": final_state.get("follow_up"),
+            "planned_tables": final_state.get("planned_tables"),
+            "speculation": final_state.get("speculation"),
+            "query_template": (final_state.get("query_template") or {}).get("filled"),
+            "decomposition": final_state.get("decomposition"),
+            "sub_queries": final_state.get("sub_queries"),
+            "llm_usage": llm_usage,
             "valid": final_state.get("valid", False),
             "executed": final_state.get("executed", False),
             "results": final_state.get("results"),
+            "columns": final_state.get("columns"),
+            "truncated": final_state.get("truncated", False),
+            "total_rows": final_state.get("total_rows"),
+            "approximation": final_state.get("approximation"),
+            "engine": resolve_engine(final_state.get("engine"), final_state.get("sql")),
+            "database": self.database.id,
             "total_attempts": final_state.get("total_attempts", 0),
-            "attempted_strategies": final_state.get("attempted_strategies", [])
+            "attempted_strategies": final_state.get("attempted_strategies", []),
+            "short_circuits": final_state.get("short_circuits", 0),
+            "fix_store_hits": final_state.get("fix_store_hits", 0)
         }
 
-        # Attach structured output to Langfuse trace
-        self.langfuse.update_current_trace(
+        # Attach structured output to the trace (failed requests are always kept)
+        update_current_trace(
             input=question,
             output=result.get("nl_response"),
             metadata={
@@ -164,15 +396,35 @@ class SQLAgent:
                 "executed": result["executed"],
                 "total_attempts": result["total_attempts"],
                 "attempted_strategies": result["attempted_strategies"],
+                "short_circuits": result["short_circuits"],
+                "fix_store_hits": result["fix_store_hits"],
+                "fast_path": result["fast_path"],
+                "speculation": result["speculation"],
+                "query_template": result["query_template"],
+                "decomposition": result["decomposition"],
+                "follow_up": result["follow_up"],
+                "approximate": (result["approximation"] or {}).get("status") == "approximate",
+                "database": result["database"],
+                "llm_usage": llm_usage,
                 "has_sql": bool(result["sql"])
-            }
+            },
+            failed=not result["valid"]
         )
 
+        if result["valid"] and result["executed"] and result["follow_up"] in (None, "new"):
+            ANSWER_CACHE.put(cache_key, {k: v for k, v in result.items()
+                                         if k not in ("question", "cached", "follow_up", "llm_usage")},
+                             stamp(self.database.id, result["engine"], result["sql"], versions))
         return result
 
 
     def close(self):
-            """Close database connection"""
-            self.cursor.close()
-            self.conn.close()
+            """Close database connections"""
+            for conn, cursor in self._sessions.values():
+                cursor.close()
+                conn.close()
+            self._sessions.clear()
+            if self.database is not None:
+                get_registry().release(self.database)
+                self.database = None
             print("✅ Database connection closed")
\ No newline at end of file
@@ -0,0 +1,388 @@
+"""
+Approximate answers from samples of the fact tables.
+
+Exploratory questions ("what share of orders happen on weekends") can be
+answered from a small sample in a fraction of the time. When a request opts
+in (approximate=True), execute_sql_node first tries to answer the validated
+SQL from a sample of orders / order_products_prior:
+
+- sample tables (`orders_sample_1pct`, ...) built with `build` below keep
+  whole orders, chosen by a hash of order_id, so a join of the two sampled
+  tables on order_id is itself a sample of the joined rows. Without them,
+  TABLESAMPLE BERNOULLI is used, for queries reading one fact table only
+- COUNT and SUM are scaled by the sampling rate; AVG, and ratios of scaled
+  aggregates, are estimated as they are
+- confidence intervals come from REPLICATES disjoint sub-samples (a hash of
+  order_id): the query is grouped by sub-sample too, and the spread
+  of the sub-sample estimates gives a 95% interval for every value
+
+Queries with other aggregates (MIN, MAX, COUNT DISTINCT, percentiles...),
+window functions, subqueries, HAVING or an ORDER BY that is not in the
+select list, and answers whose intervals are wider than
+APPROXIMATE_MAX_RELATIVE_ERROR, run exactly instead.
+
+Usage:
+    python -m src.agent.approximate build --engine duckdb --percent 1
+    python -m src.agent.approximate build --engine postgres --percent 1
+"""
+import argparse
+import math
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config.settings import (
+    APPROXIMATE_MAX_RELATIVE_ERROR,
+    APPROXIMATE_SAMPLE_PERCENT,
+    APPROXIMATE_SAMPLING,
+    PARQUET_DIR,
+    SQL_AUTO_LIMIT
+)
+from src.db.registry import current_database
+from src.memory.cache import RESULT_CACHE, TTLCache, result_key
+from src.utils.concurrency import DB_LIMITER
+
+
+FACT_TABLES = ("orders", "order_products_prior")
+REPLICATES = 20
+T_95 = 2.093  # Student t quantile, two-sided 95% with REPLICATES - 1 degrees of freedom
+
+# (database, backend, percent) -> whether the sample tables exist
+SAMPLE_TABLES = TTLCache("sample_tables", 300, optional=False)
+
+
+def sample_table(table: str, percent: float = APPROXIMATE_SAMPLE_PERCENT) -> str:
+    return f"{table}_sample_{percent:g}pct".replace(".", "_")
+
+
+def _is_additive(node) -> bool:
+    """COUNT / SUM, possibly scaled by a constant: estimated by summing the sub-samples"""
+    from sqlglot import exp
+
+    if isinstance(node, exp.Paren):
+        return _is_additive(node.this)
+    if isinstance(node, exp.Filter):
+        return _is_additive(node.this)
+    if isinstance(node, (exp.Count, exp.Sum)):
+        return True
+    if isinstance(node, (exp.Mul, exp.Div)):
+        left, right = node.this, node.expression
+        if isinstance(node, exp.Mul) and isinstance(left, exp.Literal) and left.is_number:
+            return _is_additive(right)
+        return isinstance(right, exp.Literal) and right.is_number and _is_additive(left)
+    return False
+
+
+def _select_position(term, projections) -> Optional[int]:
+    """Select-list position an ORDER BY / GROUP BY term refers to (ordinal, alias or same expression)"""
+    from sqlglot import exp
+
+    if isinstance(term, exp.Literal) and term.is_int:
+        position = int(term.this) - 1
+        return position if 0 <= position < len(projections) else None
+    for position, projection in enumerate(projections):
+        if isinstance(term, exp.Column) and not term.table and term.name == projection.alias:
+            return position
+        if term.sql() == projection.unalias().sql():
+            return position
+        if (isinstance(term, exp.Column) and isinstance(projection.unalias(), exp.Column)
+                and term.name == projection.unalias().name):
+            return position
+    return None
+
+
+def approximate_sql(sql: str, sampling: str, percent: float = APPROXIMATE_SAMPLE_PERCENT
+                    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    (plan, None) for a query that can be answered from a sample, or (None,
+    why not). The plan holds the SQL to run ("sql"), the output column names
+    and, per column, how to turn its sub-sample figures into an estimate.
+    `sampling` is "tables" (prebuilt sample tables) or "tablesample".
+    """
+    import sqlglot
+    from sqlglot import exp
+
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except sqlglot.errors.ParseError:
+        return None, "unparseable SQL"
+    if not isinstance(tree, exp.Select) or tree.find(exp.With):
+        return None, "not a single SELECT"
+    if any(select is not tree for select in tree.find_all(exp.Select)):
+        return None, "subqueries"
+    if tree.args.get("distinct") or tree.args.get("having") or tree.find(exp.Window):
+        return None, "DISTINCT, HAVING or window functions"
+
+    facts = [table for table in tree.find_all(exp.Table) if table.name in FACT_TABLES]
+    if not facts:
+        return None, "no sampled table"
+    if len({table.name for table in facts}) < len(facts):
+        return None, "a fact table is read twice"
+    if len(facts) > 1:
+        if sampling != "tables":
+            return None, "independent samples of joined tables"
+        joined_on_order = any(
+            isinstance(eq.this, exp.Column) and isinstance(eq.expression, exp.Column)
+            and eq.this.name == eq.expression.name == "order_id"
+            for eq in tree.find_all(exp.EQ)
+        ) or any("order_id" in [c.name for c in join.args.get("using") or []] for join in tree.args.get("joins") or [])
+        if not joined_on_order:
+            return None, "fact tables not joined on order_id"
+
+    projections = list(tree.expressions)
+    columns, kinds = [], []
+    for projection in projections:
+        node = projection.unalias()
+        aggregates = list(node.find_all(exp.AggFunc))
+        for aggregate in aggregates:
+            if isinstance(aggregate.this, exp.Distinct):
+                return None, f"{aggregate.key.upper()} DISTINCT can't be estimated from a sample"
+            if not isinstance(aggregate, (exp.Count, exp.Sum, exp.Avg)):
+                return None, f"{aggregate.key.upper()} can't be estimated from a sample"
+        if not aggregates:
+            kinds.append("group")
+        elif _is_additive(node):
+            counts_only = all(isinstance(a, exp.Count) for a in aggregates) and not isinstance(node, exp.Div)
+            kinds.append("count" if counts_only else "sum")
+        else:
+            kinds.append("ratio")
+        # Output names as Postgres gives them
+        columns.append(projection.alias or (node.name if isinstance(node, exp.Column)
+                                            else node.key if isinstance(node, exp.Func) else "?column?"))
+    if all(kind == "group" for kind in kinds):
+        return None, "no aggregates"
+    if len(set(columns)) < len(columns):
+        return None, "duplicate column names"
+    grouped = [_select_position(term, projections) for term in (tree.args.get("group").expressions
+                                                             if tree.args.get("group") else [])]
+    if None in grouped or any(kinds[position] != "group" for position in grouped):
+        return None, "GROUP BY term outside the select list"
+
+    sort = []
+    for ordered in (tree.args.get("order").expressions if tree.args.get("order") else []):
+        position = _select_position(ordered.this, projections)
+        if position is None:
+            return None, "ORDER BY term outside the select list"
+        sort.append(f'"{columns[position]}"' + (" desc" if ordered.args.get("desc") else ""))
+    limit = tree.args.get("limit")
+    offset = tree.args.get("offset")
+
+    # Inner query: per sub-sample, COUNT / SUM scaled to the whole table
+    scale = REPLICATES * 100 / percent
+    for aggregate in list(tree.find_all(exp.Count, exp.Sum)):
+        target = aggregate.parent if isinstance(aggregate.parent, exp.Filter) else aggregate
+        target.replace(exp.Paren(this=exp.Mul(this=target.copy(), expression=exp.Literal.number(f"{scale:g}"))))
+    for table in facts:
+        if sampling == "tables":
+            if not table.alias:
+                table.set("alias", exp.TableAlias(this=exp.to_identifier(table.name)))
+            table.set("this", exp.to_identifier(sample_table(table.name, percent)))
+        else:
+            table.set("sample", exp.TableSample(method=exp.Var(this="bernoulli"),
+                                                percent=exp.Literal.number(f"{percent:g}")))
+    # Sub-sample by the high bits of a multiplicative hash: order ids are often
+    # sequential per user, so order_id % REPLICATES would line up with order_number
+    replicate = f"floor(({facts[0].alias_or_name}.order_id * 2654435761 % 4294967296) / {2**32 / REPLICATES:.1f})"
+    tree.set("expressions", [projection.unalias().as_(f"__c{i}") for i, projection in enumerate(tree.expressions)]
+             + [sqlglot.parse_one(replicate, read="postgres").as_("__replicate")])
+    groups = [f"__c{i}" for i, kind in enumerate(kinds) if kind == "group"]
+    tree.set("group", exp.Group(expressions=[exp.Literal.number(len(projections) + 1)]
+                                + [exp.Literal.number(int(g[3:]) + 1) for g in groups]))
+    for key in ("order", "limit", "offset"):
+        tree.set(key, None)
+    inner = tree.sql(dialect="postgres").lower()
+
+    # Outer query: one row per group, sub-sample sums for the intervals
+    select = []
+    for i, (column, kind) in enumerate(zip(columns, kinds)):
+        if kind == "group":
+            select.append(f'__c{i} as "{column}"')
+            continue
+        estimate = f"sum(__c{i}) / {REPLICATES}.0" if kind in ("count", "sum") else f"avg(__c{i})"
+        select += [f'{estimate} as "{column}"', f"sum(__c{i} * __c{i}) as __s{i}", f"count(__c{i}) as __n{i}"]
+    outer = f"select {', '.join(select)} from ({inner}) as __replicates"
+    if groups:
+        outer += f" group by {', '.join(groups)}"
+    if sort:
+        outer += f" order by {', '.join(sort)}"
+    if limit is not None:
+        outer += f" {limit.sql(dialect='postgres').lower()}"
+    if offset is not None:
+        outer += f" {offset.sql(dialect='postgres').lower()}"
+    return {"sql": outer, "columns": columns, "kinds": kinds, "sampling": sampling, "percent": percent}, None
+
+
+def _number(value: Any) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float, Decimal)) else None
+
+
+def estimate_results(plan: Dict[str, Any], rows: list) -> Tuple[list, Dict[str, List[Optional[List[float]]]], float]:
+    """
+    (rows shaped like the exact query's, {column: [low, high] per row}, widest
+    interval half-width relative to its estimate) from the plan's output rows.
+    """
+    results, intervals = [], {c: [] for c, k in zip(plan["columns"], plan["kinds"]) if k != "group"}
+    worst = 0.0
+    for row in rows:
+        values, i = [], 0
+        for column, kind in zip(plan["columns"], plan["kinds"]):
+            if kind == "group":
+                values.append(row[i])
+                i += 1
+                continue
+            estimate, squares, present = _number(row[i]), _number(row[i + 1]), row[i + 2] or 0
+            i += 3
+            if estimate is None or squares is None:
+                values.append(None)
+                intervals[column].append(None)
+                continue
+            # Additive columns: a sub-sample without rows contributes a zero count or sum.
+            # Ratios are averaged over the sub-samples that have rows, which must be all of them
+            n = present if kind == "ratio" else REPLICATES
+            if n < REPLICATES:
+                half = math.inf
+            else:
+                variance = max(squares - (estimate * n) ** 2 / n, 0.0) / (n - 1)
+                half = T_95 * math.sqrt(variance / n)
+            low, high = estimate - half, estimate + half
+            if kind == "count":
+                estimate = int(round(estimate))
+                low, high = (round(low), round(high)) if math.isfinite(half) else (low, high)
+            worst = max(worst, half / abs(estimate) if estimate else (0.0 if half == 0 else math.inf))
+            values.append(estimate)
+            intervals[column].append([low, high])
+        results.append(tuple(values))
+    return results, intervals, worst
+
+
+def approximation_note(approximation: Dict[str, Any]) -> str:
+    """One sentence for the natural-language answer"""
+    return (f"(Approximate: estimated from a {approximation['percent']:g}% sample, "
+            f"95% confidence within ±{approximation['max_relative_error']:.1%}.)")
+
+
+def _sampling(backend, conn, cursor, percent: float) -> Optional[str]:
+    """"tables", "tablesample" or None (sample tables required but not built)"""
+    if APPROXIMATE_SAMPLING == "tablesample":
+        return "tablesample"
+    key = (current_database().id, backend.name, percent)
+    built = SAMPLE_TABLES.get(key)
+    if built is None:
+        built = all(backend.table_exists(conn, cursor, sample_table(t, percent)) for t in FACT_TABLES)
+        SAMPLE_TABLES.put(key, built)
+    if built:
+        return "tables"
+    return "tablesample" if APPROXIMATE_SAMPLING == "auto" else None
+
+
+def approximate_answer(backend, conn, cursor, sql: str, percent: float = APPROXIMATE_SAMPLE_PERCENT
+                       ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    (result, approximation) for execute_sql_node. result is None when the
+    query must run exactly; approximation then says why.
+    """
+    sampling = _sampling(backend, conn, cursor, percent)
+    if sampling is None:
+        return None, {"status": "exact", "reason": "sample tables not built"}
+    plan, reason = approximate_sql(sql, sampling, percent)
+    if plan is None:
+        return None, {"status": "exact", "reason": reason}
+
+    key = result_key(backend.name, plan["sql"])
+    cached = RESULT_CACHE.get(key)
+    if cached is not None:
+        return cached, cached["approximation"]
+    try:
+        with DB_LIMITER.slot():
+            _, rows = backend.execute(conn, cursor, backend.translate(plan["sql"]))
+    except Exception as e:
+        backend.rollback(conn)
+        return None, {"status": "exact", "reason": f"sample query failed: {str(e)[:100]}"}
+    if not rows:
+        return None, {"status": "exact", "reason": "no rows in the sample"}
+    if SQL_AUTO_LIMIT > 0 and len(rows) > SQL_AUTO_LIMIT:
+        return None, {"status": "exact", "reason": "too many groups"}
+
+    results, intervals, worst = estimate_results(plan, rows)
+    if not worst <= APPROXIMATE_MAX_RELATIVE_ERROR:
+        return None, {"status": "exact", "reason": f"sample error ±{worst:.1%} over the limit"}
+    approximation = {
+        "status": "approximate",
+        "reason": None,
+        "sample": sampling,
+        "percent": percent,
+        "confidence": 0.95,
+        "max_relative_error": worst,
+        "intervals": intervals,
+    }
+    result = {
+        "results": results,
+        "columns": plan["columns"],
+        "truncated": False,
+        "total_rows": len(results),
+        "total_rows_estimated": False,
+        "approximation": approximation,
+    }
+    RESULT_CACHE.put(key, result)
+    return result, approximation
+
+
+# ---------------------------
+# Sample tables
+# ---------------------------
+
+def build_samples(engine: str, percent: float = APPROXIMATE_SAMPLE_PERCENT, parquet_dir: str = PARQUET_DIR):
+    """
+    Create the sample tables: the same orders (chosen by a hash of order_id)
+    in both, so joining them on order_id keeps whole sampled orders.
+    """
+    threshold = round(percent * 100)  # Out of 10,000 hash buckets
+    if engine == "duckdb":
+        import duckdb
+
+        db = duckdb.connect(database=":memory:")
+        for table in FACT_TABLES:
+            source = (Path(parquet_dir) / f"{table}.parquet").as_posix()
+            target = (Path(parquet_dir) / f"{sample_table(table, percent)}.parquet").as_posix()
+            print(f"Sampling {table} → {target}")
+            db.execute(
+                f"COPY (SELECT * FROM read_parquet('{source}') WHERE hash(order_id) % 10000 < {threshold}) "
+                f"TO '{target}' (FORMAT PARQUET, COMPRESSION ZSTD)"
+            )
+        db.close()
+    else:
+        from src.db.db_connection import get_db_connection
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                for table in FACT_TABLES:
+                    target = sample_table(table, percent)
+                    print(f"Sampling {table} → {target}")
+                    cursor.execute(f"DROP TABLE IF EXISTS {target}")
+                    cursor.execute(
+                        f"CREATE TABLE {target} AS SELECT * FROM {table} "
+                        f"WHERE abs(hashint8(order_id::bigint)::bigint) % 10000 < {threshold}"
+                    )
+                    cursor.execute(f"ANALYZE {target}")
+            conn.commit()
+        finally:
+            conn.close()
+    print("✅ Sample tables built")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Approximate answer utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build the order-level sample tables")
+    build.add_argument("--engine", choices=["postgres", "duckdb"], default="postgres")
+    build.add_argument("--percent", type=float, default=APPROXIMATE_SAMPLE_PERCENT)
+    build.add_argument("--parquet-dir", default=PARQUET_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build_samples(args.engine, args.percent, args.parquet_dir)
+
+
+if __name__ == "__main__":
+    main()
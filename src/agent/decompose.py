@@ -0,0 +1,162 @@
+"""
+Decomposition of compound questions into sub-queries.
+
+Questions that combine several parts ("compare the top aisle in each
+department and the average days between orders for users who buy from it")
+tend to produce one large, fragile join. After planning, decompose_node asks
+the LLM whether to split such a question into a small DAG of sub-questions:
+
+- each sub-question has an id (s1, s2, ...), the columns it must return and
+  the ids it depends on; a dependent sub-query reads its dependencies as
+  tables, which are defined as CTEs over their SQL when it runs (with the
+  planned column names, whatever the generated SQL called them)
+- sub-queries whose dependencies are done are generated and executed
+  concurrently, on pooled connections (src.db.backends.ConnectionPool)
+- merge_sql combines the sub-results locally in DuckDB before the single
+  validate_and_respond step
+
+The answer's SQL is the equivalent single query (every sub-query as a CTE
+in front of merge_sql), so a failed validation continues through the normal
+correction ladder. If anything fails along the way the question goes to
+generate_sql as usual.
+"""
+import contextvars
+import json
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.config.settings import DECOMPOSE_MIN_TABLES, DECOMPOSE_WORKERS
+from src.utils.sql_rewrite import referenced_tables, with_ctes
+from src.utils.sql_utils import clean_sql, validate_sql
+
+
+# Wording that joins independent parts; questions without it are never split
+COMPOUND_PATTERN = re.compile(
+    r"\b(and|compare|compared|versus|vs|both|as well as|along with|together with|respectively)\b",
+    re.IGNORECASE,
+)
+STEP_ID_PATTERN = re.compile(r"^s\d+$")
+
+
+class SubQueryError(RuntimeError):
+    """A sub-query could not be generated or executed"""
+
+
+def looks_compound(question: str, planned_tables: Optional[List[str]]) -> bool:
+    """Cheap gate before spending an LLM call on decomposition"""
+    return len(planned_tables or []) >= DECOMPOSE_MIN_TABLES and bool(COMPOUND_PATTERN.search(question))
+
+
+def parse_decomposition(response: str, max_steps: int) -> Optional[Tuple[List[Dict[str, Any]], str]]:
+    """
+    (steps in dependency order, merge SQL) from the decomposer's JSON, or
+    None when the question should not (or can't safely) be split.
+    """
+    try:
+        output = json.loads(response)
+        raw_steps = output.get("steps") or []
+        merge_sql = clean_sql(output.get("merge_sql") or "")
+    except (json.JSONDecodeError, AttributeError):
+        print(f"⚠️ Decomposition failed to parse JSON: {response[:200]}")
+        return None
+    if not 2 <= len(raw_steps) <= max_steps or not merge_sql:
+        return None
+
+    steps = {}
+    for raw in raw_steps:
+        if not isinstance(raw, dict):
+            return None
+        step_id = str(raw.get("id", "")).lower()
+        columns = [str(c).lower() for c in raw.get("columns") or []]
+        if (not STEP_ID_PATTERN.match(step_id) or step_id in steps or not raw.get("question")
+                or not columns or len(set(columns)) != len(columns)):
+            return None
+        steps[step_id] = {
+            "id": step_id,
+            "question": str(raw["question"]),
+            "depends_on": [str(d).lower() for d in raw.get("depends_on") or []],
+            "columns": columns,
+        }
+
+    # Dependency order (Kahn); unknown ids or cycles reject the whole plan
+    ordered, done = [], set()
+    while len(ordered) < len(steps):
+        ready = [s for s in steps.values() if s["id"] not in done and set(s["depends_on"]) <= done]
+        if not ready:
+            return None
+        for step in ready:
+            ordered.append(step)
+            done.add(step["id"])
+
+    tables = referenced_tables(merge_sql)
+    if not validate_sql(merge_sql)[0] or not tables or not tables <= set(steps):
+        return None
+    return ordered, merge_sql
+
+
+def dependency_ctes(step: Dict[str, Any], steps: List[Dict[str, Any]],
+                    done: Dict[str, Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """(id, sql) of every finished sub-query `step` reads, directly or not, in dependency order"""
+    by_id = {s["id"]: s for s in steps}
+    needed, stack = set(), list(step["depends_on"])
+    while stack:
+        step_id = stack.pop()
+        if step_id not in needed:
+            needed.add(step_id)
+            stack.extend(by_id[step_id]["depends_on"])
+    return [_cte(s["id"], done) for s in steps if s["id"] in needed]
+
+
+def compose_decomposed_sql(steps: List[Dict[str, Any]], done: Dict[str, Dict[str, Any]], merge_sql: str) -> str:
+    """The equivalent single query: every sub-query as a CTE in front of merge_sql"""
+    return with_ctes([_cte(step["id"], done) for step in steps], merge_sql)
+
+
+def _cte(step_id: str, done: Dict[str, Dict[str, Any]]) -> Tuple[str, str]:
+    """A finished sub-query as a CTE whose column list fixes the planned column names"""
+    return f"{step_id} ({', '.join(done[step_id]['columns'])})", done[step_id]["sql"]
+
+
+_pool = None
+
+
+def run_dag(steps: List[Dict[str, Any]], run_step: Callable[[Dict[str, Any], Dict[str, Dict[str, Any]]], Dict[str, Any]],
+            workers: int = DECOMPOSE_WORKERS) -> Dict[str, Dict[str, Any]]:
+    """
+    Run every step as soon as its dependencies are done, up to `workers` at a
+    time process-wide. run_step(step, done) gets the results finished so far
+    and returns the step's result, including its "sql". Returns {id: result};
+    the first failure is raised once the steps already running have finished.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(workers, thread_name_prefix="sub-query")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    pending = list(steps)
+    running = {}
+    error = None
+    while pending or running:
+        if error is None:
+            for step in [s for s in pending if set(s["depends_on"]) <= set(results)]:
+                pending.remove(step)
+                # Run in this request's context so token usage and tracing are attributed to it
+                future = _pool.submit(contextvars.copy_context().run, run_step, step, results)
+                running[future] = step
+        else:
+            pending.clear()
+        if not running:
+            break
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+            step = running.pop(future)
+            try:
+                results[step["id"]] = future.result()
+            except Exception as e:
+                error = error or e
+    if error is not None:
+        raise error
+    if pending:
+        raise SubQueryError(f"Unresolvable dependencies: {[s['id'] for s in pending]}")
+    return results
@@ -0,0 +1,332 @@
+"""
+Fast-path answers for simple result shapes.
+
+validate_and_respond_node normally spends an LLM call to check the result
+and write the answer. For three shapes a local check is confident enough to
+skip it, and the answer is rendered from a template:
+
+- scalar:  one aggregate value (count/avg/sum/min/max) whose function matches
+           the question's intent ("how many" -> COUNT, "average" -> AVG);
+           "how many X" must count X (the rows of table X or DISTINCT x_id)
+- top row: "which X has the most Y" answered by ORDER BY ... LIMIT 1
+- top-N:   "top 5 ..." answered by ORDER BY ... LIMIT 5 with exactly 5 rows
+
+Rankings must sort the way the question asks: DESC for top / most /
+highest / largest, ASC for bottom / least / fewest / lowest / smallest.
+
+In every case the output columns must match entities named in the question
+(or be the aggregate being asked for), values must be non-null, and the
+result must not be truncated. Every content word of the question must be
+covered by a table, column or literal of the SQL, and every filter literal
+of the SQL must be stated in the question, so "how many products in the
+dairy eggs department" is not answered by an unfiltered count. Anything
+else goes to the LLM validator.
+
+Fast-path answers are not checked by the LLM, so they are not recorded in
+the few-shot, template or fix stores.
+"""
+import re
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Set
+
+from src.config.settings import FAST_PATH_MAX_ROWS
+
+
+WORD = re.compile(r"[a-z0-9]+")
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "fifteen": 15, "twenty": 20,
+}
+_N = r"\d+|" + "|".join(NUMBER_WORDS)
+TOP_N_PATTERN = re.compile(
+    r"\b(?:top|bottom)\s+(?P<n>" + _N + r")\b.*"
+    r"|\b(?P<n2>" + _N + r")\s+(?:most|least|highest|lowest|largest|smallest|biggest|fewest)\b.*"
+)
+SUPERLATIVE_PATTERN = re.compile(
+    r"^\s*(?:which|what)\s+(?P<noun>[a-z ]+?)\s+(?:has|had|have|is|was|gets|got|contains)\s+the\s+"
+    r"(?P<sup>most|least|highest|lowest|largest|smallest|biggest|fewest)\b(?P<rest>.*)"
+)
+HOW_MANY_PATTERN = re.compile(
+    r"^\s*how many\s+(?P<subject>.+?)(?:\s+(?:are|is|were|was)\s+(?P<rest>.*?))?\s*\??\s*$"
+)
+AGGREGATE_INTENTS = {
+    "count": re.compile(r"\bhow many\b|\bnumber of\b|\bcount\b"),
+    "avg": re.compile(r"\baverage\b|\bavg\b|\bmean\b"),
+    "sum": re.compile(r"\btotal\b|\bsum\b"),
+    "max": re.compile(r"\bmaximum\b|\bmax\b|\bhighest\b|\blargest\b|\blongest\b"),
+    "min": re.compile(r"\bminimum\b|\bmin\b|\blowest\b|\bsmallest\b|\bshortest\b"),
+}
+DESCENDING_WORDS = {"top", "most", "highest", "largest", "biggest"}
+ASCENDING_WORDS = {"bottom", "least", "fewest", "lowest", "smallest"}
+QUALIFIERS = {"of", "in", "on", "at", "by", "with", "from", "for", "per", "that", "which", "who"}
+AGGREGATE_WORDS = {"count": "number of", "avg": "average", "sum": "total", "max": "maximum", "min": "minimum"}
+STOPWORDS = {"the", "a", "an", "of", "in", "on", "by", "id", "name", "star", "count", "total", "avg", "sum"}
+# Question words that ask for a shape (count, ranking, listing) rather than name data
+SHAPE_WORDS = {
+    "how", "many", "much", "which", "what", "who", "there", "are", "is", "were", "was", "has", "had",
+    "have", "does", "do", "did", "gets", "got", "contains", "show", "me", "list", "give", "tell", "all",
+    "top", "bottom", "most", "least", "highest", "lowest", "largest", "smallest", "biggest",
+    "fewest", "number", "average", "mean", "maximum", "minimum", "max", "min", "longest", "shortest",
+}
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ies", "es", "ed", "ing", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def terms(text: str) -> Set[str]:
+    """Stemmed content words of a question or identifier"""
+    return {_stem(w) for w in WORD.findall(text.lower().replace("_", " ")) if w not in STOPWORDS}
+
+
+SHAPE_TERMS = {_stem(w) for w in SHAPE_WORDS} | set(NUMBER_WORDS)
+
+
+def _humanize(name: str) -> str:
+    return re.sub(r"\s+", " ", name.replace("_", " ")).strip()
+
+
+def _format(value: Any) -> str:
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, Decimal):
+        value = float(value)
+    if isinstance(value, int):
+        return f"{value:,}"
+    if isinstance(value, float):
+        return f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
+    return str(value)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _analyze_sql(sql: str) -> Optional[Dict[str, Any]]:
+    """Projections, aggregates, ORDER BY / LIMIT and referenced names of the outermost SELECT"""
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except SqlglotError:
+        return None
+    if not isinstance(tree, exp.Select):
+        return None
+
+    projections = []
+    for projection in tree.expressions:
+        aggregate = next(
+            (a for a in projection.find_all(exp.AggFunc) if not a.find_ancestor(exp.Window)), None
+        )
+        argument = aggregate.this if aggregate is not None else None
+        distinct = isinstance(argument, exp.Distinct)
+        if distinct:
+            argument = argument.expressions[0] if len(argument.expressions) == 1 else None
+        projections.append({
+            "aggregate": aggregate.key if aggregate is not None else None,
+            "argument": argument.name if isinstance(argument, exp.Column) else None,
+            "distinct": distinct,
+        })
+
+    limit = None
+    limit_node = tree.args.get("limit")
+    if limit_node is not None and isinstance(limit_node.expression, exp.Literal):
+        try:
+            limit = int(limit_node.expression.this)
+        except ValueError:
+            limit = None
+
+    filters = []  # Literals the rows are filtered by
+    for clause in ("where", "having"):
+        if tree.args.get(clause) is not None:
+            filters.extend(tree.args[clause].find_all(exp.Literal))
+    for join in tree.args.get("joins") or []:
+        if join.args.get("on") is not None:
+            filters.extend(join.args["on"].find_all(exp.Literal))
+
+    order = tree.args.get("order")
+    source = tree.args.get("from_") or tree.args.get("from")  # "from_" in newer sqlglot
+    return {
+        "projections": projections,
+        "grouped": bool(tree.args.get("group")),
+        "ordered": bool(order),
+        # Direction of the first sort key: "desc" or "asc" (the default)
+        "direction": ("desc" if order.expressions[0].args.get("desc") else "asc") if order else None,
+        "source": source.this.name if source is not None and isinstance(source.this, exp.Table) else None,
+        "limit": limit,
+        "tables": [t.name for t in tree.find_all(exp.Table)],
+        "columns": [c.name for c in tree.find_all(exp.Column)],
+        "literals": [literal.this for literal in tree.find_all(exp.Literal)],
+        "filters": [(literal.this, literal.is_string, _compared_column(literal)) for literal in filters],
+    }
+
+
+def _compared_column(literal) -> str:
+    """Name of the column a filter literal is compared with ("" if none)"""
+    from sqlglot import exp
+
+    column = literal.parent.find(exp.Column) if literal.parent is not None else None
+    return column.name if column is not None else ""
+
+
+def _requested_n(question: str) -> Optional[int]:
+    match = TOP_N_PATTERN.search(question)
+    if not match:
+        return None
+    raw = match.group("n") or match.group("n2")
+    return int(raw) if raw.isdigit() else NUMBER_WORDS[raw]
+
+
+def _requested_direction(question: str) -> Optional[str]:
+    """Sort direction ("desc" or "asc") the ranking words of a question ask for; None if they disagree"""
+    words = set(WORD.findall(question))
+    descending, ascending = bool(words & DESCENDING_WORDS), bool(words & ASCENDING_WORDS)
+    if descending == ascending:
+        return None
+    return "desc" if descending else "asc"
+
+
+def _counted_entity(info: Dict[str, Any]) -> Optional[str]:
+    """What a COUNT counts: the DISTINCT column, else the rows of the FROM table"""
+    projection = info["projections"][0]
+    if projection["distinct"]:
+        return projection["argument"]
+    return info["source"]
+
+
+def _head_noun(subject: str) -> str:
+    """Last word before any qualifier: "reordered products in snacks" -> products"""
+    words = []
+    for word in WORD.findall(subject):
+        if word in QUALIFIERS:
+            break
+        words.append(word)
+    return words[-1] if words else ""
+
+
+def _question_numbers(question: str) -> Set[str]:
+    words = WORD.findall(question)
+    return {w for w in words if w.isdigit()} | {str(NUMBER_WORDS[w]) for w in words if w in NUMBER_WORDS}
+
+
+def _sql_covers_question(question: str, info: Dict[str, Any]) -> bool:
+    """
+    Every content word and number of the question is a table, column or
+    literal of the SQL, and every filter literal of the SQL is in the
+    question: the SQL neither drops nor adds conditions. Aliases don't
+    count, a label like weekend_orders filters nothing.
+    """
+    question_terms = terms(question)
+    covered = terms(" ".join(info["tables"] + info["columns"] + info["literals"]))
+    if question_terms - SHAPE_TERMS - covered:
+        return False
+    if not _question_numbers(question) <= set(info["literals"]):
+        return False
+    for value, is_string, column in info["filters"]:
+        if is_string:
+            if not terms(value) <= question_terms:
+                return False
+        elif value not in _question_numbers(question):
+            # Flags such as reordered = 1 are stated by naming the column (not just its table)
+            if value not in ("0", "1") or not (terms(column) - terms(" ".join(info["tables"]))) & question_terms:
+                return False
+    return True
+
+
+def _columns_match(question_terms: Set[str], columns: List[str], projections: List[Dict[str, Any]],
+                   rows: List[tuple]) -> bool:
+    """Label columns must name a question entity; numeric columns may instead be the aggregate"""
+    for i, column in enumerate(columns):
+        if terms(column) & question_terms:
+            continue
+        is_aggregate = i < len(projections) and projections[i]["aggregate"] is not None
+        if is_aggregate and all(_is_number(row[i]) for row in rows):
+            continue
+        return False
+    return True
+
+
+def _label_and_metrics(columns: List[str], row: tuple) -> str:
+    labels = [_format(v) for v in row if not _is_number(v)]
+    metrics = [f"{_humanize(c)}: {_format(v)}" for c, v in zip(columns, row) if _is_number(v)]
+    label = ", ".join(labels) or _format(row[0])
+    return f"{label} ({'; '.join(metrics)})" if metrics and labels else label
+
+
+def _scalar_answer(question: str, info: Dict[str, Any], value: Any) -> Optional[str]:
+    projections = info["projections"]
+    if info["grouped"] or len(projections) != 1 or not _is_number(value):
+        return None
+    aggregate = projections[0]["aggregate"]
+    if aggregate not in AGGREGATE_INTENTS or not AGGREGATE_INTENTS[aggregate].search(question):
+        return None
+    if aggregate == "count" and value < 0:
+        return None
+
+    match = HOW_MANY_PATTERN.match(question) if aggregate == "count" else None
+    if match:
+        # "There are N products" needs products counted, not the order lines that mention them
+        entity = _counted_entity(info)
+        if entity is None or terms(entity) != {_stem(_head_noun(match.group("subject")))}:
+            return None
+        rest = (match.group("rest") or "").strip()
+        rest = "" if rest in ("", "there") else f" {rest}"
+        verb = "is" if value == 1 else "are"
+        return f"There {verb} {_format(value)} {match.group('subject')}{rest}."
+
+    subject = _humanize(projections[0]["argument"] or (info["tables"][0] if info["tables"] else "result"))
+    return f"The {AGGREGATE_WORDS[aggregate]} {subject} is {_format(value)}."
+
+
+def fast_path_response(question: str, sql: str, columns: Optional[List[str]],
+                       results: Optional[list], truncated: bool = False) -> Optional[str]:
+    """
+    Template answer when the result shape and SQL confidently answer the
+    question; None means "ask the LLM validator".
+    """
+    if not results or not columns or truncated or len(results) > FAST_PATH_MAX_ROWS:
+        return None
+    if any(value is None for row in results for value in row):
+        return None
+    info = _analyze_sql(sql)
+    if info is None or len(info["projections"]) != len(columns):
+        return None
+
+    q = question.lower().strip()
+    question_terms = terms(q)
+    if not _sql_covers_question(q, info):
+        return None
+
+    # Single scalar: one aggregate value
+    if len(results) == 1 and len(columns) == 1:
+        return _scalar_answer(q, info, results[0][0])
+
+    if not info["ordered"] or not _columns_match(question_terms, columns, info["projections"], results):
+        return None
+    if info["direction"] != _requested_direction(q):
+        return None
+
+    # Top-N list: the requested N, the SQL limit and the row count all agree
+    n = _requested_n(q)
+    if n is not None:
+        if info["limit"] != n or len(results) != n:
+            return None
+        lines = [f"{i}. {_label_and_metrics(columns, row)}" for i, row in enumerate(results, 1)]
+        ranking = TOP_N_PATTERN.search(q).group(0).strip(" ?.")
+        return f"Here are the {ranking}:\n" + "\n".join(lines)
+
+    # Single top row: "which X has the most Y" with LIMIT 1
+    match = SUPERLATIVE_PATTERN.match(q)
+    if match and info["limit"] == 1 and len(results) == 1:
+        rest = match.group("rest").strip(" ?.")
+        return (
+            f"The {match.group('noun')} with the {match.group('sup')}{' ' + rest if rest else ''} "
+            f"is {_label_and_metrics(columns, results[0])}."
+        )
+    return None
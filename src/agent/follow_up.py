@@ -0,0 +1,65 @@
+"""
+Conversational follow-ups within a session.
+
+A session's last answered state (kept by the LangGraph checkpointer) becomes
+the `previous` context of the next question: its SQL and its result, stored
+column by column. follow_up_node asks the LLM to express the new question as
+SQL over a relation named `previous`, then:
+
+- local: the SQL only reads `previous` and the previous result was complete
+         (not truncated), so it runs in an in-memory DuckDB over the cached
+         columns, with no database round-trip
+- cte:   otherwise `previous` is composed onto the previous SQL as a CTE and
+         the query runs on the database like any generated SQL
+- new:   the question doesn't refine the previous result and goes through
+         the normal planning path
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.sql_rewrite import with_ctes
+
+
+PREVIOUS = "previous"
+
+
+def session_context(values: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The previous turn's SQL and column-oriented result; an unanswered turn keeps the context it had"""
+    if not values:
+        return None
+    if not (values.get("valid") and values.get("executed") and values.get("sql")):
+        return values.get("previous")
+    columns = values.get("columns") or []
+    results = values.get("results") or []
+    return {
+        "question": values["question"],
+        # A follow-up's SQL already embeds the turn before it as a CTE
+        "sql": values["sql"],
+        "columns": columns,
+        "data": {column: [row[i] for row in results] for i, column in enumerate(columns)},
+        "rows": len(results),
+        "truncated": bool(values.get("truncated")),
+        "planned_tables": values.get("planned_tables") or [],
+    }
+
+
+def compose_follow_up_sql(previous_sql: str, sql: str) -> str:
+    """`sql` reads `previous`; define it as a CTE over the previous SQL"""
+    return with_ctes([(PREVIOUS, previous_sql)], sql)
+
+
+def can_run_locally(previous: Dict[str, Any], tables: Optional[set]) -> bool:
+    """Only `previous` is read, every row of it is cached and its columns are addressable"""
+    columns = previous["columns"]
+    return (
+        tables == {PREVIOUS}
+        and not previous["truncated"]
+        and bool(columns)
+        and len(set(columns)) == len(columns)
+    )
+
+
+def run_on_previous(previous: Dict[str, Any], sql: str) -> Tuple[List[str], list]:
+    """Execute follow-up SQL in DuckDB over the cached result"""
+    from src.db.backends import execute_local
+
+    return execute_local({PREVIOUS: previous["data"]}, sql)
@@ -1,32 +1,235 @@
 """
 All node functions for the SQL agent graph
 """
+import contextvars
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
 from src.agent.state import SQLAgentState
+from src.agent.decompose import (
+    SubQueryError,
+    compose_decomposed_sql,
+    dependency_ctes,
+    looks_compound,
+    parse_decomposition,
+    run_dag
+)
+from src.agent.approximate import approximate_answer, approximation_note
+from src.agent.fast_path import fast_path_response
+from src.agent.follow_up import (
+    can_run_locally,
+    compose_follow_up_sql,
+    run_on_previous
+)
 from src.prompts.templates import (
+    build_decomposition_prompt,
+    build_follow_up_prompt,
     build_planning_prompt,
     build_optimized_prompt,
     build_optimized_correction_prompt,
     build_validation_and_response_prompt,
     build_simplified_prompt,
-    build_alternative_prompt
+    build_alternative_prompt,
+    build_sub_query_prompt
+)
+from src.config.settings import (
+    DECOMPOSE_MAX_ROWS,
+    DECOMPOSE_MAX_SUB_QUERIES,
+    DECOMPOSITION_ENABLED,
+    FAST_PATH_ENABLED,
+    LOOP_DETECTION_ENABLED,
+    MAX_CONCURRENT_LLM_CALLS,
+    SPECULATIVE_GENERATION,
+    SQL_AUTO_LIMIT,
+    SQL_TOTAL_ROWS
 )
 from src.utils.llm import call_llm
-from src.utils.sql_utils import clean_sql, validate_sql
+from src.utils.concurrency import DB_LIMITER
+from src.utils.sql_utils import clean_sql, sql_fingerprint, validate_sql
+from src.utils.sql_rewrite import apply_row_limit, referenced_tables, total_rows_mode, with_ctes
 from src.utils.schema_utils import (
-    FULL_SCHEMA,
+    current_schema,
     ensure_schema_dict,
     schema_filter_tool
 )
+from src.db.backends import execute_local, get_backend, get_pool, resolve_engine
+from src.db.change_tracking import CHANGE_TRACKER, stamp
+from src.db.registry import current_database
+from src.db.index_advisor import record_workload
+from src.memory.cache import PLAN_CACHE, RESULT_CACHE, plan_key, result_key
+from src.memory.few_shot import record_example, retrieve_examples
+from src.memory.fix_store import lookup_fix, record_fixes
+from src.memory.query_templates import match_template, record_template, reject_template, render
+
+
+def _failed_attempts(state: SQLAgentState) -> Dict[str, str]:
+    """Failed attempts so far, plus the SQL about to be replaced and its error"""
+    failed = dict(state.get("failed_attempts") or {})
+    if state.get("sql"):
+        # Keep the original error when a duplicate is re-recorded
+        failed.setdefault(sql_fingerprint(state["sql"]), state.get("reason") or "")
+    return failed
+
+
+def _known_fix(state: SQLAgentState, failed: Dict[str, str]) -> Optional[str]:
+    """A previously successful fix for the current failure, unless already tried"""
+    fingerprint = sql_fingerprint(state["sql"])
+    fix = lookup_fix(fingerprint, failed.get(fingerprint))
+    if fix and sql_fingerprint(fix) not in failed:
+        print("🧠 Reusing a known fix for this error (skipping LLM)")
+        return fix
+    return None
+
+
+_speculation_pool = None
+_speculation_pool_lock = threading.Lock()
+
+
+def _speculative_generate(question: str) -> str:
+    """SQL generation against the full schema, started before the plan is known"""
+    examples = retrieve_examples(question)
+    prompt = build_optimized_prompt(question, ensure_schema_dict(current_schema()), examples)
+    return clean_sql(call_llm(prompt))
+
+
+def _get_speculation_pool() -> ThreadPoolExecutor:
+    """Process-wide executor for speculative generation, created on first use"""
+    global _speculation_pool
+    with _speculation_pool_lock:
+        if _speculation_pool is None:
+            _speculation_pool = ThreadPoolExecutor(MAX_CONCURRENT_LLM_CALLS, thread_name_prefix="speculative-sql")
+        return _speculation_pool
+
+
+def _start_speculation(question: str):
+    # Run in this request's context so token usage and tracing are attributed to it
+    return _get_speculation_pool().submit(contextvars.copy_context().run, _speculative_generate, question)
+
+
+def _resolve_speculation(future, planned_tables) -> Tuple[Optional[str], str]:
+    """Keep the speculative SQL only if it is valid and stays within the planned tables"""
+    try:
+        sql = future.result()
+    except Exception as e:
+        print(f"⚠️ Speculative generation failed: {str(e)[:100]}")
+        return None, "failed"
+    tables = referenced_tables(sql)
+    is_valid, _ = validate_sql(sql)
+    if is_valid and tables and tables <= {t.lower() for t in planned_tables}:
+        print(f"🏎️ Speculative SQL accepted (uses {sorted(tables)})")
+        return sql, "accepted"
+    print(f"🗑️ Speculative SQL discarded (uses {sorted(tables or [])})")
+    return None, "discarded"
+
+
+def follow_up_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
+    """
+    Answers a follow-up in a session from the previous result: locally over
+    the cached columns when possible, else by composing onto the previous SQL.
+    Unrelated questions fall through to planning.
+    """
+    print("💬 Follow-up: Checking against the previous result...")
+    previous = state["previous"]
+    schema = schema_filter_tool(previous["planned_tables"]) if previous["planned_tables"] else current_schema()
+    response = call_llm(build_follow_up_prompt(state["question"], previous, schema))
+    
+    try:
+        output = json.loads(response)
+        refines = bool(output.get("refines_previous")) and bool(output.get("sql"))
+    except (json.JSONDecodeError, AttributeError):
+        print(f"⚠️ Follow-up check failed to parse JSON: {response[:200]}")
+        refines = False
+    if refines:
+        sql = clean_sql(output["sql"])
+        tables = referenced_tables(sql)
+        refines = validate_sql(sql)[0] and bool(tables) and "previous" in tables
+    if not refines:
+        print("🆕 Not a refinement of the previous result: planning from scratch")
+        return {**state, "follow_up": "new"}
+    
+    composed = compose_follow_up_sql(previous["sql"], sql)
+    planned_tables = sorted(set(previous["planned_tables"]) | (tables - {"previous"}))
+    update = {
+        "sql": composed,
+        "planned_tables": planned_tables,
+        "filtered_schema": schema_filter_tool(planned_tables) if planned_tables else current_schema(),
+        "total_attempts": state.get("total_attempts", 0) + 1
+    }
+    
+    if can_run_locally(previous, tables):
+        try:
+            columns, results = run_on_previous(previous, sql)
+            print(f"🧮 Refined the previous result locally: {len(results)} rows (database skipped)")
+            return {
+                **state,
+                **update,
+                "follow_up": "local",
+                "valid": True,
+                "executed": True,
+                "exec_sql": composed,
+                "results": results,
+                "columns": columns,
+                "truncated": False,
+                "total_rows": len(results),
+                "total_rows_estimated": False,
+                "reason": None
+            }
+        except Exception as e:
+            print(f"⚠️ Local refinement failed, running on the database: {str(e)[:100]}")
+    
+    print(f"🔗 Composed onto the previous SQL: {sql[:100]}...")
+    return {**state, **update, "follow_up": "cte"}
+
+
+def match_template_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
+    """
+    Answers a literal variation of a validated question from its query
+    template: the slots are filled from the question and planning and SQL
+    generation are skipped. Other questions go on to planning.
+    """
+    match = match_template(state["question"])
+    if match is None:
+        return {**state, "query_template": None}
+    template, params, filled = match
+    sql = render(template, params)
+    print(f"🧩 Query template match ({filled}): {template['question']} {params}")
+    planned_tables = template["tables"] or None
+    return {
+        **state,
+        "sql": sql,
+        "query_template": {"pattern": template["question"], "sql": template["sql"],
+                           "params": params, "rendered": sql, "filled": filled},
+        "planned_tables": planned_tables,
+        "filtered_schema": schema_filter_tool(planned_tables) if planned_tables else current_schema(),
+        "total_attempts": state.get("total_attempts", 0) + 1
+    }
 
 
 def planning_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
     """
     Analyzes question and decides which tables are needed.
     This is what makes it AGENTIC - the agent plans before acting.
+    
+    In speculative mode, full-schema SQL generation runs concurrently with
+    the planner and is kept when the plan confirms it.
     """
     print("🧠 Planning: Analyzing question...")
     
+    cached_plan = PLAN_CACHE.get(plan_key(state["question"]))
+    if cached_plan is not None:
+        print(f"💾 Plan cache hit: tables {cached_plan}")
+        return {
+            **state,
+            "planned_tables": cached_plan,
+            "filtered_schema": schema_filter_tool(cached_plan),
+            "speculative_sql": None,
+            "speculation": None
+        }
+    
+    speculation = _start_speculation(state["question"]) if SPECULATIVE_GENERATION else None
+    
     prompt = build_planning_prompt(state["question"])
     response = call_llm(prompt)
     
@@ -35,36 +238,178 @@ def planning_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
         
         if not isinstance(planned_tables, list):
             print("⚠️ Planning failed: Invalid response format")
-            planned_tables = list(FULL_SCHEMA['tables'].keys())
+            planned_tables = list(current_schema()['tables'].keys())
         
         print(f"📋 Plan: Need tables {planned_tables}")
         
         filtered_schema = schema_filter_tool(planned_tables)
+        PLAN_CACHE.put(plan_key(state["question"]), planned_tables)
         print(f"✂️ Filtered schema: {len(filtered_schema['tables'])} tables, {len(filtered_schema['common_joins'])} joins")
-        
-        return {
-            **state, 
-            "planned_tables": planned_tables,
-            "filtered_schema": filtered_schema
-        }
     
     except json.JSONDecodeError as e:
         print(f"⚠️ Planning failed to parse JSON: {e}")
         print(f"Raw response: {response[:200]}")
-        return {
-            **state,
-            "planned_tables": list(FULL_SCHEMA['tables'].keys()),
-            "filtered_schema": FULL_SCHEMA
+        planned_tables = list(current_schema()['tables'].keys())
+        filtered_schema = current_schema()
+    
+    speculative_sql, outcome = None, None
+    if speculation is not None:
+        speculative_sql, outcome = _resolve_speculation(speculation, planned_tables)
+    
+    return {
+        **state,
+        "planned_tables": planned_tables,
+        "filtered_schema": filtered_schema,
+        "speculative_sql": speculative_sql,
+        "speculation": outcome
+    }
+
+
+def _execute_sub_query(state: SQLAgentState, step, steps, done, sql: str):
+    """Validate and run one sub-query on a pooled connection; returns (engine, columns, rows)"""
+    is_valid, reason = validate_sql(sql)
+    if not is_valid:
+        raise SubQueryError(reason)
+    tables = referenced_tables(sql)
+    if tables is None:
+        raise SubQueryError("SQL does not parse")
+    unknown = tables & ({s["id"] for s in steps} - set(step["depends_on"]))
+    if unknown:
+        raise SubQueryError(f"Reads sub-queries it doesn't depend on: {sorted(unknown)}")
+    
+    # Dependencies run again as CTEs; one extra row tells an oversized result apart
+    exec_sql = with_ctes(dependency_ctes(step, steps, done), sql) if step["depends_on"] else sql
+    exec_sql, _ = apply_row_limit(exec_sql, DECOMPOSE_MAX_ROWS + 1)
+    backend = get_backend(resolve_engine(state.get("engine"), exec_sql))
+    start = time.perf_counter()
+    with get_pool(backend.name).connection() as (conn, cursor), DB_LIMITER.slot():
+        columns, rows = backend.execute(conn, cursor, backend.translate(exec_sql))
+    if backend.name == "postgres":
+        record_workload(exec_sql, (time.perf_counter() - start) * 1000, len(rows))
+    if len(rows) > DECOMPOSE_MAX_ROWS:
+        raise SubQueryError(f"More than {DECOMPOSE_MAX_ROWS} rows")
+    if len(columns) != len(step["columns"]):
+        raise SubQueryError(f"Returned columns {columns}, expected {step['columns']}")
+    return backend.name, columns, rows
+
+
+def _run_sub_query(state: SQLAgentState, step, steps, done, schema, records) -> dict:
+    """Generate and execute one sub-query, with one correction on failure"""
+    by_id = {s["id"]: s for s in steps}
+    dependencies = [
+        {
+            "id": dep,
+            "question": by_id[dep]["question"],
+            "columns": done[dep]["columns"],
+            "sample": [dict(zip(done[dep]["columns"], row)) for row in done[dep]["rows"][:3]]
         }
+        for dep in step["depends_on"]
+    ]
+    record = {"id": step["id"], "question": step["question"], "depends_on": step["depends_on"],
+              "sql": None, "engine": None, "rows": None, "exec_ms": None, "status": "failed", "error": None}
+    records.append(record)
+    start = time.perf_counter()
+    sql = None
+    try:
+        sql = clean_sql(call_llm(build_sub_query_prompt(state["question"], step, schema, dependencies)))
+        try:
+            engine, columns, rows = _execute_sub_query(state, step, steps, done, sql)
+        except Exception as e:
+            print(f"🔧 Sub-query {step['id']} failed, correcting once: {str(e)[:100]}")
+            sql = clean_sql(call_llm(build_optimized_correction_prompt(
+                question=step["question"], schema=schema, previous_sql=sql, error_reason=str(e)
+            )))
+            engine, columns, rows = _execute_sub_query(state, step, steps, done, sql)
+    except Exception as e:
+        record.update(sql=sql, error=str(e)[:200])
+        raise SubQueryError(f"{step['id']}: {str(e)[:200]}") from e
+    finally:
+        record["exec_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    
+    record.update(sql=sql, engine=engine, rows=len(rows), status="executed")
+    print(f"✅ Sub-query {step['id']} on {engine}: {len(rows)} rows in {record['exec_ms']:.0f} ms")
+    # The planned names are what merge_sql and later sub-queries refer to
+    return {"sql": sql, "columns": step["columns"], "rows": rows}
+
+
+def decompose_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
+    """
+    Splits a compound question into sub-queries that are generated and
+    executed in parallel, then merged locally. Other questions, and any
+    failure, continue to generate_sql.
+    """
+    if not (DECOMPOSITION_ENABLED and looks_compound(state["question"], state.get("planned_tables"))):
+        return {**state, "decomposition": None}
+    
+    print("🧩 Decomposition: Looking for independent parts...")
+    schema = ensure_schema_dict(state.get("filtered_schema") or current_schema())
+    response = call_llm(build_decomposition_prompt(state["question"], schema, DECOMPOSE_MAX_SUB_QUERIES))
+    plan = parse_decomposition(response, DECOMPOSE_MAX_SUB_QUERIES)
+    if plan is None:
+        print("➡️ Not decomposed: generating a single query")
+        return {**state, "decomposition": "single"}
+    
+    steps, merge_sql = plan
+    print("🧩 Sub-queries: " + ", ".join(
+        s["id"] + (f" (after {', '.join(s['depends_on'])})" if s["depends_on"] else "") for s in steps
+    ))
+    records = []
+    try:
+        done = run_dag(steps, lambda step, done: _run_sub_query(state, step, steps, done, schema, records))
+        columns, results = execute_local(
+            {sid: {c: [row[i] for row in r["rows"]] for i, c in enumerate(r["columns"])} for sid, r in done.items()},
+            merge_sql
+        )
+        if not results:
+            raise SubQueryError("Merged result is empty")
+    except Exception as e:
+        print(f"⚠️ Decomposition abandoned, generating a single query: {str(e)[:100]}")
+        return {**state, "decomposition": "failed", "sub_queries": records}
+    
+    sql = compose_decomposed_sql(steps, done, merge_sql)
+    row_limit = SQL_AUTO_LIMIT if SQL_AUTO_LIMIT > 0 else None
+    truncated = bool(row_limit) and len(results) > row_limit
+    print(f"🧮 Merged {len(steps)} sub-results locally: {len(results)} rows")
+    return {
+        **state,
+        "sql": sql,
+        "exec_sql": sql,
+        "row_limit": row_limit,
+        "valid": True,
+        "executed": True,
+        "reason": None,
+        "results": results[:row_limit] if truncated else results,
+        "columns": columns,
+        "truncated": truncated,
+        "total_rows": len(results),
+        "total_rows_estimated": False,
+        "speculative_sql": None,
+        "decomposition": "merged",
+        "sub_queries": records,
+        "total_attempts": state.get("total_attempts", 0) + 1
+    }
 
 
 def generate_sql_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
     """Generates SQL using filtered schema from planning node"""
+    if state.get("speculative_sql"):
+        sql = state["speculative_sql"]
+        print(f"🏎️ Using speculative SQL (filtered-schema generation skipped): {sql[:100]}...")
+        return {
+            **state,
+            "sql": sql,
+            "total_attempts": state.get("total_attempts", 0) + 1
+        }
+    
     print("🔄 Generating SQL...")
     
-    schema_to_use = ensure_schema_dict(state.get("filtered_schema", FULL_SCHEMA))
+    schema_to_use = ensure_schema_dict(state.get("filtered_schema") or current_schema())
     
-    prompt = build_optimized_prompt(state["question"], schema_to_use)
+    examples = retrieve_examples(state["question"])
+    if examples:
+        print(f"📚 Using {len(examples)} similar validated examples")
+    
+    prompt = build_optimized_prompt(state["question"], schema_to_use, examples)
     raw_sql = call_llm(prompt)
     sql = clean_sql(raw_sql)
     
@@ -80,6 +425,20 @@ def generate_sql_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
 def validate_sql_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
     """Validate SQL syntax and safety before execution"""
     print("🔍 Validating syntax...")
+    
+    # Same SQL as an attempt that already failed: it would fail the same way
+    previous_error = state.get("failed_attempts", {}).get(sql_fingerprint(state["sql"]))
+    if LOOP_DETECTION_ENABLED and previous_error is not None:
+        print("🔁 Duplicate of a failed attempt - skipping execution")
+        return {
+            **state,
+            "valid": False,
+            "reason": f"Same SQL as a previous failed attempt, which failed with: {previous_error}",
+            "executed": False,
+            "duplicate_attempt": True,
+            "short_circuits": state.get("short_circuits", 0) + 1
+        }
+    
     is_valid, reason = validate_sql(state["sql"])
     print(f"Syntax valid: {is_valid}")
     if not is_valid:
@@ -88,36 +447,146 @@ def validate_sql_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
         **state, 
         "valid": is_valid, 
         "reason": None if is_valid else reason, 
-        "executed": False
+        "executed": False,
+        "duplicate_attempt": False
     }
 
 
+def _template(state: SQLAgentState) -> Optional[dict]:
+    """The query template, while the SQL is still the one filled from it"""
+    template = state.get("query_template")
+    return template if template and template["rendered"] == state["sql"] else None
+
+
+def rewrite_sql_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
+    """Bound the result size: add a LIMIT to unbounded queries before execution"""
+    row_limit = None
+    exec_sql = state["sql"]
+    template = _template(state)
+    if SQL_AUTO_LIMIT > 0:
+        # One extra row tells a truncated result apart from one that fits exactly
+        exec_sql, injected = apply_row_limit(state["sql"], SQL_AUTO_LIMIT + 1)
+        if injected:
+            row_limit = SQL_AUTO_LIMIT
+            print(f"✂️ Unbounded query: limiting result to {row_limit} rows")
+    if template is not None:
+        # The filled and parameterized SQL share their structure, so they get the same LIMIT
+        template_sql = apply_row_limit(template["sql"], SQL_AUTO_LIMIT + 1)[0] if row_limit else template["sql"]
+        template = {**template, "exec_sql": template_sql}
+        return {**state, "exec_sql": exec_sql, "row_limit": row_limit, "query_template": template}
+    return {**state, "exec_sql": exec_sql, "row_limit": row_limit}
+
+
+def _total_rows(backend, conn, cursor, state: SQLAgentState) -> Tuple[Optional[int], bool]:
+    """Total size of a truncated result: (rows, estimated) or (None, False)"""
+    mode = total_rows_mode(state["question"], SQL_TOTAL_ROWS)
+    if mode is None:
+        return None, False
+    sql = backend.translate(state["sql"])
+    try:
+        with DB_LIMITER.slot():
+            if mode == "estimate":
+                estimate = backend.estimate_rows(conn, cursor, sql)
+                if estimate is not None:
+                    return estimate, True
+            return backend.count_rows(conn, cursor, sql), False
+    except Exception as e:
+        backend.rollback(conn)
+        print(f"⚠️ Could not determine total rows: {str(e)[:100]}")
+        return None, False
+
+
 def execute_sql_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
     """Execute SQL with proper transaction management"""
-    print("⚡ Executing SQL...")
+    backend = get_backend(resolve_engine(state.get("engine"), state["sql"]))
+    approximation = None
+    if state.get("approximate"):
+        result, approximation = approximate_answer(backend, conn, cursor, state["sql"])
+        if result is not None:
+            print(f"🎯 Approximate answer from a {approximation['percent']:g}% sample "
+                  f"(±{approximation['max_relative_error']:.1%})")
+            return {**state, **result, "executed": True, "reason": None}
+        print(f"🎯 Running exactly: {approximation['reason']}")
+    sql = state.get("exec_sql") or state["sql"]
+    key = result_key(backend.name, sql)
+    cached = RESULT_CACHE.get(key)
+    if cached is not None:
+        print(f"💾 Result cache hit: {len(cached['results'])} rows (database skipped)")
+        return {**state, **cached, "approximation": approximation, "executed": True, "reason": None}
+    # Versions from before the query: a change while it runs leaves the entry already stale
+    database_id = current_database().id
+    versions = CHANGE_TRACKER.snapshot(database_id)
+    
+    print(f"⚡ Executing SQL on {backend.name}...")
     try:
-        cursor.execute(state["sql"])
-        results = cursor.fetchall()
-        conn.commit()
-        print(f"✅ Executed! Got {len(results)} rows")
-        return {
-            **state, 
-            "executed": True, 
-            "results": results, 
-            "reason": None
+        start = time.perf_counter()
+        template = _template(state)
+        with DB_LIMITER.slot():
+            if template is not None:
+                columns, results = backend.execute_prepared(conn, cursor, template["exec_sql"],
+                                                            template["params"], sql)
+            else:
+                columns, results = backend.execute(conn, cursor, backend.translate(sql))
+        if backend.name == "postgres":
+            record_workload(sql, (time.perf_counter() - start) * 1000, len(results))
+        
+        row_limit = state.get("row_limit")
+        truncated = bool(row_limit) and len(results) > row_limit
+        total_rows, estimated = None, False
+        if truncated:
+            results = results[:row_limit]
+            total_rows, estimated = _total_rows(backend, conn, cursor, state)
+            print(f"✅ Executed! Got first {len(results)} of {total_rows if total_rows is not None else 'more'} rows")
+        else:
+            print(f"✅ Executed! Got {len(results)} rows")
+        result = {
+            "results": results,
+            "columns": columns,
+            "truncated": truncated,
+            "total_rows": total_rows if truncated else len(results),
+            "total_rows_estimated": estimated
         }
+        RESULT_CACHE.put(key, result, stamp(database_id, backend.name, sql, versions))
+        return {**state, **result, "approximation": approximation, "executed": True, "reason": None}
     except Exception as e:
-        conn.rollback()
+        backend.rollback(conn)
         print(f"❌ Execution failed: {str(e)[:100]}")
         print("🔄 Transaction rolled back")
         return {
             **state, 
             "executed": False, 
             "results": None, 
+            "columns": None,
+            "truncated": False,
+            "total_rows": None,
+            "total_rows_estimated": False,
+            "approximation": approximation,
             "reason": f"Execution error: {str(e)}"
         }
 
 
+def _refines_previous(state: SQLAgentState) -> bool:
+    return state.get("follow_up") in ("local", "cte")
+
+
+def _answer_question(state: SQLAgentState) -> str:
+    """What the answer must satisfy; a follow-up is only meaningful with the question it refines"""
+    if _refines_previous(state):
+        return f"{state['previous']['question']} Follow-up: {state['question']}"
+    return state["question"]
+
+
+def _approximated(state: SQLAgentState) -> Optional[dict]:
+    approximation = state.get("approximation")
+    return approximation if approximation and approximation["status"] == "approximate" else None
+
+
+def _record_template(state: SQLAgentState):
+    """Generalize a validated answer into a query template, unless it came from one"""
+    if _template(state) is None:
+        record_template(state["question"], state["sql"])
+
+
 def validate_and_respond_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
     """Validates if SQL results answer the question AND generates natural language response"""
     print("🔍 Validating answer + generating response...")
@@ -131,10 +600,35 @@ def validate_and_respond_node(state: SQLAgentState, conn, cursor) -> SQLAgentSta
             "nl_response": "I couldn't execute the query to get an answer."
         }
     
+    # Simple result shapes that confidently answer the question skip the LLM, unless
+    # the SQL is a template whose slots an LLM filled from a merely similar question
+    template = _template(state)
+    if FAST_PATH_ENABLED and not (template and template["filled"] == "llm"):
+        nl_response = fast_path_response(
+            _answer_question(state), state["sql"], state.get("columns"),
+            state["results"], state.get("truncated", False)
+        )
+        if nl_response:
+            # Not checked by the LLM: kept out of the few-shot, template and fix stores
+            print("⚡ Fast path: answer rendered from template (validation LLM skipped)")
+            if _approximated(state):
+                nl_response = f"{nl_response} {approximation_note(_approximated(state))}"
+            return {
+                **state,
+                "valid": True,
+                "reason": None,
+                "nl_response": nl_response,
+                "fast_path": True
+            }
+    
     prompt = build_validation_and_response_prompt(
-        question=state["question"],
+        question=_answer_question(state),
         sql=state["sql"],
-        results=state["results"]
+        results=state["results"],
+        total_rows=state.get("total_rows"),
+        truncated=state.get("truncated", False),
+        total_rows_estimated=state.get("total_rows_estimated", False),
+        sample_percent=_approximated(state) and _approximated(state)["percent"]
     )
     
     response = call_llm(prompt)
@@ -145,12 +639,20 @@ def validate_and_respond_node(state: SQLAgentState, conn, cursor) -> SQLAgentSta
         is_valid = output.get("valid", False)
         reason = output.get("reason", "Unknown validation failure")
         nl_response = output.get("natural_language_response", "Unable to generate response.")
+        if is_valid and _approximated(state):
+            nl_response = f"{nl_response} {approximation_note(_approximated(state))}"
         
         if is_valid:
+            if not _refines_previous(state):
+                record_example(state["question"], state["sql"], state.get("planned_tables"))
+                _record_template(state)
+            record_fixes(state.get("failed_attempts"), state["sql"])
             print("✅ Answer validated! Generated NL response.")
             print(f"📝 Response: {nl_response[:100]}...")
         else:
             print(f"❌ Answer validation failed: {reason}")
+            if _template(state) is not None:
+                reject_template(state["query_template"]["pattern"])
         
         return {
             **state, 
@@ -173,16 +675,20 @@ def correct_sql_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
     """Attempt to correct SQL based on error"""
     print(f"🔧 Correcting SQL (attempt {state['total_attempts'] + 1})...")
     
-    schema_to_use = ensure_schema_dict(state.get("filtered_schema", FULL_SCHEMA))
-    
-    prompt = build_optimized_correction_prompt(
-        question=state["question"],
-        schema=schema_to_use,
-        previous_sql=state["sql"],
-        error_reason=state["reason"]
-    )
-    corrected_sql = call_llm(prompt)
-    sql = clean_sql(corrected_sql)
+    failed = _failed_attempts(state)
+    sql = _known_fix(state, failed)
+    fix_store_hits = state.get("fix_store_hits", 0) + (sql is not None)
+    if sql is None:
+        schema_to_use = ensure_schema_dict(state.get("filtered_schema") or current_schema())
+        
+        prompt = build_optimized_correction_prompt(
+            question=state["question"],
+            schema=schema_to_use,
+            previous_sql=state["sql"],
+            error_reason=state["reason"]
+        )
+        corrected_sql = call_llm(prompt)
+        sql = clean_sql(corrected_sql)
     print(f"Corrected: {sql[:100]}...")
     
     attempted = state.get("attempted_strategies", [])
@@ -194,7 +700,9 @@ def correct_sql_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
         "sql": sql, 
         "retries": state["retries"] + 1,
         "total_attempts": state.get("total_attempts", 0) + 1,
-        "attempted_strategies": attempted
+        "attempted_strategies": attempted,
+        "failed_attempts": failed,
+        "fix_store_hits": fix_store_hits
     }
 
 
@@ -204,7 +712,10 @@ def analyze_failure_node(state: SQLAgentState, conn, cursor) -> SQLAgentState:
     
     reason = state.get("reason", "")
     
-    if "syntax" in reason.lower() or "invalid" in reason.lower():
+    if state.get("duplicate_attempt"):
+        failure_type = "duplicate_attempt"
+        print("📊 Failure type: Repeated a failed query")
+    elif "syntax" in reason.lower() or "invalid" in reason.lower():
         failure_type = "syntax_error"
         print("📊 Failure type: Syntax error")
     elif "no results" in reason.lower() or "empty" in reason.lower():
@@ -227,17 +738,21 @@ def generate_simplified_sql_node(state: SQLAgentState, conn, cursor) -> SQLAgent
     """STRATEGY: Try a simpler query approach"""
     print("🔄 Strategy: Generating SIMPLIFIED SQL...")
     
-    schema_to_use = ensure_schema_dict(state.get("filtered_schema", FULL_SCHEMA))
-    
-    prompt = build_simplified_prompt(
-        question=state["question"],
-        schema=schema_to_use,
-        previous_sql=state["sql"],
-        error_reason=state["reason"]
-    )
-    
-    raw_sql = call_llm(prompt)
-    sql = clean_sql(raw_sql)
+    failed = _failed_attempts(state)
+    sql = _known_fix(state, failed)
+    fix_store_hits = state.get("fix_store_hits", 0) + (sql is not None)
+    if sql is None:
+        schema_to_use = ensure_schema_dict(state.get("filtered_schema") or current_schema())
+        
+        prompt = build_simplified_prompt(
+            question=state["question"],
+            schema=schema_to_use,
+            previous_sql=state["sql"],
+            error_reason=state["reason"]
+        )
+        
+        raw_sql = call_llm(prompt)
+        sql = clean_sql(raw_sql)
     print(f"Simplified: {sql[:100]}...")
     
     attempted = state.get("attempted_strategies", [])
@@ -249,7 +764,9 @@ def generate_simplified_sql_node(state: SQLAgentState, conn, cursor) -> SQLAgent
         "current_strategy": "simplified",
         "attempted_strategies": attempted,
         "retries": 0,
-        "total_attempts": state.get("total_attempts", 0) + 1
+        "total_attempts": state.get("total_attempts", 0) + 1,
+        "failed_attempts": failed,
+        "fix_store_hits": fix_store_hits
     }
 
 
@@ -257,18 +774,22 @@ def generate_alternative_approach_node(state: SQLAgentState, conn, cursor) -> SQ
     """STRATEGY: Try a completely different approach"""
     print("🔄 Strategy: Trying ALTERNATIVE approach...")
     
-    schema_to_use = ensure_schema_dict(state.get("filtered_schema", FULL_SCHEMA))
-    
-    prompt = build_alternative_prompt(
-        question=state["question"],
-        schema=schema_to_use,
-        previous_sql=state["sql"],
-        error_reason=state["reason"],
-        attempted_strategies=state.get("attempted_strategies", [])
-    )
-    
-    raw_sql = call_llm(prompt)
-    sql = clean_sql(raw_sql)
+    failed = _failed_attempts(state)
+    sql = _known_fix(state, failed)
+    fix_store_hits = state.get("fix_store_hits", 0) + (sql is not None)
+    if sql is None:
+        schema_to_use = ensure_schema_dict(state.get("filtered_schema") or current_schema())
+        
+        prompt = build_alternative_prompt(
+            question=state["question"],
+            schema=schema_to_use,
+            previous_sql=state["sql"],
+            error_reason=state["reason"],
+            attempted_strategies=state.get("attempted_strategies", [])
+        )
+        
+        raw_sql = call_llm(prompt)
+        sql = clean_sql(raw_sql)
     print(f"Alternative: {sql[:100]}...")
     
     attempted = state.get("attempted_strategies", [])
@@ -280,7 +801,9 @@ def generate_alternative_approach_node(state: SQLAgentState, conn, cursor) -> SQ
         "current_strategy": "alternative",
         "attempted_strategies": attempted,
         "retries": 0,
-        "total_attempts": state.get("total_attempts", 0) + 1
+        "total_attempts": state.get("total_attempts", 0) + 1,
+        "failed_attempts": failed,
+        "fix_store_hits": fix_store_hits
     }
 
 
@@ -1,15 +1,43 @@
 """
 Routing functions for the SQL agent graph
 """
-from langgraph.graph import END
+from langgraph.constants import END
 from src.agent.state import SQLAgentState
 from src.config.settings import MAX_RETRIES, MAX_TOTAL_ATTEMPTS
 
 
+def route_entry(state: SQLAgentState):
+    """Session follow-ups are checked against the previous result first"""
+    return "follow_up" if state.get("previous") else "match_template"
+
+
+def route_after_follow_up(state: SQLAgentState):
+    """Route after the follow-up check"""
+    if state.get("follow_up") == "local":
+        return "validate_and_respond"  # Already answered from the cached result
+    if state.get("follow_up") == "cte":
+        return "validate_sql"
+    return "match_template"
+
+
+def route_after_template(state: SQLAgentState):
+    """Template matches go straight to validation, other questions to planning"""
+    return "validate_sql" if state.get("query_template") else "planning"
+
+
+def route_after_decompose(state: SQLAgentState):
+    """Route after decomposition"""
+    if state.get("decomposition") == "merged":
+        return "validate_and_respond"  # Sub-results already merged into the answer rows
+    return "generate_sql"
+
+
 def route_after_syntax_check(state: SQLAgentState):
     """Route after pre-execution validation"""
+    if state.get("duplicate_attempt"):
+        return "analyze_failure"  # Repeating a failed query: escalate now
     if state["valid"]:
-        return "execute_sql"
+        return "rewrite_sql"
     if state["retries"] >= MAX_RETRIES:
         return END
     return "correct_sql"
@@ -47,6 +75,15 @@ def route_after_failure_analysis(state: SQLAgentState):
         print("   ⛔ Maximum attempts exhausted - asking user")
         return "ask_clarification"
     
+    # The last strategy repeated a failed query: move on to the next one
+    if state.get("duplicate_attempt"):
+        print("   🔁 Duplicate attempt - escalating strategy")
+        if "simplified" not in attempted:
+            return "generate_simplified"
+        if "alternative" not in attempted:
+            return "generate_alternative"
+        return "ask_clarification"
+    
     # Strategy escalation based on attempts
     if "simplified" not in attempted and total_attempts >= 2:
         print("   Decision: Try simplified SQL approach")
@@ -15,7 +15,17 @@ class SQLAgentState(TypedDict):
     # Execution tracking
     executed: bool
     results: Optional[list]
+    columns: Optional[List[str]]
+    exec_sql: Optional[str]  # SQL actually executed (sql plus any automatic LIMIT)
+    row_limit: Optional[int]  # Automatic row limit, None when the SQL was left as generated
+    truncated: bool
+    total_rows: Optional[int]
+    total_rows_estimated: bool
+    engine: Optional[str]  # Requested execution backend: postgres | duckdb | auto
+    approximate: bool  # Answer aggregates from a sample when possible
+    approximation: Optional[Dict[str, Any]]  # Sample, confidence intervals or why it ran exactly (see approximate.py)
     nl_response: Optional[str]
+    fast_path: bool  # Answer rendered from a template without the validation LLM
     
     # Strategy tracking
     retries: int
@@ -24,6 +34,23 @@ class SQLAgentState(TypedDict):
     attempted_strategies: List[str]
     current_strategy: str
     
+    # Loop detection
+    failed_attempts: Dict[str, str]  # SQL fingerprint -> error it failed with
+    duplicate_attempt: bool
+    short_circuits: int  # Duplicates skipped without a DB round-trip
+    fix_store_hits: int  # Corrections taken from the fix store instead of the LLM
+    
     # Planning fields
     planned_tables: Optional[List[str]]
-    filtered_schema: Optional[Dict[str, Any]]
\ No newline at end of file
+    filtered_schema: Optional[Dict[str, Any]]
+    speculative_sql: Optional[str]  # Full-schema SQL generated during planning, if accepted
+    speculation: Optional[str]  # accepted | discarded | failed (None when not speculating)
+    query_template: Optional[Dict[str, Any]]  # Matched template: pattern, parameterized SQL, params (see query_templates.py)
+    
+    # Question decomposition
+    decomposition: Optional[str]  # merged | single | failed (None when not considered)
+    sub_queries: Optional[List[Dict[str, Any]]]  # Per sub-query SQL, engine, rows, timing, status (see decompose.py)
+    
+    # Session follow-ups
+    previous: Optional[Dict[str, Any]]  # Previous turn's SQL and column-oriented result (see follow_up.py)
+    follow_up: Optional[str]  # local | cte | new (None outside a follow-up)
\ No newline at end of file
@@ -1,6 +1,7 @@
 """
 Configuration settings for the SQL agent
 """
+import os
 
 # Retry and attempt limits
 MAX_RETRIES = 2  # Max retries per strategy before escalating
@@ -8,4 +9,145 @@ MAX_TOTAL_ATTEMPTS = 6  # Total attempts across all strategies
 
 # LLM Configuration
 DEFAULT_MODEL = "gpt-4o-mini"
-DEFAULT_TEMPERATURE = 0
\ No newline at end of file
+DEFAULT_TEMPERATURE = 0
+LLM_BASE_URL = os.getenv("LLM_BASE_URL")  # OpenAI-compatible endpoint, e.g. the load-test stub; None = OpenAI
+SPECULATIVE_GENERATION = os.getenv("SPECULATIVE_GENERATION", "false").lower() == "true"  # Generate SQL while planning
+
+# Index advisor / workload capture
+WORKLOAD_LOG_PATH = os.getenv("WORKLOAD_LOG_PATH", "logs/sql_workload.jsonl")
+WORKLOAD_CAPTURE_ENABLED = os.getenv("WORKLOAD_CAPTURE_ENABLED", "true").lower() == "true"
+INDEX_ADVISOR_EXPLAIN_TIMEOUT_MS = 60_000  # statement_timeout for EXPLAIN ANALYZE replays
+INDEX_ADVISOR_MAX_COLUMNS = 3  # Max columns in a recommended composite index
+
+# Execution backends
+EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", "postgres")  # postgres | duckdb | auto
+PARQUET_DIR = os.getenv("PARQUET_DIR", "data/parquet")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", "0"))  # 0 = DuckDB default (all cores)
+
+# Database registry (several databases per process, see src.db.registry)
+DATABASES_PATH = os.getenv("DATABASES_PATH", "databases.yaml")  # Extra databases besides "default"
+DATABASE_IDLE_TTL_S = float(os.getenv("DATABASE_IDLE_TTL_S", "900"))  # Unused databases are closed after this
+MAX_OPEN_DATABASES = int(os.getenv("MAX_OPEN_DATABASES", "64"))  # Least recently used idle ones close beyond this
+
+# Result size limits
+SQL_AUTO_LIMIT = int(os.getenv("SQL_AUTO_LIMIT", "100"))  # LIMIT added to unbounded queries, 0 = off
+SQL_TOTAL_ROWS = os.getenv("SQL_TOTAL_ROWS", "auto")  # Total for truncated results: auto | exact | estimate | off
+
+# Schema introspection
+SCHEMA_REFRESH_INTERVAL_S = float(os.getenv("SCHEMA_REFRESH_INTERVAL_S", "0"))  # 0 = disabled
+SCHEMA_STATS_MAX_DISTINCT = 50  # Only keep common values for low-cardinality columns
+SCHEMA_STATS_MAX_COMMON_VALUES = 10
+
+# Few-shot example retrieval
+FEW_SHOT_ENABLED = os.getenv("FEW_SHOT_ENABLED", "true").lower() == "true"
+FEW_SHOT_STORE_PATH = os.getenv("FEW_SHOT_STORE_PATH", "data/few_shot_examples.jsonl")
+FEW_SHOT_K = 3  # Examples injected into the generation prompt
+FEW_SHOT_MIN_SIMILARITY = 0.2  # Cosine similarity below which examples are ignored
+FEW_SHOT_MAX_EXAMPLES = 2000
+
+# Query templates (validated SQL generalized over its literals, see src.memory.query_templates)
+QUERY_TEMPLATES_ENABLED = os.getenv("QUERY_TEMPLATES_ENABLED", "true").lower() == "true"
+QUERY_TEMPLATE_STORE_PATH = os.getenv("QUERY_TEMPLATE_STORE_PATH", "data/query_templates.jsonl")
+QUERY_TEMPLATE_MAX = 2000
+QUERY_TEMPLATE_CANDIDATES = 5  # Nearest templates tried against a question
+QUERY_TEMPLATE_LLM_FILL = os.getenv("QUERY_TEMPLATE_LLM_FILL", "false").lower() == "true"  # Slot-filling call when no pattern matches
+QUERY_TEMPLATE_LLM_MIN_SIMILARITY = 0.5  # Nearest template must be at least this similar for the LLM fill
+PREPARED_STATEMENTS_PER_CONNECTION = 100  # Postgres prepared statements kept per connection (LRU)
+
+# Fast-path answers (skip the validation LLM for simple result shapes)
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+FAST_PATH_MAX_ROWS = 10  # Largest top-N list answered from a template
+
+# Answer / plan / result / LLM caches (LRU with TTL, per process or shared by workers)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = 2000  # Per cache layer
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "600"))  # 0 disables a layer
+PLAN_CACHE_TTL_S = float(os.getenv("PLAN_CACHE_TTL_S", "86400"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "600"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "86400"))
+# SQLite file shared by worker processes; unset = per process. Whoever can write it can change
+# cached answers (entries are JSON, not pickles): keep it on a local path owned by the API user.
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH")
+CHANGE_TRACKING_INTERVAL_S = float(os.getenv("CHANGE_TRACKING_INTERVAL_S", "5"))  # Table version polls, 0 = TTL only
+TRACKED_CACHE_TTL_S = float(os.getenv("TRACKED_CACHE_TTL_S", "86400"))  # Answers / results stamped with table versions
+
+# Cache warm-up from the run log (API server background job)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").lower() == "true"
+WARMUP_INTERVAL_S = float(os.getenv("WARMUP_INTERVAL_S", "300"))  # Result refresh / re-warm period
+WARMUP_TOP_QUESTIONS = int(os.getenv("WARMUP_TOP_QUESTIONS", "20"))
+WARMUP_LOOKBACK_HOURS = float(os.getenv("WARMUP_LOOKBACK_HOURS", "168"))
+WARMUP_MAX_TOKENS = int(os.getenv("WARMUP_MAX_TOKENS", "50000"))  # LLM tokens per warm-up cycle
+WARMUP_MAX_SECONDS = float(os.getenv("WARMUP_MAX_SECONDS", "120"))  # Wall time per warm-up cycle
+WARMUP_MAX_ACTIVE = 1  # Only start an item while at most this many requests hold a slot
+WARMUP_LOCK_PATH = os.getenv("WARMUP_LOCK_PATH", "logs/warmup.lock")  # With a shared cache, one worker warms it
+
+# Conversational sessions (follow-ups refine the previous result)
+FOLLOW_UP_ENABLED = os.getenv("FOLLOW_UP_ENABLED", "true").lower() == "true"
+SESSION_TTL_S = float(os.getenv("SESSION_TTL_S", "1800"))  # Idle sessions are forgotten after this
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))  # Oldest sessions are forgotten beyond this
+
+# Result handles and streaming export (/results/{handle})
+RESULT_HANDLE_TTL_S = float(os.getenv("RESULT_HANDLE_TTL_S", "3600"))  # How long a handle can be exported
+RESULT_HANDLE_MAX = 10000  # Oldest handles are forgotten beyond this
+RESULT_STREAM_CHUNK_ROWS = int(os.getenv("RESULT_STREAM_CHUNK_ROWS", "10000"))  # Rows fetched and encoded at a time
+RESULT_PAGE_MAX_ROWS = 10000  # Largest keyset page
+MAX_CONCURRENT_EXPORTS = int(os.getenv("MAX_CONCURRENT_EXPORTS", "4"))  # Streams holding a DB connection
+
+# /query response encoding (JSON / MessagePack / Arrow by Accept header, see backend_server.encoding)
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))  # Smaller bodies are sent as is
+RESPONSE_GZIP_LEVEL = 5
+RESPONSE_BROTLI_QUALITY = 4  # Used instead of gzip when the brotli package is installed and accepted
+
+# Question decomposition (compound questions as parallel sub-queries)
+DECOMPOSITION_ENABLED = os.getenv("DECOMPOSITION_ENABLED", "true").lower() == "true"
+DECOMPOSE_MIN_TABLES = 3  # Only questions planned over at least this many tables are considered
+DECOMPOSE_MAX_SUB_QUERIES = 4
+DECOMPOSE_MAX_ROWS = int(os.getenv("DECOMPOSE_MAX_ROWS", "10000"))  # Larger sub-results fall back to one query
+DECOMPOSE_WORKERS = int(os.getenv("DECOMPOSE_WORKERS", "4"))  # Sub-queries in flight per process
+
+# Approximate answers (opt-in per request, see src.agent.approximate)
+APPROXIMATE_SAMPLING = os.getenv("APPROXIMATE_SAMPLING", "auto")  # auto | tables | tablesample
+APPROXIMATE_SAMPLE_PERCENT = float(os.getenv("APPROXIMATE_SAMPLE_PERCENT", "1"))  # Share of orders sampled
+APPROXIMATE_MAX_RELATIVE_ERROR = float(os.getenv("APPROXIMATE_MAX_RELATIVE_ERROR", "0.05"))  # Wider 95% intervals run exactly
+
+# Correction loop memory
+LOOP_DETECTION_ENABLED = os.getenv("LOOP_DETECTION_ENABLED", "true").lower() == "true"
+FIX_STORE_ENABLED = os.getenv("FIX_STORE_ENABLED", "true").lower() == "true"
+FIX_STORE_MAX_ENTRIES = 5000  # (error signature, failed SQL) -> fix entries kept per process
+
+# Concurrency limits and admission control
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8"))
+MAX_CONCURRENT_DB_QUERIES = int(os.getenv("MAX_CONCURRENT_DB_QUERIES", "8"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))  # Provider RPM limit
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))  # Provider TPM limit
+LIMITER_ACQUIRE_TIMEOUT_S = 60
+MAX_CONCURRENT_AGENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_AGENT_REQUESTS", "4"))
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "32"))
+QUEUE_SLO_S = {"interactive": 10.0, "batch": 120.0}  # Max acceptable queue wait per priority
+
+# Tracing
+TRACING_MODE = os.getenv("TRACING_MODE", "sampled")  # off | full | sampled
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "langfuse")  # langfuse | collector | memory
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "http://127.0.0.1:4318")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))  # Share of successful requests kept
+TRACE_SLOW_THRESHOLD_S = float(os.getenv("TRACE_SLOW_THRESHOLD_S", "15"))  # Slower requests are always kept
+TRACE_QUEUE_SIZE = 1000  # Kept traces waiting for export; new ones are dropped when full
+TRACE_BATCH_SIZE = 50
+TRACE_FLUSH_INTERVAL_S = 2.0
+
+# On-demand profiling (armed through the admin API, see src.utils.profiling)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # X-Admin-Token for /admin endpoints; unset = admin endpoints off
+PROFILE_DIR = os.getenv("PROFILE_DIR", "logs/profiles")
+PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", "50"))  # Oldest capture files are deleted beyond this
+PROFILE_SAMPLE_INTERVAL_MS = 5  # Default stack sampling period
+PROFILE_TRACEMALLOC_FRAMES = 16  # Frames kept per allocation traceback
+
+# Multi-worker metrics (prometheus_client multiprocess mode, on when PROMETHEUS_MULTIPROC_DIR is set)
+METRICS_REFRESH_INTERVAL_S = 5.0  # How often each worker publishes its gauges
+
+# Run log (one SQLite record per query, written in the background)
+RUN_LOG_ENABLED = os.getenv("RUN_LOG_ENABLED", "true").lower() == "true"
+RUN_LOG_PATH = os.getenv("RUN_LOG_PATH", "logs/run_log.db")
+RUN_LOG_QUEUE_SIZE = 1000  # Finished runs waiting to be written; new ones are dropped when full
+RUN_LOG_BATCH_SIZE = 50
+RUN_LOG_FLUSH_INTERVAL_S = 1.0
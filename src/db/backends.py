@@ -0,0 +1,538 @@
+"""
+Pluggable execution backends.
+
+Generated SQL is written for PostgreSQL. The Postgres backend runs it as-is;
+the DuckDB backend runs it in-process over Parquet conversions of the same
+tables after translating the few dialect differences that matter.
+
+The engine is chosen per deployment (EXECUTION_BACKEND) or per query
+(SQLAgent.query(..., engine=...)). "auto" sends aggregate queries to DuckDB
+when the Parquet files are present and everything else to Postgres.
+
+Backends and pools belong to a database (src.db.registry): get_backend and
+get_pool return those of the database the current request runs against.
+
+Usage:
+    python -m src.db.backends convert --from-postgres
+    python -m src.db.backends convert --csv-dir /path/to/instacart
+"""
+import abc
+import argparse
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.config.settings import (
+    DUCKDB_THREADS,
+    EXECUTION_BACKEND,
+    LIMITER_ACQUIRE_TIMEOUT_S,
+    MAX_CONCURRENT_DB_QUERIES,
+    PARQUET_DIR,
+    PREPARED_STATEMENTS_PER_CONNECTION,
+)
+from src.db.db_connection import get_db_connection
+from src.db.registry import current_database
+from src.utils.sql_rewrite import count_rows_sql
+
+
+# Source CSV file for each table in the Instacart dataset
+INSTACART_CSV_FILES = {
+    "aisles": "aisles.csv",
+    "departments": "departments.csv",
+    "products": "products.csv",
+    "orders": "orders.csv",
+    "order_products_prior": "order_products__prior.csv",
+    "order_products_train": "order_products__train.csv",
+}
+
+AGGREGATE_PATTERN = re.compile(r"\b(count|sum|avg|min|max|stddev|percentile_cont)\s*\(|\bgroup by\b")
+
+# Registry settings passed to psycopg2 (the rest fall back to the DB_* variables)
+CONNECTION_SETTINGS = ("host", "port", "dbname", "user", "password")
+
+# Data version per table: write counters, and the file node that TRUNCATE and rewrites replace
+TABLE_VERSIONS_SQL = """
+SELECT s.relname, c.relfilenode, s.n_tup_ins, s.n_tup_upd, s.n_tup_del
+FROM pg_stat_user_tables s
+JOIN pg_class c ON c.oid = s.relid
+WHERE s.schemaname = 'public'
+"""
+
+
+class ExecutionBackend(abc.ABC):
+    """Base class: connection handling, dialect translation and execution"""
+
+    name = "base"
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ExecutionBackend":
+        """Instance for a database's registry settings"""
+        return cls()
+
+    @abc.abstractmethod
+    def connect(self):
+        """New connection to the engine"""
+
+    def translate(self, sql: str) -> str:
+        """Rewrite PostgreSQL-flavoured SQL for this engine"""
+        return sql
+
+    def execute(self, conn, cursor, sql: str) -> Tuple[List[str], list]:
+        """Run a query and return (column names, rows)"""
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description or []]
+        conn.commit()
+        return columns, rows
+
+    def execute_prepared(self, conn, cursor, sql: str, params: List[Any],
+                         literal_sql: str) -> Tuple[List[str], list]:
+        """
+        Run a parameterized query ($1, $2, ... bound to params). Engines
+        without server-side prepared statements run literal_sql, the same
+        query with the parameters written in.
+        """
+        return self.execute(conn, cursor, self.translate(literal_sql))
+
+    def rollback(self, conn):
+        conn.rollback()
+
+    def stream(self, conn, sql: str, chunk_rows: int) -> Iterator[Tuple[List[str], list]]:
+        """Run a query and yield (column names, rows) chunks without holding the whole result"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql)
+            columns = [desc[0] for desc in cursor.description or []]
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield columns, rows
+        finally:
+            cursor.close()
+
+    def count_rows(self, conn, cursor, sql: str) -> int:
+        """Exact number of rows the query returns"""
+        _, rows = self.execute(conn, cursor, count_rows_sql(sql))
+        return int(rows[0][0])
+
+    def estimate_rows(self, conn, cursor, sql: str) -> Optional[int]:
+        """Planner row estimate without running the query, if the engine has one"""
+        return None
+
+    def is_available(self) -> bool:
+        return True
+
+    def table_exists(self, conn, cursor, table: str) -> bool:
+        return False
+
+    def table_versions(self, conn, cursor) -> Dict[str, str]:
+        """Table -> token that changes with the table's data (src.db.change_tracking); {} = untracked"""
+        return {}
+
+    def close(self):
+        """Release engine-wide resources (connections are closed by their owners)"""
+
+
+class PostgresBackend(ExecutionBackend):
+    """psycopg2 connection to the Postgres instance loaded from the CSVs"""
+
+    name = "postgres"
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        self.settings = settings or {}
+        # connection -> names of the statements prepared on it, least recently used first
+        self._prepared: "weakref.WeakKeyDictionary[Any, OrderedDict[str, None]]" = weakref.WeakKeyDictionary()
+        self._prepared_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "PostgresBackend":
+        return cls({key: config[key] for key in CONNECTION_SETTINGS if config.get(key) is not None})
+
+    def connect(self):
+        return get_db_connection(**self.settings)
+
+    def _prepare(self, conn, cursor, sql: str) -> str:
+        """Name of the statement prepared for sql on this connection, preparing it if needed"""
+        name = "tpl_" + hashlib.md5(sql.encode("utf-8")).hexdigest()[:16]
+        with self._prepared_lock:
+            statements = self._prepared.setdefault(conn, OrderedDict())
+            if name in statements:
+                statements.move_to_end(name)
+                return name
+        cursor.execute(f"PREPARE {name} AS {sql}")
+        with self._prepared_lock:
+            statements[name] = None
+            evicted = []
+            while len(statements) > PREPARED_STATEMENTS_PER_CONNECTION:
+                evicted.append(statements.popitem(last=False)[0])
+        for old in evicted:
+            cursor.execute(f"DEALLOCATE {old}")
+        return name
+
+    def execute_prepared(self, conn, cursor, sql: str, params: List[Any],
+                         literal_sql: str) -> Tuple[List[str], list]:
+        # Prepared statements outlive transactions (not connections): planning is
+        # skipped once Postgres settles on the generic plan after a few executions
+        try:
+            name = self._prepare(conn, cursor, sql)
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ Could not prepare template, running literal SQL: {str(e)[:100]}")
+            return self.execute(conn, cursor, literal_sql)
+        try:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        except Exception:
+            # Forget the statement on both sides, so the next use prepares it afresh
+            conn.rollback()
+            with self._prepared_lock:
+                self._prepared.get(conn, {}).pop(name, None)
+            try:
+                cursor.execute(f"DEALLOCATE {name}")
+            except Exception:
+                conn.rollback()  # Already gone on the server
+            raise
+        rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description or []]
+        conn.commit()
+        return columns, rows
+
+    def stream(self, conn, sql: str, chunk_rows: int) -> Iterator[Tuple[List[str], list]]:
+        # A named cursor keeps the result on the server; each fetch ships one chunk
+        cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+        cursor.itersize = chunk_rows
+        try:
+            cursor.execute(sql)
+            rows = cursor.fetchmany(chunk_rows)
+            columns = [desc[0] for desc in cursor.description or []]
+            while rows:
+                yield columns, rows
+                rows = cursor.fetchmany(chunk_rows)
+        finally:
+            cursor.close()
+            conn.rollback()  # End the read-only transaction the cursor lived in
+
+    def table_exists(self, conn, cursor, table: str) -> bool:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+        exists = cursor.fetchone()[0]
+        conn.commit()
+        return bool(exists)
+
+    def table_versions(self, conn, cursor) -> Dict[str, str]:
+        cursor.execute(TABLE_VERSIONS_SQL)
+        versions = {table: ":".join(map(str, counters)) for table, *counters in cursor.fetchall()}
+        conn.rollback()  # Statistics are read once per transaction: the next poll needs a new one
+        return versions
+
+    def estimate_rows(self, conn, cursor, sql: str) -> Optional[int]:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = cursor.fetchone()[0]
+        conn.commit()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class DuckDBBackend(ExecutionBackend):
+    """Embedded columnar engine reading Parquet files from PARQUET_DIR"""
+
+    name = "duckdb"
+
+    # (pattern, replacement) pairs applied to lowercased, normalized SQL
+    DIALECT_REWRITES = [
+        # Tables are plain views in DuckDB's default schema
+        (re.compile(r"\bpublic\."), ""),
+        # TABLESAMPLE SYSTEM (10) means 10 percent in Postgres, 10 rows in DuckDB
+        (re.compile(r"\btablesample\s+(system|bernoulli)\s*\(\s*([\d.]+)\s*\)"), r"tablesample \1(\2 percent)"),
+        # ::regclass / ::oid casts only make sense against pg_catalog
+        (re.compile(r"::(regclass|oid)\b"), ""),
+    ]
+
+    def __init__(self, parquet_dir: str = PARQUET_DIR):
+        self.parquet_dir = Path(parquet_dir)
+        self._db = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "DuckDBBackend":
+        return cls(config.get("parquet_dir") or PARQUET_DIR)
+
+    def _database(self):
+        """Process-wide in-memory database with one view per Parquet file"""
+        with self._lock:
+            if self._db is None:
+                import duckdb
+
+                db = duckdb.connect(database=":memory:")
+                # Match Postgres semantics: integer / integer truncates (global: cursors are new sessions)
+                db.execute("SET GLOBAL integer_division = true")
+                if DUCKDB_THREADS:
+                    db.execute(f"SET threads = {DUCKDB_THREADS}")
+                for path in sorted(self.parquet_dir.glob("*.parquet")):
+                    db.execute(
+                        f"CREATE OR REPLACE VIEW {path.stem} AS "
+                        f"SELECT * FROM read_parquet('{path.as_posix()}')"
+                    )
+                self._db = db
+            return self._db
+
+    def connect(self):
+        # Each caller gets its own connection to the shared database
+        return self._database().cursor()
+
+    def translate(self, sql: str) -> str:
+        for pattern, replacement in self.DIALECT_REWRITES:
+            sql = pattern.sub(replacement, sql)
+        return sql
+
+    def execute(self, conn, cursor, sql: str) -> Tuple[List[str], list]:
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description or []]
+        return columns, rows
+
+    def rollback(self, conn):
+        # Read-only autocommit connection, nothing to roll back
+        pass
+
+    def is_available(self) -> bool:
+        return any(self.parquet_dir.glob("*.parquet"))
+
+    def table_exists(self, conn, cursor, table: str) -> bool:
+        # Views are created when the database opens; files added later aren't visible yet
+        cursor.execute("SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [table])
+        return cursor.fetchone()[0] > 0
+
+    def table_versions(self, conn, cursor) -> Dict[str, str]:
+        # Views read their file on every query: a replaced file is new data
+        versions = {}
+        for path in self.parquet_dir.glob("*.parquet"):
+            stat = path.stat()
+            versions[path.stem.lower()] = f"{stat.st_mtime_ns}:{stat.st_size}"
+        return versions
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_BACKEND_CLASSES = {
+    "postgres": PostgresBackend,
+    "duckdb": DuckDBBackend,
+}
+
+
+def create_backend(name: str, config: Optional[Dict[str, Any]] = None) -> ExecutionBackend:
+    """New backend instance for an engine name and a database's registry settings"""
+    if name not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown execution backend: {name}")
+    return _BACKEND_CLASSES[name].from_config(config or {})
+
+
+def get_backend(name: Optional[str] = None) -> ExecutionBackend:
+    """Return the current database's backend instance for an engine name"""
+    name = name or EXECUTION_BACKEND
+    if name not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown execution backend: {name}")
+    return current_database().backend(name)
+
+
+def resolve_engine(requested: Optional[str], sql: Optional[str] = None) -> str:
+    """
+    Turn a requested engine ("postgres", "duckdb", "auto" or None) into a
+    concrete backend name for this query.
+    """
+    requested = requested or EXECUTION_BACKEND
+    if requested != "auto":
+        return requested
+    if sql and AGGREGATE_PATTERN.search(sql) and get_backend("duckdb").is_available():
+        return "duckdb"
+    return "postgres"
+
+
+class ConnectionPool:
+    """
+    Bounded pool of (conn, cursor) pairs for one backend, for work that runs
+    queries in parallel within a request (e.g. decomposed sub-queries).
+    Connections are opened lazily and kept for reuse.
+    """
+
+    def __init__(self, backend: ExecutionBackend, size: int = MAX_CONCURRENT_DB_QUERIES):
+        self.backend = backend
+        self.size = size
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def opened(self) -> int:
+        """Connections currently open, idle or in use"""
+        return self._opened
+
+    @contextmanager
+    def connection(self, timeout: float = LIMITER_ACQUIRE_TIMEOUT_S):
+        session = None
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self.backend.connect()
+                    session = (conn, conn.cursor())
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                try:
+                    session = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No free {self.backend.name} connection after {timeout}s") from None
+        try:
+            yield session
+        except Exception:
+            try:
+                self.backend.rollback(session[0])
+            except Exception:
+                pass  # Broken connection: dropped below
+            raise
+        finally:
+            if getattr(session[0], "closed", False):
+                with self._lock:
+                    self._opened -= 1
+            else:
+                self._idle.put(session)
+
+    def close(self):
+        while True:
+            try:
+                conn, cursor = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            cursor.close()
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+def get_pool(name: Optional[str] = None) -> ConnectionPool:
+    """Return the current database's connection pool for an engine name"""
+    return current_database().pool(get_backend(name).name)
+
+
+# ---------------------------
+# Local execution over in-memory results
+# ---------------------------
+
+_local_db = None
+_local_db_lock = threading.Lock()
+
+
+def _local_database():
+    """Process-wide empty in-memory DuckDB; callers register their data on their own cursor"""
+    global _local_db
+    with _local_db_lock:
+        if _local_db is None:
+            import duckdb
+
+            db = duckdb.connect(database=":memory:")
+            db.execute("SET GLOBAL integer_division = true")  # Match Postgres, as the DuckDB backend does
+            _local_db = db
+        return _local_db
+
+
+def execute_local(relations: Dict[str, Dict[str, List[Any]]], sql: str) -> Tuple[List[str], list]:
+    """
+    Run PostgreSQL-flavoured SQL in DuckDB over column-oriented results
+    ({relation name: {column: values}}) without touching a database.
+    """
+    import numpy as np
+
+    cursor = _local_database().cursor()
+    try:
+        # Registered relations are local to this cursor's connection
+        for name, data in relations.items():
+            cursor.register(name, {column: np.array(values, dtype=object) for column, values in data.items()})
+        cursor.execute(get_backend("duckdb").translate(sql))
+        rows = cursor.fetchall()
+        return [desc[0] for desc in cursor.description or []], rows
+    finally:
+        cursor.close()
+
+
+# ---------------------------
+# Parquet conversion
+# ---------------------------
+
+def convert_to_parquet(output_dir: str = PARQUET_DIR, csv_dir: Optional[str] = None):
+    """
+    Write one Parquet file per Instacart table, either from the source CSVs
+    or straight out of the configured Postgres database.
+    """
+    import duckdb
+
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    db = duckdb.connect(database=":memory:")
+
+    if csv_dir:
+        sources = {
+            table: f"read_csv_auto('{(Path(csv_dir) / csv_file).as_posix()}')"
+            for table, csv_file in INSTACART_CSV_FILES.items()
+        }
+    else:
+        db.execute("INSTALL postgres")
+        db.execute("LOAD postgres")
+        dsn = " ".join(
+            f"{key}={os.getenv(env, default)}"
+            for key, env, default in [
+                ("host", "DB_HOST", "localhost"),
+                ("port", "DB_PORT", "5432"),
+                ("dbname", "DB_NAME", ""),
+                ("user", "DB_USER", ""),
+                ("password", "DB_PASSWORD", ""),
+            ]
+        )
+        db.execute(f"ATTACH '{dsn}' AS pg (TYPE POSTGRES, READ_ONLY)")
+        sources = {table: f"pg.public.{table}" for table in INSTACART_CSV_FILES}
+
+    for table, source in sources.items():
+        target = (out / f"{table}.parquet").as_posix()
+        print(f"Converting {table} → {target}")
+        db.execute(f"COPY (SELECT * FROM {source}) TO '{target}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+
+    db.close()
+    print("✅ Parquet conversion complete")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Execution backend utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="Convert Instacart tables to Parquet")
+    source = convert.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv-dir", help="Directory with the Instacart CSV files")
+    source.add_argument("--from-postgres", action="store_true", help="Read tables from Postgres")
+    convert.add_argument("--output-dir", default=PARQUET_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        convert_to_parquet(args.output_dir, args.csv_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Table-level change tracking for cache invalidation.
+
+Without it, cached answers and results can only expire by TTL, since
+nothing says when the data behind them changed. The tracker keeps a version
+vector per database and engine: table -> a token that changes whenever the
+table's data does. For Postgres it comes from one catalog query over
+pg_stat_user_tables (rows inserted / updated / deleted) and
+pg_class.relfilenode (changed by TRUNCATE and table rewrites); for DuckDB
+it is each Parquet file's size and modification time.
+
+Answer and result cache entries are stamped with the versions of the tables
+their SQL reads (from the AST), as they were before the query ran. An entry
+is only served while every stamped version is current, so loading new
+orders drops the answers that read orders and keeps the ones over aisles.
+Stamped entries live for TRACKED_CACHE_TTL_S instead of the layer's TTL.
+
+The API server polls the databases and engines opened so far every
+CHANGE_TRACKING_INTERVAL_S, so a change is noticed within one interval
+(plus up to a second for Postgres to publish its counters). Nothing is
+stamped before the first poll, for tables the engine doesn't report, or
+outside the server; such entries keep the plain TTL. A stamped entry that
+can't be checked (polling stopped) is a miss.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.config.settings import CHANGE_TRACKING_INTERVAL_S
+
+
+# (database id, engine, ((table, version), ...)) of the tables an entry depends on
+Stamp = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+
+STALE_AFTER_POLLS = 3  # Versions older than this many intervals can't vouch for an entry
+
+
+class ChangeTracker:
+    """Latest table versions per (database, engine), as recorded by polls"""
+
+    def __init__(self, interval_s: float = CHANGE_TRACKING_INTERVAL_S):
+        self.interval_s = interval_s
+        self._versions: Dict[Tuple[str, str], Tuple[float, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, database_id: str, engine: str, versions: Dict[str, str]) -> List[str]:
+        """Record polled versions; returns the tables whose version changed since the last poll"""
+        with self._lock:
+            previous = self._versions.get((database_id, engine))
+            self._versions[(database_id, engine)] = (time.monotonic(), versions)
+        if previous is None:
+            return []
+        old = previous[1]
+        return sorted(table for table in old.keys() | versions.keys() if old.get(table) != versions.get(table))
+
+    def current(self, database_id: str, engine: str) -> Optional[Dict[str, str]]:
+        """Latest versions, or None if the engine wasn't polled recently"""
+        entry = self._versions.get((database_id, engine))
+        if entry is None or time.monotonic() - entry[0] > STALE_AFTER_POLLS * self.interval_s:
+            return None
+        return entry[1]
+
+    def snapshot(self, database_id: str) -> Dict[str, Dict[str, str]]:
+        """engine -> current versions; taken before running queries whose results get stamped"""
+        with self._lock:
+            engines = [engine for database, engine in self._versions if database == database_id]
+        snapshot = {engine: self.current(database_id, engine) for engine in engines}
+        return {engine: versions for engine, versions in snapshot.items() if versions is not None}
+
+    def forget(self, database_id: str):
+        with self._lock:
+            for key in [key for key in self._versions if key[0] == database_id]:
+                del self._versions[key]
+
+    def poll(self, database) -> Dict[str, List[str]]:
+        """Read the versions of every engine opened for a database; engine -> changed tables"""
+        changed = {}
+        for engine in database.engines():
+            with database.pool(engine).connection() as (conn, cursor):
+                versions = database.backend(engine).table_versions(conn, cursor)
+            changed[engine] = self.update(database.id, engine, versions)
+        return changed
+
+
+CHANGE_TRACKER = ChangeTracker()
+
+
+def stamp(database_id: str, engine: str, sql: str,
+          snapshot: Dict[str, Dict[str, str]]) -> Optional[Stamp]:
+    """Versions of the tables `sql` reads, from a snapshot; None if any of them isn't tracked"""
+    from src.utils.sql_rewrite import referenced_tables
+
+    versions = snapshot.get(engine)
+    if not versions or not sql:
+        return None
+    tables = referenced_tables(sql)
+    if tables is None or any(table not in versions for table in tables):
+        return None
+    return database_id, engine, tuple(sorted((table, versions[table]) for table in tables))
+
+
+def is_current(entry_stamp: Stamp) -> Optional[bool]:
+    """Whether none of the stamped tables changed; None when that can't be told"""
+    database_id, engine, tables = entry_stamp
+    versions = CHANGE_TRACKER.current(database_id, engine)
+    if versions is None:
+        return None
+    return all(versions.get(table) == version for table, version in tables)
+
+
+def start_change_tracker(interval_s: float = CHANGE_TRACKING_INTERVAL_S) -> Optional[threading.Thread]:
+    """
+    Background thread polling the open databases' table versions every
+    interval_s seconds. Disabled when interval_s <= 0.
+    """
+    if interval_s <= 0:
+        return None
+
+    stop = threading.Event()
+
+    def loop():
+        from src.db.registry import get_registry
+
+        while True:
+            for database in get_registry().databases():
+                try:
+                    for engine, tables in CHANGE_TRACKER.poll(database).items():
+                        if tables:
+                            print(f"🔄 Data changed in {database.id} ({engine}): {', '.join(tables[:10])}")
+                except Exception as e:
+                    print(f"⚠️ Change tracking failed for {database.id}: {str(e)[:100]}")
+            if stop.wait(interval_s):
+                break
+
+    thread = threading.Thread(target=loop, name="change-tracker", daemon=True)
+    thread.stop = stop
+    thread.start()
+    return thread
@@ -5,7 +5,7 @@ import psycopg2
 # Load environment variables
 load_dotenv()
 
-def get_db_connection():
+def get_db_connection(**overrides):
 
     # Read DB config from environment
     DB_USER = os.getenv("DB_USER")
@@ -14,12 +14,13 @@ def get_db_connection():
     DB_PORT = os.getenv("DB_PORT", "5432")
     DB_NAME = os.getenv("DB_NAME")
 
+    # Another registered database (host, port, dbname, user, password)
     conn = psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
+        host=overrides.get("host", DB_HOST),
+        port=overrides.get("port", DB_PORT),
+        database=overrides.get("dbname", DB_NAME),
+        user=overrides.get("user", DB_USER),
+        password=overrides.get("password", DB_PASSWORD)
     )
 
     return conn
\ No newline at end of file
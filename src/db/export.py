@@ -0,0 +1,344 @@
+"""
+Result handles and streaming export.
+
+A validated answer gets a result handle (an unguessable token for its SQL
+and engine, kept RESULT_HANDLE_TTL_S). GET /results/{handle} re-executes the
+SQL and streams the rows as CSV, Arrow IPC (stream format) or Parquet, one
+RESULT_STREAM_CHUNK_ROWS chunk at a time, so server memory is bounded by a
+chunk whatever the size of the result:
+
+- full export: Postgres rows come from a named (server-side) cursor, DuckDB
+  rows from its streaming result
+- keyset pagination: page_size rows ordered by `key` columns; the response
+  carries an opaque cursor for the next page (X-Next-Cursor), which resumes
+  after the last key seen (rows whose key is NULL are not paged)
+- range resumption: "Range: rows=N-" (or rows=N-M) restarts a full export at
+  row N of the query's own order, answered with 206 and Content-Range
+
+pyarrow is imported on first use (Arrow and Parquet formats only).
+"""
+import base64
+import csv
+import datetime
+import decimal
+import io
+import json
+import re
+import secrets
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.config.settings import (
+    MAX_CONCURRENT_EXPORTS,
+    RESULT_HANDLE_MAX,
+    RESULT_HANDLE_TTL_S,
+    RESULT_PAGE_MAX_ROWS,
+    RESULT_STREAM_CHUNK_ROWS,
+)
+from src.memory.cache import TTLCache
+from src.utils.concurrency import ConcurrencyLimiter
+from src.utils.sql_rewrite import row_range_sql
+
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+RANGE_PATTERN = re.compile(r"^\s*rows\s*=\s*(\d+)\s*-\s*(\d*)\s*$")
+
+# Not a cache: handles must survive CACHE_ENABLED=false
+RESULT_HANDLES = TTLCache("result_handle", RESULT_HANDLE_TTL_S, RESULT_HANDLE_MAX, optional=False)
+EXPORT_LIMITER = ConcurrencyLimiter("export", MAX_CONCURRENT_EXPORTS)
+
+
+class ExportError(ValueError):
+    """Invalid export request (unknown format, key column, cursor or range)"""
+
+
+def create_handle(result: Dict[str, Any]) -> Optional[str]:
+    """Handle for a validated, executed answer; None for anything else"""
+    if not (result.get("valid") and result.get("executed") and result.get("sql")):
+        return None
+    handle = secrets.token_urlsafe(16)
+    RESULT_HANDLES.put(handle, {
+        "sql": result["sql"],
+        "engine": result.get("engine"),
+        "database": result.get("database"),
+        "columns": list(result.get("columns") or []),
+        "question": result.get("question"),
+    })
+    return handle
+
+
+def get_handle(handle: str) -> Optional[Dict[str, Any]]:
+    return RESULT_HANDLES.get(handle)
+
+
+def parse_range(header: Optional[str]) -> Optional[Tuple[int, Optional[int]]]:
+    """(first row, row count or None) from a "rows=N-" / "rows=N-M" Range header"""
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header)
+    if not match:
+        raise ExportError(f"Unsupported Range: {header} (expected rows=N- or rows=N-M)")
+    first = int(match.group(1))
+    if not match.group(2):
+        return first, None
+    last = int(match.group(2))
+    if last < first:
+        raise ExportError(f"Unsatisfiable Range: {header}")
+    return first, last - first + 1
+
+
+# ---------------------------
+# Keyset pagination
+# ---------------------------
+
+def encode_cursor(key_values: List[Any], skip: int) -> str:
+    payload = json.dumps({"k": [_json_value(v) for v in key_values], "n": skip}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[List[Any], int]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values, skip = payload["k"], int(payload["n"])
+    except (ValueError, KeyError, TypeError):
+        raise ExportError("Invalid cursor") from None
+    if not isinstance(values, list) or skip < 0:
+        raise ExportError("Invalid cursor")
+    return values, skip
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def keyset_page_sql(sql: str, key: List[str], after: Optional[Tuple[List[Any], int]], page_size: int,
+                    width: int) -> str:
+    """
+    One page of the query's rows ordered by `key`. A page starts at the last
+    key of the previous one (>=) and skips the rows with that key already
+    returned, so a non-unique key never loses rows at a page boundary; ties
+    are ordered by every column (`width` of them) so they come back in the
+    same order each time. One extra row tells whether another page follows.
+    """
+    from sqlglot import exp
+
+    columns = ", ".join(exp.to_identifier(c, quoted=True).sql("postgres") for c in key)
+    conditions = [f"{exp.to_identifier(c, quoted=True).sql('postgres')} is not null" for c in key]
+    skip = 0
+    if after is not None:
+        values, skip = after
+        if len(values) != len(key) or any(v is None or isinstance(v, (list, dict)) for v in values):
+            raise ExportError("Cursor does not match the key columns")
+        literals = ", ".join(exp.convert(v).sql("postgres") for v in values)
+        conditions.append(f"({columns}) >= ({literals})" if len(key) > 1 else f"{columns} >= {literals}")
+    body = sql.rstrip().rstrip(";").rstrip()
+    return (
+        f"select * from (\n{body}\n) as result_rows\n"
+        f"where {' and '.join(conditions)}\n"
+        f"order by {columns}, {', '.join(str(i + 1) for i in range(width))}\n"
+        f"limit {page_size + 1}" + (f" offset {skip}" if skip else "")
+    )
+
+
+def next_cursor(rows: list, key_index: List[int], after: Optional[Tuple[List[Any], int]]) -> str:
+    """Cursor after the last row of a page: its key, and how many rows with that key were returned"""
+    last = [rows[-1][i] for i in key_index]
+    tied = 0
+    for row in reversed(rows):
+        if [row[i] for i in key_index] != last:
+            break
+        tied += 1
+    if after is not None and tied == len(rows) and [_json_value(v) for v in last] == after[0]:
+        tied += after[1]  # The whole page continued the previous page's key
+    return encode_cursor(last, tied)
+
+
+# ---------------------------
+# Execution
+# ---------------------------
+
+@contextmanager
+def export_rows(handle: Dict[str, Any], sql: str, chunk_rows: int = RESULT_STREAM_CHUNK_ROWS):
+    """(column names, iterator of row chunks) for `sql` on the handle's database and engine, on a pooled connection"""
+    from src.db.backends import get_backend, get_pool, resolve_engine
+    from src.db.registry import UnknownDatabaseError, get_registry, use_database
+
+    try:
+        database = get_registry().open(handle.get("database"))
+    except UnknownDatabaseError as e:
+        raise ExportError(str(e)) from None
+    try:
+        with use_database(database):
+            backend = get_backend(resolve_engine(handle.get("engine"), handle["sql"]))
+            pool = get_pool(backend.name)
+        with EXPORT_LIMITER.slot(timeout=0.5), pool.connection() as (conn, _):
+            chunks = backend.stream(conn, backend.translate(sql), chunk_rows)
+            try:
+                first = next(chunks, None)
+                columns = first[0] if first else list(handle["columns"])
+                yield columns, _chain(first, chunks)
+            finally:
+                chunks.close()
+    finally:
+        get_registry().release(database)
+
+
+def _chain(first, chunks) -> Iterator[list]:
+    if first is None:
+        return
+    yield first[1]
+    for _, rows in chunks:
+        yield rows
+
+
+# ---------------------------
+# Encoding
+# ---------------------------
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands over what was written since the last drain()"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _arrow_type(values: list):
+    import pyarrow as pa
+
+    sample = next((v for v in values if v is not None), None)
+    if isinstance(sample, bool):
+        return pa.bool_()
+    if isinstance(sample, int):
+        return pa.int64()
+    if isinstance(sample, (float, decimal.Decimal)):
+        return pa.float64()
+    if isinstance(sample, datetime.datetime):
+        return pa.timestamp("us", tz="UTC" if sample.tzinfo else None)
+    if isinstance(sample, datetime.date):
+        return pa.date32()
+    if isinstance(sample, bytes):
+        return pa.binary()
+    return pa.string()
+
+
+def _arrow_batch(schema, rows: list):
+    """Rows as a record batch of `schema` (column types are fixed by the first chunk)"""
+    import pyarrow as pa
+
+    arrays = []
+    for i, field in enumerate(schema):
+        values = [row[i] for row in rows]
+        if pa.types.is_floating(field.type):
+            values = [float(v) if isinstance(v, decimal.Decimal) else v for v in values]
+        elif pa.types.is_string(field.type):
+            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def encode(columns: List[str], chunks: Iterator[list], fmt: str, header: bool = True,
+           metadata: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+    """
+    Encode row chunks as one CSV / Arrow IPC stream / Parquet file, yielding
+    bytes per chunk. `metadata` goes into the Arrow / Parquet schema.
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+        return
+
+    import pyarrow as pa
+
+    rows = next(chunks, [])
+    schema = pa.schema([(c, _arrow_type([row[i] for row in rows])) for i, c in enumerate(columns)],
+                       metadata=metadata)
+    sink = _Sink()
+    if fmt == "arrow":
+        import pyarrow.ipc
+
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+    else:
+        import pyarrow.parquet as pq
+
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        write = lambda batch: writer.write_batch(batch)  # One row group per chunk
+    try:
+        while rows:
+            write(_arrow_batch(schema, rows))
+            yield sink.drain()
+            rows = next(chunks, [])
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_filename(handle: str, fmt: str) -> str:
+    return f"result_{handle[:8]}.{FORMATS[fmt][1]}"
+
+
+def stream_export(stored: Dict[str, Any], fmt: str,
+                  requested: Optional[Tuple[int, Optional[int]]] = None) -> Iterator[bytes]:
+    """The whole result, or the requested row range of it, as one file (CSV header only from row 0)"""
+    sql = row_range_sql(stored["sql"], *requested) if requested else stored["sql"]
+    with export_rows(stored, sql) as (columns, chunks):
+        yield from encode(columns, chunks, fmt, header=not requested or requested[0] == 0)
+
+
+def export_page(stored: Dict[str, Any], fmt: str, key: Optional[str], page_size: int,
+                after: Optional[str] = None) -> Tuple[bytes, Optional[str], int]:
+    """One keyset page as a file: (body, cursor of the next page or None, rows)"""
+    key_columns = [c.strip() for c in (key or "").split(",") if c.strip()]
+    if not key_columns:
+        raise ExportError("key (comma-separated result columns) is required for keyset pagination")
+    unknown = [c for c in key_columns if c not in stored["columns"]]
+    if unknown:
+        raise ExportError(f"Unknown key columns {unknown}; result columns are {stored['columns']}")
+    if not 0 < page_size <= RESULT_PAGE_MAX_ROWS:
+        raise ExportError(f"page_size must be between 1 and {RESULT_PAGE_MAX_ROWS}")
+
+    position = decode_cursor(after) if after else None
+    sql = keyset_page_sql(stored["sql"], key_columns, position, page_size, len(stored["columns"]))
+    # A page is at most RESULT_PAGE_MAX_ROWS + 1 rows: one chunk
+    with export_rows(stored, sql, chunk_rows=page_size + 1) as (columns, chunks):
+        rows = next(chunks, [])
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    cursor = next_cursor(rows, [columns.index(c) for c in key_columns], position) if more else None
+    body = b"".join(encode(columns, iter([rows] if rows else []), fmt))
+    return body, cursor, len(rows)
@@ -0,0 +1,467 @@
+"""
+Index advisor driven by the generated-SQL workload.
+
+Every SQL statement executed by the agent is appended to a JSONL workload log.
+The advisor replays the distinct statements with EXPLAIN (ANALYZE, BUFFERS),
+which runs them: each must pass the agent's guardrails again (read-only
+SELECT) and runs in a read-only transaction, so a tampered or stale log
+can't write. It then collects predicate, join and sort columns from the plans, and ranks candidate
+indexes by the scan time they would save. Candidates can optionally be checked
+with hypothetical indexes (hypopg) and created.
+
+Usage:
+    python -m src.db.index_advisor report --top 10
+    python -m src.db.index_advisor report --validate --create
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.config.settings import (
+    INDEX_ADVISOR_EXPLAIN_TIMEOUT_MS,
+    INDEX_ADVISOR_MAX_COLUMNS,
+    WORKLOAD_CAPTURE_ENABLED,
+    WORKLOAD_LOG_PATH,
+)
+from src.utils.sql_utils import normalize_sql, validate_sql
+
+
+_write_lock = threading.Lock()
+
+SCAN_NODE_TYPES = {"Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan"}
+JOIN_COND_KEYS = ("Hash Cond", "Merge Cond", "Join Filter")
+
+# Column reference followed by a comparison operator, e.g. "(order_dow = 0)",
+# "((p.product_name)::text ~~ 'a%'::text)" or "(o.user_id = op.user_id)"
+PREDICATE_PATTERN = re.compile(
+    r"\(*(?:(\w+)\.)?(\w+)\)*(?:::[\w ]+?)?\)*\s*(=|<>|<=|>=|<|>|~~\*?|!~~)"
+)
+COLUMN_REF_PATTERN = re.compile(r"(?:(\w+)\.)?(\w+)")
+EQUALITY_OPERATORS = {"="}
+
+
+# ---------------------------
+# Workload capture
+# ---------------------------
+
+def record_workload(sql: str, duration_ms: float, row_count: int, log_path: str = WORKLOAD_LOG_PATH):
+    """Append one executed statement to the workload log (never raises)"""
+    if not WORKLOAD_CAPTURE_ENABLED or not sql:
+        return
+    entry = {
+        "ts": time.time(),
+        "sql": sql,
+        "duration_ms": round(duration_ms, 3),
+        "rows": row_count,
+    }
+    try:
+        path = Path(log_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with _write_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not record workload: {e}")
+
+
+def load_workload(log_path: str = WORKLOAD_LOG_PATH) -> Dict[str, Dict[str, Any]]:
+    """Group logged statements by normalized SQL -> {sql, count, total_ms}"""
+    workload: Dict[str, Dict[str, Any]] = {}
+    path = Path(log_path)
+    if not path.exists():
+        return workload
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            key = normalize_sql(entry.get("sql", "")).rstrip(";").strip()
+            if not key:
+                continue
+            item = workload.setdefault(key, {"sql": key, "count": 0, "total_ms": 0.0})
+            item["count"] += 1
+            item["total_ms"] += entry.get("duration_ms", 0.0)
+    return workload
+
+
+# ---------------------------
+# Plan analysis
+# ---------------------------
+
+def explain_analyze(cursor, sql: str) -> Dict[str, Any]:
+    """Run EXPLAIN (ANALYZE, BUFFERS) in a read-only transaction and return the top-level JSON plan"""
+    cursor.execute("SET TRANSACTION READ ONLY")
+    cursor.execute(f"SET LOCAL statement_timeout = {int(INDEX_ADVISOR_EXPLAIN_TIMEOUT_MS)}")
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+    return _plan_from_row(cursor.fetchone())
+
+
+def explain_cost(cursor, sql: str) -> float:
+    """Planner total cost without executing the statement"""
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+    return _plan_from_row(cursor.fetchone())["Plan"]["Total Cost"]
+
+
+def _plan_from_row(row) -> Dict[str, Any]:
+    plan = row[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def iter_plan_nodes(node: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    """Depth-first walk over a plan tree"""
+    yield node
+    for child in node.get("Plans", []):
+        yield from iter_plan_nodes(child)
+
+
+def _node_time_ms(node: Dict[str, Any]) -> float:
+    return node.get("Actual Total Time", 0.0) * node.get("Actual Loops", 1)
+
+
+def _node_rows(node: Dict[str, Any]) -> float:
+    return node.get("Actual Rows", node.get("Plan Rows", 0)) * node.get("Actual Loops", 1)
+
+
+def _alias_map(root: Dict[str, Any]) -> Dict[str, str]:
+    aliases = {}
+    for node in iter_plan_nodes(root):
+        if "Relation Name" in node:
+            aliases[node.get("Alias", node["Relation Name"])] = node["Relation Name"]
+            aliases[node["Relation Name"]] = node["Relation Name"]
+    return aliases
+
+
+def _first_relation_scan(node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    for child in iter_plan_nodes(node):
+        if child.get("Node Type") in SCAN_NODE_TYPES:
+            return child
+    return None
+
+
+def _resolve(qualifier: Optional[str], column: str, default_relation: Optional[str],
+             aliases: Dict[str, str], known_columns: Dict[str, set]) -> Optional[Tuple[str, str]]:
+    relation = aliases.get(qualifier) if qualifier else default_relation
+    if relation and column in known_columns.get(relation, set()):
+        return relation, column
+    return None
+
+
+def extract_candidates(plan: Dict[str, Any], known_columns: Dict[str, set]) -> List[Dict[str, Any]]:
+    """
+    Collect index candidates from one EXPLAIN (ANALYZE) plan.
+
+    Each candidate is {table, columns, kind, benefit_ms}, where benefit_ms is a
+    rough estimate of scan/sort time an index on those columns would save.
+    """
+    root = plan["Plan"]
+    aliases = _alias_map(root)
+    candidates = []
+
+    for node in iter_plan_nodes(root):
+        node_type = node.get("Node Type")
+
+        # Filter predicates on sequential scans
+        if node_type == "Seq Scan" and node.get("Filter"):
+            relation = node["Relation Name"]
+            eq_cols, range_cols = [], []
+            for qualifier, column, operator in PREDICATE_PATTERN.findall(node["Filter"]):
+                resolved = _resolve(qualifier, column, relation, aliases, known_columns)
+                if not resolved or resolved[0] != relation:
+                    continue
+                target = eq_cols if operator in EQUALITY_OPERATORS else range_cols
+                if column not in eq_cols and column not in range_cols:
+                    target.append(column)
+
+            columns = (eq_cols + range_cols)[:INDEX_ADVISOR_MAX_COLUMNS]
+            if columns:
+                kept = _node_rows(node)
+                removed = node.get("Rows Removed by Filter", 0) * node.get("Actual Loops", 1)
+                selectivity = kept / (kept + removed) if (kept + removed) else 1.0
+                candidates.append({
+                    "table": relation,
+                    "columns": columns,
+                    "kind": "filter",
+                    "benefit_ms": _node_time_ms(node) * max(0.0, 1.0 - selectivity),
+                })
+
+        # Join keys where one side is a full scan of a much larger relation
+        for key in JOIN_COND_KEYS:
+            if key not in node or len(node.get("Plans", [])) != 2:
+                continue
+            sides = [_first_relation_scan(child) for child in node["Plans"]]
+            for qualifier, column in COLUMN_REF_PATTERN.findall(node[key]):
+                resolved = _resolve(qualifier, column, None, aliases, known_columns)
+                if not resolved:
+                    continue
+                for idx, side in enumerate(sides):
+                    other = sides[1 - idx]
+                    if not side or side.get("Node Type") != "Seq Scan" or side["Relation Name"] != resolved[0]:
+                        continue
+                    this_rows = max(_node_rows(side), 1.0)
+                    other_rows = _node_rows(other) if other else this_rows
+                    candidates.append({
+                        "table": resolved[0],
+                        "columns": [resolved[1]],
+                        "kind": "join",
+                        "benefit_ms": _node_time_ms(side) * max(0.0, 1.0 - other_rows / this_rows),
+                    })
+
+        # Sort keys that an ordered index could provide
+        if node_type == "Sort" and node.get("Sort Key"):
+            child_ms = sum(_node_time_ms(child) for child in node.get("Plans", []))
+            sort_ms = max(0.0, _node_time_ms(node) - child_ms)
+            columns, table = [], None
+            for sort_key in node["Sort Key"]:
+                match = re.fullmatch(r"\(?(?:(\w+)\.)?(\w+)\)?(?: DESC| ASC)?", sort_key.strip())
+                resolved = match and _resolve(match.group(1), match.group(2),
+                                              _single_relation(aliases), aliases, known_columns)
+                if not resolved or (table and resolved[0] != table):
+                    columns = []
+                    break
+                table = resolved[0]
+                columns.append(resolved[1])
+            if columns:
+                candidates.append({
+                    "table": table,
+                    "columns": columns[:INDEX_ADVISOR_MAX_COLUMNS],
+                    "kind": "sort",
+                    "benefit_ms": sort_ms * 0.5,
+                })
+
+    return candidates
+
+
+def _single_relation(aliases: Dict[str, str]) -> Optional[str]:
+    relations = set(aliases.values())
+    return relations.pop() if len(relations) == 1 else None
+
+
+def rank_recommendations(
+    analyzed: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+    existing_indexes: Optional[Dict[str, List[List[str]]]] = None,
+    top: int = 10
+) -> List[Dict[str, Any]]:
+    """
+    Aggregate candidates across the workload.
+
+    analyzed: list of (workload_item, candidates) pairs.
+    Returns recommendations sorted by estimated total benefit.
+    """
+    existing_indexes = existing_indexes or {}
+    merged: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+
+    for item, candidates in analyzed:
+        for cand in candidates:
+            cols = tuple(cand["columns"])
+            if _already_indexed(cand["table"], cols, existing_indexes):
+                continue
+            key = (cand["table"], cols)
+            rec = merged.setdefault(key, {
+                "table": cand["table"],
+                "columns": list(cols),
+                "kinds": set(),
+                "queries": [],
+                "occurrences": 0,
+                "estimated_benefit_ms": 0.0,
+            })
+            rec["kinds"].add(cand["kind"])
+            rec["occurrences"] += item["count"]
+            rec["estimated_benefit_ms"] += cand["benefit_ms"] * item["count"]
+            if item["sql"] not in rec["queries"]:
+                rec["queries"].append(item["sql"])
+
+    recommendations = []
+    for rec in merged.values():
+        if rec["estimated_benefit_ms"] <= 0:
+            continue
+        rec["kinds"] = sorted(rec["kinds"])
+        rec["estimated_benefit_ms"] = round(rec["estimated_benefit_ms"], 2)
+        rec["ddl"] = index_ddl(rec["table"], rec["columns"])
+        recommendations.append(rec)
+
+    recommendations.sort(key=lambda r: r["estimated_benefit_ms"], reverse=True)
+    return recommendations[:top]
+
+
+def _already_indexed(table: str, columns: Tuple[str, ...], existing: Dict[str, List[List[str]]]) -> bool:
+    """An existing index whose leading columns match the candidate makes it redundant"""
+    for index_cols in existing.get(table, []):
+        if tuple(index_cols[:len(columns)]) == columns:
+            return True
+    return False
+
+
+def index_ddl(table: str, columns: List[str], concurrently: bool = False) -> str:
+    name = f"idx_{table}_{'_'.join(columns)}"[:63]
+    mode = "CONCURRENTLY " if concurrently else ""
+    return f"CREATE INDEX {mode}IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+
+
+def fetch_existing_indexes(cursor) -> Dict[str, List[List[str]]]:
+    """Map table -> list of index column lists for plain btree indexes"""
+    cursor.execute("""
+        SELECT tablename, indexdef
+        FROM pg_indexes
+        WHERE schemaname = 'public'
+    """)
+    existing = defaultdict(list)
+    for table, indexdef in cursor.fetchall():
+        match = re.search(r"USING btree \((.+)\)", indexdef)
+        if match:
+            existing[table].append([c.strip().split()[0].strip('"') for c in match.group(1).split(",")])
+    return dict(existing)
+
+
+# ---------------------------
+# Hypothetical validation and creation
+# ---------------------------
+
+def validate_with_hypopg(conn, cursor, recommendations: List[Dict[str, Any]]) -> bool:
+    """
+    Re-plan affected queries with each index created hypothetically.
+    Adds cost_before/cost_after/validated to each recommendation.
+    Returns False when the hypopg extension is unavailable.
+    """
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS hypopg")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ hypopg not available, skipping validation: {str(e)[:100]}")
+        return False
+
+    for rec in recommendations:
+        try:
+            before = sum(explain_cost(cursor, sql) for sql in rec["queries"])
+            hypothetical = f"CREATE INDEX ON {rec['table']} ({', '.join(rec['columns'])})"
+            cursor.execute("SELECT * FROM hypopg_create_index(%s)", (hypothetical,))
+            after = sum(explain_cost(cursor, sql) for sql in rec["queries"])
+            rec["cost_before"] = round(before, 2)
+            rec["cost_after"] = round(after, 2)
+            rec["validated"] = after < before * 0.95
+        except Exception as e:
+            conn.rollback()
+            rec["validated"] = False
+            rec["validation_error"] = str(e)[:200]
+        finally:
+            cursor.execute("SELECT hypopg_reset()")
+    conn.commit()
+    return True
+
+
+def create_indexes(conn, recommendations: List[Dict[str, Any]], only_validated: bool = True):
+    """Create recommended indexes concurrently (requires autocommit)"""
+    previous = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for rec in recommendations:
+                if only_validated and not rec.get("validated"):
+                    continue
+                ddl = index_ddl(rec["table"], rec["columns"], concurrently=True)
+                print(f"🛠️ {ddl}")
+                cursor.execute(ddl)
+                rec["created"] = True
+    finally:
+        conn.autocommit = previous
+
+
+# ---------------------------
+# Report
+# ---------------------------
+
+def analyze_workload(conn, cursor, log_path: str = WORKLOAD_LOG_PATH, min_count: int = 1):
+    """Replay distinct workload statements that pass validate_sql with EXPLAIN ANALYZE and extract candidates"""
+    from src.utils.schema_utils import FULL_SCHEMA
+
+    known_columns = {
+        name: set(info.get("columns", {}).keys())
+        for name, info in FULL_SCHEMA["tables"].items()
+    }
+    analyzed = []
+    conn.rollback()  # Each replay starts its own (read-only) transaction
+    for item in load_workload(log_path).values():
+        if item["count"] < min_count:
+            continue
+        is_valid, reason = validate_sql(item["sql"])
+        if not is_valid:
+            print(f"⚠️ Skipping statement that fails validation ({reason}): {item['sql'][:100]}")
+            continue
+        try:
+            plan = explain_analyze(cursor, item["sql"])
+            conn.rollback()
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ Skipping statement: {str(e)[:100]}")
+            continue
+        item["execution_ms"] = plan.get("Execution Time")
+        analyzed.append((item, extract_candidates(plan, known_columns)))
+    return analyzed
+
+
+def format_report(recommendations: List[Dict[str, Any]], statements: int) -> str:
+    lines = [
+        "# Index recommendations",
+        "",
+        f"Analyzed {statements} distinct statements.",
+        "",
+        "| # | Index | Kind | Occurrences | Est. benefit (ms) | Validated |",
+        "|---|-------|------|-------------|-------------------|-----------|",
+    ]
+    for i, rec in enumerate(recommendations, 1):
+        validated = rec.get("validated")
+        validated = "-" if validated is None else ("yes" if validated else "no")
+        lines.append(
+            f"| {i} | `{rec['table']}({', '.join(rec['columns'])})` | {', '.join(rec['kinds'])} "
+            f"| {rec['occurrences']} | {rec['estimated_benefit_ms']:,.2f} | {validated} |"
+        )
+    lines.append("")
+    for rec in recommendations:
+        lines.append(f"{rec['ddl']};")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Workload-driven index advisor")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="Analyze the workload log and print recommendations")
+    report.add_argument("--log", default=WORKLOAD_LOG_PATH, help="Workload JSONL path")
+    report.add_argument("--top", type=int, default=10)
+    report.add_argument("--min-count", type=int, default=1, help="Ignore statements seen fewer times")
+    report.add_argument("--validate", action="store_true", help="Check candidates with hypopg")
+    report.add_argument("--create", action="store_true", help="Create validated indexes")
+    report.add_argument("--json", action="store_true", help="Emit JSON instead of markdown")
+    args = parser.parse_args(argv)
+
+    from src.db.db_connection import get_db_connection
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        analyzed = analyze_workload(conn, cursor, args.log, args.min_count)
+        recommendations = rank_recommendations(analyzed, fetch_existing_indexes(cursor), args.top)
+        conn.rollback()
+        if args.validate or args.create:
+            validate_with_hypopg(conn, cursor, recommendations)
+        if args.create:
+            create_indexes(conn, recommendations)
+
+        if args.json:
+            print(json.dumps(recommendations, indent=2))
+        else:
+            print(format_report(recommendations, len(analyzed)))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
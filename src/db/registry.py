@@ -0,0 +1,245 @@
+"""
+Registry of the databases one process answers questions about.
+
+The database configured through the environment (DB_HOST, DB_NAME, ...,
+schema_summary.yaml and PARQUET_DIR) is "default". Others are listed in
+DATABASES_PATH:
+
+    databases:
+      eu:
+        host: eu-warehouse.internal
+        dbname: instacart
+        user: agent
+        password: ${EU_DB_PASSWORD}     # ${VAR} is read from the environment
+        schema_path: schemas/eu.yaml    # schema_summary.yaml format
+        parquet_dir: data/parquet/eu    # for the duckdb engine
+
+Omitted connection settings fall back to the DB_* variables. A database's
+schema, execution backends and connection pools are created on its first
+request and closed, together with its answer/plan/result cache entries, once
+it has been unused for DATABASE_IDLE_TTL_S or when more than
+MAX_OPEN_DATABASES are open. The compiled graph is shared by all databases:
+nodes reach the request's database through current_database(), which
+SQLAgent.query sets with use_database().
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config.settings import DATABASE_IDLE_TTL_S, DATABASES_PATH, MAX_OPEN_DATABASES
+
+
+DEFAULT_DATABASE = "default"
+
+
+class UnknownDatabaseError(ValueError):
+    """No database is configured under the requested id"""
+
+
+class Database:
+    """One configured database and the resources opened for it so far"""
+
+    def __init__(self, database_id: str, config: Dict[str, Any]):
+        self.id = database_id
+        self.config = config
+        self.in_use = 0  # Agents and exports currently holding it; never closed while > 0
+        self.last_used = time.monotonic()
+        self._schema = None
+        self._backends = {}
+        self._pools = {}
+        self._lock = threading.RLock()
+
+    @property
+    def schema(self) -> Dict[str, Any]:
+        if self._schema is None:
+            from src.utils.schema_utils import FULL_SCHEMA, load_schema
+
+            with self._lock:
+                if self._schema is None:
+                    path = self.config.get("schema_path")
+                    # The default database shares FULL_SCHEMA, which is hot-reloaded in place
+                    self._schema = load_schema(Path(path)) if path else FULL_SCHEMA
+        return self._schema
+
+    def backend(self, name: str):
+        backend = self._backends.get(name)
+        if backend is None:
+            from src.db.backends import create_backend
+
+            with self._lock:
+                backend = self._backends.get(name)
+                if backend is None:
+                    backend = self._backends[name] = create_backend(name, self.config)
+        return backend
+
+    def pool(self, name: str):
+        pool = self._pools.get(name)
+        if pool is None:
+            from src.db.backends import ConnectionPool
+
+            with self._lock:
+                pool = self._pools.get(name)
+                if pool is None:
+                    pool = self._pools[name] = ConnectionPool(self.backend(name))
+        return pool
+
+    def engines(self) -> List[str]:
+        """Engines whose backend has been opened"""
+        return sorted(self._backends)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_use": self.in_use,
+            "idle_s": round(time.monotonic() - self.last_used, 1),
+            "schema_loaded": self._schema is not None,
+            "backends": self.engines(),
+            "pooled_connections": {name: pool.opened for name, pool in self._pools.items()},
+        }
+
+    def close(self):
+        """Close pooled connections and engines and drop this database's cache entries"""
+        from src.db.change_tracking import CHANGE_TRACKER
+        from src.memory.cache import purge_database
+
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            for backend in self._backends.values():
+                backend.close()
+            self._pools.clear()
+            self._backends.clear()
+            self._schema = None
+        purge_database(self.id)
+        CHANGE_TRACKER.forget(self.id)
+
+
+def _expand(value: Any) -> Any:
+    return os.path.expandvars(value) if isinstance(value, str) else value
+
+
+def load_database_configs(path: str = DATABASES_PATH) -> Dict[str, Dict[str, Any]]:
+    """{database id: settings} from the registry file; {} when there is none"""
+    if not path or not Path(path).exists():
+        return {}
+    import yaml
+
+    with open(path, "r", encoding="utf-8") as f:
+        databases = (yaml.safe_load(f) or {}).get("databases") or {}
+    return {
+        str(database_id): {key: _expand(value) for key, value in (config or {}).items()}
+        for database_id, config in databases.items()
+    }
+
+
+class DatabaseRegistry:
+    """
+    Lazily opened databases by id. Opening one only records it; schema,
+    backends and pools are created when a request first needs them.
+    """
+
+    def __init__(self, configs: Optional[Dict[str, Dict[str, Any]]] = None,
+                 idle_ttl_s: float = DATABASE_IDLE_TTL_S, max_open: int = MAX_OPEN_DATABASES):
+        self.configs = {**(configs or {}), DEFAULT_DATABASE: {}}
+        self.idle_ttl_s = idle_ttl_s
+        self.max_open = max_open
+        self.default = Database(DEFAULT_DATABASE, {})
+        # database id -> Database, least recently used first
+        self._open: "OrderedDict[str, Database]" = OrderedDict({DEFAULT_DATABASE: self.default})
+        self._lock = threading.Lock()
+
+    def open(self, database_id: Optional[str] = None) -> Database:
+        """The database, marked in use until release()"""
+        database_id = database_id or DEFAULT_DATABASE
+        if database_id not in self.configs:
+            raise UnknownDatabaseError(f"Unknown database: {database_id}")
+        with self._lock:
+            database = self._open.get(database_id)
+            if database is None:
+                database = self._open[database_id] = Database(database_id, self.configs[database_id])
+                print(f"🗄️ Opened database {database_id}")
+            self._open.move_to_end(database_id)
+            database.in_use += 1
+            database.last_used = time.monotonic()
+        return database
+
+    def release(self, database: Database):
+        with self._lock:
+            database.in_use -= 1
+            database.last_used = time.monotonic()
+        self.evict_idle()
+
+    @contextmanager
+    def acquire(self, database_id: Optional[str] = None):
+        database = self.open(database_id)
+        try:
+            yield database
+        finally:
+            self.release(database)
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """Close databases idle for longer than idle_ttl_s, or beyond max_open; returns their ids"""
+        now = time.monotonic() if now is None else now
+        evicted = []
+        with self._lock:
+            excess = len(self._open) - self.max_open
+            for database in list(self._open.values()):
+                if database is self.default or database.in_use:
+                    continue
+                if now - database.last_used > self.idle_ttl_s or len(evicted) < excess:
+                    evicted.append(self._open.pop(database.id))
+        for database in evicted:
+            database.close()
+            print(f"🗄️ Closed idle database {database.id}")
+        return [database.id for database in evicted]
+
+    def databases(self) -> List[Database]:
+        """The open databases"""
+        with self._lock:
+            return list(self._open.values())
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {database.id: database.stats() for database in self.databases()}
+
+    def close(self):
+        with self._lock:
+            databases = list(self._open.values())
+            self._open = OrderedDict({DEFAULT_DATABASE: self.default})
+        for database in databases:
+            database.close()
+
+
+_registry: Optional[DatabaseRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> DatabaseRegistry:
+    """The process-wide registry, read from DATABASES_PATH on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = DatabaseRegistry(load_database_configs())
+    return _registry
+
+
+# Database of the request being answered; None means the default one
+_current_database: contextvars.ContextVar[Optional[Database]] = contextvars.ContextVar("database", default=None)
+
+
+def current_database() -> Database:
+    return _current_database.get() or get_registry().default
+
+
+@contextmanager
+def use_database(database: Database):
+    """Run the enclosed code (and the graph nodes it invokes) against `database`"""
+    token = _current_database.set(database)
+    try:
+        yield database
+    finally:
+        _current_database.reset(token)
@@ -0,0 +1,227 @@
+"""
+Process-wide caches for repeated questions.
+
+Four layers, from the most to the least work saved:
+
+- answer: normalized question + engine -> the full query() result
+- plan:   normalized question -> planned tables (skips the planner call)
+- result: backend + executed SQL -> columns/rows (skips the database)
+- llm:    model + prompt -> completion (temperature 0, so repeatable)
+
+Each layer is a bounded LRU with a TTL. Answers and results can be stamped
+with the versions of the tables they read (src.db.change_tracking): they are
+then dropped as soon as one of those tables changes and otherwise kept for
+TRACKED_CACHE_TTL_S. A schema reload clears everything. Answer,
+plan and result keys start with the id of the database they belong to
+(src.db.registry), so databases share the layers' size limits and a closed
+database's entries are purged. The
+warm-up job (src.memory.warmup) fills the layers for popular questions
+before users ask them.
+
+With SHARED_CACHE_PATH set, the answer, result and llm layers live in a
+file shared by all worker processes on the host (src.memory.shared_cache)
+instead of in each process.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from src.config.settings import (
+    ANSWER_CACHE_TTL_S,
+    CACHE_ENABLED,
+    CACHE_MAX_ENTRIES,
+    LLM_CACHE_TTL_S,
+    PLAN_CACHE_TTL_S,
+    RESULT_CACHE_TTL_S,
+    SHARED_CACHE_PATH,
+    TRACKED_CACHE_TTL_S,
+)
+from src.db.change_tracking import Stamp, is_current
+from src.db.registry import current_database
+from src.memory.few_shot import normalize_question
+from src.utils.sql_utils import sql_fingerprint
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store():
+    """The host-wide store, opened on first use; None without SHARED_CACHE_PATH"""
+    global _shared_store
+    if not SHARED_CACHE_PATH:
+        return None
+    if _shared_store is None:
+        from src.memory.shared_cache import SharedStore
+
+        with _shared_store_lock:
+            if _shared_store is None:
+                _shared_store = SharedStore(SHARED_CACHE_PATH)
+    return _shared_store
+
+
+class TTLCache:
+    """
+    Bounded LRU map whose entries expire ttl_s seconds after they were stored,
+    or TRACKED_CACHE_TTL_S for entries stamped with table versions, which are
+    dropped once those tables change. With a `shared` store, entries live
+    there instead of in this process.
+    """
+
+    def __init__(self, name: str, ttl_s: float, max_entries: int = CACHE_MAX_ENTRIES, optional: bool = True,
+                 shared=None):
+        self.name = name
+        self.optional = optional  # Off with CACHE_ENABLED=false (stores that aren't caches pass False)
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.shared = shared
+        # key -> (expires, value, stamp)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, Optional[Stamp]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "invalidated": 0, "shared_errors": 0}
+
+    def __len__(self):
+        if self.shared is not None:
+            return self._shared("count", default=0)
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if (self.optional and not CACHE_ENABLED) or self.ttl_s <= 0:
+            return None
+        if self.shared is not None:
+            value = self._current(key, self._shared("get", key))
+            with self._lock:
+                self.stats["hits" if value is not None else "misses"] += 1
+            return value
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.stats["misses"] += 1
+                return None
+        value = self._current(key, entry[1:])
+        with self._lock:
+            if value is None:
+                self.stats["misses"] += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def _shared(self, operation: str, *args, default=None):
+        """Call the shared store; its errors are misses / skipped writes, not failed requests"""
+        try:
+            return getattr(self.shared, operation)(self.name, *args)
+        except (sqlite3.Error, TypeError, ValueError) as e:  # Locked / corrupt file, value it can't encode or decode
+            with self._lock:
+                self.stats["shared_errors"] += 1
+            print(f"⚠️ Shared cache {self.name} {operation} failed: {str(e)[:100]}")
+            return default
+
+    def _current(self, key: Hashable, entry: Optional[Tuple[Any, Optional[Stamp]]]) -> Optional[Any]:
+        """Value of an unexpired (value, stamp) entry, unless its tables changed (then it's dropped)"""
+        if entry is None:
+            return None
+        value, stamp = entry
+        if stamp is None:
+            return value
+        current = is_current(stamp)
+        if current is False:
+            self.invalidate(key)
+            with self._lock:
+                self.stats["invalidated"] += 1
+        return value if current else None
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Unexpired, unchanged value without counting a hit or touching LRU order"""
+        if self.shared is not None:
+            return self._current(key, self._shared("get", key))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return self._current(key, entry[1:])
+
+    def put(self, key: Hashable, value: Any, stamp: Optional[Stamp] = None):
+        """Store a value; `stamp` ties it to the versions of the tables it was computed from"""
+        if (self.optional and not CACHE_ENABLED) or self.ttl_s <= 0:
+            return
+        ttl_s = max(self.ttl_s, TRACKED_CACHE_TTL_S) if stamp is not None else self.ttl_s
+        if self.shared is not None:
+            if self._shared("put", key, value, ttl_s, self.max_entries, stamp, default=False) is not False:
+                with self._lock:
+                    self.stats["stored"] += 1
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_s, value, stamp)
+            self._entries.move_to_end(key)
+            self.stats["stored"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        if self.shared is not None:
+            self._shared("delete", key)
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches; returns how many were dropped"""
+        if self.shared is not None:
+            return self._shared("delete_where", predicate, default=0)
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        if self.shared is not None:
+            self._shared("clear")
+        with self._lock:
+            self._entries.clear()
+
+
+ANSWER_CACHE = TTLCache("answer", ANSWER_CACHE_TTL_S, shared=get_shared_store())
+PLAN_CACHE = TTLCache("plan", PLAN_CACHE_TTL_S)
+RESULT_CACHE = TTLCache("result", RESULT_CACHE_TTL_S, shared=get_shared_store())
+LLM_CACHE = TTLCache("llm", LLM_CACHE_TTL_S, shared=get_shared_store())
+CACHES = {cache.name: cache for cache in (ANSWER_CACHE, PLAN_CACHE, RESULT_CACHE, LLM_CACHE)}
+
+
+def answer_key(question: str, engine: Optional[str], approximate: bool = False) -> Tuple[str, str, Optional[str], bool]:
+    return current_database().id, normalize_question(question), engine, approximate
+
+
+def plan_key(question: str) -> Tuple[str, str]:
+    return current_database().id, normalize_question(question)
+
+
+def result_key(backend: str, sql: str) -> Tuple[str, str, str]:
+    return current_database().id, backend, sql_fingerprint(sql)
+
+
+def llm_key(model: str, prompt: str) -> Tuple[str, str]:
+    return model, hashlib.md5(prompt.encode("utf-8")).hexdigest()
+
+
+def clear_caches():
+    """Drop every cached entry (schema reloads, tests)"""
+    for cache in CACHES.values():
+        cache.clear()
+
+
+def purge_database(database_id: str):
+    """Drop a database's answers, plans and results (it was closed)"""
+    for cache in (ANSWER_CACHE, PLAN_CACHE, RESULT_CACHE):
+        cache.invalidate_where(lambda key: key[0] == database_id)
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """Hits, misses, stores and invalidations are this process's; entries of shared caches are host-wide"""
+    return {name: {**cache.stats, "entries": len(cache)} for name, cache in CACHES.items()}
@@ -0,0 +1,200 @@
+"""
+Few-shot example store and retrieval index.
+
+Validated (question, SQL, tables) triples are appended to a JSONL store when
+validate_and_respond_node succeeds. A TF-IDF index over the questions returns
+the nearest examples with a single vectorized cosine similarity, and they are
+injected into the SQL generation prompt.
+
+The store is bounded: duplicates (same normalized question) replace the older
+entry, and the file is compacted to the most recent FEW_SHOT_MAX_EXAMPLES.
+"""
+import json
+import math
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.config.settings import (
+    FEW_SHOT_ENABLED,
+    FEW_SHOT_K,
+    FEW_SHOT_MAX_EXAMPLES,
+    FEW_SHOT_MIN_SIMILARITY,
+    FEW_SHOT_STORE_PATH,
+)
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "by", "do", "does", "for", "from", "how", "i", "in",
+    "is", "me", "of", "on", "or", "show", "the", "to", "what", "which", "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word unigrams and bigrams without stopwords"""
+    words = [w for w in TOKEN_PATTERN.findall(text.lower()) if w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(TOKEN_PATTERN.findall(question.lower()))
+
+
+class ExampleStore:
+    """Append-only JSONL store with an in-memory TF-IDF index"""
+
+    def __init__(self, path: str = FEW_SHOT_STORE_PATH, max_examples: int = FEW_SHOT_MAX_EXAMPLES):
+        self.path = Path(path)
+        self.max_examples = max_examples
+        self._lock = threading.Lock()
+        self._examples: Dict[str, Dict[str, Any]] = {}  # normalized question -> example
+        self._appended = 0
+        self._index = None  # (examples list, vocab, idf, matrix)
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    example = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                key = normalize_question(example.get("question", ""))
+                if key:
+                    self._examples.pop(key, None)  # later entries win, keep insertion order
+                    self._examples[key] = example
+        self._trim()
+
+    def _trim(self):
+        while len(self._examples) > self.max_examples:
+            self._examples.pop(next(iter(self._examples)))
+
+    def __len__(self):
+        return len(self._examples)
+
+    def add(self, question: str, sql: str, tables: Optional[List[str]] = None, **fields) -> bool:
+        """Record a validated example (with any extra fields). Returns False for an exact duplicate."""
+        key = normalize_question(question)
+        if not key or not sql:
+            return False
+        example = {"question": question, "sql": sql, "tables": tables or [], **fields}
+
+        with self._lock:
+            existing = self._examples.get(key)
+            if existing and existing["sql"] == sql:
+                return False
+            self._examples.pop(key, None)
+            self._examples[key] = example
+            self._trim()
+            self._index = None
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(example) + "\n")
+            self._appended += 1
+            # Rewrite the file every max_examples appends so it stays bounded
+            if self._appended >= self.max_examples:
+                self._compact()
+        return True
+
+    def remove(self, question: str) -> bool:
+        """Forget the example stored for a question"""
+        with self._lock:
+            if self._examples.pop(normalize_question(question), None) is None:
+                return False
+            self._index = None
+            self._compact()
+        return True
+
+    def _compact(self):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for example in self._examples.values():
+                f.write(json.dumps(example) + "\n")
+        tmp.replace(self.path)
+        self._appended = 0
+
+    def _build_index(self):
+        examples = list(self._examples.values())
+        docs = [Counter(tokenize(e["question"])) for e in examples]
+        doc_freq = Counter(term for doc in docs for term in doc)
+        vocab = {term: i for i, term in enumerate(doc_freq)}
+        idf = np.array(
+            [math.log((1 + len(docs)) / (1 + doc_freq[t])) + 1 for t in vocab],
+            dtype=np.float32,
+        )
+
+        matrix = np.zeros((len(docs), len(vocab)), dtype=np.float32)
+        for row, doc in enumerate(docs):
+            for term, count in doc.items():
+                matrix[row, vocab[term]] = count
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return examples, vocab, idf, matrix
+
+    def search(self, question: str, k: int = FEW_SHOT_K,
+               min_similarity: float = FEW_SHOT_MIN_SIMILARITY) -> List[Dict[str, Any]]:
+        """Top-k most similar stored examples by TF-IDF cosine similarity"""
+        with self._lock:
+            if not self._examples:
+                return []
+            if self._index is None:
+                self._index = self._build_index()
+            examples, vocab, idf, matrix = self._index
+
+        query = np.zeros(len(vocab), dtype=np.float32)
+        for term, count in Counter(tokenize(question)).items():
+            if term in vocab:
+                query[vocab[term]] = count
+        query *= idf
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        scores = matrix @ (query / norm)
+        k = min(k, len(examples))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**examples[i], "similarity": round(float(scores[i]), 3)}
+            for i in top
+            if scores[i] >= min_similarity
+        ]
+
+
+_store: Optional[ExampleStore] = None
+_store_lock = threading.Lock()
+
+
+def get_example_store() -> ExampleStore:
+    """Process-wide example store (loaded on first use)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ExampleStore()
+        return _store
+
+
+def record_example(question: str, sql: str, tables: Optional[List[str]] = None):
+    """Capture a validated example (never raises)"""
+    if not FEW_SHOT_ENABLED:
+        return
+    try:
+        get_example_store().add(question, sql, tables)
+    except OSError as e:
+        print(f"⚠️ Could not record few-shot example: {e}")
+
+
+def retrieve_examples(question: str, k: int = FEW_SHOT_K) -> List[Dict[str, Any]]:
+    """Nearest validated examples for the generation prompt"""
+    if not FEW_SHOT_ENABLED or k <= 0:
+        return []
+    return get_example_store().search(question, k)
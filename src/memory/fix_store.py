@@ -0,0 +1,75 @@
+"""
+Process-wide memory of successful corrections.
+
+When a request recovers after failed attempts, each failed attempt is keyed
+by (error signature, SQL fingerprint) and mapped to the SQL that finally
+validated. Correction nodes look the failing SQL up before calling the LLM,
+so the same failure seen again is fixed without a model round-trip.
+
+Keys include the failed SQL's fingerprint, not only the error signature: a
+fix is a concrete query, and "column ? does not exist" on one query says
+nothing about how to fix another.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from src.config.settings import FIX_STORE_ENABLED, FIX_STORE_MAX_ENTRIES
+from src.utils.sql_utils import error_signature, sql_fingerprint
+
+
+class FixStore:
+    """Bounded LRU map of (error signature, SQL fingerprint) -> fixed SQL"""
+
+    def __init__(self, max_entries: int = FIX_STORE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._fixes: "OrderedDict[tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+
+    def __len__(self):
+        return len(self._fixes)
+
+    def lookup(self, fingerprint: str, reason: str) -> Optional[str]:
+        key = (error_signature(reason), fingerprint)
+        with self._lock:
+            fix = self._fixes.get(key)
+            if fix is None:
+                self.stats["misses"] += 1
+                return None
+            self._fixes.move_to_end(key)
+            self.stats["hits"] += 1
+            return fix
+
+    def record(self, failed_attempts: Dict[str, str], fixed_sql: str):
+        """Map every failed attempt of a request to the SQL that succeeded"""
+        fixed_fingerprint = sql_fingerprint(fixed_sql)
+        with self._lock:
+            for fingerprint, reason in failed_attempts.items():
+                if fingerprint == fixed_fingerprint or not reason:
+                    continue
+                key = (error_signature(reason), fingerprint)
+                self._fixes[key] = fixed_sql
+                self._fixes.move_to_end(key)
+                self.stats["recorded"] += 1
+            while len(self._fixes) > self.max_entries:
+                self._fixes.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._fixes.clear()
+
+
+FIX_STORE = FixStore()
+
+
+def lookup_fix(fingerprint: str, reason: str) -> Optional[str]:
+    """Known fix for this failing SQL and error, if any"""
+    if not FIX_STORE_ENABLED or not reason:
+        return None
+    return FIX_STORE.lookup(fingerprint, reason)
+
+
+def record_fixes(failed_attempts: Optional[Dict[str, str]], fixed_sql: str):
+    if FIX_STORE_ENABLED and failed_attempts and fixed_sql:
+        FIX_STORE.record(failed_attempts, fixed_sql)
@@ -0,0 +1,294 @@
+"""
+Query templates: validated SQL generalized over the literals of its question.
+
+Many questions differ from an answered one only by a value: "top 5 vs top 10
+products", "products in the dairy vs bakery department", "orders on day 0
+vs day 6". When an answer is validated, the literals of its SQL that the
+question also mentions become typed slots:
+
+    "top 5 products in the dairy eggs department"
+    ... WHERE d.department = 'dairy eggs' ... LIMIT 5
+ -> question pattern "top {s1} products in the {s2} department"
+    SQL ... WHERE d.department = $2 ... LIMIT $1
+
+Only literals compared with a column or used as a LIMIT can be slots, and a
+value that occurs twice in the SQL or in the question stays a constant
+(which occurrence the question means would be a guess). Slots hold integers
+or lowercase / title-case words; the other literals are kept as written.
+
+A new question is matched against the nearest stored patterns (TF-IDF, like
+the few-shot store). A pattern that matches the whole normalized question
+fills the slots locally; otherwise, with QUERY_TEMPLATE_LLM_FILL on and a
+similar enough nearest template, one small LLM call fills them or says the
+question asks something else. A match skips planning and SQL generation:
+the filled SQL goes straight to validation and execution, where Postgres
+runs the template as a prepared statement (src.db.backends). An LLM-filled
+answer is always checked by the validation LLM (never the fast path), and a
+template whose answer fails validation is dropped.
+
+Templates are kept in a JSONL store keyed by question pattern, bounded to
+QUERY_TEMPLATE_MAX.
+"""
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config.settings import (
+    QUERY_TEMPLATE_CANDIDATES,
+    QUERY_TEMPLATE_LLM_FILL,
+    QUERY_TEMPLATE_LLM_MIN_SIMILARITY,
+    QUERY_TEMPLATE_MAX,
+    QUERY_TEMPLATE_STORE_PATH,
+    QUERY_TEMPLATES_ENABLED,
+)
+from src.memory.few_shot import ExampleStore, normalize_question
+
+
+SLOT_PATTERN = re.compile(r"\{(s\d+)\}")
+SLOT_REGEX = {
+    "int": r"\d+",
+    "text": r"[a-z0-9_]+(?: [a-z0-9_]+)*?",
+}
+LIKE_WILDCARDS = re.compile(r"^(%?)(.*?)(%?)$", re.DOTALL)
+CONJUNCTIONS = {"and", "or", "but"}  # A text slot holding one of these took in more than one value
+
+
+def _slot_literals(tree) -> List[Any]:
+    """Literals compared with a column or used as a LIMIT"""
+    from sqlglot import exp
+
+    comparisons = (exp.EQ, exp.NEQ, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Like, exp.ILike, exp.Between, exp.In)
+    literals = []
+    for literal in tree.find_all(exp.Literal, bfs=False):
+        parent = literal.parent
+        if isinstance(parent, exp.Limit) or (isinstance(parent, comparisons) and parent.find(exp.Column)):
+            literals.append(literal)
+    return literals
+
+
+def _slot_value(literal) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+    """(type, normalized value, slot settings) of a literal that can be a slot"""
+    from sqlglot import exp
+
+    if not literal.is_string:
+        text = literal.this
+        return ("int", text, {}) if text.isdigit() else None
+    prefix, core, suffix = LIKE_WILDCARDS.match(literal.this).groups()
+    if not isinstance(literal.parent, (exp.Like, exp.ILike)):
+        prefix, core, suffix = "", literal.this, ""
+    if core == core.lower():
+        case = "lower"
+    elif core == core.title():
+        case = "title"
+    else:
+        return None
+    # The value must survive question normalization to be recognized in other questions
+    if not core or normalize_question(core) != core.lower() or CONJUNCTIONS & set(core.lower().split()):
+        return None
+    return "text", core.lower(), {"case": case, "wrap": [prefix, suffix]}
+
+
+def _find_span(words: List[str], span: List[str]) -> List[int]:
+    return [i for i in range(len(words) - len(span) + 1) if words[i:i + len(span)] == span]
+
+
+def extract_template(question: str, sql: str) -> Optional[Dict[str, Any]]:
+    """Template of a validated (question, SQL) pair; None if no literal of the SQL is in the question"""
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+
+    from src.utils.sql_rewrite import referenced_tables
+
+    try:
+        statements = sqlglot.parse(sql, read="postgres")
+    except SqlglotError:
+        return None
+    if len(statements) != 1 or not isinstance(statements[0], (exp.Select, exp.SetOperation)):
+        return None
+    tree = statements[0]
+    if tree.find(exp.Parameter, exp.Placeholder):
+        return None
+
+    literals = _slot_literals(tree)
+    values: Dict[Tuple[str, str], List[Any]] = {}
+    for literal in literals:
+        value = _slot_value(literal)
+        if value is not None:
+            values.setdefault(value[:2], []).append((literal, value[2]))
+    slot_ids = {id(literal) for literal in literals}
+    for literal in tree.find_all(exp.Literal):
+        if id(literal) not in slot_ids:  # The same value used elsewhere as a constant
+            text = literal.this.lower() if literal.is_string else literal.this
+            values.pop(("text" if literal.is_string else "int", text), None)
+
+    words = normalize_question(question).split()
+    taken = [False] * len(words)
+    found = []  # (position in the question, span length, type, literal, settings)
+    for (kind, text), occurrences in values.items():
+        span = text.split()
+        positions = _find_span(words, span)
+        if len(occurrences) != 1 or len(positions) != 1:
+            continue
+        start = positions[0]
+        if any(taken[start:start + len(span)]):
+            continue
+        taken[start:start + len(span)] = [True] * len(span)
+        literal, settings = occurrences[0]
+        found.append((start, len(span), kind, literal, settings))
+    if not found:
+        return None
+
+    # Slots (and the parameters they bind) are numbered in question order
+    found.sort(key=lambda item: item[0])
+    slots, spans = [], {}
+    for number, (start, length, kind, literal, settings) in enumerate(found, 1):
+        name = f"s{number}"
+        slots.append({"name": name, "type": kind, **settings})
+        spans[start] = (length, name)
+        literal.replace(exp.Parameter(this=exp.Literal.number(number)))
+
+    pattern, i = [], 0
+    while i < len(words):
+        if i in spans:
+            length, name = spans[i]
+            pattern.append(f"{{{name}}}")
+            i += length
+        else:
+            pattern.append(words[i])
+            i += 1
+    return {
+        "question": " ".join(pattern),
+        "sql": tree.sql(dialect="postgres"),
+        "tables": sorted(referenced_tables(sql) or []),
+        "slots": slots,
+        "example": question,
+    }
+
+
+def _compiled(template: Dict[str, Any]) -> re.Pattern:
+    types = {slot["name"]: slot["type"] for slot in template["slots"]}
+    parts = []
+    for word in template["question"].split(" "):
+        slot = SLOT_PATTERN.fullmatch(word)
+        parts.append(f"(?P<{slot.group(1)}>{SLOT_REGEX[types[slot.group(1)]]})" if slot else re.escape(word))
+    return re.compile(" ".join(parts))
+
+
+def slot_params(template: Dict[str, Any], values: Dict[str, Any]) -> Optional[List[Any]]:
+    """Statement parameters ($1, $2, ...) for slot values; None if a value doesn't fit its slot"""
+    params = []
+    for slot in template["slots"]:
+        value = values.get(slot["name"])
+        if value is None:
+            return None
+        text = str(value).strip().lower()
+        if slot["type"] == "int":
+            if not text.isdigit():
+                return None
+            params.append(int(text))
+            continue
+        if not text or normalize_question(text) != text or CONJUNCTIONS & set(text.split()):
+            return None
+        prefix, suffix = slot["wrap"]
+        params.append(f"{prefix}{text.title() if slot['case'] == 'title' else text}{suffix}")
+    return params
+
+
+def render(template: Dict[str, Any], params: List[Any]) -> str:
+    """The template's SQL with its parameters written in as literals"""
+    import sqlglot
+    from sqlglot import exp
+
+    def fill(node):
+        if isinstance(node, exp.Parameter):
+            value = params[int(node.this.this) - 1]
+            return exp.Literal.number(value) if isinstance(value, int) else exp.Literal.string(value)
+        return node
+
+    return sqlglot.parse_one(template["sql"], read="postgres").transform(fill).sql(dialect="postgres")
+
+
+class TemplateStore(ExampleStore):
+    """Templates keyed by question pattern, searched like few-shot examples"""
+
+    def __init__(self, path: str = QUERY_TEMPLATE_STORE_PATH, max_examples: int = QUERY_TEMPLATE_MAX):
+        super().__init__(path, max_examples)
+        self._patterns: Dict[str, re.Pattern] = {}
+
+    def pattern(self, template: Dict[str, Any]) -> re.Pattern:
+        compiled = self._patterns.get(template["question"])
+        if compiled is None:
+            compiled = self._patterns[template["question"]] = _compiled(template)
+        return compiled
+
+
+_store: Optional[TemplateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_template_store() -> TemplateStore:
+    """Process-wide template store (loaded on first use)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TemplateStore()
+        return _store
+
+
+def _llm_fill(template: Dict[str, Any], question: str) -> Optional[Dict[str, Any]]:
+    """Slot values from one small LLM call; None if the question asks something else"""
+    from src.prompts.templates import build_template_fill_prompt
+    from src.utils.llm import call_llm
+
+    response = call_llm(build_template_fill_prompt(template, question))
+    try:
+        values = json.loads(response).get("values")
+    except (json.JSONDecodeError, AttributeError):
+        print(f"⚠️ Template fill failed to parse JSON: {response[:200]}")
+        return None
+    return values if isinstance(values, dict) else None
+
+
+def match_template(question: str) -> Optional[Tuple[Dict[str, Any], List[Any], str]]:
+    """(template, parameters, "pattern" | "llm") for a question a stored template answers"""
+    if not QUERY_TEMPLATES_ENABLED:
+        return None
+    store = get_template_store()
+    candidates = store.search(question, k=QUERY_TEMPLATE_CANDIDATES)
+    normalized = normalize_question(question)
+    for template in candidates:
+        match = store.pattern(template).fullmatch(normalized)
+        params = slot_params(template, match.groupdict()) if match else None
+        if params is not None:
+            return template, params, "pattern"
+    if QUERY_TEMPLATE_LLM_FILL and candidates and candidates[0]["similarity"] >= QUERY_TEMPLATE_LLM_MIN_SIMILARITY:
+        values = _llm_fill(candidates[0], question)
+        params = slot_params(candidates[0], values) if values else None
+        if params is not None:
+            return candidates[0], params, "llm"
+    return None
+
+
+def record_template(question: str, sql: str):
+    """Generalize a validated answer into a template (never raises)"""
+    if not QUERY_TEMPLATES_ENABLED:
+        return
+    template = extract_template(question, sql)
+    if template is None:
+        return
+    try:
+        get_template_store().add(template["question"], template["sql"], template["tables"],
+                                 slots=template["slots"], example=template["example"])
+    except OSError as e:
+        print(f"⚠️ Could not record query template: {e}")
+
+
+def reject_template(pattern: str):
+    """Drop the template of a question pattern whose filled SQL failed answer validation"""
+    try:
+        if get_template_store().remove(pattern):
+            print(f"🗑️ Query template dropped: {pattern}")
+    except OSError as e:
+        print(f"⚠️ Could not drop query template: {e}")
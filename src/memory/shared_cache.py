@@ -0,0 +1,184 @@
+"""
+Cache tier shared by the worker processes of one host.
+
+With several API workers (uvicorn --workers / gunicorn), process-wide caches
+hold the same answers, results and completions once per worker, and a
+question answered by one worker is a miss in the others. When
+SHARED_CACHE_PATH is set, the answer, result and LLM caches keep their
+entries in one SQLite file (WAL mode) instead: every worker reads what any
+worker stored, and entries live in the OS page cache once rather than in N
+Python heaps.
+
+Keys, entries and their table-version stamps are stored as JSON, never
+pickled: whoever can write the file can change cached answers, but not run
+code in the workers. Tuples, dicts and the database types of result rows
+(Decimal, dates, times, bytes, UUIDs) are tagged so that they read back as
+they were stored; values of other types are not shared (a skipped write).
+Entries expire like in-process ones (wall clock, since the monotonic clock
+is not shared between processes). Instead of LRU order, the oldest stored
+entries are dropped beyond max_entries, which saves a write per hit.
+
+The store is best-effort: TTLCache treats SQLite errors (a lock held past
+the timeout, a read-only or corrupt file) and entries it can't encode or
+decode as misses and skipped writes.
+"""
+import base64
+import datetime
+import decimal
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+SCHEMA = """
+drop table if exists entries;  -- Pickled entries of earlier versions
+create table if not exists cache_entries (
+    cache text not null,
+    key text not null,
+    expires real not null,
+    stored real not null,
+    value text not null,
+    stamp text,
+    primary key (cache, key)
+);
+create index if not exists cache_entries_stored on cache_entries (cache, stored);
+"""
+
+PRUNE_EVERY = 100  # Puts per process between expiry / size sweeps of every cache
+
+# JSON has lists, string-keyed objects and scalars; every other value is a one-key object naming its type
+ENCODERS = (
+    (tuple, "tuple", lambda v: _array(v)),
+    (dict, "dict", lambda v: "[" + ",".join(f"[{dumps(k)},{dumps(item)}]" for k, item in v.items()) + "]"),
+    (decimal.Decimal, "decimal", lambda v: json.dumps(str(v))),
+    (datetime.datetime, "datetime", lambda v: json.dumps(v.isoformat())),
+    (datetime.date, "date", lambda v: json.dumps(v.isoformat())),
+    (datetime.time, "time", lambda v: json.dumps(v.isoformat())),
+    (datetime.timedelta, "timedelta", lambda v: f"[{v.days},{v.seconds},{v.microseconds}]"),
+    (bytes, "bytes", lambda v: json.dumps(base64.b64encode(v).decode("ascii"))),
+    (uuid.UUID, "uuid", lambda v: json.dumps(str(v))),
+)
+DECODERS = {
+    "tuple": tuple,
+    "dict": lambda pairs: {k: v for k, v in pairs},
+    "decimal": decimal.Decimal,
+    "datetime": datetime.datetime.fromisoformat,
+    "date": datetime.date.fromisoformat,
+    "time": datetime.time.fromisoformat,
+    "timedelta": lambda parts: datetime.timedelta(*parts),
+    "bytes": base64.b64decode,
+    "uuid": uuid.UUID,
+}
+
+
+def _array(items) -> str:
+    return "[" + ",".join(map(dumps, items)) + "]"
+
+
+def _decode_object(obj: Dict[str, Any]) -> Any:
+    if len(obj) != 1 or next(iter(obj)) not in DECODERS:
+        raise ValueError("Not a shared cache entry")
+    tag, raw = next(iter(obj.items()))
+    return DECODERS[tag](raw)
+
+
+def dumps(value: Any) -> str:
+    """JSON of a key, entry or stamp (TypeError for values of other types)"""
+    # Written as text rather than through tagged copies of the value: no per-row objects are allocated
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return json.dumps(value)
+    if isinstance(value, list):
+        return _array(value)
+    for kind, tag, encode in ENCODERS:
+        if isinstance(value, kind):
+            return f'{{"{tag}":{encode(value)}}}'
+    raise TypeError(f"{type(value).__name__} values are not shared between processes")
+
+
+def loads(text: str) -> Any:
+    return json.loads(text, object_hook=_decode_object)
+
+
+class SharedStore:
+    """SQLite file holding the entries of several named caches"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # A new file is readable and writable by this user only (SQLite gives the WAL files the same mode)
+        self.path.touch(mode=0o600, exist_ok=True)
+        self._local = threading.local()
+        self._puts = 0
+        self._max_entries: Dict[str, int] = {}  # cache -> bound, for the caches this process stored into
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        # Cache keys are tuples of strings, booleans and None, whose JSON is stable across processes
+        return dumps(key)
+
+    def get(self, cache: str, key: Hashable) -> Optional[Tuple[Any, Any]]:
+        """(value, stamp) of an unexpired entry"""
+        row = self._connect().execute(
+            "select value, stamp from cache_entries where cache = ? and key = ? and expires >= ?",
+            (cache, self._key(key), time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return loads(row[0]), loads(row[1]) if row[1] is not None else None
+
+    def put(self, cache: str, key: Hashable, value: Any, ttl_s: float, max_entries: int, stamp: Any = None):
+        now = time.time()
+        self._connect().execute(
+            "insert or replace into cache_entries values (?, ?, ?, ?, ?, ?)",
+            (cache, self._key(key), now + ttl_s, now, dumps(value),
+             dumps(stamp) if stamp is not None else None),
+        )
+        with self._lock:
+            self._max_entries[cache] = max_entries
+            self._puts += 1
+            sweep = dict(self._max_entries) if self._puts % PRUNE_EVERY == 0 else {}
+        # Every cache, so that ones that rarely store are trimmed too
+        for name, bound in sweep.items():
+            self.prune(name, bound)
+
+    def prune(self, cache: str, max_entries: int):
+        conn = self._connect()
+        conn.execute("delete from cache_entries where cache = ? and expires < ?", (cache, time.time()))
+        conn.execute(
+            """delete from cache_entries where cache = ? and key in (
+                   select key from cache_entries where cache = ? order by stored desc limit -1 offset ?)""",
+            (cache, cache, max_entries),
+        )
+
+    def delete(self, cache: str, key: Hashable):
+        self._connect().execute("delete from cache_entries where cache = ? and key = ?", (cache, self._key(key)))
+
+    def delete_where(self, cache: str, predicate: Callable[[Hashable], bool]) -> int:
+        conn = self._connect()
+        keys = [row[0] for row in conn.execute("select key from cache_entries where cache = ?", (cache,))
+                if predicate(loads(row[0]))]
+        conn.executemany("delete from cache_entries where cache = ? and key = ?", [(cache, key) for key in keys])
+        return len(keys)
+
+    def clear(self, cache: str):
+        self._connect().execute("delete from cache_entries where cache = ?", (cache,))
+
+    def count(self, cache: str) -> int:
+        return self._connect().execute(
+            "select count(*) from cache_entries where cache = ? and expires >= ?", (cache, time.time())
+        ).fetchone()[0]
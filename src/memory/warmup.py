@@ -0,0 +1,229 @@
+"""
+Cache warm-up from the run log.
+
+Popular questions are the user runs answered in the last
+WARMUP_LOOKBACK_HOURS, grouped by normalized question (and database) and
+ranked by how often, then how recently, they were asked. For each one a
+warm-up cycle
+either:
+
+- re-runs the question through SQLAgent (source="warmup") when its answer
+  is not cached, filling the plan, LLM, result and answer caches, or
+- re-executes the cached answer's SQL (no LLM) to refresh the result
+  cache; the cached answer is kept if the rows are unchanged and dropped
+  otherwise, so the next request re-validates against fresh data
+
+A cycle stops at WARMUP_MAX_TOKENS LLM tokens or WARMUP_MAX_SECONDS. The API
+server runs cycles at batch priority and only while it is nearly idle
+(backend_server.app); warm-up runs are logged with source="warmup" and do
+not count towards popularity. With several workers sharing a cache
+(SHARED_CACHE_PATH), one of them runs the cycles (WarmupLock).
+
+Usage:
+    python -m src.memory.warmup list --top 20
+    python -m src.memory.warmup run --top 5
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config.settings import (
+    RUN_LOG_PATH,
+    WARMUP_LOCK_PATH,
+    WARMUP_LOOKBACK_HOURS,
+    WARMUP_MAX_SECONDS,
+    WARMUP_MAX_TOKENS,
+    WARMUP_TOP_QUESTIONS,
+)
+from src.db.registry import DEFAULT_DATABASE, get_registry, use_database
+from src.memory.cache import ANSWER_CACHE, RESULT_CACHE, answer_key, result_key
+
+
+def popular_questions(run_log_path: str = RUN_LOG_PATH, top: int = WARMUP_TOP_QUESTIONS,
+                      lookback_hours: float = WARMUP_LOOKBACK_HOURS) -> List[Dict[str, Any]]:
+    """Most frequently, then most recently, answered user questions with their latest SQL"""
+    from src.utils.run_log import connect
+
+    if not Path(run_log_path).exists():
+        return []
+    conn = connect(run_log_path)
+    try:
+        # Bare columns next to max(ts) come from the most recent run of each group
+        rows = conn.execute(
+            """select question, engine, coalesce(database, ?), final_sql, max(ts) as last_ts, count(*) as n
+               from runs
+               where source = 'user' and outcome = 'answered' and final_sql is not null and ts >= ?
+               group by question_key, engine, coalesce(database, ?)
+               order by n desc, last_ts desc
+               limit ?""",
+            (DEFAULT_DATABASE, time.time() - lookback_hours * 3600, DEFAULT_DATABASE, top),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [
+        {"question": question, "engine": engine, "database": database, "sql": sql, "last_ts": last_ts, "count": n}
+        for question, engine, database, sql, last_ts, n in rows
+    ]
+
+
+class CacheWarmer:
+    """One warm-up cycle over a list of popular questions, within token and time budgets"""
+
+    def __init__(self, agent=None, max_tokens: int = WARMUP_MAX_TOKENS,
+                 max_seconds: float = WARMUP_MAX_SECONDS):
+        # database id -> SQLAgent; a given agent answers for the default database
+        self._agents = {DEFAULT_DATABASE: agent} if agent is not None else {}
+        self._owns_agents = agent is None
+        self.max_tokens = max_tokens
+        self.deadline = time.monotonic() + max_seconds
+        self.stats = {"warmed": 0, "refreshed": 0, "changed": 0, "failed": 0, "tokens": 0}
+
+    def agent(self, database_id: str = DEFAULT_DATABASE):
+        if database_id not in self._agents:
+            from src.agent.agent import SQLAgent
+
+            self._agents[database_id] = SQLAgent(database=database_id)
+        return self._agents[database_id]
+
+    @property
+    def exhausted(self) -> bool:
+        return self.stats["tokens"] >= self.max_tokens or time.monotonic() >= self.deadline
+
+    def run_item(self, item: Dict[str, Any]):
+        """Refresh a cached answer's result, or warm an uncached question"""
+        database_id = item.get("database") or DEFAULT_DATABASE
+        try:
+            with get_registry().acquire(database_id) as database, use_database(database):
+                self._run_item(item, self.agent(database_id))
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"⚠️ Warm-up failed for {item['question'][:60]!r}: {str(e)[:100]}")
+
+    def _run_item(self, item: Dict[str, Any], agent):
+        if ANSWER_CACHE.peek(answer_key(item["question"], item["engine"])) is not None:
+            self._refresh(item, agent)
+        else:
+            result = agent.query(item["question"], engine=item["engine"], source="warmup")
+            self.stats["tokens"] += result["llm_usage"]["total_tokens"]
+            self.stats["warmed" if result["valid"] and result["executed"] else "failed"] += 1
+
+    def _refresh(self, item: Dict[str, Any], agent):
+        """Re-execute the cached answer's SQL into the result cache"""
+        from src.agent.nodes import execute_sql_node, rewrite_sql_node
+        from src.db.backends import resolve_engine
+        from src.db.change_tracking import CHANGE_TRACKER, stamp
+        from src.db.registry import current_database
+
+        key = answer_key(item["question"], item["engine"])
+        answer = ANSWER_CACHE.peek(key)
+        sql = answer.get("sql") or item["sql"]
+        engine = resolve_engine(item["engine"], sql)
+        conn, cursor = agent._session(engine)
+
+        state = rewrite_sql_node({"question": item["question"], "sql": sql, "engine": item["engine"]}, conn, cursor)
+        RESULT_CACHE.invalidate(result_key(engine, state["exec_sql"]))
+        database_id = current_database().id
+        versions = CHANGE_TRACKER.snapshot(database_id)
+        state = execute_sql_node(state, conn, cursor)
+        if not state["executed"]:
+            ANSWER_CACHE.invalidate(key)
+            self.stats["failed"] += 1
+            return
+        self.stats["refreshed"] += 1
+        if state["results"] == answer.get("results"):
+            # Same rows: the answer stays valid for another TTL, or until its tables change
+            ANSWER_CACHE.put(key, answer, stamp(database_id, engine, sql, versions))
+        else:
+            ANSWER_CACHE.invalidate(key)
+            self.stats["changed"] += 1
+
+    def close(self):
+        if self._owns_agents:
+            for agent in self._agents.values():
+                agent.close()
+        self._agents.clear()
+
+
+class WarmupLock:
+    """
+    Exclusive lock file marking the one worker process that warms the shared
+    cache. Held until the process exits, when the OS releases it for the
+    next worker that tries.
+    """
+
+    def __init__(self, path: str = WARMUP_LOCK_PATH):
+        self.path = Path(path)
+        self._file = None
+
+    def acquire(self) -> bool:
+        """True if this process holds the lock (without waiting for it)"""
+        if self._file is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+        print(f"🔥 Worker {os.getpid()} runs cache warm-up")
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def run_cycle(items: Optional[List[Dict[str, Any]]] = None, agent=None, **budget) -> Dict[str, int]:
+    """Warm or refresh the popular questions in this process, sequentially"""
+    items = popular_questions() if items is None else items
+    warmer = CacheWarmer(agent, **budget)
+    try:
+        for item in items:
+            if warmer.exhausted:
+                break
+            warmer.run_item(item)
+    finally:
+        warmer.close()
+    return warmer.stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Cache warm-up from the run log")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("list", "Show the questions a warm-up cycle would run"),
+                            ("run", "Run one warm-up cycle in this process")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument("--db", default=RUN_LOG_PATH)
+        command.add_argument("--top", type=int, default=WARMUP_TOP_QUESTIONS)
+        command.add_argument("--hours", type=float, default=WARMUP_LOOKBACK_HOURS)
+    args = parser.parse_args(argv)
+
+    items = popular_questions(args.db, args.top, args.hours)
+    if args.command == "list":
+        for item in items:
+            print(f"{item['count']:>5}  {item['database']:10}  {item['engine'] or '':8}  {item['question']}")
+        if not items:
+            print("(no answered questions in the run log)")
+        return
+    stats = run_cycle(items)
+    print(f"🔥 Warm-up: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,21 @@
 Prompt templates for the SQL agent
 """
 import json
-from typing import Dict, Any, List
-from src.utils.schema_utils import FULL_SCHEMA
+from typing import Dict, Any, List, Optional
+from src.utils.schema_utils import current_schema
 
 
 def build_planning_prompt(question: str) -> str:
     """Prompt for planning node to decide which tables are needed"""
-    available_tables = list(FULL_SCHEMA['tables'].keys())
-    table_descriptions = {
-        name: FULL_SCHEMA['tables'][name].get('description', 'No description')
-        for name in available_tables
-    }
+    full_schema = current_schema()
+    available_tables = list(full_schema['tables'].keys())
+    table_descriptions = {}
+    for name in available_tables:
+        table_info = full_schema['tables'][name]
+        description = table_info.get('description', 'No description')
+        if table_info.get('row_count'):
+            description += f" (~{table_info['row_count']:,} rows)"
+        table_descriptions[name] = description
     
     return f"""
 You are a database query planner. Analyze the user's question and decide which tables are needed.
@@ -43,8 +47,20 @@ JSON array of table names:
 """.strip()
 
 
-def build_optimized_prompt(question: str, schema: Dict[str, Any]) -> str:
-    """Optimized SQL generation prompt"""
+def format_examples(examples: List[Dict[str, Any]]) -> str:
+    """Render retrieved few-shot examples as question/SQL pairs"""
+    if not examples:
+        return ""
+    blocks = [f"Question: {e['question']}\nSQL: {e['sql']}" for e in examples]
+    return "Validated examples of similar questions:\n\n" + "\n\n".join(blocks) + "\n"
+
+
+def build_optimized_prompt(
+    question: str,
+    schema: Dict[str, Any],
+    examples: Optional[List[Dict[str, Any]]] = None
+) -> str:
+    """Optimized SQL generation prompt, with optional few-shot examples"""
     return f"""
 You are an expert PostgreSQL SQL generator.
 
@@ -54,11 +70,13 @@ CRITICAL RULES:
 - Use ONLY tables and columns from the schema
 - Follow join templates strictly
 - Never invent joins or columns
+- When filtering text columns, use the exact literals from a column's stats.common_values (respect their case)
 - Prefer correctness over brevity
 
 Database schema with semantics:
 {schema}
 
+{format_examples(examples)}
 User question:
 {question}
 
@@ -76,8 +94,7 @@ def build_optimized_correction_prompt(
     
     # Safety check
     if not isinstance(schema, dict):
-        from src.utils.schema_utils import FULL_SCHEMA
-        schema = FULL_SCHEMA
+        schema = current_schema()
     
     # Extract actual available columns SAFELY
     available_columns = []
@@ -127,15 +144,34 @@ Corrected SELECT query (using ONLY existing columns):
 def build_validation_and_response_prompt(
     question: str,
     sql: str,
-    results: list
+    results: list,
+    total_rows: Optional[int] = None,
+    truncated: bool = False,
+    total_rows_estimated: bool = False,
+    sample_percent: Optional[float] = None
 ) -> str:
     """
     Creates a prompt for LLM to:
     1. Validate if results answer the question
     2. Generate a natural language response
+    
+    `truncated` means execution stopped at the automatic row limit; total_rows
+    is then the full result size (exact or planner-estimated) if known.
+    `sample_percent` is set when the values were estimated from a sample.
     """
     sample_results = results[:10]
-    total_rows = len(results)
+    if not truncated:
+        total_rows = len(results)
+    elif total_rows is None:
+        total_rows = f"more than {len(results)}"
+    elif total_rows_estimated:
+        total_rows = f"approximately {total_rows:,}"
+    sample_note = ""
+    if sample_percent:
+        sample_note = (
+            f"\nThese values are estimates from a {sample_percent:g}% sample of the data, not exact figures.\n"
+            "Judge plausibility accordingly and present them as approximate (\"about 3.2 million\").\n"
+        )
     
     return f"""
 You are a SQL result validator and response generator.
@@ -160,7 +196,7 @@ SQL Query Executed:
 
 Results (showing {len(sample_results)} of {total_rows} total rows):
 {sample_results}
-
+{sample_note}
 Validation Checklist:
 1. Does the SQL query the correct tables/columns for this question?
 2. Do the returned values semantically match what was asked?
@@ -253,4 +289,177 @@ Failure reason:
 {error_reason}
 
 Generate ALTERNATIVE SQL approach:
-""".strip()
\ No newline at end of file
+""".strip()
+
+def build_follow_up_prompt(
+    question: str,
+    previous: Dict[str, Any],
+    schema: Dict[str, Any]
+) -> str:
+    """Rewrite a conversational follow-up as SQL over the previous result"""
+    sample_rows = [
+        dict(zip(previous["columns"], values))
+        for values in list(zip(*previous["data"].values()))[:5]
+    ]
+    return f"""
+You are an expert PostgreSQL SQL generator in a conversation about data.
+
+The user's previous question was answered. Its result is available as a
+table named `previous`.
+
+Previous question:
+{previous["question"]}
+
+Previous SQL:
+{previous["sql"]}
+
+Table `previous` has columns {previous["columns"]} and {previous["rows"]} rows, e.g.:
+{sample_rows}
+
+Database schema:
+{schema}
+
+New question:
+{question}
+
+Your task:
+1. Decide whether the new question refines the previous result (filter, sort,
+   aggregate, limit, or add a column to it) or is a new, unrelated question
+2. If it refines it, write ONE SQL SELECT query that reads FROM previous
+3. Prefer filtering, sorting or aggregating `previous` alone; join schema
+   tables to `previous` only when the question needs columns it doesn't have
+
+CRITICAL RULES:
+- Output ONLY valid JSON with two fields: "refines_previous" (boolean), "sql" (string)
+- The SQL must select FROM previous, never repeat the previous SQL
+- Use the exact literals seen in `previous` or in stats.common_values
+- For a new, unrelated question output {{"refines_previous": false, "sql": ""}}
+
+Example output:
+{{"refines_previous": true, "sql": "SELECT * FROM previous WHERE department = 'dairy eggs'"}}
+
+JSON:
+""".strip()
+
+
+def build_decomposition_prompt(
+    question: str,
+    schema: Dict[str, Any],
+    max_steps: int
+) -> str:
+    """Split a compound question into a dependency graph of sub-questions"""
+    return f"""
+You are a query decomposer for a PostgreSQL database. Compound questions
+are easier to answer correctly as a few small queries whose results are
+combined afterwards than as one large query with many joins.
+
+Database schema:
+{schema}
+
+User question:
+{question}
+
+Your task:
+1. Decide whether the question combines independent parts (e.g. "compare X
+   and Y", "X, and Y for those X"). If one simple query answers it, don't split it
+2. Otherwise split it into 2 to {max_steps} sub-questions, each answerable by
+   one simple SELECT over the schema
+3. Give each sub-question an id (s1, s2, ...), the exact output column names
+   it must return, and the ids of earlier sub-questions it needs (it can read
+   their results as tables named by their ids)
+4. Write merge_sql: ONE SELECT over the sub-question ids only (joined on
+   their shared columns) that produces the final answer
+
+CRITICAL RULES:
+- Output ONLY valid JSON with two fields: "steps" (array) and "merge_sql" (string)
+- Prefer independent sub-questions (empty depends_on); they run in parallel
+- Column names are lowercase snake_case and unique within a sub-question
+- If the question should not be split output {{"steps": [], "merge_sql": ""}}
+
+Example output:
+{{"steps": [
+  {{"id": "s1", "question": "Number of products in each department", "depends_on": [], "columns": ["department", "product_count"]}},
+  {{"id": "s2", "question": "Reorder rate of each department", "depends_on": [], "columns": ["department", "reorder_rate"]}}
+ ],
+ "merge_sql": "SELECT s1.department, s1.product_count, s2.reorder_rate FROM s1 JOIN s2 USING (department) ORDER BY s1.product_count DESC"}}
+
+JSON:
+""".strip()
+
+
+def build_sub_query_prompt(
+    question: str,
+    step: Dict[str, Any],
+    schema: Dict[str, Any],
+    dependencies: List[Dict[str, Any]]
+) -> str:
+    """SQL for one sub-question of a decomposed question"""
+    inputs = ""
+    if dependencies:
+        described = "\n".join(
+            f"- {d['id']} ({d['question']}): columns {d['columns']}, e.g. {d['sample']}"
+            for d in dependencies
+        )
+        inputs = f"""
+Results of earlier sub-questions, available as tables (read FROM them, don't recompute them):
+{described}
+"""
+    return f"""
+You are an expert PostgreSQL SQL generator answering one part of a larger question.
+
+CRITICAL RULES:
+- Output ONLY one SQL SELECT query
+- Do NOT include markdown, backticks, or explanations
+- Return exactly these columns, with these names, in this order: {step['columns']}
+- Use ONLY tables and columns from the schema (and the earlier results below)
+- When filtering text columns, use the exact literals from a column's stats.common_values (respect their case)
+
+Database schema with semantics:
+{schema}
+{inputs}
+Larger question (for context only):
+{question}
+
+Part to answer now:
+{step['question']}
+
+SQL:
+""".strip()
+
+
+def build_template_fill_prompt(template: Dict[str, Any], question: str) -> str:
+    """Slot values of a validated query template for a new question"""
+    slots = "\n".join(
+        f"- {slot['name']}: {'a whole number' if slot['type'] == 'int' else 'words from the question'}"
+        for slot in template["slots"]
+    )
+    return f"""
+A validated question pattern has slots written as {{s1}}, {{s2}}, ...
+
+Pattern:
+{template["question"]}
+
+Example it was learned from:
+{template["example"]}
+
+Slots:
+{slots}
+
+New question:
+{question}
+
+Your task: decide whether the new question asks exactly what the pattern
+asks, only with other slot values. If it does, give the value of every slot
+as it appears in the new question. If it asks anything more, less or
+different (other filters, columns, grouping or ordering), it does not match.
+
+CRITICAL RULES:
+- Output ONLY valid JSON with one field: "values" (object or null)
+- Numbers as digits ("ten" -> "10")
+- If the question does not match output {{"values": null}}
+
+Example output:
+{{"values": {{"s1": "10", "s2": "bakery"}}}}
+
+JSON:
+""".strip()
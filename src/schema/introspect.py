@@ -0,0 +1,306 @@
+"""
+Schema introspection with incremental refresh and column statistics.
+
+Regenerates the structural part of schema_summary.yaml (columns, keys) from
+information_schema and enriches it with row counts and pg_stats column
+statistics. The semantic layer (descriptions, hints, common_joins) is kept
+from the existing schema, since it is intentionally not autogenerated.
+
+Refreshes are incremental: a cheap catalog fingerprint is taken per table and
+only tables whose structure or statistics changed are re-introspected.
+
+Usage:
+    python -m src.schema.introspect refresh          # incremental, writes YAML
+    python -m src.schema.introspect refresh --full   # re-introspect every table
+"""
+import argparse
+import copy
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from src.config.settings import (
+    SCHEMA_REFRESH_INTERVAL_S,
+    SCHEMA_STATS_MAX_COMMON_VALUES,
+    SCHEMA_STATS_MAX_DISTINCT,
+)
+from src.utils.schema_utils import FULL_SCHEMA, SCHEMA_PATH, reload_schema
+
+
+CATALOG_STATE_PATH = SCHEMA_PATH.with_name("catalog_state.json")
+
+FINGERPRINT_SQL = """
+SELECT
+    c.table_name,
+    md5(string_agg(
+        c.column_name || ':' || c.data_type || ':' || c.is_nullable,
+        ',' ORDER BY c.ordinal_position
+    )) AS structure,
+    coalesce(greatest(s.last_analyze, s.last_autoanalyze)::text, '') AS analyzed_at
+FROM information_schema.columns c
+LEFT JOIN pg_stat_user_tables s
+  ON s.relname = c.table_name AND s.schemaname = c.table_schema
+WHERE c.table_schema = 'public'
+  AND c.table_name NOT LIKE '%\\_sample\\_%pct'  -- approximate-answer samples (src.agent.approximate)
+GROUP BY c.table_name, s.last_analyze, s.last_autoanalyze
+"""
+
+COLUMNS_SQL = """
+SELECT table_name, column_name, data_type, is_nullable, ordinal_position
+FROM information_schema.columns
+WHERE table_schema = 'public' AND table_name = ANY(%s)
+ORDER BY table_name, ordinal_position
+"""
+
+PRIMARY_KEYS_SQL = """
+SELECT tc.table_name, kcu.column_name
+FROM information_schema.table_constraints tc
+JOIN information_schema.key_column_usage kcu
+  ON tc.constraint_name = kcu.constraint_name
+WHERE tc.constraint_type = 'PRIMARY KEY'
+  AND tc.table_schema = 'public'
+  AND tc.table_name = ANY(%s)
+ORDER BY tc.table_name, kcu.ordinal_position
+"""
+
+FOREIGN_KEYS_SQL = """
+SELECT tc.table_name, kcu.column_name, ccu.table_name, ccu.column_name
+FROM information_schema.table_constraints tc
+JOIN information_schema.key_column_usage kcu
+  ON tc.constraint_name = kcu.constraint_name
+JOIN information_schema.constraint_column_usage ccu
+  ON ccu.constraint_name = tc.constraint_name
+WHERE tc.constraint_type = 'FOREIGN KEY'
+  AND tc.table_schema = 'public'
+  AND tc.table_name = ANY(%s)
+ORDER BY tc.table_name
+"""
+
+ROW_COUNTS_SQL = """
+SELECT c.relname, greatest(c.reltuples, coalesce(s.n_live_tup, 0))::bigint
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE n.nspname = 'public' AND c.relname = ANY(%s)
+"""
+
+COLUMN_STATS_SQL = """
+SELECT tablename, attname, n_distinct, null_frac, most_common_vals::text
+FROM pg_stats
+WHERE schemaname = 'public' AND tablename = ANY(%s)
+"""
+
+
+# ---------------------------
+# Catalog queries
+# ---------------------------
+
+def catalog_fingerprints(cursor) -> Dict[str, str]:
+    """One cheap query: table -> structure hash + last analyze time"""
+    cursor.execute(FINGERPRINT_SQL)
+    return {table: f"{structure}|{analyzed_at}" for table, structure, analyzed_at in cursor.fetchall()}
+
+
+def parse_pg_array(text: Optional[str]) -> List[str]:
+    """Parse a Postgres array literal such as {a,"b c",NULL} into strings"""
+    if not text or text[0] != "{":
+        return []
+    values, current, quoted, escaped, was_quoted = [], [], False, False, False
+    for ch in text[1:-1]:
+        if escaped:
+            current.append(ch)
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == '"':
+            quoted = not quoted
+            was_quoted = True
+        elif ch == "," and not quoted:
+            value = "".join(current)
+            if was_quoted or value != "NULL":
+                values.append(value)
+            current, was_quoted = [], False
+        else:
+            current.append(ch)
+    value = "".join(current)
+    if current or was_quoted:
+        if was_quoted or value != "NULL":
+            values.append(value)
+    return values
+
+
+def column_stats(n_distinct: float, null_frac: float, common_values: List[str],
+                 data_type: str, row_count: int) -> Dict[str, Any]:
+    """
+    Compact per-column statistics for the prompt. Common values are only kept
+    for low-cardinality text columns, where they tell the generator the exact
+    literals to use (e.g. department names are lowercase).
+    """
+    distinct = int(round(-n_distinct * row_count)) if n_distinct < 0 else int(n_distinct)
+    stats: Dict[str, Any] = {"distinct": distinct}
+    if null_frac:
+        stats["null_frac"] = round(float(null_frac), 4)
+
+    is_text = data_type in ("text", "character varying", "character")
+    if is_text and common_values and distinct <= SCHEMA_STATS_MAX_DISTINCT:
+        stats["common_values"] = common_values[:SCHEMA_STATS_MAX_COMMON_VALUES]
+        if all(v == v.lower() for v in common_values):
+            stats["case"] = "lowercase"
+    return stats
+
+
+def introspect_tables(cursor, tables: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Structural and statistical description of the given tables"""
+    result: Dict[str, Dict[str, Any]] = {}
+
+    cursor.execute(COLUMNS_SQL, (tables,))
+    for table, column, dtype, nullable, position in cursor.fetchall():
+        info = result.setdefault(table, {"columns": {}, "primary_key": [], "foreign_keys": []})
+        info["columns"][column] = {
+            "data_type": dtype,
+            "nullable": nullable == "YES",
+            "ordinal_position": position,
+        }
+
+    cursor.execute(PRIMARY_KEYS_SQL, (tables,))
+    for table, column in cursor.fetchall():
+        result[table]["primary_key"].append(column)
+
+    cursor.execute(FOREIGN_KEYS_SQL, (tables,))
+    for table, column, foreign_table, foreign_column in cursor.fetchall():
+        result[table]["foreign_keys"].append({
+            "column": column,
+            "references": {"table": foreign_table, "column": foreign_column},
+        })
+
+    cursor.execute(ROW_COUNTS_SQL, (tables,))
+    for table, row_count in cursor.fetchall():
+        if table in result:
+            result[table]["row_count"] = int(row_count)
+
+    cursor.execute(COLUMN_STATS_SQL, (tables,))
+    for table, column, n_distinct, null_frac, common_vals in cursor.fetchall():
+        col = result.get(table, {}).get("columns", {}).get(column)
+        if col is None:
+            continue
+        col["stats"] = column_stats(
+            n_distinct or 0, null_frac or 0, parse_pg_array(common_vals),
+            col["data_type"], result[table].get("row_count", 0)
+        )
+
+    return result
+
+
+# ---------------------------
+# Merge and refresh
+# ---------------------------
+
+def merge_table(fresh: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Carry hand-written descriptions over to freshly introspected table info"""
+    if not previous:
+        return fresh
+    if "description" in previous:
+        fresh["description"] = previous["description"]
+    for name, column in fresh["columns"].items():
+        old = previous.get("columns", {}).get(name, {})
+        if "description" in old:
+            column["description"] = old["description"]
+    return fresh
+
+
+def _load_catalog_state() -> Dict[str, str]:
+    try:
+        return json.loads(CATALOG_STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def refresh_schema(cursor, full: bool = False, write: bool = True) -> List[str]:
+    """
+    Diff catalog fingerprints against the last refresh, re-introspect changed
+    tables and hot-reload FULL_SCHEMA in place. Returns the changed tables.
+    """
+    current = catalog_fingerprints(cursor)
+    previous = {} if full else _load_catalog_state()
+
+    changed = sorted(t for t, fp in current.items() if previous.get(t) != fp)
+    dropped = sorted(set(FULL_SCHEMA.get("tables", {})) - set(current))
+    if not changed and not dropped:
+        print("✅ Schema up to date")
+        return []
+
+    schema = copy.deepcopy(FULL_SCHEMA)
+    fresh = introspect_tables(cursor, changed) if changed else {}
+    for table in changed:
+        if table in fresh:
+            schema["tables"][table] = merge_table(fresh[table], schema["tables"].get(table))
+    for table in dropped:
+        schema["tables"].pop(table, None)
+
+    reload_schema(schema)
+    print(f"🔄 Schema refreshed: {len(changed)} changed, {len(dropped)} dropped")
+
+    if write:
+        with open(SCHEMA_PATH, "w", encoding="utf-8") as f:
+            yaml.dump(schema, f, sort_keys=False, allow_unicode=True)
+        CATALOG_STATE_PATH.write_text(json.dumps(current, indent=2), encoding="utf-8")
+
+    return changed + dropped
+
+
+def start_schema_refresher(interval_s: float = SCHEMA_REFRESH_INTERVAL_S) -> Optional[threading.Thread]:
+    """
+    Background thread that refreshes the schema every interval_s seconds on
+    its own connection. Disabled when interval_s <= 0.
+    """
+    if interval_s <= 0:
+        return None
+
+    stop = threading.Event()
+
+    def loop():
+        from src.db.db_connection import get_db_connection
+
+        while not stop.wait(interval_s):
+            conn = None
+            try:
+                conn = get_db_connection()
+                with conn.cursor() as cursor:
+                    refresh_schema(cursor)
+                conn.rollback()
+            except Exception as e:
+                print(f"⚠️ Schema refresh failed: {str(e)[:100]}")
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    thread = threading.Thread(target=loop, name="schema-refresher", daemon=True)
+    thread.stop = stop
+    thread.start()
+    return thread
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Regenerate schema_summary.yaml from the database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    refresh = sub.add_parser("refresh", help="Refresh changed tables")
+    refresh.add_argument("--full", action="store_true", help="Ignore saved catalog state")
+    refresh.add_argument("--dry-run", action="store_true", help="Don't write the YAML file")
+    args = parser.parse_args(argv)
+
+    from src.db.db_connection import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            changed = refresh_schema(cursor, full=args.full, write=not args.dry_run)
+        for table in changed:
+            print(f"  - {table}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
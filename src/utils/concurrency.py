@@ -0,0 +1,129 @@
+"""
+Process-wide concurrency limits for LLM calls and DB executions.
+
+- ConcurrencyLimiter caps in-flight calls with a semaphore and tracks usage
+- TokenBucket paces requests/tokens to stay under the provider's rate limits
+
+call_llm() and execute_sql_node() go through LLM_LIMITER / DB_LIMITER, so the
+limits hold no matter how many agents or API requests run in parallel.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from src.config.settings import (
+    LIMITER_ACQUIRE_TIMEOUT_S,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    MAX_CONCURRENT_DB_QUERIES,
+    MAX_CONCURRENT_LLM_CALLS,
+)
+
+
+class LimiterTimeout(RuntimeError):
+    """Raised when a slot or rate budget can't be acquired in time"""
+
+
+class TokenBucket:
+    """Continuous-refill token bucket; capacity is the per-minute budget"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def acquire(self, amount: float = 1.0, timeout: float = LIMITER_ACQUIRE_TIMEOUT_S):
+        """Block until `amount` tokens are available (amount is capped at capacity)"""
+        amount = min(amount, self.capacity)
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = max(self._paused_until - now, (amount - self._tokens) / self.rate)
+            if now + wait > deadline:
+                raise LimiterTimeout(f"Rate budget unavailable for {wait:.1f}s")
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, delta: float):
+        """Correct an estimate after the fact (positive delta = more was used)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= delta
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens, e.g. after the provider returned 429"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class ConcurrencyLimiter:
+    """Bounded number of concurrent calls, with optional rate buckets"""
+
+    def __init__(self, name: str, max_concurrent: int,
+                 requests: Optional[TokenBucket] = None, tokens: Optional[TokenBucket] = None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.requests = requests
+        self.tokens = tokens
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def pause(self, seconds: float):
+        """Pause the rate buckets, e.g. after the provider returned 429"""
+        for bucket in (self.requests, self.tokens):
+            if bucket:
+                bucket.pause(seconds)
+
+    @contextmanager
+    def slot(self, estimated_tokens: float = 0, timeout: float = LIMITER_ACQUIRE_TIMEOUT_S):
+        if self.requests:
+            self.requests.acquire(1, timeout)
+        if self.tokens and estimated_tokens:
+            self.tokens.acquire(estimated_tokens, timeout)
+        if not self._semaphore.acquire(timeout=timeout):
+            raise LimiterTimeout(f"No free {self.name} slot after {timeout}s")
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._semaphore.release()
+
+
+def estimate_tokens(prompt: str, expected_output: int = 300) -> int:
+    """Cheap prompt size estimate (~4 characters per token) plus expected output"""
+    return len(prompt) // 4 + expected_output
+
+
+LLM_LIMITER = ConcurrencyLimiter(
+    "llm",
+    MAX_CONCURRENT_LLM_CALLS,
+    requests=TokenBucket(LLM_REQUESTS_PER_MINUTE),
+    tokens=TokenBucket(LLM_TOKENS_PER_MINUTE),
+)
+DB_LIMITER = ConcurrencyLimiter("db", MAX_CONCURRENT_DB_QUERIES)
@@ -1,22 +1,78 @@
 """
 LLM configuration and utilities
 """
+import contextvars
 import os
-from langchain_openai import ChatOpenAI
-from src.config.settings import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from src.config.settings import DEFAULT_MODEL, DEFAULT_TEMPERATURE, LLM_BASE_URL
+from src.memory.cache import LLM_CACHE, llm_key
+from src.utils.concurrency import LLM_LIMITER, estimate_tokens
 
 
+# Token usage of the current request (see track_usage); shared by the node threads it spawns
+_usage: contextvars.ContextVar = contextvars.ContextVar("llm_usage", default=None)
+_usage_lock = threading.Lock()
+
+
+@contextmanager
+def track_usage():
+    """Accumulate LLM calls and tokens made inside the block (including threads started with its context)"""
+    usage = {"calls": 0, "cached_calls": 0, "input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+@lru_cache(maxsize=None)
 def load_llm(model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE):
-    """Initialize OpenAI LLM"""
+    """Initialize OpenAI LLM (imported and created once per model/temperature)"""
+    from langchain_openai import ChatOpenAI
+
     return ChatOpenAI(
         model=model,
         temperature=temperature,
-        openai_api_key=os.getenv("OPENAI_API_KEY")
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=LLM_BASE_URL
     )
 
 
 def call_llm(prompt: str, model: str = DEFAULT_MODEL) -> str:
-    """Call LLM with prompt and return response"""
+    """Call LLM with prompt and return response (within the global LLM limits)"""
+    cache_key = llm_key(model, prompt)
+    cached = LLM_CACHE.get(cache_key)
+    if cached is not None:
+        tracked = _usage.get()
+        if tracked is not None:
+            with _usage_lock:
+                tracked["cached_calls"] += 1
+        return cached
+
     llm = load_llm(model=model)
-    response = llm.invoke(prompt)
-    return response.content.strip()
\ No newline at end of file
+    from openai import RateLimitError  # already imported by langchain_openai
+
+    estimated = estimate_tokens(prompt)
+    try:
+        with LLM_LIMITER.slot(estimated):
+            response = llm.invoke(prompt)
+    except RateLimitError as e:
+        # Back off every caller in the process, not just this one
+        retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+        LLM_LIMITER.pause(float(retry_after) if retry_after and retry_after.isdigit() else 10.0)
+        raise
+
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("total_tokens"):
+        LLM_LIMITER.tokens.adjust(usage["total_tokens"] - estimated)
+    tracked = _usage.get()
+    if tracked is not None:
+        with _usage_lock:
+            tracked["calls"] += 1
+            for key in ("input_tokens", "output_tokens", "total_tokens"):
+                tracked[key] += usage.get(key, 0)
+    content = response.content.strip()
+    LLM_CACHE.put(cache_key, content)
+    return content
\ No newline at end of file
@@ -0,0 +1,313 @@
+"""
+On-demand profiling of agent requests.
+
+Profiling is off until an admin arms it (POST /admin/profiling) for the next
+N requests, optionally only those whose question matches a pattern. Each
+captured request, one at a time, gets:
+
+- <id>.prof        cProfile stats of the request thread (pstats, snakeviz)
+- <id>.folded      sampled stacks in collapsed format, one line per stack,
+                   rooted at the graph node that was running
+                   (flamegraph.pl, speedscope, inferno)
+- <id>.tracemalloc allocation snapshot at the end of the request
+                   (tracemalloc.Snapshot.load), when memory capture is on
+- <id>.json        summary: per-node wall time and allocations, time spent
+                   outside nodes (LangGraph and agent overhead), top
+                   functions and top allocation sites
+
+Files are written to PROFILE_DIR and downloaded from
+/admin/profiling/captures/{id}/{kind}. Work in other threads (decomposed
+sub-queries, the run log writer) is not profiled; it shows up as waiting.
+
+When nothing is armed, profile_request and profile_node cost one global and
+one context variable read per request and node.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config.settings import (
+    PROFILE_DIR,
+    PROFILE_MAX_CAPTURES,
+    PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_TRACEMALLOC_FRAMES,
+)
+
+
+CAPTURE_FILES = {
+    "prof": "application/octet-stream",
+    "folded": "text/plain",
+    "tracemalloc": "application/octet-stream",
+    "json": "application/json",
+}
+MAX_STACK_DEPTH = 128
+TOP_ENTRIES = 25
+
+_current_capture: contextvars.ContextVar = contextvars.ContextVar("profile_capture", default=None)
+_armed: Optional[Dict[str, Any]] = None  # What to capture next; None = profiling off
+_lock = threading.Lock()
+_capturing = False  # cProfile and tracemalloc are process-wide: one capture at a time
+
+
+class ProfilingError(ValueError):
+    """Invalid arming request or unknown capture"""
+
+
+def arm(requests: int = 1, pattern: Optional[str] = None, memory: bool = True,
+        interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS) -> Dict[str, Any]:
+    """Capture the next `requests` requests (whose question matches `pattern`, if given)"""
+    global _armed
+    if requests < 1:
+        raise ProfilingError("requests must be at least 1")
+    try:
+        compiled = re.compile(pattern, re.IGNORECASE) if pattern else None
+    except re.error as e:
+        raise ProfilingError(f"Invalid pattern: {e}")
+    with _lock:
+        _armed = {
+            "remaining": requests,
+            "pattern": compiled,
+            "memory": memory,
+            "interval_s": max(interval_ms, 1) / 1000,
+        }
+    print(f"🔬 Profiling armed for {requests} request(s)" + (f" matching {pattern!r}" if pattern else ""))
+    return status()
+
+
+def disarm() -> Dict[str, Any]:
+    global _armed
+    with _lock:
+        _armed = None
+    return status()
+
+
+def status() -> Dict[str, Any]:
+    armed = _armed
+    return {
+        "armed": armed is not None,
+        "remaining": armed["remaining"] if armed else 0,
+        "pattern": armed["pattern"].pattern if armed and armed["pattern"] else None,
+        "memory": armed["memory"] if armed else None,
+        "capturing": _capturing,
+    }
+
+
+def _claim(question: str) -> Optional[Dict[str, Any]]:
+    """Settings for a capture of this request, counting it against the armed budget"""
+    global _armed, _capturing
+    with _lock:
+        armed = _armed
+        if armed is None or _capturing:
+            return None
+        if armed["pattern"] is not None and not armed["pattern"].search(question):
+            return None
+        armed["remaining"] -= 1
+        if armed["remaining"] <= 0:
+            _armed = None
+        _capturing = True
+        return armed
+
+
+class _Sampler(threading.Thread):
+    """Collapsed stacks of one thread, prefixed with the node it was running"""
+
+    def __init__(self, capture: "Capture", interval_s: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.capture = capture
+        self.interval_s = interval_s
+        self.target = threading.get_ident()
+        self.stacks: Counter = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval_s):
+            frame = sys._current_frames().get(self.target)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None and len(names) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            names.append(f"node:{self.capture.node}" if self.capture.node else "outside nodes")
+            self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class Capture:
+    """Profile of one request"""
+
+    def __init__(self, question: str, settings: Dict[str, Any]):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.question = question
+        self.memory = settings["memory"]
+        self.node: Optional[str] = None
+        self.nodes: List[Dict[str, Any]] = []
+        self.profile = cProfile.Profile()
+        self.sampler = _Sampler(self, settings["interval_s"])
+        self._started_tracemalloc = False
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self.start_time = time.perf_counter()
+        self.sampler.start()
+        self.profile.enable()
+
+    @contextmanager
+    def node_scope(self, name: str):
+        self.node = name
+        memory = tracemalloc.is_tracing()
+        if memory:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = {"node": name, "ms": round((time.perf_counter() - start) * 1000, 3)}
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                entry["allocated_kb"] = round((current - before) / 1024, 1)
+                entry["peak_kb"] = round((peak - before) / 1024, 1)
+            self.nodes.append(entry)
+            self.node = None
+
+    def finish(self, directory: Path) -> Dict[str, Any]:
+        self.profile.disable()
+        duration_ms = (time.perf_counter() - self.start_time) * 1000
+        self.sampler.stop()
+        snapshot = None
+        if self._started_tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+        directory.mkdir(parents=True, exist_ok=True)
+        base = directory / self.id
+        self.profile.dump_stats(f"{base}.prof")
+        with open(f"{base}.folded", "w", encoding="utf-8") as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        files = ["prof", "folded", "json"]
+        top_allocations = []
+        if snapshot is not None:
+            snapshot.dump(f"{base}.tracemalloc")
+            files.append("tracemalloc")
+            for stat in snapshot.statistics("lineno")[:TOP_ENTRIES]:
+                frame = stat.traceback[0]
+                top_allocations.append({
+                    "site": f"{frame.filename}:{frame.lineno}",
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count": stat.count,
+                })
+
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        top_functions = []
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in sorted(
+                stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_ENTRIES]:
+            top_functions.append({
+                "function": f"{function} ({Path(filename).name}:{line})",
+                "calls": calls,
+                "own_ms": round(tottime * 1000, 3),
+                "cumulative_ms": round(cumtime * 1000, 3),
+            })
+
+        node_ms = sum(entry["ms"] for entry in self.nodes)
+        summary = {
+            "id": self.id,
+            "question": self.question,
+            "duration_ms": round(duration_ms, 3),
+            "nodes": self.nodes,
+            "outside_nodes_ms": round(duration_ms - node_ms, 3),
+            "samples": sum(self.sampler.stacks.values()),
+            "top_functions": top_functions,
+            "top_allocations": top_allocations,
+            "files": files,
+        }
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+def _prune(directory: Path):
+    """Keep the newest PROFILE_MAX_CAPTURES captures"""
+    summaries = sorted(directory.glob("*.json"))
+    for old in summaries[:max(len(summaries) - PROFILE_MAX_CAPTURES, 0)]:
+        for kind in CAPTURE_FILES:
+            old.with_suffix(f".{kind}").unlink(missing_ok=True)
+
+
+@contextmanager
+def profile_request(question: str, directory: str = PROFILE_DIR):
+    """Profile the enclosed request if profiling is armed for it; yields the Capture or None"""
+    global _capturing
+    if _armed is None:
+        yield None
+        return
+    settings = _claim(question)
+    if settings is None:
+        yield None
+        return
+    capture = Capture(question, settings)
+    token = _current_capture.set(capture)
+    try:
+        capture.start()
+        yield capture
+    finally:
+        _current_capture.reset(token)
+        try:
+            summary = capture.finish(Path(directory))
+            _prune(Path(directory))
+            print(f"🔬 Profile {capture.id}: {summary['duration_ms']:.0f} ms, "
+                  f"{summary['outside_nodes_ms']:.0f} ms outside nodes")
+        finally:
+            with _lock:
+                _capturing = False
+
+
+@contextmanager
+def profile_node(name: str):
+    """Per-node scope inside a captured request (no-op otherwise)"""
+    capture = _current_capture.get()
+    if capture is None:
+        yield
+        return
+    with capture.node_scope(name):
+        yield
+
+
+def list_captures(directory: str = PROFILE_DIR) -> List[Dict[str, Any]]:
+    """Summaries of the kept captures, newest first (without the top lists)"""
+    captures = []
+    for path in sorted(Path(directory).glob("*.json"), reverse=True):
+        with open(path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+        captures.append({key: summary[key] for key in ("id", "question", "duration_ms",
+                                                       "outside_nodes_ms", "files")})
+    return captures
+
+
+def capture_path(capture_id: str, kind: str, directory: str = PROFILE_DIR) -> Path:
+    """File of one capture; ProfilingError if it doesn't exist"""
+    if kind not in CAPTURE_FILES or not re.fullmatch(r"[\w-]+", capture_id):
+        raise ProfilingError(f"Unknown capture file: {capture_id}.{kind}")
+    path = Path(directory) / f"{capture_id}.{kind}"
+    if not path.exists():
+        raise ProfilingError(f"Unknown capture file: {capture_id}.{kind}")
+    return path
@@ -0,0 +1,501 @@
+"""
+Persistent run log: one structured record per SQLAgent.query in SQLite.
+
+Each run stores the question, planned tables, outcome, row count, LLM
+tokens and total time, plus two child tables:
+
+- node_timings: every node the graph visited, in order, with its duration
+                and the LLM tokens spent while it ran
+- attempts:     every candidate SQL with the strategy that produced it and
+                how it ended (invalid, duplicate, execution_error,
+                wrong_answer, answered) and the error
+
+Requests only append to an in-memory record and hand it to a bounded queue
+(dropped when full); a background thread writes batches in one
+transaction, so the request thread never waits on SQLite.
+
+Usage:
+    python -m src.utils.run_log slowest --top 10
+    python -m src.utils.run_log failures
+    python -m src.utils.run_log repeats --min-count 3
+    python -m src.utils.run_log follow_ups
+    python -m src.utils.run_log nodes
+"""
+import argparse
+import contextvars
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config.settings import (
+    RUN_LOG_BATCH_SIZE,
+    RUN_LOG_ENABLED,
+    RUN_LOG_FLUSH_INTERVAL_S,
+    RUN_LOG_PATH,
+    RUN_LOG_QUEUE_SIZE,
+)
+from src.db.registry import current_database
+from src.memory.few_shot import normalize_question
+
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar("current_run", default=None)
+_run_log = None
+_run_log_lock = threading.Lock()
+
+SCHEMA = """
+create table if not exists runs (
+    run_id text primary key,
+    ts real not null,
+    question text not null,
+    question_key text not null,
+    source text,
+    engine text,
+    outcome text not null,
+    failure_type text,
+    planned_tables text,
+    final_sql text,
+    rows integer,
+    total_rows integer,
+    attempts integer,
+    fast_path integer,
+    cached integer,
+    follow_up text,
+    speculation text,
+    llm_calls integer,
+    input_tokens integer,
+    output_tokens integer,
+    total_tokens integer,
+    duration_ms real,
+    error text,
+    database text
+);
+create table if not exists node_timings (
+    run_id text not null,
+    seq integer not null,
+    node text not null,
+    duration_ms real not null,
+    tokens integer not null
+);
+create table if not exists attempts (
+    run_id text not null,
+    seq integer not null,
+    strategy text,
+    sql text,
+    status text not null,
+    error text,
+    rows integer,
+    exec_ms real
+);
+create index if not exists runs_question_key on runs (question_key);
+create index if not exists node_timings_run on node_timings (run_id);
+create index if not exists attempts_run on attempts (run_id);
+"""
+
+# Columns added to runs after the first release, created in logs that predate them
+ADDED_COLUMNS = [
+    ("source", "text"),  # Cache warm-up
+    ("cached", "integer"),
+    ("follow_up", "text"),  # Session follow-ups
+    ("database", "text"),  # Database registry
+]
+RUN_COLUMNS = (
+    "run_id", "ts", "question", "question_key", "source", "engine", "outcome", "failure_type",
+    "planned_tables", "final_sql", "rows", "total_rows", "attempts", "fast_path", "cached", "follow_up",
+    "speculation", "llm_calls", "input_tokens", "output_tokens", "total_tokens", "duration_ms", "error",
+    "database",
+)
+
+
+def connect(path: str = RUN_LOG_PATH) -> sqlite3.Connection:
+    """Open (and create) the run log database"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    existing = {row[1] for row in conn.execute("pragma table_info(runs)")}
+    for column, kind in ADDED_COLUMNS:
+        if column not in existing:
+            conn.execute(f"alter table runs add column {column} {kind}")
+    return conn
+
+
+# ---------------------------
+# Recording
+# ---------------------------
+
+class RunRecord:
+    """What one request did, filled in by the graph's node wrappers"""
+
+    __slots__ = ("run_id", "question", "source", "engine", "database", "llm_usage", "start", "ts",
+                 "nodes", "attempts", "last_node", "last_tokens", "state", "cached")
+
+    def __init__(self, question: str, engine: Optional[str], llm_usage: Optional[Dict[str, int]],
+                 source: str = "user"):
+        self.run_id = uuid.uuid4().hex
+        self.question = question
+        self.source = source
+        self.engine = engine
+        self.database = current_database().id
+        self.llm_usage = llm_usage
+        self.start = time.perf_counter()
+        self.ts = time.time()
+        self.nodes: List[Dict[str, Any]] = []
+        self.attempts: List[Dict[str, Any]] = []
+        self.last_node: Optional[str] = None
+        self.last_tokens = 0
+        self.state: Optional[Dict[str, Any]] = None
+        self.cached = False
+
+    def _tokens(self) -> int:
+        return self.llm_usage["total_tokens"] if self.llm_usage else 0
+
+    def record_node(self, node: str, start: float, state: Optional[Dict[str, Any]]):
+        """Timing of one node and, for the SQL stages, the fate of the current attempt"""
+        tokens = self._tokens()
+        self.nodes.append({
+            "node": node,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "tokens": tokens - self.last_tokens,
+        })
+        self.last_tokens = tokens
+        self.last_node = node
+        if state is None:
+            return
+        self.state = state
+
+        if node == "validate_sql":
+            status = "pending" if state.get("valid") else (
+                "duplicate" if state.get("duplicate_attempt") else "invalid"
+            )
+            self.attempts.append({
+                "strategy": state.get("current_strategy"),
+                "sql": state.get("sql"),
+                "status": status,
+                "error": None if state.get("valid") else state.get("reason"),
+                "rows": None,
+                "exec_ms": None,
+            })
+        elif node == "follow_up" and state.get("follow_up") == "local":
+            # Answered from the previous result without validate_sql / execute_sql
+            self.attempts.append({
+                "strategy": "follow_up",
+                "sql": state.get("sql"),
+                "status": "pending",
+                "error": None,
+                "rows": len(state.get("results") or []),
+                "exec_ms": self.nodes[-1]["duration_ms"],
+            })
+        elif node == "decompose" and state.get("sub_queries"):
+            for sub in state["sub_queries"]:
+                self.attempts.append({
+                    "strategy": f"sub_query:{sub['id']}",
+                    "sql": sub["sql"],
+                    "status": sub["status"],
+                    "error": sub["error"],
+                    "rows": sub["rows"],
+                    "exec_ms": sub["exec_ms"],
+                })
+            if state.get("decomposition") == "merged":
+                # The merged answer, validated like any other attempt
+                self.attempts.append({
+                    "strategy": "decompose",
+                    "sql": state.get("sql"),
+                    "status": "pending",
+                    "error": None,
+                    "rows": len(state.get("results") or []),
+                    "exec_ms": self.nodes[-1]["duration_ms"],
+                })
+        elif node == "execute_sql" and self.attempts:
+            attempt = self.attempts[-1]
+            attempt["exec_ms"] = self.nodes[-1]["duration_ms"]
+            if state.get("executed"):
+                attempt["rows"] = len(state.get("results") or [])
+            else:
+                attempt["status"] = "execution_error"
+                attempt["error"] = state.get("reason")
+        elif node == "validate_and_respond" and self.attempts:
+            attempt = self.attempts[-1]
+            attempt["status"] = "answered" if state.get("valid") else "wrong_answer"
+            attempt["error"] = None if state.get("valid") else state.get("reason")
+
+    def record_cached(self, start: float, result: Dict[str, Any]):
+        """The request was answered from the answer cache without running the graph"""
+        self.cached = True
+        self.record_node("answer_cache", start, result)
+
+    def to_row(self, error: Optional[str] = None) -> Dict[str, Any]:
+        state = self.state or {}
+        answered = bool(state.get("valid") and state.get("executed"))
+        if error:
+            outcome = "error"
+        elif answered:
+            outcome = "answered"
+        elif self.last_node == "ask_clarification":
+            outcome = "clarification"
+        else:
+            outcome = "failed"
+        failed = [a["status"] for a in self.attempts if a["status"] not in ("answered", "pending", "executed")]
+        usage = self.llm_usage or {}
+        return {
+            "run_id": self.run_id,
+            "ts": self.ts,
+            "question": self.question,
+            "question_key": normalize_question(self.question),
+            "source": self.source,
+            "engine": self.engine,
+            "database": self.database,
+            "outcome": outcome,
+            "failure_type": None if answered else (state.get("failure_type") or (failed[-1] if failed else None)),
+            "planned_tables": state.get("planned_tables"),
+            "final_sql": state.get("sql"),
+            "rows": len(state["results"]) if state.get("results") is not None else None,
+            "total_rows": state.get("total_rows"),
+            "attempts": len(self.attempts),
+            "fast_path": int(bool(state.get("fast_path"))),
+            "cached": int(self.cached),
+            "follow_up": state.get("follow_up"),
+            "speculation": state.get("speculation"),
+            "llm_calls": usage.get("calls", 0),
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0),
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "error": error,
+            "nodes": self.nodes,
+            "attempt_rows": self.attempts,
+        }
+
+
+class RunLog:
+    """Bounded, drop-on-full queue of finished runs written to SQLite in batches"""
+
+    def __init__(self, path: str = RUN_LOG_PATH, queue_size: int = RUN_LOG_QUEUE_SIZE,
+                 batch_size: int = RUN_LOG_BATCH_SIZE, flush_interval_s: float = RUN_LOG_FLUSH_INTERVAL_S):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"recorded": 0, "dropped": 0, "written": 0, "write_errors": 0}
+
+    def _count(self, stat: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[stat] += n
+
+    def submit(self, row: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(row)
+            self._count("recorded")
+        except queue.Full:
+            self._count("dropped")
+            return
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="run-log-writer", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval_s
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = connect(self.path)
+                write_runs(conn, batch)
+                self._count("written", len(batch))
+            except Exception as e:  # A bad row must not stop the writer: later runs would be lost
+                self._count("write_errors")
+                print(f"⚠️ Could not write run log: {type(e).__name__}: {str(e)[:100]}")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except sqlite3.Error:
+                        pass
+                    conn = None
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until queued runs are written (tests, shutdown)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+
+def write_runs(conn: sqlite3.Connection, rows: List[Dict[str, Any]]):
+    """Insert finished runs and their node timings and attempts in one transaction"""
+    with conn:
+        conn.executemany(
+            # Named columns: migrated logs have the added ones at the end
+            f"insert or ignore into runs ({', '.join(RUN_COLUMNS)}) "
+            f"values ({', '.join(':' + column for column in RUN_COLUMNS)})",
+            [{**row, "planned_tables": json.dumps(row["planned_tables"]) if row["planned_tables"] else None}
+             for row in rows],
+        )
+        conn.executemany(
+            "insert into node_timings values (?, ?, ?, ?, ?)",
+            [(row["run_id"], seq, n["node"], n["duration_ms"], n["tokens"])
+             for row in rows for seq, n in enumerate(row["nodes"])],
+        )
+        conn.executemany(
+            "insert into attempts values (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(row["run_id"], seq, a["strategy"], a["sql"], a["status"], a["error"], a["rows"], a["exec_ms"])
+             for row in rows for seq, a in enumerate(row["attempt_rows"])],
+        )
+
+
+def get_run_log() -> RunLog:
+    """Process-wide run log, created on first use"""
+    global _run_log
+    with _run_log_lock:
+        if _run_log is None:
+            _run_log = RunLog()
+        return _run_log
+
+
+def configure_run_log(run_log: Optional[RunLog]):
+    """Install a run log (tests, benchmarks); None restores the default one on next use"""
+    global _run_log
+    with _run_log_lock:
+        _run_log = run_log
+
+
+@contextmanager
+def track_run(question: str, engine: Optional[str] = None, llm_usage: Optional[Dict[str, int]] = None,
+              source: str = "user"):
+    """Record the graph run inside the block; submitted to the run log when it ends"""
+    if not RUN_LOG_ENABLED:
+        yield None
+        return
+    run = RunRecord(question, engine, llm_usage, source)
+    token = _current_run.set(run)
+    error = None
+    try:
+        yield run
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)[:200]}"
+        raise
+    finally:
+        _current_run.reset(token)
+        get_run_log().submit(run.to_row(error))
+
+
+def record_node(node: str, start: float, state: Optional[Dict[str, Any]]):
+    """Called by the graph's node wrapper after each node (no-op outside track_run)"""
+    run = _current_run.get()
+    if run is not None:
+        run.record_node(node, start, state)
+
+
+# ---------------------------
+# Reports
+# ---------------------------
+
+REPORTS = {
+    "slowest": (
+        "Slowest runs",
+        """select round(duration_ms) as ms, outcome, attempts, llm_calls, total_tokens, question
+           from runs where ts >= :since order by duration_ms desc limit :top""",
+    ),
+    "failures": (
+        "Failed attempts by status, and runs that did not get an answer",
+        """select 'attempt' as level, a.status as kind, count(*) as n, count(distinct a.run_id) as runs
+           from attempts a join runs r using (run_id)
+           where r.ts >= :since and a.status not in ('answered', 'pending', 'executed') group by a.status
+           union all
+           select 'run', outcome || coalesce(' / ' || failure_type, ''), count(*), count(*)
+           from runs where ts >= :since and outcome != 'answered' group by 2
+           order by level, n desc limit :top""",
+    ),
+    "repeats": (
+        "Repeated questions (cache candidates), by total time spent",
+        """select count(*) as n, round(avg(duration_ms)) as avg_ms, round(sum(duration_ms) / 1000, 1) as total_s,
+                  sum(total_tokens) as tokens, round(avg(outcome = 'answered'), 2) as answered,
+                  count(distinct final_sql) as distinct_sql, min(question) as question
+           from runs where ts >= :since group by question_key having count(*) >= :min_count
+           order by sum(duration_ms) desc limit :top""",
+    ),
+    "follow_ups": (
+        "Session follow-ups vs standalone questions",
+        """select coalesce(follow_up, 'standalone') as kind, count(*) as n, round(avg(duration_ms)) as avg_ms,
+                  round(max(duration_ms)) as max_ms, round(avg(llm_calls), 2) as llm_calls,
+                  round(avg(outcome = 'answered'), 2) as answered
+           from runs where ts >= :since and source = 'user' group by 1 order by n desc limit :top""",
+    ),
+    "nodes": (
+        "Time and tokens per node",
+        """select n.node, count(*) as calls, round(avg(n.duration_ms), 1) as avg_ms,
+                  round(max(n.duration_ms), 1) as max_ms, round(sum(n.duration_ms) / 1000, 1) as total_s,
+                  sum(n.tokens) as tokens
+           from node_timings n join runs r using (run_id)
+           where r.ts >= :since group by n.node order by sum(n.duration_ms) desc limit :top""",
+    ),
+}
+
+
+def run_report(conn: sqlite3.Connection, name: str, top: int = 20, since: float = 0.0,
+               min_count: int = 2) -> List[sqlite3.Row]:
+    """Rows of one of the REPORTS"""
+    conn.row_factory = sqlite3.Row
+    params = {"top": top, "since": since, "min_count": min_count}
+    return conn.execute(REPORTS[name][1], params).fetchall()
+
+
+def print_rows(rows: List[sqlite3.Row], max_width: int = 80):
+    if not rows:
+        print("(no runs)")
+        return
+    columns = rows[0].keys()
+    cells = [[str(row[c]) if row[c] is not None else "" for c in columns] for row in rows]
+    cells = [[cell.replace("\n", " ")[:max_width] for cell in row] for row in cells]
+    widths = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in cells:
+        print("  ".join(cell.ljust(w) for cell, w in zip(row, widths)))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Reports over the agent run log")
+    parser.add_argument("report", choices=list(REPORTS))
+    parser.add_argument("--db", default=RUN_LOG_PATH)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--hours", type=float, help="Only runs from the last N hours")
+    parser.add_argument("--min-count", type=int, default=2, help="repeats: minimum times a question was asked")
+    args = parser.parse_args(argv)
+
+    if not Path(args.db).exists():
+        print(f"❌ No run log at {args.db}")
+        return
+    since = time.time() - args.hours * 3600 if args.hours else 0.0
+    conn = connect(args.db)
+    try:
+        print(f"📊 {REPORTS[args.report][0]}\n")
+        print_rows(run_report(conn, args.report, args.top, since, args.min_count))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
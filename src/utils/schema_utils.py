@@ -1,24 +1,96 @@
 """
 Schema utilities and filters
 """
-from typing import Dict, Any, List
-import yaml
+from typing import Dict, Any, List, Tuple
+import marshal
+import sys
 from pathlib import Path
 
+from src.db.registry import current_database
+
 
-# Load schema once at module level
 SCHEMA_PATH = Path(__file__).parent.parent / "schema" / "schema_summary.yaml"
+# Precompiled (marshal) copy of the YAML; rebuilt whenever the YAML changes
+SCHEMA_ARTIFACT_PATH = SCHEMA_PATH.with_suffix(".bin")
+
+
+def _source_key(path: Path) -> Tuple:
+    stat = path.stat()
+    return (stat.st_mtime_ns, stat.st_size, tuple(sys.version_info[:2]))
+
+
+def compile_schema_artifact(schema: Dict[str, Any], key: Tuple, artifact_path: Path = SCHEMA_ARTIFACT_PATH):
+    """Write the fast-loading binary artifact (best effort, e.g. read-only installs)"""
+    tmp = artifact_path.with_suffix(".tmp")
+    try:
+        tmp.write_bytes(marshal.dumps((key, schema)))
+        tmp.replace(artifact_path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not write schema artifact: {e}")
 
-with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
-    FULL_SCHEMA: Dict[str, Any] = yaml.safe_load(f)
+
+def load_schema(path: Path = SCHEMA_PATH) -> Dict[str, Any]:
+    """Load the schema from the compiled artifact next to it, falling back to YAML"""
+    key = _source_key(path)
+    artifact_path = path.with_suffix(".bin")
+    try:
+        stored_key, schema = marshal.loads(artifact_path.read_bytes())
+        if stored_key == key:
+            return schema
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    import yaml
+
+    with open(path, "r", encoding="utf-8") as f:
+        schema = yaml.safe_load(f)
+    compile_schema_artifact(schema, key, artifact_path)
+    return schema
+
+
+# Load schema once at module level
+FULL_SCHEMA: Dict[str, Any] = load_schema()
+
+_schema_key = _source_key(SCHEMA_PATH)
+
+
+def reload_schema(schema: Dict[str, Any]):
+    """
+    Hot-reload FULL_SCHEMA in place so every module that imported it sees
+    the new version without a restart.
+    """
+    for key in list(FULL_SCHEMA.keys()):
+        if key not in schema:
+            del FULL_SCHEMA[key]
+    FULL_SCHEMA.update(schema)
+
+
+def reload_schema_if_modified() -> bool:
+    """Reload from disk when another process rewrote schema_summary.yaml"""
+    global _schema_key
+    try:
+        key = _source_key(SCHEMA_PATH)
+    except OSError:
+        return False
+    if key == _schema_key:
+        return False
+    reload_schema(load_schema())
+    _schema_key = key
+    print("🔄 Reloaded schema from disk")
+    return True
+
+
+def current_schema() -> Dict[str, Any]:
+    """Schema of the database the current request runs against (FULL_SCHEMA for the default one)"""
+    return current_database().schema
 
 
 def ensure_schema_dict(schema: Any) -> Dict[str, Any]:
-    """Ensure schema is a dict, fallback to FULL_SCHEMA if not"""
+    """Ensure schema is a dict, fallback to the full schema if not"""
     if isinstance(schema, dict):
         return schema
-    print(f"⚠️ Warning: Invalid schema type {type(schema)}, using FULL_SCHEMA")
-    return FULL_SCHEMA
+    print(f"⚠️ Warning: Invalid schema type {type(schema)}, using the full schema")
+    return current_schema()
 
 
 def schema_filter_tool(table_names: List[str]) -> Dict[str, Any]:
@@ -26,21 +98,28 @@ def schema_filter_tool(table_names: List[str]) -> Dict[str, Any]:
     Extract only specified tables and their related info from full schema.
     This is the 'tool' the agent uses to get relevant schema.
     """
+    full_schema = current_schema()
     filtered_schema = {
         'tables': {},
-        'hints': FULL_SCHEMA.get('hints', []),
+        'hints': full_schema.get('hints', []),
         'common_joins': []
     }
     
     # Extract requested tables
     for table_name in table_names:
-        if table_name in FULL_SCHEMA['tables']:
-            filtered_schema['tables'][table_name] = FULL_SCHEMA['tables'][table_name]
+        if table_name in full_schema['tables']:
+            filtered_schema['tables'][table_name] = full_schema['tables'][table_name]
     
     # Extract relevant joins (any join involving requested tables)
-    for join_info in FULL_SCHEMA.get('common_joins', []):
+    for join_info in full_schema.get('common_joins', []):
         join_tables = set(join_info.get('tables', []))
         if join_tables.intersection(set(table_names)):
             filtered_schema['common_joins'].append(join_info)
     
-    return filtered_schema
\ No newline at end of file
+    return filtered_schema
+
+
+if __name__ == "__main__":
+    # Precompile the schema artifact, e.g. during an image build
+    compile_schema_artifact(load_schema(), _source_key(SCHEMA_PATH))
+    print(f"✅ Compiled {SCHEMA_ARTIFACT_PATH}")
@@ -0,0 +1,153 @@
+"""
+AST-level rewrites and inspection of generated SQL.
+
+apply_row_limit() appends a LIMIT to the outermost query when it has none,
+so Postgres can use a top-N sort and only ships the rows that are shown.
+The AST decides whether a limit is safe; the SQL text is otherwise left as
+generated:
+
+- explicit LIMIT / FETCH FIRST clauses are kept as written
+- scalar aggregates (aggregates without GROUP BY) already return one row
+- subqueries and CTEs are never touched, the limit only bounds the final result
+
+sqlglot is imported on first use.
+"""
+import re
+from typing import List, Optional, Set, Tuple
+
+
+# Questions where the user cares about the full size of the result
+TOTAL_QUESTION_PATTERN = re.compile(r"\b(how many|number of|count|total|all)\b", re.IGNORECASE)
+WITH_PATTERN = re.compile(r"^\s*with\s+(recursive\s+)?", re.IGNORECASE)
+
+
+def _is_single_row(select) -> bool:
+    """Aggregate-only projection without GROUP BY (or no FROM): exactly one row"""
+    from sqlglot import exp
+
+    if select.args.get("group"):
+        return False
+    if not (select.args.get("from_") or select.args.get("from")):  # "from_" in newer sqlglot
+        return True
+    for projection in select.expressions:
+        aggregates = [
+            agg for agg in projection.find_all(exp.AggFunc)
+            if not agg.find_ancestor(exp.Window)
+        ]
+        if not aggregates:
+            return False
+    return True
+
+
+def apply_row_limit(sql: str, limit: int) -> Tuple[str, Optional[int]]:
+    """
+    Add LIMIT `limit` to the outermost query if it is unbounded.
+    Returns (sql, injected limit or None if the SQL was left unchanged).
+    """
+    if limit <= 0 or not sql:
+        return sql, None
+
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+
+    try:
+        statements = sqlglot.parse(sql, read="postgres")
+    except SqlglotError:
+        return sql, None
+    if len(statements) != 1 or statements[0] is None:
+        return sql, None
+
+    tree = statements[0]
+    if isinstance(tree, exp.Select):
+        if tree.args.get("limit") or _is_single_row(tree):
+            return sql, None
+    elif isinstance(tree, exp.SetOperation):
+        if tree.args.get("limit"):
+            return sql, None
+    else:
+        return sql, None
+
+    body = sql.rstrip().rstrip(";").rstrip()
+    return f"{body}\nlimit {limit}", limit
+
+
+def row_range_sql(sql: str, offset: int, limit: Optional[int] = None) -> str:
+    """
+    Rows offset .. offset + limit of the query's result, in the query's own
+    order (range resumption of exports). The query is wrapped when it already
+    has a LIMIT/OFFSET, which must apply first.
+    """
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+
+    body = sql.rstrip().rstrip(";").rstrip()
+    bounds = (f"\nlimit {limit}" if limit is not None else "") + (f"\noffset {offset}" if offset else "")
+    if not bounds:
+        return body
+    try:
+        statements = sqlglot.parse(body, read="postgres")
+    except SqlglotError:
+        statements = []
+    tree = statements[0] if len(statements) == 1 else None
+    if (isinstance(tree, (exp.Select, exp.SetOperation))
+            and not tree.args.get("limit") and not tree.args.get("offset")):
+        return body + bounds
+    return f"select * from (\n{body}\n) as result_rows{bounds}"
+
+
+def referenced_tables(sql: str) -> Optional[Set[str]]:
+    """Base tables a query reads (CTE names excluded); None if it doesn't parse"""
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except SqlglotError:
+        return None
+    ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    return {t.name.lower() for t in tree.find_all(exp.Table) if t.name.lower() not in ctes}
+
+
+def with_ctes(ctes: List[Tuple[str, str]], sql: str) -> str:
+    """Define (name, query) pairs as CTEs in front of `sql`, ahead of any CTEs it already has"""
+    body = sql.strip().rstrip(";").strip()
+    definitions = ",\n".join(
+        f"{name} as (\n{query.strip().rstrip(';').strip()}\n)" for name, query in ctes
+    )
+    match = WITH_PATTERN.match(body)
+    if match:
+        return f"with {match.group(1) or ''}{definitions},\n{body[match.end():]}"
+    return f"with {definitions}\n{body}"
+
+
+def count_rows_sql(sql: str) -> str:
+    """Exact total of a query's result; the outermost ORDER BY is dropped, it can't change the count"""
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+
+    body = sql.rstrip().rstrip(";").rstrip()
+    try:
+        tree = sqlglot.parse_one(body, read="postgres")
+        if isinstance(tree, exp.Select) and tree.args.get("order") and not tree.args.get("limit"):
+            tree.set("order", None)
+            body = tree.sql(dialect="postgres")
+    except SqlglotError:
+        pass
+    return f"select count(*) from (\n{body}\n) as total_rows"
+
+
+def total_rows_mode(question: str, setting: str) -> Optional[str]:
+    """
+    How to report the total when a result is truncated: "exact" (COUNT(*)),
+    "estimate" (planner row estimate) or None. "auto" counts exactly only
+    when the question asks for a quantity.
+    """
+    if setting == "off":
+        return None
+    if setting == "auto":
+        return "exact" if TOTAL_QUESTION_PATTERN.search(question or "") else "estimate"
+    return setting
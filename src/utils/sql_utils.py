@@ -2,6 +2,7 @@
 SQL utility functions
 """
 from typing import Tuple, Optional
+import hashlib
 import re
 
 def preprocess_sql(sql: str) -> str:
@@ -104,4 +105,27 @@ def validate_sql(sql: str) -> tuple[bool, str]:
     if not is_read_only_query(sql):
         return False, "Only SELECT queries are allowed"
 
-    return True, "SQL is safe to execute"
\ No newline at end of file
+    return True, "SQL is safe to execute"
+
+
+def sql_fingerprint(sql: str) -> str:
+    """
+    Stable identity of a query: normalized (lowercase, no comments, collapsed
+    whitespace, no trailing semicolon) and hashed.
+    """
+    normalized = normalize_sql(preprocess_sql(sql or "")).rstrip(";").strip()
+    return hashlib.md5(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def error_signature(reason: str) -> str:
+    """
+    Error class without the specifics: drops Postgres LINE/caret context and
+    replaces quoted names, literals and numbers with placeholders.
+    """
+    if not reason:
+        return ""
+    text = reason.lower()
+    text = re.sub(r"\n\s*(line \d+:|\^).*", "", text)
+    text = re.sub(r"\"[^\"]*\"|'[^']*'", "?", text)
+    text = re.sub(r"\b\d+(\.\d+)?\b", "n", text)
+    return re.sub(r"\s+", " ", text).strip()[:200]
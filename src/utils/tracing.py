@@ -0,0 +1,383 @@
+"""
+Tracing for the agent, with three modes (TRACING_MODE):
+
+- "off":     @observe returns the function unchanged (zero overhead)
+- "full":    every call is traced inline with Langfuse's @observe
+- "sampled": spans are recorded in memory (a perf_counter per node) and the
+             keep/drop decision is made when the request finishes:
+             head sampling keeps TRACE_SAMPLE_RATE of requests, tail sampling
+             always keeps failed or slow ones. Kept traces go into a bounded
+             queue (dropped when full) that a background thread exports in
+             batches, so the request thread never waits on the exporter.
+
+langfuse is only imported when a Langfuse client or exporter is first used.
+
+A local stand-in collector for development and tests:
+    python -m src.utils.tracing collector --port 4318
+    TRACE_EXPORTER=collector TRACE_COLLECTOR_URL=http://localhost:4318 ...
+"""
+import argparse
+import contextvars
+import functools
+import json
+import queue
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config.settings import (
+    TRACE_BATCH_SIZE,
+    TRACE_COLLECTOR_URL,
+    TRACE_EXPORTER,
+    TRACE_FLUSH_INTERVAL_S,
+    TRACE_QUEUE_SIZE,
+    TRACE_SAMPLE_RATE,
+    TRACE_SLOW_THRESHOLD_S,
+    TRACING_MODE,
+)
+
+
+_langfuse = None
+_lock = threading.Lock()
+
+_mode = TRACING_MODE
+_tracer = None
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+
+
+def get_langfuse():
+    """Process-wide Langfuse client, created on first use"""
+    global _langfuse
+    with _lock:
+        if _langfuse is None:
+            from langfuse import Langfuse
+
+            _langfuse = Langfuse()
+        return _langfuse
+
+
+# ---------------------------
+# Exporters
+# ---------------------------
+
+class InMemoryExporter:
+    """Keeps exported traces in a list (tests, benchmarks)"""
+
+    def __init__(self):
+        self.traces: List[Dict[str, Any]] = []
+
+    def export(self, traces: List[Dict[str, Any]]):
+        self.traces.extend(traces)
+
+
+class CollectorExporter:
+    """POSTs JSON batches to a collector endpoint"""
+
+    def __init__(self, url: str = TRACE_COLLECTOR_URL, timeout: float = 2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def export(self, traces: List[Dict[str, Any]]):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(traces, default=str).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+
+class LangfuseExporter:
+    """Replays recorded traces as Langfuse observations"""
+
+    def export(self, traces: List[Dict[str, Any]]):
+        client = get_langfuse()
+        for trace in traces:
+            root = client.start_observation(
+                name=trace["name"],
+                input=trace.get("input"),
+                output=trace.get("output"),
+                metadata={
+                    **trace.get("metadata", {}),
+                    "duration_ms": trace["duration_ms"],
+                    "sampled_by": trace["sampled_by"],
+                },
+                level="ERROR" if trace["failed"] else "DEFAULT",
+            )
+            for span in trace["spans"]:
+                root.start_observation(
+                    name=span["name"],
+                    metadata={"offset_ms": span["offset_ms"], "duration_ms": span["duration_ms"]},
+                    level="ERROR" if span.get("error") else "DEFAULT",
+                    status_message=span.get("error"),
+                ).end()
+            root.end()
+        client.flush()
+
+
+EXPORTERS = {
+    "langfuse": LangfuseExporter,
+    "collector": CollectorExporter,
+    "memory": InMemoryExporter,
+}
+
+
+# ---------------------------
+# Sampled tracer
+# ---------------------------
+
+class Trace:
+    """Spans of one request, recorded in memory"""
+
+    __slots__ = ("trace_id", "name", "start", "start_time", "spans", "head_sampled",
+                 "failed", "input", "output", "metadata")
+
+    def __init__(self, name: str, head_sampled: bool):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.start = time.perf_counter()
+        self.start_time = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.head_sampled = head_sampled
+        self.failed = False
+        self.input = None
+        self.output = None
+        self.metadata: Dict[str, Any] = {}
+
+
+class Tracer:
+    """Tail-aware sampler with a bounded, drop-on-full export queue"""
+
+    def __init__(self, exporter, sample_rate: float = TRACE_SAMPLE_RATE,
+                 slow_threshold_s: float = TRACE_SLOW_THRESHOLD_S,
+                 queue_size: int = TRACE_QUEUE_SIZE, batch_size: int = TRACE_BATCH_SIZE,
+                 flush_interval_s: float = TRACE_FLUSH_INTERVAL_S):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_threshold_s = slow_threshold_s
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self.stats = {"recorded": 0, "kept": 0, "dropped": 0, "exported": 0, "export_errors": 0}
+
+    def start_trace(self, name: str) -> Trace:
+        return Trace(name, head_sampled=random.random() < self.sample_rate)
+
+    def finish(self, trace: Trace):
+        """Decide whether to keep the trace and hand it to the exporter thread"""
+        duration = time.perf_counter() - trace.start
+        self.stats["recorded"] += 1
+        if trace.failed:
+            sampled_by = "error"
+        elif duration >= self.slow_threshold_s:
+            sampled_by = "slow"
+        elif trace.head_sampled:
+            sampled_by = "head"
+        else:
+            return
+
+        payload = {
+            "trace_id": trace.trace_id,
+            "name": trace.name,
+            "start_time": trace.start_time,
+            "duration_ms": round(duration * 1000, 3),
+            "failed": trace.failed,
+            "sampled_by": sampled_by,
+            "input": trace.input,
+            "output": trace.output,
+            "metadata": trace.metadata,
+            "spans": trace.spans,
+        }
+        try:
+            self._queue.put_nowait(payload)
+            self.stats["kept"] += 1
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval_s
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.exporter.export(batch)
+                self.stats["exported"] += len(batch)
+            except Exception as e:
+                self.stats["export_errors"] += 1
+                print(f"⚠️ Trace export failed: {str(e)[:100]}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until queued traces are exported (tests, shutdown)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+
+def configure_tracing(mode: str = TRACING_MODE, exporter=None, **tracer_options) -> Optional[Tracer]:
+    """
+    Select the tracing mode. Affects functions decorated afterwards; in
+    "sampled" mode a Tracer with the given exporter (default TRACE_EXPORTER)
+    is installed.
+    """
+    global _mode, _tracer
+    _mode = mode
+    _tracer = None
+    if mode == "sampled":
+        _tracer = Tracer(exporter or EXPORTERS[TRACE_EXPORTER](), **tracer_options)
+    return _tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    global _tracer
+    if _mode == "sampled" and _tracer is None:
+        _tracer = Tracer(EXPORTERS[TRACE_EXPORTER]())
+    return _tracer
+
+
+# ---------------------------
+# Decorator and trace helpers
+# ---------------------------
+
+def observe(name: str):
+    """
+    Trace a function according to the tracing mode. The outermost observed
+    call of a request starts the trace; nested calls become its spans.
+    """
+    def decorator(func):
+        if _mode == "off":
+            return func
+
+        if _mode == "full":
+            observed = None
+
+            @functools.wraps(func)
+            def full_wrapper(*args, **kwargs):
+                nonlocal observed
+                if observed is None:
+                    from langfuse import observe as langfuse_observe
+
+                    observed = langfuse_observe(name=name)(func)
+                return observed(*args, **kwargs)
+            return full_wrapper
+
+        @functools.wraps(func)
+        def sampled_wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                tracer = get_tracer()
+                trace = tracer.start_trace(name)
+                token = _current_trace.set(trace)
+                try:
+                    return func(*args, **kwargs)
+                except BaseException:
+                    trace.failed = True
+                    raise
+                finally:
+                    _current_trace.reset(token)
+                    tracer.finish(trace)
+
+            start = time.perf_counter()
+            error = None
+            try:
+                return func(*args, **kwargs)
+            except BaseException as e:
+                error = f"{type(e).__name__}: {str(e)[:200]}"
+                raise
+            finally:
+                trace.spans.append({
+                    "name": name,
+                    "offset_ms": round((start - trace.start) * 1000, 3),
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                    "error": error,
+                })
+        return sampled_wrapper
+    return decorator
+
+
+def update_current_trace(input: Any = None, output: Any = None,
+                         metadata: Optional[Dict[str, Any]] = None, failed: bool = False):
+    """Attach request-level input/output/metadata to the active trace"""
+    if _mode == "full":
+        get_langfuse().update_current_trace(input=input, output=output, metadata=metadata)
+        return
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    trace.input = input
+    trace.output = output
+    trace.metadata.update(metadata or {})
+    trace.failed = trace.failed or failed
+
+
+# ---------------------------
+# Local stand-in collector
+# ---------------------------
+
+def make_collector_server(port: int = 4318, output_path: Optional[str] = None):
+    """HTTP server that accepts exported batches; received traces are in server.traces"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    received: List[Dict[str, Any]] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            batch = json.loads(body or b"[]")
+            received.extend(batch)
+            if output_path:
+                with open(output_path, "a", encoding="utf-8") as f:
+                    for trace in batch:
+                        f.write(json.dumps(trace) + "\n")
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.traces = received
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Tracing utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    collector = sub.add_parser("collector", help="Run a local stand-in trace collector")
+    collector.add_argument("--port", type=int, default=4318)
+    collector.add_argument("--output", default="logs/traces.jsonl")
+    args = parser.parse_args(argv)
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    server = make_collector_server(args.port, args.output)
+    print(f"📡 Collecting traces on http://127.0.0.1:{args.port} → {args.output}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Tests for API admission control and the process-wide concurrency limiters
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend_server.admission import AdmissionController, Overloaded
+from src.utils.concurrency import ConcurrencyLimiter, LimiterTimeout, TokenBucket
+
+SLO = {"interactive": 5.0, "batch": 5.0}
+
+
+def test_slots_go_to_interactive_waiters_first():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=4, slo_s=SLO)
+        await admission.acquire()
+        order = []
+
+        async def request(priority):
+            await admission.acquire(priority)
+            order.append(priority)
+            admission.release(0.1)
+
+        waiters = [asyncio.create_task(request(p)) for p in ("batch", "interactive")]
+        await asyncio.sleep(0)
+        assert admission.queue_depth == 2
+        admission.release(0.1)
+        await asyncio.gather(*waiters)
+        assert order == ["interactive", "batch"] and admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_sheds_when_queue_is_full_or_slo_would_be_missed():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=1, slo_s={"interactive": 5.0, "batch": 0.5})
+        await admission.acquire()
+        with pytest.raises(Overloaded) as slo:
+            await admission.acquire("batch")
+        assert slo.value.reason == "slo" and slo.value.retry_after >= 1
+
+        queued = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as full:
+            await admission.acquire()
+        assert full.value.reason == "queue_full"
+        queued.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiters_do_not_leak_slots():
+    """A client that disconnects while queued, even after being handed a slot, gives it back"""
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=4, slo_s=SLO)
+        await admission.acquire()
+
+        gone = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        gone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+        admission.release(0.1)
+        assert admission.active == 0 and admission.queue_depth == 0
+
+        await admission.acquire()
+        handed = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        admission.release(0.1)  # Slot handed to the waiter, which is cancelled before it resumes
+        handed.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await handed
+        assert admission.active == 0
+        assert await admission.acquire() == 0.0
+
+    asyncio.run(scenario())
+
+
+def test_limiter_caps_concurrency_and_times_out():
+    limiter = ConcurrencyLimiter("db", 2)
+    peak, lock = [0], threading.Lock()
+
+    def work():
+        with limiter.slot():
+            with lock:
+                peak[0] = max(peak[0], limiter.in_use)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2 and limiter.in_use == 0
+
+    with limiter.slot(), limiter.slot():
+        with pytest.raises(LimiterTimeout):
+            with limiter.slot(timeout=0.01):
+                pass
+    assert limiter.in_use == 0
+
+
+def test_token_bucket_budget_adjust_and_pause():
+    bucket = TokenBucket(per_minute=60)
+    bucket.acquire(60, timeout=0)
+    with pytest.raises(LimiterTimeout):
+        bucket.acquire(30, timeout=0.1)  # Refills at one token per second
+    bucket.adjust(-10)  # Estimate was 10 too high
+    bucket.acquire(10, timeout=0)
+
+    bucket.adjust(-60)
+    bucket.pause(30)
+    with pytest.raises(LimiterTimeout):
+        bucket.acquire(1, timeout=0.1)
@@ -0,0 +1,63 @@
+"""
+Tests for approximate answers from order samples
+"""
+import duckdb
+
+from src.agent.approximate import approximate_answer, approximate_sql, build_samples
+from src.db.backends import get_backend, get_pool
+from src.db.registry import DatabaseRegistry, use_database
+from src.memory import cache
+
+
+def test_only_scalable_aggregates_are_rewritten():
+    plan, reason = approximate_sql(
+        "select order_dow, count(*) as n from orders group by order_dow order by n desc limit 3", "tables", 1)
+    assert reason is None and plan["columns"] == ["order_dow", "n"] and plan["kinds"] == ["group", "count"]
+    assert "from orders_sample_1pct as orders" in plan["sql"] and "count(*) * 2000" in plan["sql"]
+    assert plan["sql"].endswith('group by __c0 order by "n" desc limit 3')
+
+    plan, _ = approximate_sql("select avg(reordered) from order_products_prior", "tablesample", 1)
+    assert "tablesample bernoulli (1)" in plan["sql"] and plan["kinds"] == ["ratio"]
+
+    for sql in [
+        "select max(order_number) from orders",
+        "select count(distinct user_id) from orders",
+        "select order_dow, count(*) from orders group by order_dow having count(*) > 10",
+        "select count(*) from orders group by order_dow",
+        "select count(*) from products",
+    ]:
+        plan, reason = approximate_sql(sql, "tables", 1)
+        assert plan is None and reason
+    two_facts = "select count(*) from orders o join order_products_prior op on o.order_id = op.order_id"
+    assert approximate_sql(two_facts, "tables", 1)[0] is not None
+    assert approximate_sql(two_facts, "tablesample", 1)[0] is None
+
+
+def test_sample_estimates_cover_the_exact_answer(tmp_path):
+    db = duckdb.connect()
+    db.execute(f"COPY (SELECT i AS order_id, i % 7 AS order_dow, i % 40 AS order_number FROM range(200000) t(i)) "
+               f"TO '{(tmp_path / 'orders.parquet').as_posix()}' (FORMAT PARQUET)")
+    db.execute(f"COPY (SELECT i % 200000 AS order_id, i % 2 AS reordered FROM range(400000) t(i)) "
+               f"TO '{(tmp_path / 'order_products_prior.parquet').as_posix()}' (FORMAT PARQUET)")
+    build_samples("duckdb", 50, str(tmp_path))
+
+    registry = DatabaseRegistry({"sampled": {"parquet_dir": str(tmp_path)}})
+    try:
+        with registry.acquire("sampled") as database, use_database(database):
+            backend = get_backend("duckdb")
+            with get_pool("duckdb").connection() as (conn, cursor):
+                sql = "select order_dow, count(*) as n from orders group by order_dow order by order_dow"
+                result, approximation = approximate_answer(backend, conn, cursor, sql, percent=50)
+                assert approximation["status"] == "approximate" and approximation["sample"] == "tables"
+                _, exact = backend.execute(conn, cursor, sql)
+                assert [row[0] for row in result["results"]] == [row[0] for row in exact]
+                for (_, n), (low, high) in zip(exact, approximation["intervals"]["n"]):
+                    assert low <= n <= high
+
+                result, approximation = approximate_answer(
+                    backend, conn, cursor, "select max(order_number) from orders", percent=50)
+                assert result is None and approximation == {
+                    "status": "exact", "reason": "MAX can't be estimated from a sample"}
+    finally:
+        registry.close()
+        cache.clear_caches()
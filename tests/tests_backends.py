@@ -0,0 +1,67 @@
+"""
+Tests for execution backend dialect translation and engine routing
+"""
+import pytest
+
+from src.db import backends
+from src.db.backends import DuckDBBackend, ExecutionBackend, resolve_engine
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("select * from public.orders", "select * from orders"),
+    ("select count(*) from orders tablesample system (10)", "select count(*) from orders tablesample system(10 percent)"),
+    ("select * from orders tablesample bernoulli(2.5) where order_dow = 0",
+     "select * from orders tablesample bernoulli(2.5 percent) where order_dow = 0"),
+    ("select 'orders'::regclass::oid", "select 'orders'"),
+    # Integer division truncates through the integer_division setting, not a rewrite
+    ("select sum(reordered) / count(*) from order_products_prior", "select sum(reordered) / count(*) from order_products_prior"),
+    ("select republic.x from republic", "select republic.x from republic"),
+])
+def test_duckdb_translate(sql, expected):
+    assert DuckDBBackend().translate(sql) == expected
+
+
+def test_duckdb_integer_division_matches_postgres(tmp_path):
+    pytest.importorskip("duckdb")
+    backend = DuckDBBackend(str(tmp_path))
+    conn = backend.connect()
+    assert backend.execute(conn, conn, backend.translate("select 7 / 2, 7.0 / 2"))[1] == [(3, 3.5)]
+
+
+class _Available:
+    def __init__(self, available):
+        self.available = available
+
+    def is_available(self):
+        return self.available
+
+
+@pytest.mark.parametrize("requested, sql, parquet, expected", [
+    ("postgres", "select count(*) from orders", True, "postgres"),
+    ("duckdb", "select * from orders", False, "duckdb"),
+    ("auto", "select count(*) from orders", True, "duckdb"),
+    ("auto", "select aisle_id, avg(x) from products group by aisle_id", True, "duckdb"),
+    ("auto", "select count(*) from orders", False, "postgres"),
+    ("auto", "select * from orders where order_id = 1", True, "postgres"),
+    ("auto", None, True, "postgres"),
+    (None, "select count(*) from orders", True, "duckdb"),
+])
+def test_resolve_engine(monkeypatch, requested, sql, parquet, expected):
+    monkeypatch.setattr(backends, "EXECUTION_BACKEND", "auto")
+    monkeypatch.setattr(backends, "get_backend", lambda name: _Available(parquet))
+    assert resolve_engine(requested, sql) == expected
+
+
+def test_backends_must_implement_connect():
+    with pytest.raises(TypeError):
+        ExecutionBackend()
+
+
+def test_api_rejects_unknown_engines():
+    """An unknown engine is a 422 from request validation, not a 500 from resolve_engine"""
+    from fastapi.testclient import TestClient
+
+    import backend_server.app as app
+
+    response = TestClient(app.app).post("/query", json={"query": "How many orders?", "engine": "mysql"})
+    assert response.status_code == 422 and response.json()["detail"][0]["loc"] == ["body", "engine"]
@@ -0,0 +1,118 @@
+"""
+Tests for the answer/plan/result/LLM caches and cache warm-up
+"""
+import time
+
+from src.db import change_tracking
+from src.db.backends import DuckDBBackend
+from src.memory import cache
+from src.memory.cache import TTLCache, answer_key
+from src.memory.warmup import CacheWarmer, popular_questions
+from src.utils.run_log import RunRecord, connect, write_runs
+
+
+def test_ttl_cache_expires_and_evicts(monkeypatch):
+    """Entries expire after the TTL and the least recently used one is evicted first"""
+    ttl = TTLCache("test", ttl_s=0.05, max_entries=2)
+    ttl.put("a", 1)
+    ttl.put("b", 2)
+    assert ttl.get("a") == 1
+    ttl.put("c", 3)  # evicts "b", "a" was used more recently
+    assert ttl.get("b") is None and ttl.peek("a") == 1
+    time.sleep(0.06)
+    assert ttl.get("a") is None and ttl.stats["hits"] == 1
+
+    monkeypatch.setattr(cache, "CACHE_ENABLED", False)
+    ttl.put("d", 4)
+    assert ttl.get("d") is None
+
+
+def test_stamped_entries_follow_table_versions(tmp_path):
+    """Only entries reading a changed table are dropped; unchecked ones are misses, not deletions"""
+    import duckdb
+
+    parquet = tmp_path / "orders.parquet"
+    duckdb.sql(f"copy (select 1 as order_id) to '{parquet.as_posix()}' (format parquet)")
+    backend = DuckDBBackend(str(tmp_path))
+    tracker = change_tracking.CHANGE_TRACKER
+    try:
+        tracker.update("default", "duckdb", {**backend.table_versions(None, None), "aisles": "1"})
+        versions = tracker.snapshot("default")
+        ttl = TTLCache("test", ttl_s=600)
+        ttl.put("orders", 1, change_tracking.stamp("default", "duckdb", "select count(*) from public.orders", versions))
+        ttl.put("aisles", 2, change_tracking.stamp("default", "duckdb", "select * from aisles", versions))
+        assert change_tracking.stamp("default", "duckdb", "select * from departments", versions) is None
+
+        duckdb.sql(f"copy (select 1 as order_id union all select 2) to '{parquet.as_posix()}' (format parquet)")
+        changed = tracker.update("default", "duckdb", {**backend.table_versions(None, None), "aisles": "1"})
+        assert changed == ["orders"]
+        assert ttl.get("orders") is None and ttl.get("aisles") == 2 and ttl.stats["invalidated"] == 1
+
+        tracker.forget("default")
+        assert ttl.get("aisles") is None and len(ttl) == 1
+    finally:
+        tracker.forget("default")
+
+
+def _answered(question, source="user", sql="select count(*) from orders"):
+    run = RunRecord(question, "duckdb", None, source)
+    run.record_node("validate_and_respond", time.perf_counter(),
+                    {"valid": True, "executed": True, "sql": sql, "results": [(1,)]})
+    return run.to_row()
+
+
+def test_popular_questions_rank_user_runs(tmp_path):
+    """Frequency first; warm-up runs and unanswered runs don't count"""
+    path = str(tmp_path / "runs.db")
+    conn = connect(path)
+    write_runs(conn, [
+        _answered("How many orders?"), _answered("how many orders"),
+        _answered("Which aisle is largest?"),
+        _answered("Which aisle is largest?", source="warmup"), _answered("Which aisle is largest?", source="warmup"),
+        RunRecord("Gibberish", "duckdb", None).to_row(),
+    ])
+    conn.close()
+
+    items = popular_questions(path, top=10)
+    assert [(i["count"], i["sql"]) for i in items] == [(2, "select count(*) from orders"),
+                                                       (1, "select count(*) from orders")]
+    assert popular_questions(str(tmp_path / "missing.db")) == []
+
+
+def test_warmer_refreshes_cached_answers(monkeypatch):
+    """Cached answers are re-executed without the LLM and dropped when the rows change"""
+    import src.agent.nodes as nodes
+
+    rows = {"value": [(1000,)]}
+
+    class FakeBackend:
+        name = "duckdb"
+
+        def translate(self, sql):
+            return sql
+
+        def execute(self, conn, cursor, sql):
+            return ["count"], rows["value"]
+
+    class FakeAgent:
+        def _session(self, engine):
+            return None, None
+
+        def query(self, *args, **kwargs):
+            raise AssertionError("refresh must not run the graph")
+
+    monkeypatch.setattr(nodes, "get_backend", lambda name: FakeBackend())
+    item = {"question": "How many orders?", "engine": "duckdb", "sql": "select count(*) from orders"}
+    key = answer_key(item["question"], item["engine"])
+    cache.ANSWER_CACHE.put(key, {"sql": item["sql"], "results": [(1000,)], "nl_response": "1,000"})
+    try:
+        warmer = CacheWarmer(FakeAgent())
+        warmer.run_item(item)
+        assert cache.ANSWER_CACHE.peek(key) is not None
+
+        rows["value"] = [(1001,)]
+        warmer.run_item(item)
+        assert cache.ANSWER_CACHE.peek(key) is None
+        assert warmer.stats == {"warmed": 0, "refreshed": 2, "changed": 1, "failed": 0, "tokens": 0}
+    finally:
+        cache.clear_caches()
@@ -0,0 +1,51 @@
+"""
+Tests for loop detection and the fix store in the correction cycle
+"""
+from src.agent.nodes import validate_sql_node
+from src.agent.routing import route_after_failure_analysis, route_after_syntax_check
+from src.memory.fix_store import FixStore
+from src.utils.sql_utils import error_signature, sql_fingerprint
+
+
+def test_fingerprints_ignore_formatting_and_error_specifics():
+    """Whitespace/case/semicolons don't change a fingerprint; names and positions don't change a signature"""
+    assert sql_fingerprint("SELECT *\n  FROM orders;") == sql_fingerprint("select * from orders")
+    assert sql_fingerprint("select 1") != sql_fingerprint("select 2")
+    assert error_signature('Execution error: column "foo" does not exist\nLINE 1: select foo\n       ^') == \
+        error_signature('Execution error: column "bar" does not exist\nLINE 3: select bar')
+
+
+def test_duplicate_attempt_short_circuits_and_escalates():
+    """Re-proposed failing SQL is not executed and the router moves to the next strategy"""
+    sql = "select bogus from orders"
+    state = {
+        "sql": sql.upper(),
+        "failed_attempts": {sql_fingerprint(sql): 'Execution error: column "bogus" does not exist'},
+        "retries": 1,
+        "total_attempts": 2,
+        "attempted_strategies": ["correct"],
+        "short_circuits": 0,
+    }
+
+    state = validate_sql_node(state, None, None)
+
+    assert state["duplicate_attempt"] and not state["valid"] and not state["executed"]
+    assert state["short_circuits"] == 1
+    assert route_after_syntax_check(state) == "analyze_failure"
+    assert route_after_failure_analysis(state) == "generate_simplified"
+
+
+def test_fix_store_maps_failed_attempts_to_fix():
+    """A recorded fix is returned for the same failing SQL and error class only"""
+    store = FixStore(max_entries=2)
+    failed_sql = sql_fingerprint("select order_hour from orders")
+    store.record({failed_sql: 'Execution error: column "order_hour" does not exist'},
+                 "select order_hour_of_day from orders")
+
+    assert store.lookup(failed_sql, 'Execution error: column "x" does not exist') == \
+        "select order_hour_of_day from orders"
+    assert store.lookup(failed_sql, "No results to validate") is None
+    assert store.lookup(sql_fingerprint("select 1"), 'Execution error: column "x" does not exist') is None
+
+    store.record({sql_fingerprint("a"): "e1", sql_fingerprint("b"): "e2"}, "select 2")
+    assert len(store) == 2
@@ -0,0 +1,134 @@
+"""
+Tests for compound question decomposition into parallel sub-queries
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+import src.agent.nodes as nodes
+from src.agent.decompose import SubQueryError, parse_decomposition, run_dag
+from src.agent.routing import route_after_decompose
+
+
+def _plan(steps, merge_sql="select s1.a, s2.b from s1 join s2 using (k)"):
+    return json.dumps({"steps": steps, "merge_sql": merge_sql})
+
+
+def test_parse_decomposition_orders_steps_and_rejects_bad_plans():
+    steps = [
+        {"id": "s2", "question": "b per k", "depends_on": ["s1"], "columns": ["k", "b"]},
+        {"id": "s1", "question": "a per k", "depends_on": [], "columns": ["k", "a"]},
+    ]
+    ordered, merge_sql = parse_decomposition(_plan(steps), max_steps=4)
+    assert [s["id"] for s in ordered] == ["s1", "s2"] and merge_sql.startswith("select s1.a")
+
+    cycle = [{**steps[0]}, {**steps[1], "depends_on": ["s2"]}]
+    assert parse_decomposition(_plan(cycle), 4) is None
+    assert parse_decomposition(_plan(steps, "select * from s1 join orders using (k)"), 4) is None
+    assert parse_decomposition(_plan(steps[1:]), 4) is None  # One step is just a query
+    assert parse_decomposition(json.dumps({"steps": [], "merge_sql": ""}), 4) is None
+    assert parse_decomposition("not json", 4) is None
+
+
+def test_run_dag_runs_independent_steps_concurrently():
+    steps = [
+        {"id": "s1", "depends_on": []},
+        {"id": "s2", "depends_on": []},
+        {"id": "s3", "depends_on": ["s1", "s2"]},
+    ]
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def run_step(step, done):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return {"sql": step["id"], "inputs": sorted(done)}
+
+    results = run_dag(steps, run_step)
+    assert peak[0] == 2 and results["s3"]["inputs"] == ["s1", "s2"]
+
+    def failing(step, done):
+        if step["id"] == "s2":
+            raise SubQueryError("s2: boom")
+        return {"sql": step["id"]}
+
+    with pytest.raises(SubQueryError):
+        run_dag(steps, failing)
+
+
+class FakeBackend:
+    name = "duckdb"
+    fail = False
+
+    def translate(self, sql):
+        return sql
+
+    def execute(self, conn, cursor, sql):
+        if self.fail:
+            raise RuntimeError("column does not exist")
+        if "from s1" in sql:  # s2 runs with s1 as a CTE
+            assert sql.startswith("with s1 (department, product_count) as (")
+            return ["department", "rate"], [("snacks", 0.5), ("produce", 0.25)]
+        return ["department", "n"], [("snacks", 33), ("produce", 33)]
+
+    def rollback(self, conn):
+        pass
+
+
+class FakePool:
+    @contextmanager
+    def connection(self):
+        yield None, None
+
+
+def test_decompose_node_merges_sub_results_and_falls_back(monkeypatch):
+    plan = _plan(
+        [
+            {"id": "s1", "question": "Products per department", "depends_on": [],
+             "columns": ["department", "product_count"]},
+            {"id": "s2", "question": "Reorder rate per department", "depends_on": ["s1"],
+             "columns": ["department", "reorder_rate"]},
+        ],
+        "select s1.department, s1.product_count, s2.reorder_rate from s1 join s2 using (department) "
+        "order by s2.reorder_rate desc",
+    )
+
+    def fake_llm(prompt, *args, **kwargs):
+        if "query decomposer" in prompt:
+            return plan
+        if "Part to answer now:\nReorder rate" in prompt:
+            return "select s1.department, 0.5 from s1"
+        return "select department, count(*) from products group by 1"
+
+    backend = FakeBackend()
+    monkeypatch.setattr(nodes, "call_llm", fake_llm)
+    monkeypatch.setattr(nodes, "get_backend", lambda name: backend)
+    monkeypatch.setattr(nodes, "get_pool", lambda name: FakePool())
+    state = {
+        "question": "Compare the number of products and the reorder rate in each department",
+        "planned_tables": ["departments", "products", "order_products_prior"],
+        "filtered_schema": {"tables": {}, "common_joins": []},
+        "engine": "duckdb",
+        "total_attempts": 0,
+    }
+
+    merged = nodes.decompose_node(state, None, None)
+    assert merged["decomposition"] == "merged" and route_after_decompose(merged) == "validate_and_respond"
+    assert merged["columns"] == ["department", "product_count", "reorder_rate"]
+    assert merged["results"] == [("snacks", 33, 0.5), ("produce", 33, 0.25)]
+    assert merged["sql"].startswith("with s1 (department, product_count) as (")
+    assert [s["status"] for s in merged["sub_queries"]] == ["executed", "executed"]
+
+    backend.fail = True
+    failed = nodes.decompose_node(state, None, None)
+    assert failed["decomposition"] == "failed" and route_after_decompose(failed) == "generate_sql"
+    assert failed["sub_queries"][0]["status"] == "failed" and not failed.get("executed")
+
+    # Single-table or non-compound questions don't spend an LLM call
+    assert nodes.decompose_node({**state, "planned_tables": ["orders"]}, None, None)["decomposition"] is None
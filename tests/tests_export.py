@@ -0,0 +1,62 @@
+"""
+Tests for result handles, streaming export and keyset pagination
+"""
+import csv
+import io
+
+import pytest
+
+from src.db.export import ExportError, create_handle, export_page, get_handle, parse_range, stream_export
+
+
+def _handle(sql, columns):
+    # DuckDB computes range() without any Parquet files
+    return get_handle(create_handle({"valid": True, "executed": True, "engine": "duckdb",
+                                     "sql": sql, "columns": columns}))
+
+
+def _csv_rows(body: bytes):
+    return list(csv.reader(io.StringIO(body.decode("utf-8"))))
+
+
+def test_keyset_pages_cover_every_row_with_a_non_unique_key():
+    stored = _handle("select i, i % 3 as g from range(1000) t(i)", ["i", "g"])
+    seen, after, pages = [], None, 0
+    while True:
+        body, after, rows = export_page(stored, "csv", "g", page_size=128, after=after)
+        page = _csv_rows(body)
+        assert page[0] == ["i", "g"] and len(page) - 1 == rows
+        seen += [(int(g), int(i)) for i, g in page[1:]]
+        pages += 1
+        if after is None:
+            break
+    assert pages == 8 and sorted(seen) == seen and len(set(seen)) == 1000
+
+    with pytest.raises(ExportError):
+        export_page(stored, "csv", "missing", page_size=10)
+    with pytest.raises(ExportError):
+        export_page(stored, "csv", "g", page_size=10, after="not-a-cursor")
+    assert create_handle({"valid": False, "executed": True, "sql": "select 1"}) is None
+
+
+def test_stream_export_formats_and_range_resumption():
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+
+    stored = _handle("select i, 'row ' || i as s, i / 2.0 as half from range(25000) t(i) order by i",
+                     ["i", "s", "half"])
+    rows = _csv_rows(b"".join(stream_export(stored, "csv")))
+    assert len(rows) == 25001 and rows[1] == ["0", "row 0", "0.0"]
+
+    table = pa.ipc.open_stream(b"".join(stream_export(stored, "arrow"))).read_all()
+    assert table.num_rows == 25000 and table.schema.field("i").type == pa.int64()
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(stream_export(stored, "parquet"))))
+    assert parquet.metadata.num_rows == 25000 and parquet.num_row_groups == 3  # One per 10,000-row chunk
+
+    # Resumed exports continue at the requested row, without a repeated CSV header
+    resumed = _csv_rows(b"".join(stream_export(stored, "csv", parse_range("rows=24998-"))))
+    assert resumed == [["24998", "row 24998", "12499.0"], ["24999", "row 24999", "12499.5"]]
+    assert parse_range("rows=10-19") == (10, 10)
+    with pytest.raises(ExportError):
+        parse_range("bytes=0-")
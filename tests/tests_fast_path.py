@@ -0,0 +1,111 @@
+"""
+Tests for fast-path (template) answers
+"""
+from src.agent.fast_path import fast_path_response
+
+
+TOP_PRODUCTS_SQL = (
+    "select p.product_name, count(*) as order_count from order_products_prior op "
+    "join products p on op.product_id = p.product_id "
+    "group by p.product_name order by order_count desc limit 3"
+)
+
+
+def test_simple_shapes_are_answered_from_templates():
+    assert fast_path_response(
+        "How many departments are there?", "select count(*) from departments", ["count"], [(21,)]
+    ) == "There are 21 departments."
+
+    assert fast_path_response(
+        "Which department has the most products?",
+        "select d.department, count(*) as product_count from products p join departments d "
+        "on p.department_id = d.department_id group by d.department order by product_count desc limit 1",
+        ["department", "product_count"], [("personal care", 6563)],
+    ) == "The department with the most products is personal care (product count: 6,563)."
+
+    answer = fast_path_response(
+        "Show me the top 3 most ordered products", TOP_PRODUCTS_SQL,
+        ["product_name", "order_count"], [("Banana", 472565), ("Organic Strawberries", 264683), ("Limes", 9)],
+    )
+    assert answer.startswith("Here are the top 3 most ordered products:\n1. Banana (order count: 472,565)")
+
+
+def test_low_confidence_goes_to_the_llm():
+    rows = [("Banana", 3), ("Limes", 2), ("Kiwi", 1)]
+    # Question counts aisles, SQL counts departments
+    assert fast_path_response("How many aisles are there?", "select count(*) from departments", ["count"], [(21,)]) is None
+    # Requested N doesn't match the rows
+    assert fast_path_response("Top 5 most ordered products", TOP_PRODUCTS_SQL, ["product_name", "order_count"], rows) is None
+    # Column that names nothing in the question
+    assert fast_path_response("Top 3 most ordered products", TOP_PRODUCTS_SQL, ["aisle", "order_count"], rows) is None
+    # NULLs, truncated results and unordered lists
+    assert fast_path_response("How many orders are there?", "select count(*) from orders", ["count"], [(None,)]) is None
+    assert fast_path_response("Top 3 most ordered products", TOP_PRODUCTS_SQL, ["product_name", "order_count"], rows, truncated=True) is None
+    assert fast_path_response("Show me products in snacks", "select product_name from products", ["product_name"], [("a",), ("b",)]) is None
+
+
+def test_filtered_questions_need_the_filter_in_the_sql():
+    """Conditions the question states must be in the SQL, and the SQL must not add its own"""
+    count = ["count"]
+    assert fast_path_response(
+        "How many products are in the dairy eggs department?", "select count(*) from products", count, [(49688,)]
+    ) is None
+    assert fast_path_response(
+        "How many orders were placed on weekends?", "select count(*) as weekend_orders from orders", count, [(9,)]
+    ) is None
+    assert fast_path_response(
+        "Top 3 products in the snacks department", TOP_PRODUCTS_SQL,
+        ["product_name", "order_count"], [("Banana", 3), ("Limes", 2), ("Kiwi", 1)],
+    ) is None
+    # A filter the question doesn't state, or a different value than it asks for
+    assert fast_path_response("How many orders are there?", "select count(*) from orders where order_dow = 0", count, [(9,)]) is None
+    assert fast_path_response(
+        "How many products are in the snacks department?",
+        "select count(*) from products p join departments d on p.department_id = d.department_id "
+        "where d.department = 'dairy eggs'", count, [(3449,)],
+    ) is None
+
+    assert fast_path_response(
+        "How many products are in the dairy eggs department?",
+        "select count(*) from products p join departments d on p.department_id = d.department_id "
+        "where d.department = 'dairy eggs'", count, [(3449,)],
+    ) == "There are 3,449 products in the dairy eggs department."
+    assert fast_path_response(
+        "How many reordered products are there?",
+        "select count(distinct product_id) from order_products_prior where reordered = 1", count, [(12,)],
+    ) == "There are 12 reordered products."
+    # COUNT(*) over order lines is not a number of products
+    assert fast_path_response(
+        "How many reordered products are there?", "select count(*) from order_products_prior where reordered = 1",
+        count, [(12,)],
+    ) is None
+
+
+def test_rankings_must_sort_the_way_the_question_asks():
+    """DESC answers top / most, ASC answers bottom / least; the answer says which was asked"""
+    columns, rows = ["product_name", "order_count"], [("Kiwi", 1), ("Limes", 2), ("Banana", 3)]
+    ascending = TOP_PRODUCTS_SQL.replace("desc", "asc")
+    assert fast_path_response("Bottom 3 ordered products", ascending, columns, rows) == (
+        "Here are the bottom 3 ordered products:\n1. Kiwi (order count: 1)\n2. Limes (order count: 2)\n"
+        "3. Banana (order count: 3)"
+    )
+    assert fast_path_response("Show me the 3 least ordered products", ascending, columns, rows).startswith(
+        "Here are the 3 least ordered products:"
+    )
+
+    assert fast_path_response("Bottom 3 ordered products", TOP_PRODUCTS_SQL, columns, rows) is None
+    assert fast_path_response("Top 3 ordered products", ascending, columns, rows) is None
+    assert fast_path_response("The 3 most ordered products", ascending, columns, rows) is None
+    assert fast_path_response("The 3 least ordered products", TOP_PRODUCTS_SQL, columns, rows) is None
+    assert fast_path_response("Top 3 least ordered products", ascending, columns, rows) is None
+
+    most_products = (
+        "select d.department, count(*) as product_count from products p join departments d "
+        "on p.department_id = d.department_id group by d.department order by product_count {} limit 1"
+    )
+    top_row = ["department", "product_count"], [("bulk", 38)]
+    assert fast_path_response("Which department has the most products?", most_products.format("asc"), *top_row) is None
+    assert fast_path_response("Which department has the fewest products?", most_products.format("desc"), *top_row) is None
+    assert fast_path_response("Which department has the least products?", most_products.format(""), *top_row) == (
+        "The department with the least products is bulk (product count: 38)."
+    )
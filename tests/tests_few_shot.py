@@ -0,0 +1,33 @@
+"""
+Tests for the few-shot example store and retrieval index
+"""
+from src.memory.few_shot import ExampleStore
+
+
+def test_retrieves_most_similar_example(tmp_path):
+    """Nearest question by TF-IDF cosine similarity comes first"""
+    store = ExampleStore(str(tmp_path / "examples.jsonl"))
+    store.add("How many products are in the dairy eggs department?", "select 1", ["products"])
+    store.add("What are the busiest hours of the day for orders?", "select 2", ["orders"])
+
+    results = store.search("how many products in the snacks department", k=2)
+
+    assert results[0]["sql"] == "select 1"
+    assert all(r["similarity"] >= 0.2 for r in results)
+
+
+def test_deduplicates_and_bounds_store(tmp_path):
+    """Same question replaces the older entry and the store never exceeds its bound"""
+    path = tmp_path / "examples.jsonl"
+    store = ExampleStore(str(path), max_examples=2)
+
+    assert store.add("top 5 products", "select 1") is True
+    assert store.add("Top 5 products?", "select 1") is False
+    store.add("top 5 products", "select 2")
+    store.add("orders per day", "select 3")
+    store.add("orders per hour", "select 4")
+
+    assert len(store) == 2
+    reloaded = ExampleStore(str(path), max_examples=2)
+    assert [e["sql"] for e in reloaded.search("orders per hour", k=2)][0] == "select 4"
+    assert len(reloaded) == 2
@@ -0,0 +1,77 @@
+"""
+Tests for session follow-ups over the previous result
+"""
+import json
+
+import src.agent.nodes as nodes
+from src.agent.follow_up import compose_follow_up_sql, run_on_previous, session_context
+from src.agent.routing import route_after_follow_up, route_entry
+
+
+PREVIOUS_TURN = {
+    "question": "How many products does each department have?",
+    "sql": "select d.department, count(*) as product_count from products p "
+           "join departments d using (department_id) group by 1 order by 2 desc;",
+    "valid": True,
+    "executed": True,
+    "columns": ["department", "product_count"],
+    "results": [("dairy eggs", 34), ("snacks", 33), ("produce", 33)],
+    "truncated": False,
+    "planned_tables": ["products", "departments"],
+}
+
+
+def test_session_context_is_column_oriented_and_survives_failed_turns():
+    previous = session_context(PREVIOUS_TURN)
+    assert previous["data"] == {"department": ["dairy eggs", "snacks", "produce"], "product_count": [34, 33, 33]}
+    # A failed follow-up keeps the context it was given
+    assert session_context({"question": "?", "valid": False, "previous": previous}) is previous
+    assert session_context(None) is None
+
+
+def test_compose_follow_up_sql():
+    """The previous SQL becomes the `previous` CTE, ahead of any CTEs of the follow-up"""
+    assert compose_follow_up_sql("select 1 as a;", "select * from previous") == \
+        "with previous as (\nselect 1 as a\n)\nselect * from previous"
+    assert compose_follow_up_sql("select 1 as a", "WITH t AS (select a from previous) select * from t") == \
+        "with previous as (\nselect 1 as a\n),\nt AS (select a from previous) select * from t"
+
+
+def test_run_on_previous_filters_cached_columns():
+    previous = session_context(PREVIOUS_TURN)
+    columns, rows = run_on_previous(
+        previous, "select department from previous where product_count = 33 order by department"
+    )
+    assert columns == ["department"] and rows == [("produce",), ("snacks",)]
+    _, rows = run_on_previous(previous, "select sum(product_count) / count(*) from previous")
+    assert rows == [(33,)]  # integer division, as in Postgres
+
+
+def test_follow_up_node_local_cte_and_new(monkeypatch):
+    """Refinements of a complete result run locally; anything touching other tables is composed"""
+    responses = {}
+    monkeypatch.setattr(nodes, "call_llm", lambda prompt, *a, **kw: responses["next"])
+    state = {"question": "only dairy", "previous": session_context(PREVIOUS_TURN), "total_attempts": 0}
+    assert route_entry(state) == "follow_up" and route_entry({"previous": None}) == "match_template"
+
+    responses["next"] = json.dumps({"refines_previous": True,
+                                    "sql": "select * from previous where department = 'dairy eggs'"})
+    local = nodes.follow_up_node(state, None, None)
+    assert local["follow_up"] == "local" and local["results"] == [("dairy eggs", 34)]
+    assert local["sql"].startswith("with previous as (") and route_after_follow_up(local) == "validate_and_respond"
+
+    responses["next"] = json.dumps({"refines_previous": True,
+                                    "sql": "select p.*, a.aisle from previous p join aisles a on true"})
+    composed = nodes.follow_up_node(state, None, None)
+    assert composed["follow_up"] == "cte" and not composed.get("executed")
+    assert composed["planned_tables"] == ["aisles", "departments", "products"]
+    assert route_after_follow_up(composed) == "validate_sql"
+
+    # A truncated previous result can't be refined locally
+    truncated = {**state, "previous": {**state["previous"], "truncated": True}}
+    responses["next"] = json.dumps({"refines_previous": True, "sql": "select * from previous order by 2"})
+    assert nodes.follow_up_node(truncated, None, None)["follow_up"] == "cte"
+
+    responses["next"] = json.dumps({"refines_previous": False, "sql": ""})
+    new = nodes.follow_up_node(state, None, None)
+    assert new["follow_up"] == "new" and route_after_follow_up(new) == "match_template"
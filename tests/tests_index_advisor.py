@@ -0,0 +1,149 @@
+"""
+Tests for the workload-driven index advisor
+"""
+import pytest
+from src.db.index_advisor import (
+    extract_candidates,
+    rank_recommendations,
+    record_workload,
+    load_workload,
+)
+
+
+KNOWN_COLUMNS = {
+    "orders": {"order_id", "user_id", "order_dow", "order_hour_of_day"},
+    "order_products_prior": {"order_id", "product_id", "reordered"},
+    "products": {"product_id", "product_name", "department_id"},
+}
+
+# Trimmed EXPLAIN (ANALYZE, FORMAT JSON) output for:
+# select p.product_name, count(*) from order_products_prior op
+# join products p on op.product_id = p.product_id
+# join orders o on o.order_id = op.order_id where o.order_dow = 0 group by 1
+SAMPLE_PLAN = {
+    "Plan": {
+        "Node Type": "Hash Join",
+        "Actual Total Time": 900.0,
+        "Actual Loops": 1,
+        "Hash Cond": "(op.order_id = o.order_id)",
+        "Plans": [
+            {
+                "Node Type": "Seq Scan",
+                "Relation Name": "order_products_prior",
+                "Alias": "op",
+                "Actual Total Time": 500.0,
+                "Actual Rows": 1000000,
+                "Actual Loops": 1,
+            },
+            {
+                "Node Type": "Hash",
+                "Actual Total Time": 300.0,
+                "Actual Loops": 1,
+                "Plans": [
+                    {
+                        "Node Type": "Seq Scan",
+                        "Relation Name": "orders",
+                        "Alias": "o",
+                        "Filter": "(order_dow = 0)",
+                        "Rows Removed by Filter": 90000,
+                        "Actual Total Time": 300.0,
+                        "Actual Rows": 10000,
+                        "Actual Loops": 1,
+                    }
+                ],
+            },
+        ],
+    }
+}
+
+
+def test_extract_filter_and_join_candidates():
+    """Filter and join columns are resolved through plan aliases"""
+    candidates = extract_candidates(SAMPLE_PLAN, KNOWN_COLUMNS)
+    found = {(c["table"], tuple(c["columns"]), c["kind"]) for c in candidates}
+
+    assert ("orders", ("order_dow",), "filter") in found
+    assert ("order_products_prior", ("order_id",), "join") in found
+
+
+def test_rank_skips_existing_indexes():
+    """Candidates covered by an existing index are not recommended"""
+    item = {"sql": "select 1", "count": 3}
+    analyzed = [(item, extract_candidates(SAMPLE_PLAN, KNOWN_COLUMNS))]
+
+    recs = rank_recommendations(analyzed, {"order_products_prior": [["order_id"]]})
+
+    assert [r["table"] for r in recs] == ["orders"]
+    assert recs[0]["occurrences"] == 3
+    assert recs[0]["ddl"].startswith("CREATE INDEX IF NOT EXISTS idx_orders_order_dow")
+
+
+def test_workload_log_groups_statements(tmp_path):
+    """Repeated statements are grouped by normalized SQL"""
+    log = tmp_path / "workload.jsonl"
+    record_workload("SELECT * FROM orders", 10.0, 5, str(log))
+    record_workload("select *   from orders", 20.0, 5, str(log))
+
+    workload = load_workload(str(log))
+
+    assert list(workload) == ["select * from orders"]
+    assert workload["select * from orders"]["count"] == 2
+
+
+
+class _Conn:
+    def rollback(self):
+        pass
+
+
+class _Cursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def fetchone(self):
+        return ([{"Plan": {"Node Type": "Result"}, "Execution Time": 0.1}],)
+
+
+def test_replay_skips_statements_that_fail_validation(tmp_path):
+    """Only read-only SELECTs are replayed with EXPLAIN ANALYZE, each in a read-only transaction"""
+    from src.db.index_advisor import analyze_workload
+
+    log = tmp_path / "workload.jsonl"
+    record_workload("delete from orders where order_dow = 0", 1.0, 0, str(log))
+    record_workload("select 1; drop table orders", 1.0, 0, str(log))
+    record_workload("select count(*) from orders where order_dow = 0", 1.0, 1, str(log))
+    cursor = _Cursor()
+
+    analyzed = analyze_workload(_Conn(), cursor, str(log))
+
+    assert [item["sql"] for item, _ in analyzed] == ["select count(*) from orders where order_dow = 0"]
+    assert cursor.statements[0] == "SET TRANSACTION READ ONLY"
+    assert [sql for sql in cursor.statements if sql.startswith("EXPLAIN")] == [
+        "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) select count(*) from orders where order_dow = 0"
+    ]
+
+def test_report_against_local_database(tmp_path):
+    """End-to-end analysis against the local Instacart database"""
+    psycopg2 = pytest.importorskip("psycopg2")
+    from src.db.db_connection import get_db_connection
+    from src.db.index_advisor import analyze_workload, fetch_existing_indexes
+
+    log = tmp_path / "workload.jsonl"
+    record_workload("select count(*) from orders where order_hour_of_day = 10", 1.0, 1, str(log))
+
+    try:
+        conn = get_db_connection()
+    except psycopg2.OperationalError:
+        pytest.skip("Local Postgres not available")
+    cursor = conn.cursor()
+    try:
+        analyzed = analyze_workload(conn, cursor, str(log))
+        recs = rank_recommendations(analyzed, fetch_existing_indexes(cursor))
+    finally:
+        cursor.close()
+        conn.close()
+
+    assert any(r["table"] == "orders" and r["columns"] == ["order_hour_of_day"] for r in recs)
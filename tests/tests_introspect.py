@@ -0,0 +1,50 @@
+"""
+Tests for schema introspection helpers
+"""
+import pytest
+
+from src.schema.introspect import column_stats, merge_table, parse_pg_array
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("{dairy eggs,bakery,snacks}", ["dairy eggs", "bakery", "snacks"]),
+    ('{"frozen, meals","say \\"hi\\"",plain}', ["frozen, meals", 'say "hi"', "plain"]),
+    ('{NULL,"NULL",x}', ["NULL", "x"]),
+    ('{""}', [""]),
+    ("{}", []),
+    (None, []),
+    ("not an array", []),
+])
+def test_parse_pg_array(text, expected):
+    assert parse_pg_array(text) == expected
+
+
+def test_column_stats():
+    # Negative n_distinct is a fraction of the row count
+    assert column_stats(-0.5, 0, [], "integer", 1000) == {"distinct": 500}
+
+    departments = column_stats(21, 0.01234, ["produce", "dairy eggs"], "text", 49688)
+    assert departments == {"distinct": 21, "null_frac": 0.0123,
+                           "common_values": ["produce", "dairy eggs"], "case": "lowercase"}
+
+    assert "case" not in column_stats(3, 0, ["Banana", "apple"], "character varying", 10)
+    # High-cardinality and non-text columns keep no literals
+    assert "common_values" not in column_stats(-1, 0, ["a"], "text", 10 ** 6)
+    assert "common_values" not in column_stats(7, 0, ["0", "1"], "integer", 100)
+
+
+def test_merge_keeps_hand_written_descriptions():
+    fresh = {"columns": {"aisle_id": {"data_type": "integer"}, "aisle": {"data_type": "text"}},
+             "primary_key": ["aisle_id"]}
+    previous = {
+        "description": "Grocery aisles",
+        "columns": {"aisle": {"data_type": "character varying", "description": "Aisle name, lowercase"},
+                    "dropped": {"description": "No longer exists"}},
+    }
+
+    merged = merge_table(fresh, previous)
+
+    assert merged["description"] == "Grocery aisles"
+    assert merged["columns"]["aisle"] == {"data_type": "text", "description": "Aisle name, lowercase"}
+    assert "description" not in merged["columns"]["aisle_id"] and "dropped" not in merged["columns"]
+    assert merge_table({"columns": {}}, None) == {"columns": {}}
@@ -0,0 +1,47 @@
+"""
+Tests for the load-testing harness (stub LLM and report)
+"""
+import json
+
+from fastapi.testclient import TestClient
+
+from benchmarks.load_test import parse_metrics, summarize
+from benchmarks.stub_llm import create_app
+
+
+def test_stub_llm_speaks_openai_chat_completions():
+    """Planner, generator and validator prompts get usable canned answers"""
+    client = TestClient(create_app("fixed:0"))
+
+    def ask(prompt):
+        response = client.post("/v1/chat/completions", json={
+            "model": "gpt-4o-mini", "messages": [{"role": "user", "content": prompt}],
+        })
+        assert response.status_code == 200
+        body = response.json()
+        assert body["usage"]["total_tokens"] > 0
+        return body["choices"][0]["message"]["content"]
+
+    question = "Which department has the most products?"
+    assert json.loads(ask(f"You are a database query planner.\n{question}")) == ["departments", "products"]
+    assert ask(f"Generate SQL for: {question}").startswith("select d.department")
+    assert json.loads(ask(f"You are a SQL result validator and response generator.\n{question}"))["valid"]
+
+
+def test_summary_percentiles_errors_and_resources():
+    records = [{"latency": i / 100, "outcome": "ok"} for i in range(1, 101)]
+    records += [{"latency": 0.01, "outcome": "shed_queue_full"}] * 10
+    samples = [
+        {"t": 0.0, **parse_metrics("process_cpu_seconds_total 1.0\nprocess_resident_memory_bytes 1048576\n")},
+        {"t": 2.0, **parse_metrics('process_cpu_seconds_total 2.0\nprocess_resident_memory_bytes 2097152\n'
+                                   'agent_queue_depth 3.0\nhttp_requests_total{path="/query"} 5.0\n')},
+    ]
+
+    summary = summarize(records, elapsed=10.0, samples=samples)
+
+    assert summary["throughput_rps"] == 10.0
+    assert summary["p50_s"] == 0.51 and summary["p99_s"] == 0.99
+    assert summary["error_rate"] == round(10 / 110, 4)
+    assert summary["outcomes"] == {"ok": 100, "shed_queue_full": 10}
+    assert summary["cpu_percent"] == 50.0 and summary["max_rss_mb"] == 2.0
+    assert summary["max_queue_depth"] == 3
@@ -0,0 +1,136 @@
+"""
+Tests for running the API as several worker processes
+"""
+import multiprocessing
+import os
+import tracemalloc
+
+# Worker processes import this module: the modules they configure through
+# the environment (prometheus_client, src.*) are only imported in functions
+ROWS = [(i, f"product {i}", i * 1.5) for i in range(200)]
+
+
+def _worker(env, requests, results, queue):
+    """One API worker: serve requests, store results, report cache hits and heap growth"""
+    os.environ.update(env)
+    from fastapi.testclient import TestClient
+
+    import backend_server.app as app
+    from src.memory.cache import RESULT_CACHE
+
+    client = TestClient(app.app)
+    for _ in range(requests):
+        assert client.get("/").status_code == 200
+    hits = sum(RESULT_CACHE.get(("default", "duckdb", f"sql {i}")) == ROWS for i in range(results))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(results):
+        RESULT_CACHE.put(("default", "duckdb", f"sql {i}"), list(ROWS))
+    queue.put((hits, tracemalloc.get_traced_memory()[0] - before, client.get("/metrics").text))
+
+
+def test_workers_aggregate_metrics_and_share_caches(tmp_path):
+    from prometheus_client import CollectorRegistry, multiprocess
+
+    from src.memory.cache import TTLCache
+
+    env = {
+        "PROMETHEUS_MULTIPROC_DIR": str(tmp_path / "metrics"),
+        "SHARED_CACHE_PATH": str(tmp_path / "cache.db"),
+        "RUN_LOG_ENABLED": "false",
+    }
+    os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    reports = []
+    for requests in (3, 5):
+        worker = context.Process(target=_worker, args=(env, requests, 100, queue))
+        worker.start()
+        reports.append(queue.get(timeout=120))
+        worker.join()
+        assert worker.exitcode == 0
+
+    # The second worker found every result the first one stored
+    assert [hits for hits, _, _ in reports] == [0, 100]
+    # Either worker's /metrics covers both (the scrape itself is counted after rendering)
+    assert 'http_requests_total{method="GET",path="/",status="200"} 8.0' in reports[1][2]
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, env["PROMETHEUS_MULTIPROC_DIR"])
+    assert registry.get_sample_value("http_requests_total", {"method": "GET", "path": "/", "status": "200"}) == 8
+
+    # The same entries held in process: every worker would pay this
+    local = TTLCache("result", 600)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(100):
+        local.put(("default", "duckdb", f"sql {i}"), list(ROWS))
+    in_process = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert max(growth for _, growth, _ in reports) < in_process / 10
+
+
+def test_shared_cache_failures_are_misses_and_every_cache_is_pruned(tmp_path, monkeypatch):
+    import sqlite3
+
+    from src.memory import shared_cache
+    from src.memory.cache import TTLCache
+    from src.memory.shared_cache import SharedStore
+
+    store = SharedStore(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(shared_cache, "PRUNE_EVERY", 10)
+    rare, busy = TTLCache("rare", 600, max_entries=2, shared=store), TTLCache("busy", 600, max_entries=100, shared=store)
+    for i in range(5):
+        rare.put(("default", f"q{i}"), i)
+    for i in range(5):
+        busy.put(("default", f"q{i}"), i)
+    # The tenth put was the busy cache's, and the rare one was trimmed as well
+    assert len(rare) == 2 and rare.get(("default", "q4")) == 4 and rare.get(("default", "q0")) is None
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    for operation in ("get", "put", "delete", "count"):
+        monkeypatch.setattr(store, operation, locked)
+    assert busy.get(("default", "q1")) is None
+    busy.put(("default", "q9"), 9)
+    busy.invalidate(("default", "q1"))
+    assert len(busy) == 0 and busy.stats["shared_errors"] == 4
+
+
+def test_shared_entries_are_json_and_read_back_as_stored(tmp_path):
+    """Result rows keep their types; an entry that isn't this JSON (e.g. a planted pickle) is a miss"""
+    import datetime
+    import decimal
+    import pickle
+    import sqlite3
+
+    from src.memory.cache import TTLCache
+    from src.memory.shared_cache import SharedStore
+
+    path = tmp_path / "cache.db"
+    cache = TTLCache("result", 600, shared=SharedStore(str(path)))
+    result = {
+        "columns": ["day", "revenue", "at"],
+        "results": [(datetime.date(2024, 1, 2), decimal.Decimal("10.50"), datetime.datetime(2024, 1, 2, 3, 4))],
+        "approximation": None,
+    }
+    cache.put(("default", "duckdb", "select 1"), result)
+    assert cache.get(("default", "duckdb", "select 1")) == result
+    assert cache.invalidate_where(lambda key: key[2] == "select 1") == 1
+    stamp = ("default", "duckdb", (("orders", "7"),))
+    cache.shared.put("result", ("default", "duckdb", "select 2"), result, 600, 100, stamp)
+    assert cache.shared.get("result", ("default", "duckdb", "select 2")) == (result, stamp)
+    assert path.stat().st_mode & 0o777 == 0o600
+
+    class Exploit:
+        def __reduce__(self):
+            return print, ("unpickled",)
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("update cache_entries set value = ?", (pickle.dumps(Exploit()),))
+    conn.close()
+    assert cache.get(("default", "duckdb", "select 2")) is None and cache.stats["shared_errors"] == 1
+
+    cache.put(("default", "duckdb", "select 3"), {"rows": {1, 2}})  # A set isn't shared: a skipped write
+    assert cache.stats["shared_errors"] == 2
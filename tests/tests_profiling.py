@@ -0,0 +1,36 @@
+"""
+Tests for on-demand request profiling
+"""
+import json
+import pstats
+import time
+
+import pytest
+
+from src.utils import profiling
+
+
+def test_armed_profiling_captures_only_matching_requests(tmp_path):
+    profiling.arm(requests=1, pattern="reorder", interval_ms=1)
+    try:
+        with profiling.profile_request("How many orders?", str(tmp_path)) as capture:
+            assert capture is None
+        with profiling.profile_request("Top reordered products", str(tmp_path)) as capture:
+            with profiling.profile_node("execute_sql"):
+                time.sleep(0.02)
+                data = [str(i) for i in range(10000)]
+        assert not profiling.status()["armed"]
+        with profiling.profile_request("Top reordered products", str(tmp_path)) as later:
+            assert later is None
+    finally:
+        profiling.disarm()
+
+    summary = json.loads((tmp_path / f"{capture.id}.json").read_text())
+    assert [node["node"] for node in summary["nodes"]] == ["execute_sql"]
+    assert summary["nodes"][0]["ms"] >= 20 and summary["nodes"][0]["allocated_kb"] > 0 and data
+    assert sorted(summary["files"]) == ["folded", "json", "prof", "tracemalloc"]
+    assert any(line.startswith("node:execute_sql;") for line in (tmp_path / f"{capture.id}.folded").open())
+    assert pstats.Stats(str(tmp_path / f"{capture.id}.prof")).total_calls > 0
+    assert [c["id"] for c in profiling.list_captures(str(tmp_path))] == [capture.id]
+    with pytest.raises(profiling.ProfilingError):
+        profiling.capture_path("../etc", "json", str(tmp_path))
@@ -0,0 +1,112 @@
+"""
+Tests for query templates and prepared template execution
+"""
+import json
+
+import pytest
+
+import src.agent.nodes as nodes
+from src.db.backends import PostgresBackend
+from src.memory import query_templates
+from src.memory.query_templates import TemplateStore, extract_template, match_template, render
+
+QUESTION = "Top 5 products in the dairy eggs department"
+SQL = (
+    "select p.product_name, count(*) from order_products op "
+    "join products p on p.product_id = op.product_id "
+    "join departments d on d.department_id = p.department_id "
+    "where d.department = 'dairy eggs' and op.reordered = 1 "
+    "group by 1 order by 2 desc limit 5"
+)
+
+
+def test_extracts_and_fills_template(tmp_path, monkeypatch):
+    """Literals the question mentions become slots; literal variations fill them without the LLM"""
+    template = extract_template(QUESTION, SQL)
+    assert template["question"] == "top {s1} products in the {s2} department"
+    assert "LIMIT $1" in template["sql"] and "department = $2" in template["sql"]
+    assert "reordered = 1" in template["sql"]  # Not in the question: stays a constant
+    assert extract_template("How many orders are there?", "select count(*) from orders") is None
+
+    monkeypatch.setattr(query_templates, "_store", TemplateStore(str(tmp_path / "templates.jsonl")))
+    monkeypatch.setattr(query_templates, "QUERY_TEMPLATE_LLM_FILL", False)
+    query_templates.record_template(QUESTION, SQL)
+
+    matched, params, filled = match_template("top 10 products in the bakery department?")
+    assert (params, filled) == ([10, "bakery"], "pattern")
+    rendered = render(matched, params)
+    assert "department = 'bakery'" in rendered and rendered.endswith("LIMIT 10")
+    assert match_template("top 10 products in the bakery aisle") is None
+
+    query_templates.reject_template(matched["question"])
+    assert match_template("top 10 products in the bakery department") is None
+
+
+class _Cursor:
+    def __init__(self):
+        self.statements = []
+        self.description = [("product_name",)]
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+
+    def fetchall(self):
+        return [("Banana",)]
+
+
+class _Connection:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_prepared_statements_are_reused_per_connection(monkeypatch):
+    """One PREPARE per statement and connection; the least recently used is deallocated past the limit"""
+    monkeypatch.setattr("src.db.backends.PREPARED_STATEMENTS_PER_CONNECTION", 1)
+    backend, conn, cursor = PostgresBackend(), _Connection(), _Cursor()
+
+    for limit in (5, 10):
+        columns, rows = backend.execute_prepared(conn, cursor, "select 1 limit $1", [limit], "unused")
+    assert (columns, rows) == (["product_name"], [("Banana",)])
+    prepares = [sql for sql, _ in cursor.statements if sql.startswith("PREPARE")]
+    assert len(prepares) == 1 and cursor.statements[-1][1] == [10]
+
+    backend.execute_prepared(conn, cursor, "select 2 limit $1", [5], "unused")
+    assert cursor.statements[-3][0].startswith("PREPARE") and cursor.statements[-2][0].startswith("DEALLOCATE")
+
+
+def test_failed_execution_deallocates_the_statement():
+    """The next use prepares the statement again instead of hitting "already exists" """
+    class FailingOnce(_Cursor):
+        def execute(self, sql, params=None):
+            super().execute(sql, params)
+            if sql.startswith("EXECUTE") and len(self.statements) == 2:
+                raise RuntimeError("canceling statement due to statement timeout")
+
+    backend, conn, cursor = PostgresBackend(), _Connection(), FailingOnce()
+    with pytest.raises(RuntimeError):
+        backend.execute_prepared(conn, cursor, "select 1 limit $1", [5], "unused")
+    assert cursor.statements[-1][0].startswith("DEALLOCATE tpl_")
+    assert not backend._prepared.get(conn)  # Evicted: the next use prepares it again
+    backend.execute_prepared(conn, cursor, "select 1 limit $1", [5], "unused")
+    assert [sql.split()[0] for sql, _ in cursor.statements[-2:]] == ["PREPARE", "EXECUTE"]
+
+
+def test_llm_filled_templates_are_checked_by_the_validation_llm(monkeypatch):
+    """The fast path would accept the result, but slots an LLM filled are never taken on trust"""
+    calls = []
+    response = {"valid": True, "reason": None, "natural_language_response": "There are 21 departments."}
+    monkeypatch.setattr(nodes, "call_llm", lambda prompt, *a, **kw: calls.append(prompt) or json.dumps(response))
+    monkeypatch.setattr(nodes, "record_example", lambda *a, **kw: None)
+    monkeypatch.setattr(nodes, "record_fixes", lambda *a, **kw: None)
+    sql = "select count(*) from departments"
+    state = {"question": "How many departments are there?", "sql": sql, "executed": True,
+             "columns": ["count"], "results": [(21,)], "truncated": False}
+
+    for filled, llm_calls in (("pattern", 0), ("llm", 1)):
+        template = {"pattern": "how many {s1} are there", "sql": sql, "params": [], "rendered": sql, "filled": filled}
+        result = nodes.validate_and_respond_node({**state, "query_template": template}, None, None)
+        assert result["valid"] and bool(result.get("fast_path")) == (filled == "pattern")
+        assert len(calls) == llm_calls
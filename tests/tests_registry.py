@@ -0,0 +1,50 @@
+"""
+Tests for the multi-database registry
+"""
+import time
+
+import pytest
+
+from src.db.backends import get_backend, get_pool
+from src.db.registry import DatabaseRegistry, UnknownDatabaseError, load_database_configs, use_database
+from src.memory import cache
+from src.memory.cache import answer_key
+from src.utils.schema_utils import SCHEMA_PATH, current_schema
+
+
+def test_registry_opens_lazily_and_evicts_idle_databases(tmp_path):
+    """Resources are created on first use; idle databases close with their cache entries"""
+    configs = {name: {"parquet_dir": str(tmp_path / name), "schema_path": str(SCHEMA_PATH)} for name in ("eu", "us")}
+    registry = DatabaseRegistry(configs, idle_ttl_s=60, max_open=2)  # "default" plus one more
+    try:
+        with registry.acquire("eu") as eu, use_database(eu):
+            assert eu.stats()["backends"] == [] and not eu.stats()["schema_loaded"]
+            assert get_backend("duckdb").parquet_dir == tmp_path / "eu"
+            with get_pool("duckdb").connection() as (conn, cursor):
+                cursor.execute("select 1")
+            assert "orders" in current_schema()["tables"]
+            cache.ANSWER_CACHE.put(answer_key("How many orders?", "duckdb"), {"sql": "select 1"})
+            assert eu.stats()["pooled_connections"] == {"duckdb": 1}
+
+        with registry.acquire("us") as us, use_database(us):
+            assert answer_key("How many orders?", "duckdb")[0] == "us"
+            cache.ANSWER_CACHE.put(answer_key("How many orders?", "duckdb"), {"sql": "select 2"})
+        # Opening "us" went over max_open, so the least recently used idle database closed
+        assert set(registry.stats()) == {"default", "us"}
+        assert [key[0] for key in cache.ANSWER_CACHE._entries] == ["us"]
+
+        assert registry.evict_idle(now=time.monotonic() + 120) == ["us"]
+        assert set(registry.stats()) == {"default"} and len(cache.ANSWER_CACHE) == 0
+        with pytest.raises(UnknownDatabaseError):
+            registry.open("nope")
+    finally:
+        registry.close()
+        cache.clear_caches()
+
+
+def test_load_database_configs_expands_environment(tmp_path, monkeypatch):
+    path = tmp_path / "databases.yaml"
+    path.write_text("databases:\n  eu:\n    host: eu.internal\n    password: ${EU_DB_PASSWORD}\n    port: 6432\n")
+    monkeypatch.setenv("EU_DB_PASSWORD", "secret")
+    assert load_database_configs(str(path)) == {"eu": {"host": "eu.internal", "password": "secret", "port": 6432}}
+    assert load_database_configs(str(tmp_path / "missing.yaml")) == {}
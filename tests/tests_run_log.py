@@ -0,0 +1,103 @@
+"""
+Tests for the persistent run log
+"""
+import time
+
+from src.utils.run_log import RunLog, RunRecord, connect, run_report, write_runs
+
+
+def _answered_run(question: str, usage=None) -> RunRecord:
+    run = RunRecord(question, "duckdb", usage)
+    state = {"question": question, "planned_tables": ["orders"], "current_strategy": "direct"}
+    steps = [
+        ("planning", {}),
+        ("generate_sql", {"sql": "select bogus from orders"}),
+        ("validate_sql", {"valid": True}),
+        ("execute_sql", {"executed": False, "reason": 'Execution error: column "bogus" does not exist'}),
+        ("correct_sql", {"sql": "select count(*) from orders", "current_strategy": "correct"}),
+        ("validate_sql", {"valid": True}),
+        ("execute_sql", {"executed": True, "results": [(1000,)], "reason": None}),
+        ("validate_and_respond", {"valid": True}),
+    ]
+    for node, update in steps:
+        state = {**state, **update}
+        run.record_node(node, time.perf_counter(), state)
+    return run
+
+
+def test_records_attempts_and_outcome():
+    """Each candidate SQL becomes one attempt; the final state decides the outcome"""
+    row = _answered_run("How many orders?", {"calls": 3, "input_tokens": 0, "output_tokens": 0,
+                                            "total_tokens": 900}).to_row()
+
+    assert row["outcome"] == "answered" and row["failure_type"] is None
+    assert [a["status"] for a in row["attempt_rows"]] == ["execution_error", "answered"]
+    assert [a["strategy"] for a in row["attempt_rows"]] == ["direct", "correct"]
+    assert row["attempt_rows"][1]["rows"] == 1
+    assert [n["node"] for n in row["nodes"]][:3] == ["planning", "generate_sql", "validate_sql"]
+    assert row["total_tokens"] == 900 and row["rows"] == 1
+
+    clarified = RunRecord("Gibberish", None, None)
+    clarified.record_node("ask_clarification", time.perf_counter(), {"valid": False, "failure_type": "unknown"})
+    assert clarified.to_row()["outcome"] == "clarification"
+    assert RunRecord("Boom", None, None).to_row("RuntimeError: boom")["outcome"] == "error"
+
+
+def test_a_bad_row_does_not_stop_the_writer(tmp_path):
+    """A batch that can't be written is counted and dropped; later runs are still written"""
+    log = RunLog(str(tmp_path / "runs.db"), batch_size=1, flush_interval_s=0.01)
+    bad = _answered_run("How many orders?").to_row()
+    del bad["nodes"]
+    log.submit(bad)
+    assert log.flush()
+    log.submit({**_answered_run("How many orders?").to_row(), "planned_tables": {object()}})
+    assert log.flush()
+    log.submit(_answered_run("Which aisle is largest?").to_row())
+    assert log.flush()
+    assert log.stats["write_errors"] == 2 and log.stats["written"] == 1 and log._worker.is_alive()
+
+def test_background_writes_and_reports(tmp_path):
+    """Runs are written off-thread in batches and feed the CLI reports"""
+    path = str(tmp_path / "runs.db")
+    log = RunLog(path, batch_size=10, flush_interval_s=0.05)
+    for question in ["How many orders?", "how many orders", "Which aisle is largest?"]:
+        log.submit(_answered_run(question).to_row())
+    assert log.flush()
+    assert log.stats["written"] == 3
+
+    conn = connect(path)
+    try:
+        repeats = run_report(conn, "repeats")
+        assert len(repeats) == 1 and repeats[0]["n"] == 2
+        failures = run_report(conn, "failures")
+        assert [(r["kind"], r["n"]) for r in failures] == [("execution_error", 3)]
+        assert len(run_report(conn, "slowest", top=2)) == 2
+        assert {r["node"] for r in run_report(conn, "nodes")} >= {"planning", "execute_sql"}
+    finally:
+        conn.close()
+
+
+# runs as created by the first release of the run log
+FIRST_RUNS_TABLE = """
+create table runs (
+    run_id text primary key, ts real not null, question text not null, question_key text not null,
+    engine text, outcome text not null, failure_type text, planned_tables text, final_sql text,
+    rows integer, total_rows integer, attempts integer, fast_path integer, speculation text,
+    llm_calls integer, input_tokens integer, output_tokens integer, total_tokens integer,
+    duration_ms real, error text
+)
+"""
+
+
+def test_older_logs_get_the_added_columns(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "runs.db")
+    with sqlite3.connect(path) as old:
+        old.execute(FIRST_RUNS_TABLE)
+    conn = connect(path)
+    assert {"source", "cached", "follow_up", "database"} <= {row[1] for row in conn.execute("pragma table_info(runs)")}
+
+    row = _answered_run("How many orders?").to_row()
+    write_runs(conn, [{**row, "follow_up": "local"}])
+    assert conn.execute("select outcome, follow_up, source from runs").fetchall() == [("answered", "local", "user")]
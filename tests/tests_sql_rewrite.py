@@ -0,0 +1,63 @@
+"""
+Tests for the automatic LIMIT rewrite
+"""
+from src.utils.sql_rewrite import (
+    apply_row_limit,
+    count_rows_sql,
+    referenced_tables,
+    row_range_sql,
+    total_rows_mode,
+)
+
+
+def test_limits_unbounded_queries_only():
+    """Outermost LIMIT is added to list queries and set operations, nothing else changes"""
+    sql, limit = apply_row_limit("select product_name from products order by product_name;", 101)
+    assert sql == "select product_name from products order by product_name\nlimit 101"
+    assert limit == 101
+
+    sql, limit = apply_row_limit("select a from t union select b from u", 50)
+    assert sql.endswith("limit 50") and limit == 50
+
+    # CTE and subquery bodies stay as written
+    cte = "with top as (select product_id from products limit 5) select * from top join (select * from aisles) a on true"
+    sql, _ = apply_row_limit(cte, 10)
+    assert sql == cte + "\nlimit 10"
+
+
+def test_keeps_explicit_limits_and_single_row_aggregates():
+    for sql in [
+        "select product_name from products limit 5",
+        "select product_name from products fetch first 3 rows only",
+        "select count(*) from products",
+        "select avg(days_since_prior_order), max(order_number) from orders",
+        "select 1",
+        "not sql at all (",
+    ]:
+        assert apply_row_limit(sql, 100) == (sql, None)
+
+    # Grouped and windowed aggregates can return many rows
+    assert apply_row_limit("select aisle_id, count(*) from products group by aisle_id", 100)[1] == 100
+    assert apply_row_limit("select sum(order_number) over () from orders", 100)[1] == 100
+
+
+def test_total_rows():
+    assert count_rows_sql("select a from t order by a") == "select count(*) from (\nSELECT a FROM t\n) as total_rows"
+    assert total_rows_mode("How many products are in snacks?", "auto") == "exact"
+    assert total_rows_mode("Show me products in snacks", "auto") == "estimate"
+    assert total_rows_mode("Show me products in snacks", "off") is None
+
+
+def test_referenced_tables():
+    """Base tables only: CTE names are excluded, unparsable SQL gives None"""
+    sql = ("with counts as (select department_id, count(*) as n from products group by 1) "
+           "select d.department, c.n from counts c join departments d using (department_id)")
+    assert referenced_tables(sql) == {"products", "departments"}
+    assert referenced_tables("not sql at all (") is None
+
+
+def test_row_range_sql():
+    """Bounds are appended in the query's own order, or applied around an existing LIMIT"""
+    assert row_range_sql("select a from t order by a;", 10) == "select a from t order by a\noffset 10"
+    assert row_range_sql("select a from t order by a limit 5", 2, 3) == \
+        "select * from (\nselect a from t order by a limit 5\n) as result_rows\nlimit 3\noffset 2"
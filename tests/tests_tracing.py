@@ -0,0 +1,72 @@
+"""
+Tests for sampled, non-blocking tracing against a local stand-in collector
+"""
+import threading
+import pytest
+from src.utils import tracing
+
+
+@pytest.fixture
+def collector():
+    server = tracing.make_collector_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    tracing.configure_tracing("off")
+
+
+def _request(fail: bool):
+    @tracing.observe(name="request")
+    def handle():
+        node()
+        tracing.update_current_trace(input="q", output="a", failed=fail)
+
+    @tracing.observe(name="node")
+    def node():
+        return 1
+
+    return handle
+
+
+def test_failed_requests_kept_successes_sampled(collector):
+    """Tail sampling keeps failures even with a 0% head sample rate"""
+    url = f"http://127.0.0.1:{collector.server_address[1]}"
+    tracer = tracing.configure_tracing("sampled", tracing.CollectorExporter(url), sample_rate=0.0,
+                                       flush_interval_s=0.05)
+
+    _request(fail=False)()
+    _request(fail=True)()
+    assert tracer.flush()
+
+    assert len(collector.traces) == 1
+    trace = collector.traces[0]
+    assert trace["sampled_by"] == "error"
+    assert [span["name"] for span in trace["spans"]] == ["node"]
+
+
+def test_queue_drops_when_full():
+    """A stalled exporter never blocks requests; overflow is dropped"""
+    release = threading.Event()
+
+    class StalledExporter:
+        def export(self, traces):
+            release.wait(5)
+
+    tracer = tracing.configure_tracing("sampled", StalledExporter(), sample_rate=1.0, queue_size=1)
+    for _ in range(5):
+        _request(fail=False)()
+    release.set()
+    tracing.configure_tracing("off")
+
+    assert tracer.stats["dropped"] >= 3
+
+
+def test_off_mode_returns_function_unchanged():
+    """No-op mode adds no wrapper at all"""
+    tracing.configure_tracing("off")
+
+    def func():
+        return 42
+
+    assert tracing.observe(name="x")(func) is func
@@ -0,0 +1,58 @@
+"""
+Tests for /query response encodings
+"""
+import datetime
+import decimal
+import gzip
+import io
+import json
+
+import pytest
+
+from backend_server import encoding
+
+RESULT = {
+    "sql": "select aisle, count(*), avg(price), max(day) from orders group by aisle",
+    "nl_response": "Fresh fruits lead.",
+    "columns": ["aisle", "count", "avg", "max"],
+    "results": [("fresh fruits", 120, decimal.Decimal("2.50"), datetime.date(2024, 1, 2)),
+                ("yogurt", 80, None, datetime.date(2024, 1, 3))] * 200,
+    "planned_tables": {"orders"},
+}
+
+
+def test_encodings_carry_the_same_result():
+    """JSON rows, columnar MessagePack and Arrow decode to the same values"""
+    pa = pytest.importorskip("pyarrow")
+    if encoding._msgpack() is None:
+        pytest.skip("no MessagePack package")
+
+    as_json = json.loads(encoding.encode(RESULT, "json"))
+    assert as_json["results"][0] == ["fresh fruits", 120, 2.5, "2024-01-02"]
+    assert as_json["planned_tables"] == ["orders"] and "layout" not in as_json
+
+    as_msgpack = encoding._msgpack().unpackb(encoding.encode(RESULT, "msgpack"))
+    assert as_msgpack["layout"] == "columns"
+    assert [list(row) for row in zip(*as_msgpack["results"])] == as_json["results"]
+
+    table = pa.ipc.open_stream(io.BytesIO(encoding.encode(RESULT, "arrow"))).read_all()
+    assert table.column_names == RESULT["columns"] and table.num_rows == 400
+    assert table.column("avg").to_pylist()[:2] == [2.5, None]
+    assert json.loads(table.schema.metadata[b"response"])["nl_response"] == "Fresh fruits lead."
+
+    # Only the requested fields, and no rows unless asked for
+    assert json.loads(encoding.encode(RESULT, "json", fields=["sql", "nl_response"])).keys() == {"sql", "nl_response"}
+
+
+def test_negotiation_and_compression():
+    assert encoding.negotiate(None) == "json"
+    assert encoding.negotiate("text/html, application/msgpack;q=0.9, */*;q=0.1") == "msgpack"
+    assert encoding.negotiate("application/json;q=0.5, application/vnd.apache.arrow.stream") == "arrow"
+    with pytest.raises(encoding.NotAcceptable):
+        encoding.negotiate("text/html, application/json;q=0")
+
+    body = encoding.encode(RESULT, "json")
+    compressed, used = encoding.compress(body, "gzip;q=1, br;q=0")
+    assert used == "gzip" and gzip.decompress(compressed) == body and len(compressed) < len(body) / 5
+    assert encoding.compress(body, "identity") == (body, None)
+    assert encoding.compress(b"{}", "gzip") == (b"{}", None)